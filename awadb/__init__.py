@@ -6,6 +6,7 @@ import io
 import json
 import os
 import struct
+import threading
 import time
 import uuid
 from enum import Enum
@@ -18,6 +19,10 @@ from awadb.punctuation_marks_en import punctuation_marks
 from awadb.stop_words_en import stop_words
 from awadb.words_stem_en import PorterStemmer
 from awadb.library import AwaLocal
+from awadb.library import DEFAULT_INDEXING_SIZE
+from awadb.library import DEFAULT_RETRIEVAL_PARAM
+from awadb.library import DEFAULT_RETRIEVAL_TYPE
+from awadb.library import RETRIEVAL_TYPES
 
 
 __version__ = "0.3.13"
@@ -78,23 +83,60 @@ def md5str(str):
     return m.hexdigest()
 
 
+# Embedding models loaded in this process, shared by all the AwaEmbedding objects
+embedding_models = {}
+embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: Optional[str] = None):
+    """Get the embedding model, it is loaded only once per process.
+
+    Args:
+        model_name: "OpenAI" or "HuggingFace", default to "HuggingFace".
+
+    Returns:
+        The loaded embedding model.
+    """
+    if model_name != "OpenAI":
+        model_name = "HuggingFace"
+
+    model = embedding_models.get(model_name)
+    if model is not None:
+        return model
+
+    with embedding_models_lock:
+        model = embedding_models.get(model_name)
+        if model is None:
+            if model_name == "OpenAI":
+                from awadb.awa_embedding.openai import OpenAIEmbeddings
+
+                model = OpenAIEmbeddings()
+            else:
+                from awadb.awa_embedding.huggingface import HuggingFaceEmbeddings
+
+                model = HuggingFaceEmbeddings()
+            embedding_models[model_name] = model
+    return model
+
+
 class AwaEmbedding:
     """Embedding models."""
 
-    def __init__(self, model_name: Optional[str] = None):
+    def __init__(self, model_name: Optional[str] = None, cache_dir: Optional[str] = None):
         if model_name is None:
             self.model_name = "HuggingFace"
         else:
             self.model_name = model_name
 
-        if self.model_name == "OpenAI":
-            from awadb.awa_embedding.openai import OpenAIEmbeddings
+        self.llm = get_embedding_model(self.model_name)
+        # embeddings are looked up in the persistent cache before calling the model
+        self.cache = None
+        if cache_dir is not None:
+            from awadb.embedding_cache import get_embedding_cache
 
-            self.llm = OpenAIEmbeddings()
-        else:
-            from awadb.awa_embedding.huggingface import HuggingFaceEmbeddings
-
-            self.llm = HuggingFaceEmbeddings()
+            # keyed by the model behind the provider name, its embeddings differ
+            model_id = getattr(self.llm, "model_id", self.model_name)
+            self.cache = get_embedding_cache(cache_dir, model_id)
 
     # set your own llm
     def SetModel(self, model_name):
@@ -105,14 +147,31 @@ class AwaEmbedding:
         self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
 
     def Embedding(self, sentence):
-        return self.llm.Embedding(sentence)
+        if self.cache is None:
+            return self.llm.Embedding(sentence)
+        embedding = self.cache.get(sentence)
+        if embedding is None:
+            embedding = self.llm.Embedding(sentence)
+            self.cache.put(sentence, embedding)
+        return embedding
 
     def EmbeddingBatch(
         self,
         texts: Iterable[str],
         **kwargs: Any,
     ) -> List[List[float]]:
-        return self.llm.EmbeddingBatch(texts, **kwargs)
+        if self.cache is None:
+            return self.llm.EmbeddingBatch(texts, **kwargs)
+        texts = list(texts)
+        embeddings = self.cache.get_batch(texts)
+        missed = [i for i in range(len(texts)) if embeddings[i] is None]
+        if len(missed) > 0:
+            missed_texts = [texts[i] for i in missed]
+            missed_embeddings = self.llm.EmbeddingBatch(missed_texts, **kwargs)
+            self.cache.put_batch(missed_texts, missed_embeddings)
+            for i, embedding in zip(missed, missed_embeddings):
+                embeddings[i] = embedding
+        return embeddings
 
 
 class Client:
@@ -148,12 +207,14 @@ class Client:
         self.english_word_stemmer = PorterStemmer()
         self.extra_new_fields = []
         self.row_fields = {}
+        self.tables_index_config = {}
 
         existed_meta_file = data_dir + "/tables.meta"
         if os.path.isfile(existed_meta_file):
             self.Read()
 
         self.llm = None
+        self.embedding_cache_dir = root_dir + "/embedding_cache"
         self.is_duplicate_texts = True
         self.model_name = "HuggingFace"
 
@@ -192,6 +253,7 @@ class Client:
         tables_meta["vector_field_name"] = self.tables_vector_field_name
 
         tables_meta["doc_count"] = self.tables_doc_count
+        tables_meta["index_config"] = self.tables_index_config
 
         tables_dict = {}
         for key in self.tables_attr:
@@ -260,6 +322,7 @@ class Client:
 
             self.tables_fields_check = tables_meta["fields_check"]
             self.tables_doc_count = tables_meta["doc_count"]
+            self.tables_index_config = tables_meta.get("index_config", {})
 
             for table_name in tables_meta["fields_type"]:
                 table_field_dict = {}
@@ -322,17 +385,25 @@ class Client:
                     vec_info.store_param = each_vec_info["store_param"]
                     table_info.AddVectorInfo(vec_info)
 
-                table_info.SetIndexingSize(10000)
-                table_info.SetRetrievalType("IVFPQ")
-                table_info.SetRetrievalParam('{"ncentroids" : 256, "nsubvector" : 16}')
+                self.__SetTableIndex(table_name, table_info)
                 self.tables_attr[table_name] = table_info
 
-    def Create(self, table_name, model_name="HuggingFace"):
+    def Create(
+        self,
+        table_name,
+        model_name="HuggingFace",
+        retrieval_type: str = DEFAULT_RETRIEVAL_TYPE,
+        retrieval_param: Optional[dict] = None,
+        indexing_size: int = DEFAULT_INDEXING_SIZE,
+    ):
         """Create a new table with the specified embedding model.
         
         Args:
             table_name: the creating table name.
             model_name: the embedding model name, default to "HuggingFace".
+            retrieval_type: the vector index type, "FLAT", "IVFPQ", "IVFFLAT" or "HNSW", default to "IVFPQ".
+            retrieval_param: the index parameters, e.g. `{"nlinks": 32, "efConstruction": 160}` for HNSW.
+            indexing_size: the index is built in background once the number of documents reaches it.
 
         Returns:
             True or False, whether creating table success.
@@ -341,6 +412,10 @@ class Client:
         if model_name not in EMBEDDING_MODELS:
             raise NameError("Could not find this model: ", model_name)
 
+        retrieval_type = retrieval_type.upper()
+        if retrieval_type not in RETRIEVAL_TYPES:
+            raise NameError("Could not find this retrieval type: ", retrieval_type)
+
         if table_name in self.tables:
             print("Table %s exist! Please directly Use(%s)" % (table_name, table_name))
             self.using_table_name = table_name
@@ -359,9 +434,31 @@ class Client:
         self.tables_fields_check[table_name] = False
         self.tables_doc_count[table_name] = 0
         self.model_name = model_name
+        if retrieval_param is None:
+            retrieval_param = (
+                DEFAULT_RETRIEVAL_PARAM if retrieval_type == DEFAULT_RETRIEVAL_TYPE else {}
+            )
+        self.tables_index_config[table_name] = {
+            "retrieval_type": retrieval_type,
+            "retrieval_param": dict(retrieval_param),
+            "indexing_size": indexing_size,
+        }
         #self.llm = AwaEmbedding(self.model_name)
         return True
 
+    def __SetTableIndex(self, table_name, table_info):
+        index_config = self.tables_index_config.get(table_name)
+        if index_config is None:
+            index_config = {
+                "retrieval_type": DEFAULT_RETRIEVAL_TYPE,
+                "retrieval_param": dict(DEFAULT_RETRIEVAL_PARAM),
+                "indexing_size": DEFAULT_INDEXING_SIZE,
+            }
+            self.tables_index_config[table_name] = index_config
+        table_info.SetIndexingSize(index_config["indexing_size"])
+        table_info.SetRetrievalType(index_config["retrieval_type"])
+        table_info.SetRetrievalParam(json.dumps(index_config["retrieval_param"]))
+
     def Close(self, table_name: Optional[str] = None):
         """Close the specified table engine.
         
@@ -935,7 +1032,7 @@ class Client:
                     if key == "embedding_text":
                         if self.llm is None:
                             from awadb import AwaEmbedding
-                            self.llm = AwaEmbedding(self.model_name)
+                            self.llm = AwaEmbedding(self.model_name, self.embedding_cache_dir)
                         embedding_field = {}
                         embedding_field["text_embedding"] = self.llm.Embedding(
                             field[key]
@@ -987,7 +1084,7 @@ class Client:
             if self.llm is None:
                 # Set llm
                 from awadb import AwaEmbedding
-                self.llm = AwaEmbedding(self.model_name)
+                self.llm = AwaEmbedding(self.model_name, self.embedding_cache_dir)
             embeddings = self.llm.EmbeddingBatch(texts)
 
         awa_docs = awa.DocsVec()
@@ -1080,11 +1177,7 @@ class Client:
             self.tables_doc_count[self.using_table_name] += 1
             adding_docs_no = adding_docs_no + 1
             if not self.tables_fields_check[self.using_table_name]:
-                self.tables_attr[self.using_table_name].SetIndexingSize(10000)
-                self.tables_attr[self.using_table_name].SetRetrievalType("IVFPQ")
-                self.tables_attr[self.using_table_name].SetRetrievalParam(
-                    '{"ncentroids" : 256, "nsubvector" : 16}'
-                )
+                self.__SetTableIndex(self.using_table_name, self.tables_attr[self.using_table_name])
 
                 if not awa.Create(
                     self.using_table_engine, self.tables_attr[self.using_table_name]
@@ -1156,11 +1249,7 @@ class Client:
                 awadb_docs.append(awadb_doc)
 
         if not self.tables_fields_check[self.using_table_name]:
-            self.tables_attr[self.using_table_name].SetIndexingSize(10000)
-            self.tables_attr[self.using_table_name].SetRetrievalType("IVFPQ")
-            self.tables_attr[self.using_table_name].SetRetrievalParam(
-                '{"ncentroids" : 256, "nsubvector" : 16}'
-            )
+            self.__SetTableIndex(self.using_table_name, self.tables_attr[self.using_table_name])
 
             if not awa.Create(
                 self.using_table_engine, self.tables_attr[self.using_table_name]
@@ -1290,6 +1379,9 @@ class Client:
         text_in_page_content: Optional[str] = None,
         meta_filter: Optional[dict] = None,
         not_include_fields: Optional[Set[str]] = None,
+        brute_force_search: bool = False,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
         **kwargs: Any,
     ):
         """Search API.
@@ -1300,8 +1392,12 @@ class Client:
             test_in_page_content: The filter text in page content, used in langchain.
             meta_filter: Meta filter, each key-value pair denotes field_name-field_value pair.
             not_include_fields: The fields not included in the returned search results.
+            brute_force_search: Brute force search or not. The index is used once it is built.
+            nprobe: The number of probed buckets of IVFPQ and IVFFLAT index for this query.
+            ef_search: The efSearch of HNSW index for this query.
         Returns:
             Search results, json format output.
+            "SearchPath" of each result is "index" or "brute_force".
         """
 
         query_type = typeof(query)
@@ -1318,7 +1414,10 @@ class Client:
         vec_value = None
         query_dimension = 0
         if query_type == FieldDataType.STRING:  # semantic text search
-            vec_value = self.llm.Embedding(query)
+            if self.llm is None:
+                from awadb import AwaEmbedding
+                self.llm = AwaEmbedding(self.model_name, self.embedding_cache_dir)
+            vec_value = np.array(self.llm.Embedding(query), dtype=np.dtype("float32"))
         elif query_type == FieldDataType.VECTOR:  # vector search
             vec_value = np.array(query, dtype=np.dtype("float32"))
         if vec_value is not None:
@@ -1349,8 +1448,13 @@ class Client:
 
         req.SetReqNum(1)
         req.SetTopN(topn)
-        req.SetBruteForceSearch(1)
-        req.SetRetrievalParams('{"metric_type":"L2"}')
+        req.SetBruteForceSearch(1 if brute_force_search else 0)
+        retrieval_params = {"metric_type": "L2"}
+        if nprobe is not None:
+            retrieval_params["nprobe"] = nprobe
+        if ef_search is not None:
+            retrieval_params["efSearch"] = ef_search
+        req.SetRetrievalParams(json.dumps(retrieval_params))
         self.AddFilter(req, text_in_page_content, meta_filter)
 
         response = awa.Response()
@@ -1366,6 +1470,11 @@ class Client:
 
         ret = awa.DoSearch(self.using_table_engine, req, response)
         response.PackResults(fvec_names)
+        index_config = self.tables_index_config.get(self.using_table_name, {})
+        if response.BruteForceSearch() or index_config.get("retrieval_type") == "FLAT":
+            search_path = "brute_force"
+        else:
+            search_path = "index"
 
         search_result_vec = response.Results()
         search_result_index = 0
@@ -1373,6 +1482,7 @@ class Client:
             search_result = search_result_vec[search_result_index]
             result_per_request = {}
             result_per_request["ResultSize"] = search_result.result_items.__len__()
+            result_per_request["SearchPath"] = search_path
 
             result_items_list = []
             items = search_result.result_items
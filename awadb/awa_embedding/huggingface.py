@@ -1,11 +1,13 @@
 from awadb import AwaEmbedding
-from typing import Iterable, Any, List
+from typing import Iterable, Any, List, Optional
+import os
 
 # Use all-mpnet-base-v2 as the default model
 DEFAULT_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+DEFAULT_BATCH_SIZE = 64
 
 class HuggingFaceEmbeddings(AwaEmbedding):
-    def __init__(self):
+    def __init__(self, device: Optional[str] = None):
         self.tokenizer = None
         try:
             from sentence_transformers import SentenceTransformer
@@ -14,7 +16,11 @@ class HuggingFaceEmbeddings(AwaEmbedding):
                 "Could not import sentence_transformers python package. "
                 "Please install it with `pip install sentence_transformers`."
             ) from exc
-        self.model = SentenceTransformer(DEFAULT_MODEL_NAME)
+        # "cpu", "cuda", "mps"..., sentence_transformers picks one if not set
+        if device is None:
+            device = os.environ.get("AWADB_EMBEDDING_DEVICE")
+        self.model = SentenceTransformer(DEFAULT_MODEL_NAME, device=device)
+        self.model_id = DEFAULT_MODEL_NAME
 
     def Embedding(self, sentence):
         tokens = []
@@ -27,9 +33,10 @@ class HuggingFaceEmbeddings(AwaEmbedding):
     def EmbeddingBatch(
         self,
         texts: Iterable[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
         **kwargs: Any,
     ) -> List[List[float]]:
-        results: List[List[float]] = []
-        for text in texts:
-            results.append(self.model.encode(text))
-        return results
+        texts = list(texts)
+        if len(texts) == 0:
+            return []
+        return list(self.model.encode(texts, batch_size=batch_size))
@@ -4,6 +4,75 @@ import os
 import numpy as np
 
 DEFAULT_MODEL_NAME = "text-embedding-ada-002"
+# Limits of one embedding request
+MAX_BATCH_TOKENS = 100000
+MAX_BATCH_TEXTS = 2048
+# Limit of one input text of the model
+MAX_INPUT_TOKENS = 8191
+
+
+def split_text(text, max_tokens = MAX_INPUT_TOKENS, encoding = None):
+    """Split a text into chunks of at most max_tokens tokens.
+
+    Args:
+        text: the text to split.
+        max_tokens: the max tokens of a chunk.
+        encoding: the tiktoken encoding of the model. Without it every utf-8
+            byte is counted as a token, no token is shorter than a byte.
+
+    Returns:
+        A list of (chunk, number of tokens of the chunk) tuples.
+    """
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return [(text, len(tokens))]
+        return [
+            (encoding.decode(tokens[i : i + max_tokens]),
+             len(tokens[i : i + max_tokens]))
+            for i in range(0, len(tokens), max_tokens)
+        ]
+
+    data = text.encode("utf-8")
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = min(start + max_tokens, len(data))
+        # don't cut a utf-8 character, its continuation bytes are 10xxxxxx
+        while end < len(data) and end > start and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        if end == start:
+            end = min(start + max_tokens, len(data))
+        chunks.append((data[start:end].decode("utf-8", errors = "ignore"),
+                       end - start))
+        start = end
+    if len(chunks) == 0:
+        chunks.append((text, 0))
+    return chunks
+
+
+def merge_embeddings(embeddings, weights):
+    """Merge the embeddings of the chunks of a text.
+
+    Args:
+        embeddings: the embeddings of the chunks.
+        weights: the number of tokens of the chunks.
+
+    Returns:
+        The average of the embeddings weighted by the tokens, normalized to
+        unit length like the embeddings of the model.
+    """
+    if len(embeddings) == 1:
+        return list(embeddings[0])
+    if sum(weights) <= 0:
+        weights = None
+    merged = np.average(np.array(embeddings, dtype = np.float64), axis = 0,
+                        weights = weights)
+    norm = np.linalg.norm(merged)
+    if norm > 0:
+        merged = merged / norm
+    return merged.tolist()
+
 
 class OpenAIEmbeddings(AwaEmbedding):
     def __init__(self):
@@ -15,8 +84,19 @@ class OpenAIEmbeddings(AwaEmbedding):
                 "Please install it with `pip install openai`."
             ) from exc
         self.model = openai.Embedding
+        self.model_id = DEFAULT_MODEL_NAME
         self.tokenizer = None
         openai.api_key = os.environ["OPENAI_API_KEY"]
+        try:
+            import tiktoken
+
+            self.encoding = tiktoken.encoding_for_model(DEFAULT_MODEL_NAME)
+        except ImportError:
+            self.encoding = None
+
+    def __create(self, texts):
+        data = self.model.create(input = texts, model = DEFAULT_MODEL_NAME)["data"]
+        return [item["embedding"] for item in sorted(data, key = lambda item: item["index"])]
 
     def Embedding(self, sentence):
         tokens = []
@@ -30,9 +110,45 @@ class OpenAIEmbeddings(AwaEmbedding):
     def EmbeddingBatch(
         self,
         texts: Iterable[str],
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
         **kwargs: Any,
     ) -> List[List[float]]:
+        # the texts longer than the model limit are embedded by chunks, the
+        # embeddings of the chunks are merged into the one of the text
+        chunks = []
+        owners = []
+        for i, text in enumerate(texts):
+            for chunk in split_text(text, MAX_INPUT_TOKENS, self.encoding):
+                chunks.append(chunk)
+                owners.append(i)
+
+        chunk_embeddings: List[List[float]] = []
+        batch = []
+        batch_tokens = 0
+        for text, num_tokens in chunks:
+            if len(batch) > 0 and (
+                batch_tokens + num_tokens > max_batch_tokens
+                or len(batch) >= MAX_BATCH_TEXTS
+            ):
+                chunk_embeddings.extend(self.__create(batch))
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += num_tokens
+        if len(batch) > 0:
+            chunk_embeddings.extend(self.__create(batch))
+
         results: List[List[float]] = []
-        for text in texts:
-            results.append(self.model.create(input = text, model = DEFAULT_MODEL_NAME)["data"][0]["embedding"])
+        start = 0
+        while start < len(chunks):
+            end = start
+            while end < len(chunks) and owners[end] == owners[start]:
+                end += 1
+            results.append(
+                merge_embeddings(
+                    chunk_embeddings[start:end],
+                    [num_tokens for _, num_tokens in chunks[start:end]],
+                )
+            )
+            start = end
         return results
\ No newline at end of file
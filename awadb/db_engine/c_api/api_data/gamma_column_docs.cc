@@ -0,0 +1,90 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include "gamma_column_docs.h"
+
+namespace tig_gamma {
+
+ColumnDocs::ColumnDocs(int n, const std::string &key_name)
+    : n_(n), key_name_(key_name) {
+  key_column_ = -1;
+}
+
+void ColumnDocs::AddColumn(const DocColumn &column) {
+  if (column.datatype == DataType::VECTOR) {
+    vector_columns_.push_back(column);
+    return;
+  }
+  if (column.name == key_name_) key_column_ = table_columns_.size();
+  table_columns_.push_back(column);
+}
+
+const char *ColumnDocs::Keep(std::string &&buf) {
+  kept_bufs_.push_back(std::move(buf));
+  return kept_bufs_.back().data();
+}
+
+int ColumnDocs::ValueSize(const DocColumn &column) {
+  switch (column.datatype) {
+    case DataType::INT:
+    case DataType::FLOAT:
+      return 4;
+    case DataType::LONG:
+    case DataType::DOUBLE:
+      return 8;
+    case DataType::VECTOR:
+      return column.dimension * sizeof(float);
+    default:
+      return -1;
+  }
+}
+
+size_t ColumnDocs::DataSize(const DocColumn &column) const {
+  if (column.datatype == DataType::STRING) {
+    return column.offsets ? column.offsets[n_] : 0;
+  }
+  int value_size = ValueSize(column);
+  return value_size > 0 ? (size_t)value_size * n_ : 0;
+}
+
+void ColumnDocs::GetValue(const DocColumn &column, int i, const char *&value,
+                          size_t &len) const {
+  if (column.datatype == DataType::STRING) {
+    value = column.data + column.offsets[i];
+    len = column.offsets[i + 1] - column.offsets[i];
+    return;
+  }
+  len = ValueSize(column);
+  value = column.data + (size_t)i * len;
+}
+
+std::string ColumnDocs::Key(int i) const {
+  if (key_column_ < 0) return "";
+  const char *value = nullptr;
+  size_t len = 0;
+  GetValue(table_columns_[key_column_], i, value, len);
+  return std::string(value, len);
+}
+
+void ColumnDocs::GetDoc(int i, Doc &doc) const {
+  doc.SetKey(Key(i));
+  for (const std::vector<DocColumn> *columns :
+       {&table_columns_, &vector_columns_}) {
+    for (const DocColumn &column : *columns) {
+      struct Field field;
+      const char *value = nullptr;
+      size_t len = 0;
+      GetValue(column, i, value, len);
+      field.name = column.name;
+      field.datatype = column.datatype;
+      field.value.assign(value, len);
+      doc.AddField(std::move(field));
+    }
+  }
+}
+
+}  // namespace tig_gamma
@@ -0,0 +1,87 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <deque>
+#include <string>
+#include <vector>
+
+#include "gamma_doc.h"
+
+namespace tig_gamma {
+
+// one field of a batch of docs, data is a view of a buffer which is kept by
+// the caller until the docs are added
+struct DocColumn {
+  std::string name;
+  DataType datatype;
+  // fixed size values of all the docs back to back, a VECTOR value is
+  // dimension floats; the bytes of all the strings of a STRING column
+  const char *data = nullptr;
+  int dimension = 0;                 // VECTOR only
+  const int64_t *offsets = nullptr;  // STRING only, n + 1 offsets into data
+};
+
+/**
+ * A batch of docs stored field by field, it is added to the table and the
+ * raw vectors in blocks instead of building a Doc and its Fields for every
+ * doc. The key of a doc is its value of the key column.
+ */
+class ColumnDocs {
+ public:
+  ColumnDocs(int n, const std::string &key_name);
+
+  /**
+   * VECTOR columns are vector fields, the others are table fields
+   */
+  void AddColumn(const DocColumn &column);
+
+  /**
+   * keep buf until the docs are added, used when the columns are decoded
+   * @return the data of the kept buffer
+   */
+  const char *Keep(std::string &&buf);
+
+  int Size() const { return n_; }
+
+  const std::string &KeyName() const { return key_name_; }
+
+  std::vector<DocColumn> &TableColumns() { return table_columns_; }
+
+  std::vector<DocColumn> &VectorColumns() { return vector_columns_; }
+
+  /**
+   * @return bytes of one value of a fixed size column, -1 for STRING and
+   *         MULTI_STRING
+   */
+  static int ValueSize(const DocColumn &column);
+
+  /**
+   * @return bytes of all the values of the column
+   */
+  size_t DataSize(const DocColumn &column) const;
+
+  void GetValue(const DocColumn &column, int i, const char *&value,
+                size_t &len) const;
+
+  std::string Key(int i) const;
+
+  // build doc i, for the docs which are updated one by one
+  void GetDoc(int i, Doc &doc) const;
+
+ private:
+  int n_;
+  std::string key_name_;
+  int key_column_;  // index in table_columns_, -1 if not added
+
+  std::vector<DocColumn> table_columns_;
+  std::vector<DocColumn> vector_columns_;
+  std::deque<std::string> kept_bufs_;  // a deque does not move them
+};
+
+}  // namespace tig_gamma
@@ -9,14 +9,18 @@
 
 namespace tig_gamma {
 
-EngineStatus::EngineStatus() { engine_status_ = nullptr; }
+EngineStatus::EngineStatus() {
+  engine_status_ = nullptr;
+  unindexed_num_ = 0;
+  indexing_lag_ms_ = 0;
+}
 
 int EngineStatus::Serialize(char **out, int *out_len) {
   flatbuffers::FlatBufferBuilder builder;
   auto table = gamma_api::CreateEngineStatus(
       builder, index_status_, table_mem_bytes_, index_mem_bytes_,
       vector_mem_bytes_, field_range_mem_bytes_, bitmap_mem_bytes_, doc_num_,
-      max_docid_, min_indexed_num_);
+      max_docid_, min_indexed_num_, unindexed_num_, indexing_lag_ms_);
   builder.Finish(table);
   *out_len = builder.GetSize();
   *out = (char *)malloc(*out_len * sizeof(char));
@@ -38,6 +42,8 @@ void EngineStatus::Deserialize(const char *data, int len) {
   doc_num_ = engine_status_->doc_num();
   max_docid_ = engine_status_->max_docid();
   min_indexed_num_ = engine_status_->min_indexed_num();
+  unindexed_num_ = engine_status_->unindexed_num();
+  indexing_lag_ms_ = engine_status_->indexing_lag_ms();
 }
 
 int EngineStatus::IndexStatus() { return index_status_; }
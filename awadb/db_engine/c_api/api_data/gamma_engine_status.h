@@ -58,6 +58,16 @@ class EngineStatus : public RawData {
     min_indexed_num_ = min_indexed_num;
   }
 
+  long UnindexedNum() { return unindexed_num_; }
+
+  void SetUnindexedNum(long unindexed_num) { unindexed_num_ = unindexed_num; }
+
+  long IndexingLagMs() { return indexing_lag_ms_; }
+
+  void SetIndexingLagMs(long indexing_lag_ms) {
+    indexing_lag_ms_ = indexing_lag_ms;
+  }
+
  private:
   gamma_api::EngineStatus *engine_status_;
 
@@ -72,6 +82,9 @@ class EngineStatus : public RawData {
   int max_docid_;
 
   int min_indexed_num_;
+
+  long unindexed_num_;    // stored vectors which are not indexed yet
+  long indexing_lag_ms_;  // age of the oldest unindexed vector
 };
 
 }  // namespace tig_gamma
@@ -16,8 +16,8 @@ int Request::Serialize(char **out, int *out_len) {
   for (struct VectorQuery &vec_field : vec_fields_) {
     std::string &name = vec_field.name;
 
-    std::vector<uint8_t> value(vec_field.value.size());
-    memcpy(value.data(), vec_field.value.data(), vec_field.value.size());
+    std::vector<uint8_t> value(vec_field.Size());
+    memcpy(value.data(), vec_field.Data(), vec_field.Size());
 
     double min_score = vec_field.min_score;
     double max_score = vec_field.max_score;
@@ -63,6 +63,10 @@ Response::Response() {
 }
 
 Response::~Response() { 
+  if (gamma_results_) {
+    delete[] gamma_results_;
+    gamma_results_ = nullptr;
+  }
 #ifdef PERFORMANCE_TESTING
   if(perf_tool_) {
     PerfTool *perf_tool = static_cast<PerfTool *>(perf_tool_);
@@ -255,6 +259,23 @@ void Response::SetEngineInfo(void *table, void *vector_mgr,
   vector_mgr_ = vector_mgr;
 }
 
+void Response::MoveResult(int i, int topn, Response &response) {
+  response.SetBruteForceSearch(brute_force_search_);
+  if (i < (int)results_.size()) {
+    response.AddResults(std::move(results_[i]));
+  }
+  if (gamma_results_ == nullptr || i >= req_num_) return;
+
+  GammaResult &from = gamma_results_[i];
+  GammaResult *result = new GammaResult[1];
+  std::swap(result->topn, from.topn);
+  std::swap(result->total, from.total);
+  std::swap(result->results_count, from.results_count);
+  std::swap(result->docs, from.docs);
+  if (result->results_count > topn) result->results_count = topn;
+  response.SetEngineInfo(table_, vector_mgr_, result, 1);
+}
+
 int Response::PackResultItem(const VectorDoc *vec_doc, 
                              std::vector<std::string> &fields_name,
                              struct ResultItem &result_item) {
@@ -369,4 +390,222 @@ int Response::PackResults(std::vector<std::string> &fields_name) {
   return 0;
 }
 
+static void AppendNumericValue(ResultColumn &column, const std::string &value,
+                               bool is_raw) {
+  switch (column.datatype) {
+    case DataType::INT: {
+      int v = 0;
+      if (is_raw) {
+        memcpy((void *)&v, value.c_str(), std::min(value.size(), sizeof(v)));
+      } else {
+        v = std::atoi(value.c_str());
+      }
+      column.data.append((const char *)&v, sizeof(v));
+      break;
+    }
+    case DataType::LONG: {
+      int64_t v = 0;
+      if (is_raw) {
+        long lv = 0;
+        memcpy((void *)&lv, value.c_str(), std::min(value.size(), sizeof(lv)));
+        v = lv;
+      } else {
+        v = std::atoll(value.c_str());
+      }
+      column.data.append((const char *)&v, sizeof(v));
+      break;
+    }
+    case DataType::FLOAT: {
+      float v = 0;
+      if (is_raw) {
+        memcpy((void *)&v, value.c_str(), std::min(value.size(), sizeof(v)));
+      } else {
+        v = std::strtof(value.c_str(), nullptr);
+      }
+      column.data.append((const char *)&v, sizeof(v));
+      break;
+    }
+    case DataType::DOUBLE: {
+      double v = 0;
+      if (is_raw) {
+        memcpy((void *)&v, value.c_str(), std::min(value.size(), sizeof(v)));
+      } else {
+        v = std::strtod(value.c_str(), nullptr);
+      }
+      column.data.append((const char *)&v, sizeof(v));
+      break;
+    }
+    default:
+      break;
+  }
+}
+
+static size_t DataTypeSize(DataType type) {
+  switch (type) {
+    case DataType::INT:
+      return sizeof(int);
+    case DataType::LONG:
+      return sizeof(int64_t);
+    case DataType::FLOAT:
+      return sizeof(float);
+    case DataType::DOUBLE:
+      return sizeof(double);
+    default:
+      return 0;
+  }
+}
+
+int Response::PackColumns(const std::vector<std::string> &fields_name,
+                          ColumnarResult &result) {
+  VectorManager *vector_mgr = static_cast<VectorManager *>(vector_mgr_);
+  Table *table = static_cast<Table *>(table_);
+
+  result.query_offsets.resize(req_num_ + 1, 0);
+  result.totals.resize(req_num_, 0);
+  size_t hits_num = 0;
+  for (int i = 0; i < req_num_; ++i) {
+    result.totals[i] = gamma_results_[i].total;
+    hits_num += gamma_results_[i].results_count;
+    result.query_offsets[i + 1] = hits_num;
+  }
+  result.docids.reserve(hits_num);
+  result.scores.reserve(hits_num);
+  for (int i = 0; i < req_num_; ++i) {
+    for (int j = 0; j < gamma_results_[i].results_count; ++j) {
+      VectorDoc *vec_doc = gamma_results_[i].docs[j];
+      result.docids.push_back(vec_doc->docid);
+      result.scores.push_back(vec_doc->score);
+    }
+  }
+
+  std::vector<FieldInfo> all_fields;
+  if (table) table->GetAllFields(all_fields);
+  std::map<std::string, DataType> fields_type;
+  for (const FieldInfo &field_info : all_fields) {
+    fields_type[field_info.name] = field_info.data_type;
+  }
+  std::map<std::string, RawVector *> raw_vectors;
+  if (vector_mgr) raw_vectors = vector_mgr->RawVectors();
+
+  std::vector<std::string> names = fields_name;
+  if (names.size() == 0) {
+    for (const FieldInfo &field_info : all_fields) {
+      names.push_back(field_info.name);
+    }
+  }
+
+  const std::map<std::string, int> empty_map;
+  const std::map<std::string, int> &attr_map =
+      table ? table->FieldMap() : empty_map;
+  for (const std::string &name : names) {
+    ResultColumn column;
+    column.name = name;
+    column.valid.resize(hits_num, 1);
+
+    auto vec_iter = raw_vectors.find(name);
+    if (vec_iter != raw_vectors.end()) {
+      RawVector *raw_vec = vec_iter->second;
+      int d = raw_vec->MetaInfo()->Dimension();
+      size_t d_byte = (size_t)d * raw_vec->MetaInfo()->DataSize();
+      column.datatype = DataType::VECTOR;
+      column.dimension = d;
+      column.data.resize(hits_num * d_byte, 0);
+      for (size_t k = 0; k < hits_num; ++k) {
+        int vid = raw_vec->VidMgr()->GetFirstVID(result.docids[k]);
+        ScopeVector scope_vec;
+        if (vid < 0 || raw_vec->GetVector(vid, scope_vec) != 0 ||
+            scope_vec.Get() == nullptr) {
+          column.valid[k] = 0;
+          continue;
+        }
+        memcpy((void *)(&column.data[0] + k * d_byte), scope_vec.Get(), d_byte);
+      }
+      result.columns.push_back(std::move(column));
+      continue;
+    }
+
+    auto type_iter = fields_type.find(name);
+    if (type_iter == fields_type.end()) {
+      LOG(WARNING) << "Field [" << name << "] not exist, skip packing it";
+      continue;
+    }
+    column.datatype = type_iter->second;
+    bool is_attr = attr_map.find(name) != attr_map.end();
+    bool is_string = column.datatype == DataType::STRING ||
+                     column.datatype == DataType::MULTI_STRING;
+    if (is_string) {
+      column.offsets.push_back(0);
+      if (column.datatype == DataType::MULTI_STRING) {
+        column.list_offsets.push_back(0);
+      }
+    } else {
+      column.data.reserve(hits_num * DataTypeSize(column.datatype));
+    }
+
+    for (size_t k = 0; k < hits_num; ++k) {
+      int docid = (int)result.docids[k];
+      std::vector<std::string> values;
+      int ret = 0;
+      if (is_attr) {
+        std::string value;
+        ret = table->GetFieldRawValue(docid, name, value);
+        values.push_back(std::move(value));
+      } else {
+        ret = table->GetColFieldRawValue(docid, name, values);
+      }
+      if (ret != 0 || values.size() == 0) {
+        column.valid[k] = 0;
+        values.clear();
+      }
+
+      if (is_string) {
+        for (const std::string &value : values) {
+          column.data.append(value);
+          column.offsets.push_back(column.data.size());
+          if (column.datatype == DataType::STRING) break;
+        }
+        if (column.datatype == DataType::STRING && values.size() == 0) {
+          column.offsets.push_back(column.data.size());
+        }
+        if (column.datatype == DataType::MULTI_STRING) {
+          column.list_offsets.push_back(column.offsets.size() - 1);
+        }
+      } else if (values.size() == 0) {
+        column.data.append(DataTypeSize(column.datatype), 0);
+      } else {
+        AppendNumericValue(column, values[0], is_attr);
+      }
+    }
+    result.columns.push_back(std::move(column));
+  }
+
+  delete[] gamma_results_;
+  gamma_results_ = nullptr;
+  return 0;
+}
+
+int Response::PackIdsScores(int req_num, int topn, int64_t *ids,
+                            float *scores) {
+  for (int i = 0; i < req_num; ++i) {
+    int64_t *q_ids = ids + (size_t)i * topn;
+    float *q_scores = scores + (size_t)i * topn;
+    int count = 0;
+    if (gamma_results_ && i < req_num_) {
+      count = std::min(gamma_results_[i].results_count, topn);
+      for (int j = 0; j < count; ++j) {
+        VectorDoc *vec_doc = gamma_results_[i].docs[j];
+        q_ids[j] = vec_doc->docid;
+        q_scores[j] = vec_doc->score;
+      }
+    }
+    for (int j = count; j < topn; ++j) {
+      q_ids[j] = -1;
+      q_scores[j] = -1;
+    }
+  }
+  delete[] gamma_results_;
+  gamma_results_ = nullptr;
+  return 0;
+}
+
 }  // namespace tig_gamma
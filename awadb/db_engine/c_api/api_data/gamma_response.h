@@ -9,6 +9,7 @@
 
 #include <vector>
 #include "common/common_query_data.h"
+#include "c_api/api_data/gamma_table.h"
 #include "idl/fbs-gen/c/response_generated.h"
 
 namespace tig_gamma {
@@ -103,6 +104,26 @@ struct SearchResult {
   std::vector<struct ResultItem> result_items;
 };
 
+// one result field of all the hits, hits of query i are the rows
+// [query_offsets[i], query_offsets[i + 1]) of ColumnarResult
+struct ResultColumn {
+  std::string name;
+  DataType datatype;
+  int dimension = 0;                  // VECTOR only, floats per row
+  std::string data;                   // fixed width values or string bytes
+  std::vector<int64_t> offsets;       // STRING and MULTI_STRING, into data
+  std::vector<int64_t> list_offsets;  // MULTI_STRING rows, into offsets
+  std::vector<uint8_t> valid;         // 0 if the hit has no value
+};
+
+struct ColumnarResult {
+  std::vector<int64_t> query_offsets;
+  std::vector<int> totals;
+  std::vector<int64_t> docids;
+  std::vector<float> scores;
+  std::vector<struct ResultColumn> columns;
+};
+
 class Response {
  public:
   Response();
@@ -124,12 +145,32 @@ class Response {
   void SetEngineInfo(void *table, void *vector_mgr,
                   GammaResult *gamma_results, int req_num);
  
+  // move the result of query i of this batched response to response, which
+  // becomes the response of a single query with at most topn results
+  void MoveResult(int i, int topn, Response &response);
+
   void *GetPerTool() { return perf_tool_; }
 
+  // 1 : served by brute force search; 0 : served by the vector index
+  void SetBruteForceSearch(int brute_force_search) {
+    brute_force_search_ = brute_force_search;
+  }
+
+  int BruteForceSearch() { return brute_force_search_; }
+
   int PackResults(std::vector<std::string> &fields_name);
   
   int PackResultItem(const VectorDoc *vec_doc, std::vector<std::string> &fields_name,
                      struct ResultItem &result_item);
+
+  // write docids and scores of every query into caller owned row major
+  // arrays of req_num * topn, slots without a result are set to -1
+  int PackIdsScores(int req_num, int topn, int64_t *ids, float *scores);
+
+  // pack the hits column by column instead of one ResultItem per hit,
+  // all the table fields are packed if fields_name is empty
+  int PackColumns(const std::vector<std::string> &fields_name,
+                  ColumnarResult &result);
  
  private:
   gamma_api::Response *response_;
@@ -139,6 +180,7 @@ class Response {
   void *table_ = nullptr;
   void *vector_mgr_ = nullptr;
   int req_num_ = 0;
+  int brute_force_search_ = 0;
   void *perf_tool_;
 };
 
@@ -226,6 +226,12 @@ int SetConfig(void *engine, const char *config_str, int len) {
   return ret;
 }
 
+int SetSearchBatchOptions(void *engine, int max_wait_us, int max_batch_size) {
+  int ret = static_cast<tig_gamma::GammaEngine *>(engine)
+                ->SetSearchBatchOptions(max_wait_us, max_batch_size);
+  return ret;
+}
+
 int GetConfig(void *engine, char **config_str, int *len) {
   tig_gamma::Config config;
   int res = 
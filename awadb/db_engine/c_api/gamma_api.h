@@ -186,6 +186,16 @@ int DelDocByFilter(void *engine, const char *request_str, int len,
  */
 int SetConfig(void *engine, const char *config_str, int len);
 
+/** set how concurrent single query searches are batched
+ *
+ * @param engine  search engine pointer
+ * @param max_wait_us  max microseconds a search waits for its batch, 0
+ *                     disables batching
+ * @param max_batch_size  max queries of a batch
+ * @return 0 successed, others failed
+ */
+int SetSearchBatchOptions(void *engine, int max_wait_us, int max_batch_size);
+
 /** get all cache size by query
  *
  * @param engine  search engine pointer
@@ -32,6 +32,14 @@ struct VectorQuery {
   double boost;
   int has_boost;
   std::string retrieval_type;
+
+  // optional view of caller owned query vectors, used instead of value
+  // so that batch queries can be searched without copying them
+  const char *value_ptr = nullptr;
+  size_t value_len = 0;
+
+  const char *Data() const { return value_ptr ? value_ptr : value.data(); }
+  size_t Size() const { return value_ptr ? value_len : value.size(); }
 };
 
 struct VectorResult {
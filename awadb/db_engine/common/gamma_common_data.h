@@ -8,6 +8,7 @@
 #pragma once
 
 #include <algorithm>
+#include <cmath>
 
 #include "common/common_query_data.h"
 #include "index/retrieval_model.h"
@@ -27,6 +28,20 @@ const std::string EXTRA_VECTOR_RESULT = "vector_result";
 
 const float GAMMA_INDEX_RECALL_RATIO = 1.0f;
 
+// the filtered search is done over the matched docs when they are no more
+// than this, otherwise the filters are applied in the scan of the index
+const int FILTER_EXACT_SEARCH_MAX_DOCS = 50000;
+// below this selectivity the search scope of the index is widened
+const float FILTER_HYBRID_MAX_SELECTIVITY = 0.1f;
+const int FILTER_MAX_WIDEN_FACTOR = 8;
+
+enum class FilterSearchMode : std::uint8_t {
+  NONE = 0,  // no filter
+  EXACT,     // compute distances over the matched docs only
+  PUSHDOWN,  // apply the filters in the scan of the index
+  HYBRID     // like PUSHDOWN, but widen nprobe/efSearch
+};
+
 enum class ResultCode : std::uint16_t {
 #define DefineResultCode(Name, Value) Name = Value,
 #include "definition_list.h"
@@ -53,6 +68,8 @@ class GammaSearchCondition : public RetrievalContext {
     perf_tool_ = perf_tool;
     table = nullptr;
     batch_req_num = 1;
+    filter_search_mode = FilterSearchMode::NONE;
+    filter_selectivity = 1.0f;
   }
 
   GammaSearchCondition(GammaSearchCondition *condition) {
@@ -65,12 +82,18 @@ class GammaSearchCondition : public RetrievalContext {
     brute_force_search = condition->brute_force_search;
     l2_sqrt = condition->l2_sqrt;
     has_rank = condition->has_rank;
+    retrieval_parameters = condition->retrieval_parameters;
+    min_score = condition->min_score;
+    max_score = condition->max_score;
     perf_tool_ = condition->perf_tool_;
 
     range_filters = condition->range_filters;
     term_filters = condition->term_filters;
     table = condition->table;
     batch_req_num = condition->batch_req_num;
+    filter_search_mode = condition->filter_search_mode;
+    filter_selectivity = condition->filter_selectivity;
+    filter_docids = condition->filter_docids;
   }
 
   ~GammaSearchCondition() {
@@ -98,6 +121,31 @@ class GammaSearchCondition : public RetrievalContext {
   float max_score;
   int batch_req_num;
 
+  // plan of the filtered search, see GammaEngine::PlanFilteredSearch
+  FilterSearchMode filter_search_mode;
+  float filter_selectivity;
+  std::vector<int> filter_docids;  // sorted matched docs of EXACT mode
+
+  /**
+   * Widen the search scope (nprobe, efSearch) of an index for filtered
+   * searches, so that enough matched docs are left after filtering
+   *
+   * @param scope      search scope without filters
+   * @param max_scope  upper bound of the scope, no bound if <= 0
+   * @return the search scope to use
+   */
+  int WidenSearchScope(int scope, int max_scope) const {
+    if (filter_search_mode != FilterSearchMode::HYBRID ||
+        filter_selectivity <= 0) {
+      return scope;
+    }
+    float factor = std::min(1.0f / filter_selectivity,
+                            static_cast<float>(FILTER_MAX_WIDEN_FACTOR));
+    int widened = static_cast<int>(std::ceil(scope * factor));
+    if (max_scope > 0 && widened > max_scope) widened = max_scope;
+    return std::max(widened, scope);
+  }
+
   bool IsSimilarScoreValid(float score) const override {
     return (score <= max_score) && (score >= min_score);
   };
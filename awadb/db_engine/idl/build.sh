@@ -4,13 +4,9 @@ BASE_PATH=`pwd`
 FBS_GEN_PATH=fbs-gen
 
 THIRD_PARTY=$BASE_PATH/../third_party
-declare FLATBUFFERS_VERSION
-
-if [ "$(uname)" == "Darwin" ]; then
-  FLATBUFFERS_VERSION=2.0.0
-elif [ "$(expr substr $(uname -s) 1 5)" == "Linux" ]; then   
-  FLATBUFFERS_VERSION=1.11.0
-fi
+# the generated code is checked in, it is regenerated by the flatc of the
+# headers in third_party/flatbuffers on every platform
+FLATBUFFERS_VERSION=2.0.0
 
 if [ ! -d "$THIRD_PARTY/flatbuffers-$FLATBUFFERS_VERSION" ]; then
   cd $THIRD_PARTY
@@ -22,7 +22,9 @@ struct EngineStatus FLATBUFFERS_FINAL_CLASS : private flatbuffers::Table {
     VT_BITMAP_MEM = 14,
     VT_DOC_NUM = 16,
     VT_MAX_DOCID = 18,
-    VT_MIN_INDEXED_NUM = 20
+    VT_MIN_INDEXED_NUM = 20,
+    VT_UNINDEXED_NUM = 22,
+    VT_INDEXING_LAG_MS = 24
   };
   int32_t index_status() const {
     return GetField<int32_t>(VT_INDEX_STATUS, 0);
@@ -51,6 +53,12 @@ struct EngineStatus FLATBUFFERS_FINAL_CLASS : private flatbuffers::Table {
   int32_t min_indexed_num() const {
     return GetField<int32_t>(VT_MIN_INDEXED_NUM, 0);
   }
+  int64_t unindexed_num() const {
+    return GetField<int64_t>(VT_UNINDEXED_NUM, 0);
+  }
+  int64_t indexing_lag_ms() const {
+    return GetField<int64_t>(VT_INDEXING_LAG_MS, 0);
+  }
   bool Verify(flatbuffers::Verifier &verifier) const {
     return VerifyTableStart(verifier) &&
            VerifyField<int32_t>(verifier, VT_INDEX_STATUS) &&
@@ -62,6 +70,8 @@ struct EngineStatus FLATBUFFERS_FINAL_CLASS : private flatbuffers::Table {
            VerifyField<int32_t>(verifier, VT_DOC_NUM) &&
            VerifyField<int32_t>(verifier, VT_MAX_DOCID) &&
            VerifyField<int32_t>(verifier, VT_MIN_INDEXED_NUM) &&
+           VerifyField<int64_t>(verifier, VT_UNINDEXED_NUM) &&
+           VerifyField<int64_t>(verifier, VT_INDEXING_LAG_MS) &&
            verifier.EndTable();
   }
 };
@@ -97,6 +107,12 @@ struct EngineStatusBuilder {
   void add_min_indexed_num(int32_t min_indexed_num) {
     fbb_.AddElement<int32_t>(EngineStatus::VT_MIN_INDEXED_NUM, min_indexed_num, 0);
   }
+  void add_unindexed_num(int64_t unindexed_num) {
+    fbb_.AddElement<int64_t>(EngineStatus::VT_UNINDEXED_NUM, unindexed_num, 0);
+  }
+  void add_indexing_lag_ms(int64_t indexing_lag_ms) {
+    fbb_.AddElement<int64_t>(EngineStatus::VT_INDEXING_LAG_MS, indexing_lag_ms, 0);
+  }
   explicit EngineStatusBuilder(flatbuffers::FlatBufferBuilder &_fbb)
         : fbb_(_fbb) {
     start_ = fbb_.StartTable();
@@ -118,8 +134,12 @@ inline flatbuffers::Offset<EngineStatus> CreateEngineStatus(
     int64_t bitmap_mem = 0,
     int32_t doc_num = 0,
     int32_t max_docid = 0,
-    int32_t min_indexed_num = 0) {
+    int32_t min_indexed_num = 0,
+    int64_t unindexed_num = 0,
+    int64_t indexing_lag_ms = 0) {
   EngineStatusBuilder builder_(_fbb);
+  builder_.add_indexing_lag_ms(indexing_lag_ms);
+  builder_.add_unindexed_num(unindexed_num);
   builder_.add_bitmap_mem(bitmap_mem);
   builder_.add_field_range_mem(field_range_mem);
   builder_.add_vector_mem(vector_mem);
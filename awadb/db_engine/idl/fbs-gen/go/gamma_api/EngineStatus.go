@@ -141,8 +141,32 @@ func (rcv *EngineStatus) MutateMinIndexedNum(n int32) bool {
 	return rcv._tab.MutateInt32Slot(20, n)
 }
 
+func (rcv *EngineStatus) UnindexedNum() int64 {
+	o := flatbuffers.UOffsetT(rcv._tab.Offset(22))
+	if o != 0 {
+		return rcv._tab.GetInt64(o + rcv._tab.Pos)
+	}
+	return 0
+}
+
+func (rcv *EngineStatus) MutateUnindexedNum(n int64) bool {
+	return rcv._tab.MutateInt64Slot(22, n)
+}
+
+func (rcv *EngineStatus) IndexingLagMs() int64 {
+	o := flatbuffers.UOffsetT(rcv._tab.Offset(24))
+	if o != 0 {
+		return rcv._tab.GetInt64(o + rcv._tab.Pos)
+	}
+	return 0
+}
+
+func (rcv *EngineStatus) MutateIndexingLagMs(n int64) bool {
+	return rcv._tab.MutateInt64Slot(24, n)
+}
+
 func EngineStatusStart(builder *flatbuffers.Builder) {
-	builder.StartObject(9)
+	builder.StartObject(11)
 }
 func EngineStatusAddIndexStatus(builder *flatbuffers.Builder, indexStatus int32) {
 	builder.PrependInt32Slot(0, indexStatus, 0)
@@ -171,6 +195,12 @@ func EngineStatusAddMaxDocid(builder *flatbuffers.Builder, maxDocid int32) {
 func EngineStatusAddMinIndexedNum(builder *flatbuffers.Builder, minIndexedNum int32) {
 	builder.PrependInt32Slot(8, minIndexedNum, 0)
 }
+func EngineStatusAddUnindexedNum(builder *flatbuffers.Builder, unindexedNum int64) {
+	builder.PrependInt64Slot(9, unindexedNum, 0)
+}
+func EngineStatusAddIndexingLagMs(builder *flatbuffers.Builder, indexingLagMs int64) {
+	builder.PrependInt64Slot(10, indexingLagMs, 0)
+}
 func EngineStatusEnd(builder *flatbuffers.Builder) flatbuffers.UOffsetT {
 	return builder.EndObject()
 }
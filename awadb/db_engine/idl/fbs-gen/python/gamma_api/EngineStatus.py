@@ -87,7 +87,21 @@ class EngineStatus(object):
             return self._tab.Get(flatbuffers.number_types.Int32Flags, o + self._tab.Pos)
         return 0
 
-def Start(builder): builder.StartObject(9)
+    # EngineStatus
+    def UnindexedNum(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(22))
+        if o != 0:
+            return self._tab.Get(flatbuffers.number_types.Int64Flags, o + self._tab.Pos)
+        return 0
+
+    # EngineStatus
+    def IndexingLagMs(self):
+        o = flatbuffers.number_types.UOffsetTFlags.py_type(self._tab.Offset(24))
+        if o != 0:
+            return self._tab.Get(flatbuffers.number_types.Int64Flags, o + self._tab.Pos)
+        return 0
+
+def Start(builder): builder.StartObject(11)
 def EngineStatusStart(builder):
     """This method is deprecated. Please switch to Start."""
     return Start(builder)
@@ -127,6 +141,14 @@ def AddMinIndexedNum(builder, minIndexedNum): builder.PrependInt32Slot(8, minInd
 def EngineStatusAddMinIndexedNum(builder, minIndexedNum):
     """This method is deprecated. Please switch to AddMinIndexedNum."""
     return AddMinIndexedNum(builder, minIndexedNum)
+def AddUnindexedNum(builder, unindexedNum): builder.PrependInt64Slot(9, unindexedNum, 0)
+def EngineStatusAddUnindexedNum(builder, unindexedNum):
+    """This method is deprecated. Please switch to AddUnindexedNum."""
+    return AddUnindexedNum(builder, unindexedNum)
+def AddIndexingLagMs(builder, indexingLagMs): builder.PrependInt64Slot(10, indexingLagMs, 0)
+def EngineStatusAddIndexingLagMs(builder, indexingLagMs):
+    """This method is deprecated. Please switch to AddIndexingLagMs."""
+    return AddIndexingLagMs(builder, indexingLagMs)
 def End(builder): return builder.EndObject()
 def EngineStatusEnd(builder):
     """This method is deprecated. Please switch to End."""
@@ -13,6 +13,9 @@
 #include "util/log.h"
 
 namespace tig_gamma {
+
+thread_local utils::RateLimiter *index_write_limiter = nullptr;
+
 void write_index_header(const faiss::Index *idx, faiss::IOWriter *f) {
   WRITE1(idx->d);
   WRITE1(idx->ntotal);
@@ -106,6 +109,34 @@ void read_product_quantizer(faiss::ProductQuantizer *pq, faiss::IOReader *f) {
   READVECTOR(pq->centroids);
 }
 
+// the codes are written one after another whatever the layout of the bucket
+// is, so the files do not depend on it
+static void WriteCodes(faiss::IOWriter *f, realtime::RealTimeMemData *rt_data,
+                       size_t bno, size_t start, size_t n) {
+  if (!rt_data->block_codes_) {
+    WRITEANDCHECK(rt_data->cur_invert_ptr_->codes_array_[bno] +
+                      start * rt_data->code_bytes_per_vec_,
+                  n * rt_data->code_bytes_per_vec_);
+    return;
+  }
+  std::vector<uint8_t> codes(n * rt_data->code_bytes_per_vec_);
+  rt_data->GetCodes(bno, start, n, codes.data());
+  WRITEANDCHECK(codes.data(), codes.size());
+}
+
+static void ReadCodes(faiss::IOReader *f, realtime::RealTimeMemData *rt_data,
+                      size_t bno, size_t start, size_t n) {
+  if (!rt_data->block_codes_) {
+    READANDCHECK(rt_data->cur_invert_ptr_->codes_array_[bno] +
+                     start * rt_data->code_bytes_per_vec_,
+                 n * rt_data->code_bytes_per_vec_);
+    return;
+  }
+  std::vector<uint8_t> codes(n * rt_data->code_bytes_per_vec_);
+  READANDCHECK(codes.data(), codes.size());
+  rt_data->SetCodes(bno, start, n, codes.data());
+}
+
 int WriteInvertedLists(faiss::IOWriter *f,
                        realtime::RTInvertIndex *rt_invert_index) {
   realtime::RealTimeMemData *rt_data = rt_invert_index->cur_ptr_;
@@ -120,6 +151,7 @@ int WriteInvertedLists(faiss::IOWriter *f,
   std::vector<size_t> sizes;
   sizes.resize(rt_data->buckets_num_);
   for (size_t i = 0; i < rt_data->buckets_num_; ++i) {
+    rt_data->rewritten_buckets_[i] = false;
     size_t size = rt_data->cur_invert_ptr_->retrieve_idx_pos_[i];
     sizes[i] = size;
   }
@@ -129,12 +161,12 @@ int WriteInvertedLists(faiss::IOWriter *f,
 
   for (size_t i = 0; i < rt_data->buckets_num_; i++) {
     if (sizes[i] > 0) {
-      WRITEANDCHECK(rt_data->cur_invert_ptr_->codes_array_[i],
-                    sizes[i] * rt_data->code_bytes_per_vec_);
+      WriteCodes(f, rt_data, i, 0, sizes[i]);
 
       WRITEANDCHECK(rt_data->cur_invert_ptr_->idx_array_[i], sizes[i]);
     }
   }
+  rt_data->dumped_sizes_ = sizes;
   size_t ntotal = std::accumulate(sizes.data(), sizes.data() + sizes.size(), 0);
   LOG(INFO) << "ids_count=" << ntotal
             << ", buckets_num_=" << rt_data->buckets_num_;
@@ -172,9 +204,8 @@ int ReadInvertedLists(faiss::IOReader *f,
       LOG(ERROR) << "loading, extend bucket error";
       return INTERNAL_ERR;
     }
-    uint8_t *codes = rt_data->cur_invert_ptr_->codes_array_[bno];
     long *ids = rt_data->cur_invert_ptr_->idx_array_[bno];
-    READANDCHECK(codes, sizes[bno] * rt_data->code_bytes_per_vec_);
+    ReadCodes(f, rt_data, bno, 0, sizes[bno]);
     READANDCHECK(ids, sizes[bno]);
 
     for (int pos = 0; pos < (int)sizes[bno]; pos++) {
@@ -191,6 +222,108 @@ int ReadInvertedLists(faiss::IOReader *f,
 
     rt_data->cur_invert_ptr_->retrieve_idx_pos_[bno] = sizes[bno];
   }
+  rt_data->dumped_sizes_ = sizes;
+  return 0;
+}
+
+int WriteInvertedListsDelta(faiss::IOWriter *f,
+                            realtime::RTInvertIndex *rt_invert_index) {
+  realtime::RealTimeMemData *rt_data = rt_invert_index->cur_ptr_;
+  uint32_t h = faiss::fourcc("ildt");
+  WRITE1(h);
+  WRITE1(rt_data->buckets_num_);
+  WRITE1(rt_data->code_bytes_per_vec_);
+
+  std::vector<size_t> bnos, starts, sizes;
+  for (size_t i = 0; i < rt_data->buckets_num_; ++i) {
+    bool rewritten = rt_data->rewritten_buckets_[i].exchange(false);
+    size_t size = rt_data->cur_invert_ptr_->retrieve_idx_pos_[i];
+    size_t dumped = rt_data->dumped_sizes_[i];
+    if (!rewritten && size == dumped) continue;
+    bnos.push_back(i);
+    starts.push_back(rewritten || size < dumped ? 0 : dumped);
+    sizes.push_back(size);
+  }
+  WRITEVECTOR(bnos);
+  WRITEVECTOR(starts);
+  WRITEVECTOR(sizes);
+
+  size_t ntotal = 0;
+  for (size_t i = 0; i < bnos.size(); ++i) {
+    size_t n = sizes[i] - starts[i];
+    if (n > 0) {
+      WriteCodes(f, rt_data, bnos[i], starts[i], n);
+      WRITEANDCHECK(rt_data->cur_invert_ptr_->idx_array_[bnos[i]] + starts[i],
+                    n);
+    }
+    rt_data->dumped_sizes_[bnos[i]] = sizes[i];
+    ntotal += n;
+  }
+  LOG(INFO) << "delta ids_count=" << ntotal
+            << ", changed buckets=" << bnos.size();
+  return 0;
+}
+
+int ReadInvertedListsDelta(faiss::IOReader *f,
+                           realtime::RTInvertIndex *rt_invert_index) {
+  realtime::RealTimeMemData *rt_data = rt_invert_index->cur_ptr_;
+  uint32_t h;
+  size_t buckets_num = 0, code_bytes = 0;
+  READ1(h);
+  READ1(buckets_num);
+  READ1(code_bytes);
+  if (h != faiss::fourcc("ildt") || buckets_num != rt_data->buckets_num_ ||
+      code_bytes != rt_data->code_bytes_per_vec_) {
+    return FORMAT_ERR;
+  }
+
+  std::vector<size_t> bnos, starts, sizes;
+  READVECTOR(bnos);
+  READVECTOR(starts);
+  READVECTOR(sizes);
+  if (starts.size() != bnos.size() || sizes.size() != bnos.size()) {
+    return FORMAT_ERR;
+  }
+
+  for (size_t i = 0; i < bnos.size(); ++i) {
+    size_t bno = bnos[i];
+    if (bno >= rt_data->buckets_num_ || starts[i] > sizes[i]) return FORMAT_ERR;
+    realtime::RTInvertBucketData *invert = rt_data->cur_invert_ptr_;
+    if (starts[i] == 0) {
+      // the whole bucket is rewritten
+      invert->retrieve_idx_pos_[bno] = 0;
+      invert->deleted_nums_[bno] = 0;
+    } else if (starts[i] != invert->retrieve_idx_pos_[bno]) {
+      LOG(ERROR) << "delta of bucket " << bno << " starts at " << starts[i]
+                 << ", bucket size=" << invert->retrieve_idx_pos_[bno];
+      return FORMAT_ERR;
+    }
+
+    size_t n = sizes[i] - starts[i];
+    if (rt_data->ExtendBucketIfNeed(bno, n)) {
+      LOG(ERROR) << "loading delta, extend bucket error";
+      return INTERNAL_ERR;
+    }
+    // extending may switch the bucket data
+    invert = rt_data->cur_invert_ptr_;
+    long *ids = invert->idx_array_[bno] + starts[i];
+    ReadCodes(f, rt_data, bno, starts[i], n);
+    READANDCHECK(ids, n);
+
+    for (size_t pos = starts[i]; pos < sizes[i]; pos++) {
+      long id = invert->idx_array_[bno][pos];
+      if (id & realtime::kDelIdxMask) {
+        invert->deleted_nums_[bno]++;
+        continue;
+      }
+      while ((size_t)id >= invert->nids_) {
+        invert->ExtendIDs();
+      }
+      invert->vid_bucket_no_pos_[id] = bno << 32 | pos;
+    }
+    invert->retrieve_idx_pos_[bno] = sizes[i];
+    rt_data->dumped_sizes_[bno] = sizes[i];
+  }
   return 0;
 }
 
@@ -15,8 +15,14 @@
 #include "faiss/impl/io.h"
 #include "faiss/index_io.h"
 #include "realtime/realtime_invert_index.h"
+#include "util/rate_limiter.h"
 
 namespace tig_gamma {
+
+// limits the index files written by the current thread, it is set while a
+// checkpoint is dumping, nullptr for no limit
+extern thread_local utils::RateLimiter *index_write_limiter;
+
 /*************************************************************
  * I/O macros
  *
@@ -137,6 +143,7 @@ struct FileIOWriter : faiss::IOWriter {
   }
 
   size_t operator()(const void *ptr, size_t size, size_t nitems) override {
+    if (index_write_limiter) index_write_limiter->Acquire(size * nitems);
     return fwrite(ptr, size, nitems, f);
   }
   int fileno() override { return ::fileno(f); }
@@ -146,6 +153,18 @@ int WriteInvertedLists(faiss::IOWriter *f,
                        realtime::RTInvertIndex *rt_invert_index);
 int ReadInvertedLists(faiss::IOReader *f,
                       realtime::RTInvertIndex *rt_invert_index, int &indexed_vec_count);
+
+/**
+ * write the inverted lists changed since they are written last time, a
+ * bucket changed in place is written whole, otherwise only its appended keys
+ */
+int WriteInvertedListsDelta(faiss::IOWriter *f,
+                            realtime::RTInvertIndex *rt_invert_index);
+/**
+ * apply a delta written by WriteInvertedListsDelta to the loaded lists
+ */
+int ReadInvertedListsDelta(faiss::IOReader *f,
+                           realtime::RTInvertIndex *rt_invert_index);
 }  // namespace tig_gamma
 
 #endif
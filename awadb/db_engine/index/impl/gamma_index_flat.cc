@@ -17,16 +17,329 @@
 
 #include "gamma_index_flat.h"
 
+#include <algorithm>
+
 #include "omp.h"
 #include "vector/memory_raw_vector.h"
 #include "vector/mmap_raw_vector.h"
 
 using idx_t = faiss::Index::idx_t;
 
+#ifndef FINTEGER
+#define FINTEGER long
+#endif
+
+extern "C" {
+
+/* declare BLAS functions, see http://www.netlib.org/clapack/cblas/ */
+
+int sgemm_(const char *transa, const char *transb, FINTEGER *m, FINTEGER *n,
+           FINTEGER *k, const float *alpha, const float *a, FINTEGER *lda,
+           const float *b, FINTEGER *ldb, float *beta, float *c,
+           FINTEGER *ldc);
+}
+
 namespace tig_gamma {
 
 REGISTER_MODEL(FLAT, GammaFLATIndex);
 
+namespace {
+
+// tile sizes of the blocked search, a distance tile is
+// kQueryBlockSize * kVectorBlockSize floats, computed by slices of
+// kQuerySliceSize queries
+const int kQueryBlockSize = 256;
+const int kVectorBlockSize = 1024;
+const int kQuerySliceSize = 16;
+
+struct VectorBlock {
+  // floats, or the codes of quantized vectors, nullptr if the vectors are
+  // read from the store when the block is searched
+  const uint8_t *data;
+  int start_vid;
+  int len;
+};
+
+/**
+ * Split the vectors of the memory raw vector into blocks which are
+ * contiguous in memory, a block never spans two segments.
+ */
+int GetVectorBlocks(MemoryRawVector *raw_vec, int num_vectors,
+                    std::vector<VectorBlock> &blocks) {
+  ScopeVectors headers;
+  std::vector<int> lens;
+  int ret = raw_vec->GetMemHeader(0, num_vectors, headers, lens);
+  if (ret) {
+    LOG(ERROR) << "get vector header error, ret=" << ret;
+    return ret;
+  }
+
+  size_t item_size = raw_vec->Quantizer()
+                         ? raw_vec->Quantizer()->CodeSize()
+                         : raw_vec->VectorByteSize();
+  int start_vid = 0;
+  for (size_t i = 0; i < lens.size(); ++i) {
+    const uint8_t *seg = headers.Get(i);
+    for (int offset = 0; offset < lens[i]; offset += kVectorBlockSize) {
+      VectorBlock block;
+      block.data = seg + (size_t)offset * item_size;
+      block.start_vid = start_vid + offset;
+      block.len = std::min(kVectorBlockSize, lens[i] - offset);
+      blocks.push_back(block);
+    }
+    start_vid += lens[i];
+  }
+  return 0;
+}
+
+/**
+ * Split the vectors of a raw vector which are not kept in memory, e.g. by
+ * mmap, into blocks read from its store one at a time by the search.
+ */
+void GetStoreBlocks(int num_vectors, std::vector<VectorBlock> &blocks) {
+  for (int start = 0; start < num_vectors; start += kVectorBlockSize) {
+    VectorBlock block;
+    block.data = nullptr;
+    block.start_vid = start;
+    block.len = std::min(kVectorBlockSize, num_vectors - start);
+    blocks.push_back(block);
+  }
+}
+
+/**
+ * Copy the vectors of a block from the store of raw_vec into buf.
+ */
+int ReadBlock(RawVector *raw_vec, const VectorBlock &block,
+              std::vector<float> &buf) {
+  ScopeVectors headers;
+  std::vector<int> lens;
+  int ret =
+      raw_vec->GetVectorHeader(block.start_vid, block.len, headers, lens);
+  if (ret) {
+    LOG(ERROR) << "get vector header error, start=" << block.start_vid
+               << ", ret=" << ret;
+    return ret;
+  }
+  size_t vector_size = raw_vec->VectorByteSize();
+  uint8_t *dst = reinterpret_cast<uint8_t *>(buf.data());
+  for (size_t i = 0; i < lens.size(); ++i) {
+    memcpy(dst, headers.Get(i), lens[i] * vector_size);
+    dst += lens[i] * vector_size;
+  }
+  return 0;
+}
+
+/**
+ * Blocked brute force search: the inner products of a query block and a
+ * vector block are computed as one tile by sgemm, L2 distances are derived
+ * from them with the precomputed norms, ||x - y||^2 = ||x||^2 + ||y||^2 -
+ * 2 * <x, y>. The deleted and filtered vectors are masked out per block
+ * before the tile is merged into the per-query heaps. The blocks which are
+ * not in memory are read from the store of raw_vec once per query block.
+ *
+ * @return 0 if successed
+ */
+template <class C>
+int SearchBlocked(RetrievalContext *retrieval_context, RawVector *raw_vec,
+                  const std::vector<VectorBlock> &blocks, int n,
+                  const float *xq, int d, int k, bool is_l2,
+                  float *distances, idx_t *labels) {
+  std::vector<float> x_norms;
+  if (is_l2) {
+    x_norms.resize(n);
+    faiss::fvec_norms_L2sqr(x_norms.data(), xq, d, n);
+  }
+
+  for (int i = 0; i < n; ++i) {
+    faiss::heap_heapify<C>(k, distances + (size_t)i * k,
+                           labels + (size_t)i * k);
+  }
+
+  std::vector<float> y_norms(kVectorBlockSize);
+  std::vector<uint8_t> mask(kVectorBlockSize);
+  std::vector<float> block_buf;
+  int nvalid = 0;
+  const float *yb = nullptr;
+  int ret = 0;
+
+  // one parallel region for all the tiles: the mask and the norms of a
+  // vector block are computed once, then the threads share out the query
+  // slices, each one computing its own part of the tile
+#pragma omp parallel
+  {
+    std::vector<float> tile((size_t)kQuerySliceSize * kVectorBlockSize);
+
+    for (int i0 = 0; i0 < n; i0 += kQueryBlockSize) {
+      int nq = std::min(kQueryBlockSize, n - i0);
+
+      for (const VectorBlock &block : blocks) {
+        int nb = block.len;
+#pragma omp single
+        {
+          nvalid = 0;
+          for (int j = 0; j < nb; ++j) {
+            mask[j] = retrieval_context->IsValid(block.start_vid + j) ? 1 : 0;
+            nvalid += mask[j];
+          }
+          yb = reinterpret_cast<const float *>(block.data);
+          if (nvalid > 0 && block.data == nullptr) {
+            block_buf.resize((size_t)kVectorBlockSize * d);
+            if (ReadBlock(raw_vec, block, block_buf)) {
+              ret = -1;
+              nvalid = 0;
+            }
+            yb = block_buf.data();
+          }
+          if (nvalid > 0 && is_l2) {
+            faiss::fvec_norms_L2sqr(y_norms.data(), yb, d, nb);
+          }
+        }
+
+        // nvalid and yb are only read inside the loop, its implicit barrier
+        // keeps the next single from changing them before every thread is
+        // done
+#pragma omp for schedule(static)
+        for (int s0 = 0; s0 < nq; s0 += kQuerySliceSize) {
+          if (nvalid == 0) continue;
+          int ns = std::min(kQuerySliceSize, nq - s0);
+          const float *xs = xq + (size_t)(i0 + s0) * d;
+          {
+            float one = 1, zero = 0;
+            FINTEGER nyi = nb, nxi = ns, di = d;
+            sgemm_("Transpose", "Not transpose", &nyi, &nxi, &di, &one, yb,
+                   &di, xs, &di, &zero, tile.data(), &nyi);
+          }
+
+          for (int i = 0; i < ns; ++i) {
+            int qi = i0 + s0 + i;
+            float *simi = distances + (size_t)qi * k;
+            idx_t *idxi = labels + (size_t)qi * k;
+            const float *ip_line = tile.data() + (size_t)i * nb;
+            for (int j = 0; j < nb; ++j) {
+              if (!mask[j]) continue;
+              float dis = ip_line[j];
+              if (is_l2) {
+                dis = x_norms[qi] + y_norms[j] - 2 * dis;
+                // negative values can occur for identical vectors
+                // due to roundoff errors
+                if (dis < 0) dis = 0;
+              }
+              if (!retrieval_context->IsSimilarScoreValid(dis)) continue;
+              if (C::cmp(simi[0], dis)) {
+                faiss::heap_replace_top<C>(k, simi, idxi, dis,
+                                           block.start_vid + j);
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+
+  for (int i = 0; i < n; ++i) {
+    faiss::heap_reorder<C>(k, distances + (size_t)i * k,
+                           labels + (size_t)i * k);
+  }
+  return ret;
+}
+
+/**
+ * Scan of quantized vectors, the distances of the float queries and the
+ * codes are computed by the simd kernels of the quantizer, the clipped codes
+ * are replaced by their exact vectors. The queries are searched in parallel,
+ * or the blocks if there is one query.
+ */
+template <class C>
+void SearchQuantized(RetrievalContext *retrieval_context,
+                     const std::vector<VectorBlock> &blocks,
+                     MemoryRawVector *raw_vec, int n, const float *xq, int d,
+                     int k, bool is_l2, float *distances, idx_t *labels) {
+  const VectorQuantizer *quantizer = raw_vec->Quantizer();
+  const RawVector *exact_vec = raw_vec;
+  int code_size = quantizer->CodeSize();
+  auto scan = [&](const float *xi, const VectorBlock &block, float *simi,
+                  idx_t *idxi) {
+    for (int j = 0; j < block.len; ++j) {
+      int vid = block.start_vid + j;
+      if (!retrieval_context->IsValid(vid)) continue;
+      float dis;
+      if (raw_vec->Clipped(vid)) {
+        ScopeVector scope_vec;
+        if (exact_vec->GetVector(vid, scope_vec) ||
+            scope_vec.Get() == nullptr) {
+          continue;
+        }
+        const float *yi = reinterpret_cast<const float *>(scope_vec.Get());
+        dis = is_l2 ? faiss::fvec_L2sqr(xi, yi, d)
+                    : faiss::fvec_inner_product(xi, yi, d);
+      } else {
+        const uint8_t *code = block.data + (size_t)j * code_size;
+        dis = is_l2 ? quantizer->L2Sqr(xi, code)
+                    : quantizer->InnerProduct(xi, code);
+      }
+      if (!retrieval_context->IsSimilarScoreValid(dis)) continue;
+      if (C::cmp(simi[0], dis)) {
+        faiss::heap_replace_top<C>(k, simi, idxi, dis, vid);
+      }
+    }
+  };
+
+  if (n > 1) {
+#pragma omp parallel for schedule(dynamic)
+    for (int i = 0; i < n; ++i) {
+      float *simi = distances + (size_t)i * k;
+      idx_t *idxi = labels + (size_t)i * k;
+      faiss::heap_heapify<C>(k, simi, idxi);
+      for (const VectorBlock &block : blocks) {
+        scan(xq + (size_t)i * d, block, simi, idxi);
+      }
+      faiss::heap_reorder<C>(k, simi, idxi);
+    }
+    return;
+  }
+
+  faiss::heap_heapify<C>(k, distances, labels);
+#pragma omp parallel
+  {
+    std::vector<float> local_dis(k);
+    std::vector<idx_t> local_idx(k);
+    faiss::heap_heapify<C>(k, local_dis.data(), local_idx.data());
+#pragma omp for schedule(dynamic)
+    for (size_t b = 0; b < blocks.size(); ++b) {
+      scan(xq, blocks[b], local_dis.data(), local_idx.data());
+    }
+#pragma omp critical
+    faiss::heap_addn<C>(k, distances, labels, local_dis.data(),
+                        local_idx.data(), k);
+  }
+  faiss::heap_reorder<C>(k, distances, labels);
+}
+
+template <class C>
+void RerankQuery(RetrievalContext *retrieval_context, const RawVector *raw_vec,
+                 const float *xi, int d, int k0, const int64_t *cand_labels,
+                 int k, bool is_l2, float *simi, idx_t *idxi) {
+  faiss::heap_heapify<C>(k, simi, idxi);
+  for (int j = 0; j < k0; ++j) {
+    int64_t vid = cand_labels[j];
+    if (vid < 0) continue;
+    ScopeVector scope_vec;
+    if (raw_vec->GetVector(vid, scope_vec) || scope_vec.Get() == nullptr) {
+      continue;
+    }
+    const float *yi = reinterpret_cast<const float *>(scope_vec.Get());
+    float dis = is_l2 ? faiss::fvec_L2sqr(xi, yi, d)
+                      : faiss::fvec_inner_product(xi, yi, d);
+    if (!retrieval_context->IsSimilarScoreValid(dis)) continue;
+    if (C::cmp(simi[0], dis)) {
+      faiss::heap_replace_top<C>(k, simi, idxi, dis, vid);
+    }
+  }
+  faiss::heap_reorder<C>(k, simi, idxi);
+}
+
+}  // namespace
+
 struct FLATModelParams {
   DistanceComputeType metric_type;
 
@@ -62,9 +375,10 @@ GammaFLATIndex::~GammaFLATIndex() {}
 int GammaFLATIndex::Init(const std::string &model_parameters,
                          int indexing_size) {
   indexing_size_ = indexing_size;
-  auto raw_vec_type = dynamic_cast<MemoryRawVector *>(vector_);
+  // the vectors which are not in memory are read from the store
+  auto raw_vec_type = dynamic_cast<RawVector *>(vector_);
   if (raw_vec_type == nullptr) {
-    LOG(ERROR) << "FLAT can only work in memory only mode";
+    LOG(ERROR) << "FLAT needs a raw vector";
     return -1;
   }
   FLATModelParams flat_param;
@@ -105,8 +419,12 @@ RetrievalParameters *GammaFLATIndex::Parse(const std::string &parameters) {
   int parallel_on_queries = 1;
   jp.GetInt("parallel_on_queries", parallel_on_queries);
 
+  int rerank = -1;
+  jp.GetInt("rerank", rerank);
+
   FlatRetrievalParameters *retrieval_params = new FlatRetrievalParameters(
       parallel_on_queries == 0 ? false : true, type);
+  retrieval_params->SetRerank(rerank);
 
   return retrieval_params;
 }
@@ -154,6 +472,82 @@ int GammaFLATIndex::Search(RetrievalContext *retrieval_context, int n,
   using HeapForIP = faiss::CMin<float, idx_t>;
   using HeapForL2 = faiss::CMax<float, idx_t>;
 
+  // quantized vectors are scanned by the codes in memory, the top k * rerank
+  // of them are ranked again by the full precision vectors. The vectors are
+  // scanned exactly until the quantizer is trained
+  auto memory_raw_vec = dynamic_cast<MemoryRawVector *>(vector_);
+  const VectorQuantizer *quantizer = raw_vec->Quantizer();
+  if (memory_raw_vec != nullptr && quantizer != nullptr &&
+      memory_raw_vec->QuantizerTrained()) {
+    std::vector<VectorBlock> blocks;
+    if (GetVectorBlocks(memory_raw_vec, num_vectors, blocks)) {
+      return -1;
+    }
+    int rerank = retrieval_params->Rerank() >= 0 ? retrieval_params->Rerank()
+                                                  : raw_vec->RerankFactor();
+    int k0 = rerank > 1 ? k * rerank : k;
+    std::vector<float> cand_dis;
+    std::vector<int64_t> cand_labels;
+    float *dis0 = distances;
+    int64_t *labels0 = labels;
+    if (k0 > k) {
+      cand_dis.resize((size_t)n * k0);
+      cand_labels.resize((size_t)n * k0);
+      dis0 = cand_dis.data();
+      labels0 = cand_labels.data();
+    }
+    bool is_l2 = metric_type == faiss::METRIC_L2;
+    if (is_l2) {
+      SearchQuantized<HeapForL2>(retrieval_context, blocks, memory_raw_vec, n,
+                                 xq, d, k0, true, dis0, (idx_t *)labels0);
+    } else {
+      SearchQuantized<HeapForIP>(retrieval_context, blocks, memory_raw_vec, n,
+                                 xq, d, k0, false, dis0, (idx_t *)labels0);
+    }
+    if (k0 > k) {
+      Rerank(retrieval_context, n, xq, k0, labels0, k, is_l2, distances,
+             labels);
+    }
+#ifdef PERFORMANCE_TESTING
+    std::string compute_msg = "flat quantized compute ";
+    compute_msg += std::to_string(n);
+    retrieval_context->GetPerfTool().Perf(compute_msg);
+#endif  // PERFORMANCE_TESTING
+    return 0;
+  }
+
+  // batches of queries on float vectors are searched by tiles, the vectors
+  // which are not in memory are read a block at a time
+  if (n > 1 && quantizer == nullptr &&
+      vector_->MetaInfo()->DataType() == VectorValueType::FLOAT) {
+    std::vector<VectorBlock> blocks;
+    if (memory_raw_vec != nullptr) {
+      if (GetVectorBlocks(memory_raw_vec, num_vectors, blocks)) {
+        return -1;
+      }
+    } else {
+      GetStoreBlocks(num_vectors, blocks);
+    }
+    int ret = 0;
+    if (metric_type == faiss::METRIC_INNER_PRODUCT) {
+      ret = SearchBlocked<HeapForIP>(retrieval_context, raw_vec, blocks, n, xq,
+                                     d, k, false, distances, (idx_t *)labels);
+    } else {
+      ret = SearchBlocked<HeapForL2>(retrieval_context, raw_vec, blocks, n, xq,
+                                     d, k, true, distances, (idx_t *)labels);
+    }
+    if (ret) {
+      LOG(ERROR) << "blocked search error, ret=" << ret;
+      return -1;
+    }
+#ifdef PERFORMANCE_TESTING
+    std::string compute_msg = "flat blocked compute ";
+    compute_msg += std::to_string(n);
+    retrieval_context->GetPerfTool().Perf(compute_msg);
+#endif  // PERFORMANCE_TESTING
+    return 0;
+  }
+
   {
     // we must obtain the num of threads in *THE* parallel area.
     int num_threads = omp_get_max_threads();
@@ -299,6 +693,31 @@ int GammaFLATIndex::Search(RetrievalContext *retrieval_context, int n,
   return 0;
 }
 
+void GammaFLATIndex::Rerank(RetrievalContext *retrieval_context, int n,
+                            const float *xq, int k0,
+                            const int64_t *cand_labels, int k, bool is_l2,
+                            float *distances, int64_t *labels) {
+  auto raw_vec = dynamic_cast<RawVector *>(vector_);
+  int d = vector_->MetaInfo()->Dimension();
+  using HeapForIP = faiss::CMin<float, idx_t>;
+  using HeapForL2 = faiss::CMax<float, idx_t>;
+
+#pragma omp parallel for schedule(dynamic)
+  for (int i = 0; i < n; ++i) {
+    const float *xi = xq + (size_t)i * d;
+    const int64_t *cand = cand_labels + (size_t)i * k0;
+    float *simi = distances + (size_t)i * k;
+    idx_t *idxi = (idx_t *)labels + (size_t)i * k;
+    if (is_l2) {
+      RerankQuery<HeapForL2>(retrieval_context, raw_vec, xi, d, k0, cand, k,
+                             true, simi, idxi);
+    } else {
+      RerankQuery<HeapForIP>(retrieval_context, raw_vec, xi, d, k0, cand, k,
+                             false, simi, idxi);
+    }
+  }
+}
+
 long GammaFLATIndex::GetTotalMemBytes() { return 0; }
 
 int GammaFLATIndex::Update(const std::vector<idx_t> &ids,
@@ -39,17 +39,20 @@ class FlatRetrievalParameters : public RetrievalParameters {
  public:
   FlatRetrievalParameters() : RetrievalParameters() {
     parallel_on_queries_ = true;
+    rerank_ = -1;
   }
 
   FlatRetrievalParameters(bool parallel_on_queries,
                           enum DistanceComputeType type) {
     parallel_on_queries_ = parallel_on_queries;
     distance_compute_type_ = type;
+    rerank_ = -1;
   }
 
   FlatRetrievalParameters(enum DistanceComputeType type) {
     parallel_on_queries_ = true;
     distance_compute_type_ = type;
+    rerank_ = -1;
   }
 
   ~FlatRetrievalParameters() {}
@@ -58,9 +61,15 @@ class FlatRetrievalParameters : public RetrievalParameters {
   void SetParallelOnQueries(bool parallel_on_queries) { 
       parallel_on_queries_ = parallel_on_queries; 
   }
+
+  int Rerank() { return rerank_; }
+  void SetRerank(int rerank) { rerank_ = rerank; }
+
  private:
   // parallelize over queries or vectors
   bool parallel_on_queries_;
+  // rerank factor of quantized vectors, -1 is the one of the raw vector
+  int rerank_;
 };
 
 class GammaFLATIndex : public RetrievalModel {
@@ -92,6 +101,13 @@ class GammaFLATIndex : public RetrievalModel {
 
   int Load(const std::string &index_dir) override;
 
+  /** rank the k0 candidates of each query again by the full precision
+   * vectors, distances and labels get the best k of them
+   */
+  void Rerank(RetrievalContext *retrieval_context, int n, const float *xq,
+              int k0, const int64_t *cand_labels, int k, bool is_l2,
+              float *distances, int64_t *labels);
+
   DistanceComputeType metric_type_;
   
   int rerank_ = 0;
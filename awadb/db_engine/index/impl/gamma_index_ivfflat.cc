@@ -402,6 +402,12 @@ int GammaIndexIVFFlat::Search(RetrievalContext *retrieval_context, int n,
   }
 
   int nprobe = retrieval_params->Nprobe();
+  // probe more lists for selective filters
+  GammaSearchCondition *condition =
+      dynamic_cast<GammaSearchCondition *>(retrieval_context);
+  if (condition != nullptr) {
+    nprobe = condition->WidenSearchScope(nprobe, this->nlist);
+  }
 #else
   int nprobe = this->nprobe;
 #endif
@@ -687,6 +693,60 @@ int GammaIndexIVFFlat::Load(const std::string &dir) {
   return indexed_vec_count_;
 };
 
+int GammaIndexIVFFlat::DumpDelta(const std::string &dir, int seq) {
+  std::string index_name = vector_->MetaInfo()->AbsoluteName();
+  string index_dir = dir + "/" + index_name;
+  if (!utils::file_exist(index_dir + "/ivfflat.index")) {
+    // nothing is indexed in the full dump, it is trained after it
+    return this->is_trained ? -1 : 0;
+  }
+
+  string delta_file = index_dir + "/ivfflat.delta." + std::to_string(seq);
+  string tmp_file = delta_file + ".tmp";
+  int indexed_count = indexed_vec_count_;
+  {
+    faiss::IOWriter *f = new FileIOWriter(tmp_file.c_str());
+    utils::ScopeDeleter1<FileIOWriter> del((FileIOWriter *)f);
+    uint32_t h = faiss::fourcc("IFdt");
+    WRITE1(h);
+    if (WriteInvertedListsDelta(f, rt_invert_index_ptr_)) {
+      LOG(ERROR) << "write invert list delta error, index name=" << index_name;
+      return INTERNAL_ERR;
+    }
+    WRITE1(indexed_count);
+  }
+  if (rename(tmp_file.c_str(), delta_file.c_str())) {
+    LOG(ERROR) << "rename " << tmp_file << " error: " << strerror(errno);
+    return IO_ERR;
+  }
+  LOG(INFO) << "dump delta " << seq << ", indexed count=" << indexed_count;
+  return 0;
+}
+
+int GammaIndexIVFFlat::LoadDelta(const std::string &dir, int seq) {
+  std::string index_name = vector_->MetaInfo()->AbsoluteName();
+  string delta_file =
+      dir + "/" + index_name + "/ivfflat.delta." + std::to_string(seq);
+  if (!utils::file_exist(delta_file)) {
+    LOG(INFO) << delta_file << " isn't existed, skip loading";
+    return indexed_vec_count_;
+  }
+
+  faiss::IOReader *f = new FileIOReader(delta_file.c_str());
+  utils::ScopeDeleter1<FileIOReader> del((FileIOReader *)f);
+  uint32_t h;
+  READ1(h);
+  if (h != faiss::fourcc("IFdt") ||
+      ReadInvertedListsDelta(f, rt_invert_index_ptr_)) {
+    LOG(ERROR) << "read invert list delta error, file=" << delta_file;
+    return INTERNAL_ERR;
+  }
+  READ1(indexed_vec_count_);
+  LOG(INFO) << "load delta " << seq
+            << ", indexed vector count=" << indexed_vec_count_;
+  return indexed_vec_count_;
+}
+
 GammaInvertedListScanner *GammaIndexIVFFlat::GetGammaInvertedListScanner(
     bool store_pairs, faiss::MetricType metric_type) const {
   if (metric_type == faiss::METRIC_INNER_PRODUCT) {
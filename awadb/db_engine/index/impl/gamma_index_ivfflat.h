@@ -145,6 +145,8 @@ struct GammaIndexIVFFlat : faiss::IndexIVFFlat, public RetrievalModel {
 
   int Dump(const std::string &dir) override;
   int Load(const std::string &dir) override;
+  int DumpDelta(const std::string &dir, int seq) override;
+  int LoadDelta(const std::string &dir, int seq) override;
 
   void train(int64_t n, const float *x) { faiss::IndexIVFFlat::train(n, x); }
 
@@ -22,6 +22,9 @@
 #include <algorithm>
 #include <stdexcept>
 #include <vector>
+#ifdef __AVX2__
+#include <immintrin.h>
+#endif
 
 #include "util/bitmap.h"
 #include "search/error_code.h"
@@ -47,6 +50,47 @@ static inline void ConvertVectorDim(size_t num, int raw_d, int d,
 
 IndexIVFPQStats indexIVFPQ_stats;
 
+void FastScanAccumulate(size_t code_size, const uint8_t *lut,
+                        const uint8_t *block, uint16_t *accu) {
+#ifdef __AVX2__
+  const __m256i mask = _mm256_set1_epi8(0x0f);
+  const __m256i zero = _mm256_setzero_si256();
+  // lanes of acc_lo are the vectors 0..7 and 16..23, acc_hi 8..15 and 24..31
+  __m256i acc_lo = zero;
+  __m256i acc_hi = zero;
+  for (size_t j = 0; j < code_size; j++) {
+    __m256i c = _mm256_loadu_si256((const __m256i *)(block + j * 32));
+    __m256i lo = _mm256_and_si256(c, mask);
+    __m256i hi = _mm256_and_si256(_mm256_srli_epi16(c, 4), mask);
+    __m256i t0 =
+        _mm256_broadcastsi128_si256(_mm_loadu_si128((const __m128i *)lut));
+    __m256i t1 = _mm256_broadcastsi128_si256(
+        _mm_loadu_si128((const __m128i *)(lut + 16)));
+    lut += 32;
+    __m256i d0 = _mm256_shuffle_epi8(t0, lo);
+    __m256i d1 = _mm256_shuffle_epi8(t1, hi);
+    acc_lo = _mm256_add_epi16(acc_lo, _mm256_unpacklo_epi8(d0, zero));
+    acc_hi = _mm256_add_epi16(acc_hi, _mm256_unpackhi_epi8(d0, zero));
+    acc_lo = _mm256_add_epi16(acc_lo, _mm256_unpacklo_epi8(d1, zero));
+    acc_hi = _mm256_add_epi16(acc_hi, _mm256_unpackhi_epi8(d1, zero));
+  }
+  _mm256_storeu_si256((__m256i *)accu,
+                      _mm256_permute2x128_si256(acc_lo, acc_hi, 0x20));
+  _mm256_storeu_si256((__m256i *)(accu + 16),
+                      _mm256_permute2x128_si256(acc_lo, acc_hi, 0x31));
+#else
+  const size_t bs = realtime::kCodeBlockSize;
+  memset(accu, 0, bs * sizeof(uint16_t));
+  for (size_t j = 0; j < code_size; j++) {
+    const uint8_t *c = block + j * bs;
+    for (size_t i = 0; i < bs; i++) {
+      accu[i] += lut[c[i] & 0x0f] + lut[16 + (c[i] >> 4)];
+    }
+    lut += 32;
+  }
+#endif
+}
+
 REGISTER_MODEL(IVFPQ, GammaIVFPQIndex)
 
 GammaIVFPQIndex::GammaIVFPQIndex() : indexed_vec_count_(0) {
@@ -56,6 +100,7 @@ GammaIVFPQIndex::GammaIVFPQIndex() : indexed_vec_count_(0) {
   updated_num_ = 0;
   is_trained = false;
   opq_ = nullptr;
+  fast_scan_ = false;
 #ifdef PERFORMANCE_TESTING
   search_count_ = 0;
   add_count_ = 0;
@@ -85,6 +130,18 @@ GammaIVFPQIndex::~GammaIVFPQIndex() {
 
 GammaInvertedListScanner *GammaIVFPQIndex::GetInvertedListScanner(
     bool store_pairs, faiss::MetricType metric_type) {
+  if (fast_scan_) {
+    if (metric_type == faiss::METRIC_INNER_PRODUCT) {
+      return new GammaIVFPQFastScanScanner<faiss::METRIC_INNER_PRODUCT,
+                                           faiss::CMin<float, idx_t>>(
+          *this, store_pairs);
+    } else if (metric_type == faiss::METRIC_L2) {
+      return new GammaIVFPQFastScanScanner<faiss::METRIC_L2,
+                                           faiss::CMax<float, idx_t>>(
+          *this, store_pairs);
+    }
+    return nullptr;
+  }
   if (pq.nbits == 8) {
     return GetGammaInvertedListScanner<faiss::PQDecoder8>(store_pairs, metric_type);
   } else if (pq.nbits == 16) {
@@ -158,6 +215,12 @@ int GammaIVFPQIndex::Init(const std::string &model_parameters, int indexing_size
   pq.M = ivfpq_param.nsubvector;
   pq.nbits = ivfpq_param.nbits_per_idx;
   pq.set_derived_values();
+  // two 4-bit codes a byte, 32 vectors of a bucket are scanned at a time
+  fast_scan_ = (pq.nbits == 4);
+  if (fast_scan_) {
+    LOG(INFO) << "4-bit PQ codes are scanned by blocks of "
+              << realtime::kCodeBlockSize;
+  }
 
   own_fields = false;
   quantizer_trains_alone = 0;
@@ -178,7 +241,7 @@ int GammaIVFPQIndex::Init(const std::string &model_parameters, int indexing_size
   // the size of RTInvertIndex bucket should be smaller
   rt_invert_index_ptr_ = new realtime::RTInvertIndex(
     this->nlist, this->code_size, raw_vec->VidMgr(), raw_vec->Bitmap(), 
-    ivfpq_param.bucket_init_size, ivfpq_param.bucket_max_size);
+    ivfpq_param.bucket_init_size, ivfpq_param.bucket_max_size, fast_scan_);
 
   if (this->invlists) {
     delete this->invlists;
@@ -534,6 +597,8 @@ int GammaIVFPQIndex::Search(RetrievalContext *retrieval_context, int n,
   } else {
     retrieval_params->SetNprobe(this->nprobe);
   }
+  // probe more lists for selective filters
+  nprobe = condition->WidenSearchScope(nprobe, this->nlist);
 
   const float *xq = reinterpret_cast<const float *>(x);
   const float *applied_xq = nullptr;
@@ -883,6 +948,7 @@ void GammaIVFPQIndex::copy_subset_to(faiss::IndexIVF &other, int subset_type,
   using ScopedCodes = faiss::InvertedLists::ScopedCodes;
   FAISS_THROW_IF_NOT(nlist == other.nlist);
   FAISS_THROW_IF_NOT(code_size == other.code_size);
+  FAISS_THROW_IF_NOT_MSG(!fast_scan_, "blocked codes cannot be copied");
   // FAISS_THROW_IF_NOT(other.direct_map.no());
   FAISS_THROW_IF_NOT_FMT(
       subset_type == 0 || subset_type == 1 || subset_type == 2,
@@ -1035,4 +1101,57 @@ int GammaIVFPQIndex::Load(const std::string &index_dir) {
   return indexed_vec_count_;
 }
 
+int GammaIVFPQIndex::DumpDelta(const std::string &dir, int seq) {
+  std::string index_name = vector_->MetaInfo()->AbsoluteName();
+  string index_dir = dir + "/" + index_name;
+  if (!utils::file_exist(index_dir + "/ivfpq.index")) {
+    // nothing is indexed in the full dump, it is trained after it
+    return this->is_trained ? -1 : 0;
+  }
+
+  string delta_file = index_dir + "/ivfpq.delta." + std::to_string(seq);
+  string tmp_file = delta_file + ".tmp";
+  {
+    faiss::IOWriter *f = new FileIOWriter(tmp_file.c_str());
+    utils::ScopeDeleter1<FileIOWriter> del((FileIOWriter *)f);
+    uint32_t h = faiss::fourcc("IPdt");
+    WRITE1(h);
+    if (WriteInvertedListsDelta(f, rt_invert_index_ptr_)) {
+      LOG(ERROR) << "write invert list delta error, index name=" << index_name;
+      return INTERNAL_ERR;
+    }
+    WRITE1(indexed_vec_count_);
+  }
+  if (rename(tmp_file.c_str(), delta_file.c_str())) {
+    LOG(ERROR) << "rename " << tmp_file << " error: " << strerror(errno);
+    return IO_ERR;
+  }
+  LOG(INFO) << "dump delta " << seq << ", indexed count=" << indexed_vec_count_;
+  return 0;
+}
+
+int GammaIVFPQIndex::LoadDelta(const std::string &dir, int seq) {
+  std::string index_name = vector_->MetaInfo()->AbsoluteName();
+  string delta_file =
+      dir + "/" + index_name + "/ivfpq.delta." + std::to_string(seq);
+  if (!utils::file_exist(delta_file)) {
+    LOG(INFO) << delta_file << " isn't existed, skip loading";
+    return indexed_vec_count_;
+  }
+
+  faiss::IOReader *f = new FileIOReader(delta_file.c_str());
+  utils::ScopeDeleter1<FileIOReader> del((FileIOReader *)f);
+  uint32_t h;
+  READ1(h);
+  if (h != faiss::fourcc("IPdt") ||
+      ReadInvertedListsDelta(f, rt_invert_index_ptr_)) {
+    LOG(ERROR) << "read invert list delta error, file=" << delta_file;
+    return INTERNAL_ERR;
+  }
+  READ1(indexed_vec_count_);
+  LOG(INFO) << "load delta " << seq
+            << ", indexed vector count=" << indexed_vec_count_;
+  return indexed_vec_count_;
+}
+
 }  // namespace tig_gamma
@@ -626,6 +626,126 @@ struct GammaIVFPQScanner : IVFPQScannerT<idx_t, METRIC_TYPE, PQDecoder>,
   }
 };
 
+/** accumulate the quantized tables of 4-bit PQ codes of a block of
+ * realtime::kCodeBlockSize vectors, byte j of the codes of the block are
+ * stored together.
+ *
+ * @param code_size  bytes of a code, two sub quantizers per byte
+ * @param lut        16 uint8 entries for every sub quantizer, 32 for every
+ *                   byte of the code, so zeros for the unused half of the
+ *                   last byte when M is odd
+ * @param accu       output, kCodeBlockSize sums
+ */
+void FastScanAccumulate(size_t code_size, const uint8_t *lut,
+                        const uint8_t *block, uint16_t *accu);
+
+/** scanner of 4-bit PQ codes stored in blocks of realtime::kCodeBlockSize
+ * vectors. The distance tables of a list are quantized to uint8 and looked
+ * up by simd shuffles a block at a time, the distances are approximate and
+ * are refined by the raw vectors when the results are ranked.
+ */
+template <faiss::MetricType METRIC_TYPE, class C>
+struct GammaIVFPQFastScanScanner
+    : IVFPQScannerT<idx_t, METRIC_TYPE, faiss::PQDecoderGeneric>,
+      GammaInvertedListScanner {
+  bool store_pairs;
+  std::vector<uint8_t> lut;  // quantized tables, padded to code_size * 32
+  float lut_scale;           // lut = (table - table min) * lut_scale
+  float lut_bias;            // dis0 + the sum of the table mins
+
+  GammaIVFPQFastScanScanner(const faiss::IndexIVFPQ &ivfpq, bool store_pairs)
+      : IVFPQScannerT<idx_t, METRIC_TYPE, faiss::PQDecoderGeneric>(ivfpq,
+                                                                  nullptr),
+        store_pairs(store_pairs) {
+    // the table of the unused half of the last byte is kept zero
+    lut.resize(this->pq.code_size * 2 * this->pq.ksub, 0);
+    lut_scale = 0;
+    lut_bias = 0;
+  }
+
+  inline void set_query(const float *query) override {
+    this->init_query(query);
+  }
+
+  inline void set_list(idx_t list_no, float coarse_dis) override {
+    this->init_list(list_no, coarse_dis, 2);
+    quantize_tables();
+  }
+
+  void quantize_tables() {
+    size_t M = this->pq.M, ksub = this->pq.ksub;
+    const float *tab = this->sim_table;
+    float max_span = 0;
+    lut_bias = this->dis0;
+    for (size_t m = 0; m < M; m++) {
+      const float *t = tab + m * ksub;
+      float vmin = t[0], vmax = t[0];
+      for (size_t c = 1; c < ksub; c++) {
+        vmin = std::min(vmin, t[c]);
+        vmax = std::max(vmax, t[c]);
+      }
+      max_span = std::max(max_span, vmax - vmin);
+      lut_bias += vmin;
+    }
+    // the sum of M quantized entries fits in uint16
+    float qmax = std::min(255.0f, 65535.0f / M);
+    lut_scale = max_span > 0 ? qmax / max_span : 0;
+    for (size_t m = 0; m < M; m++) {
+      const float *t = tab + m * ksub;
+      float vmin = *std::min_element(t, t + ksub);
+      for (size_t c = 0; c < ksub; c++) {
+        lut[m * ksub + c] = (uint8_t)std::min(
+            qmax, std::floor((t[c] - vmin) * lut_scale + 0.5f));
+      }
+    }
+  }
+
+  inline float distance_to_code(const uint8_t *code) const override {
+    float dis = this->dis0;
+    const float *tab = this->sim_table;
+    faiss::PQDecoderGeneric decoder(code, this->pq.nbits);
+
+    for (size_t m = 0; m < this->pq.M; m++) {
+      dis += tab[decoder.decode()];
+      tab += this->pq.ksub;
+    }
+    return dis;
+  }
+
+  inline size_t scan_codes(size_t ncode, const uint8_t *codes, const idx_t *ids,
+                           float *heap_sim, idx_t *heap_ids,
+                           size_t k) const override {
+    KnnSearchResults<C> res = {/* key */ this->key,
+                               /* ids */ this->store_pairs ? nullptr : ids,
+                               /* k */ k,
+                               /* heap_sim */ heap_sim,
+                               /* heap_ids */ heap_ids,
+                               /* nup */ 0};
+    const size_t bs = realtime::kCodeBlockSize;
+    size_t block_bytes = bs * this->pq.code_size;
+    float inv_scale = lut_scale > 0 ? 1.0f / lut_scale : 0;
+    uint16_t accu[realtime::kCodeBlockSize];
+
+    for (size_t j0 = 0; j0 < ncode; j0 += bs) {
+      FastScanAccumulate(this->pq.code_size, lut.data(), codes, accu);
+      codes += block_bytes;
+
+      size_t nb = std::min(bs, ncode - j0);
+      for (size_t i = 0; i < nb; i++) {
+        float dis = lut_bias + accu[i] * inv_scale;
+        if (!C::cmp(heap_sim[0], dis)) continue;
+        size_t j = j0 + i;
+        if (ids[j] & realtime::kDelIdxMask) continue;
+        if (!retrieval_context_->IsValid(ids[j] & realtime::kRecoverIdxMask)) {
+          continue;
+        }
+        res.add(j, dis);
+      }
+    }
+    return res.nup;
+  }
+};
+
 class IVFPQRetrievalParameters : public RetrievalParameters {
  public:
   IVFPQRetrievalParameters() : RetrievalParameters() {
@@ -922,6 +1042,10 @@ struct GammaIVFPQIndex : GammaFLATIndex, faiss::IndexIVFPQ {
 
   int Load(const std::string &index_dir) override;
 
+  int DumpDelta(const std::string &dir, int seq) override;
+
+  int LoadDelta(const std::string &dir, int seq) override;
+
   virtual void copy_subset_to(faiss::IndexIVF &other, int subset_type, idx_t a1,
                               idx_t a2) const;
 
@@ -941,6 +1065,9 @@ struct GammaIVFPQIndex : GammaFLATIndex, faiss::IndexIVFPQ {
   faiss::VectorTransform *opq_;
   // 0 is FlatL2, 1 is HNSWFlat
   int quantizer_type_;
+  // 4-bit PQ codes are stored in blocks and scanned by
+  // GammaIVFPQFastScanScanner
+  bool fast_scan_;
 #ifdef PERFORMANCE_TESTING
   std::atomic<uint64_t> search_count_;
   int add_count_;
@@ -0,0 +1,110 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <stddef.h>
+#include <string.h>
+
+#include <stdexcept>
+
+namespace hnswlib {
+
+// elements allocated by chunks of kChunkSize elements of stride Ts each, the
+// table of the chunks is allocated once, so growing never moves the elements
+// which are read by the searches at the same time
+template <typename T>
+class ChunkedArray {
+ public:
+  static const size_t kChunkBits = 16;
+  static const size_t kChunkSize = (size_t)1 << kChunkBits;
+  static const size_t kMaxChunks = (size_t)1 << 16;
+
+  ChunkedArray() : chunks_(nullptr), nchunks_(0), nattached_(0), stride_(1) {}
+
+  ~ChunkedArray() { Reset(1); }
+
+  ChunkedArray(const ChunkedArray &) = delete;
+  ChunkedArray &operator=(const ChunkedArray &) = delete;
+
+  // free all the chunks, the elements added later are stride Ts
+  void Reset(size_t stride) {
+    if (chunks_ != nullptr) {
+      for (size_t i = nattached_; i < nchunks_; i++) delete[] chunks_[i];
+      delete[] chunks_;
+    }
+    chunks_ = nullptr;
+    nchunks_ = 0;
+    nattached_ = 0;
+    stride_ = stride;
+  }
+
+  // use the n elements at base in place of the full chunks, the last ones
+  // are copied to an allocated chunk, base should be valid until Reset. T
+  // should be trivially copyable
+  void Attach(T *base, size_t n) {
+    Reset(stride_);
+    chunks_ = new T *[kMaxChunks]();
+    size_t nfull = n >> kChunkBits;
+    if (nfull > kMaxChunks) {
+      throw std::runtime_error("Too many elements: ChunkedArray is full");
+    }
+    for (; nchunks_ < nfull; nchunks_++) {
+      chunks_[nchunks_] = base + nchunks_ * kChunkSize * stride_;
+    }
+    nattached_ = nfull;
+    Reserve(n);
+    size_t start = nfull << kChunkBits;
+    if (n > start) {
+      memcpy(At(start), base + start * stride_,
+             (n - start) * stride_ * sizeof(T));
+    }
+  }
+
+  // make room for n elements, the new ones are value initialized
+  void Reserve(size_t n) {
+    size_t nchunks = (n + kChunkSize - 1) >> kChunkBits;
+    if (nchunks > kMaxChunks) {
+      throw std::runtime_error("Too many elements: ChunkedArray is full");
+    }
+    if (chunks_ == nullptr) chunks_ = new T *[kMaxChunks]();
+    for (; nchunks_ < nchunks; nchunks_++) {
+      chunks_[nchunks_] = new T[kChunkSize * stride_]();
+    }
+  }
+
+  size_t Capacity() const { return nchunks_ << kChunkBits; }
+
+  size_t ChunkBytes() const { return kChunkSize * stride_ * sizeof(T); }
+
+  // the attached elements are not counted
+  long MemBytes() const { return (long)(nchunks_ - nattached_) * ChunkBytes(); }
+
+  // the n elements of a chunk are stored one after another
+  T *Chunk(size_t chunk_no) const { return chunks_[chunk_no]; }
+
+  inline T *At(size_t i) const {
+    return chunks_[i >> kChunkBits] + (i & (kChunkSize - 1)) * stride_;
+  }
+
+  inline T &operator[](size_t i) const { return *At(i); }
+
+ private:
+  T **chunks_;
+  size_t nchunks_;
+  size_t nattached_;  // the first chunks are not allocated by Reserve
+  size_t stride_;
+};
+
+template <typename T>
+const size_t ChunkedArray<T>::kChunkBits;
+template <typename T>
+const size_t ChunkedArray<T>::kChunkSize;
+template <typename T>
+const size_t ChunkedArray<T>::kMaxChunks;
+
+}  // namespace hnswlib
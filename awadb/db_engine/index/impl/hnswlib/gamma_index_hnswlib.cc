@@ -28,6 +28,7 @@ struct HNSWLIBModelParams {
   int efConstruction;           // construction parameter for building hnsw graph
   int efSearch;                 // search parameter for hnsw graph
   int do_efSearch_check;        // check efsearch or not when searching
+  int warmup;                   // read the loaded graph file in background
   DistanceComputeType metric_type;
 
   HNSWLIBModelParams() {
@@ -35,6 +36,7 @@ struct HNSWLIBModelParams {
     efConstruction = 100;
     efSearch = 64;
     do_efSearch_check = 1;
+    warmup = 1;
     metric_type = DistanceComputeType::L2;
   }
 
@@ -54,6 +56,7 @@ struct HNSWLIBModelParams {
     int efConstruction;
     int efSearch;
     int do_efSearch_check;
+    int warmup;
 
     // for -1, set as default
     if (!jp.GetInt("nlinks", nlinks)) {
@@ -96,6 +99,15 @@ struct HNSWLIBModelParams {
       if (do_efSearch_check == 0) this->do_efSearch_check = 0;
     }
 
+    if (!jp.GetInt("warmup", warmup)) {
+      if (warmup < -1) {
+        LOG(ERROR) << "invalid warmup = " << warmup;
+        return -1;
+      }
+      if (warmup > 0) this->warmup = 1;
+      if (warmup == 0) this->warmup = 0;
+    }
+
     std::string metric_type;
 
     if (!jp.GetString("metric_type", metric_type)) {
@@ -120,6 +132,7 @@ struct HNSWLIBModelParams {
     ss << "efConstruction =" << efConstruction << ", ";
     ss << "efSearch =" << efSearch << ", ";
     ss << "do_efSearch_check =" << do_efSearch_check << ", ";
+    ss << "warmup =" << warmup << ", ";
     ss << "metric_type =" << (int)metric_type;
     return ss.str();
   }
@@ -132,9 +145,15 @@ GammaIndexHNSWLIB::GammaIndexHNSWLIB()
   indexed_vec_count_ = 0;
   updated_num_ = 0;
   deleted_num_ = 0;
+  warmup_ = 0;
 }
 
 GammaIndexHNSWLIB::~GammaIndexHNSWLIB() {
+  stop_warmup_ = true;
+  if (warmup_thread_.joinable()) {
+    warmup_thread_.join();
+  }
+
   if (space_interface_ != nullptr) {
     delete space_interface_;
     space_interface_ = nullptr;
@@ -171,14 +190,17 @@ int GammaIndexHNSWLIB::Init(const std::string &model_parameters, int indexing_si
   d = vector_->MetaInfo()->Dimension();
   size_t ef_construction = hnsw_param.efConstruction;
 
-  space_interface_ = new L2Space(d);
-  space_interface_ip_ = new InnerProductSpace(d);
+  quantizer_ = raw_vec_->Quantizer();
+  if (quantizer_ != nullptr) {
+    space_interface_ = new QuantizedSpace(quantizer_, false);
+    space_interface_ip_ = new QuantizedSpace(quantizer_, true);
+  } else {
+    space_interface_ = new L2Space(d);
+    space_interface_ip_ = new InnerProductSpace(d);
+  }
 
-  max_elements_ = 1000000;
-  std::vector<std::mutex>(max_elements_).swap(link_list_locks_);
   std::vector<std::mutex>(max_update_element_locks)
       .swap(link_list_update_locks_);
-  element_levels_ = std::vector<int>(max_elements_);
   num_deleted_ = 0;
   if (hnsw_param.metric_type == DistanceComputeType::INNER_PRODUCT) {
     fstdistfunc_ = space_interface_ip_->get_dist_func();
@@ -197,6 +219,7 @@ int GammaIndexHNSWLIB::Init(const std::string &model_parameters, int indexing_si
   ef_construction_ = std::max(ef_construction, M_);
   ef_ = hnsw_param.efSearch;
   do_efSearch_check_ = hnsw_param.do_efSearch_check;
+  warmup_ = hnsw_param.warmup;
   int random_seed = 100;
   level_generator_.seed(random_seed);
   update_probability_generator_.seed(random_seed + 1);
@@ -207,22 +230,16 @@ int GammaIndexHNSWLIB::Init(const std::string &model_parameters, int indexing_si
   label_offset_ = size_links_level0_ + data_size_;
   offsetLevel0_ = 0;
 
-  data_level0_memory_ = (char *)malloc(max_elements_ * size_data_per_element_);
-  if (data_level0_memory_ == nullptr)
-    throw std::runtime_error("Not enough memory");
-
   cur_element_count = 0;
 
-  visited_list_pool_ = new VisitedListPool(1, max_elements_);
+  // the graph grows by chunks when the vectors are added
+  visited_list_pool_ = new VisitedListPool(1, 0);
+  initElements(ChunkedArray<char>::kChunkSize);
 
   // initializations for special treatment of the first node
   enterpoint_node_ = -1;
   maxlevel_ = -1;
 
-  linkLists_ = (char **)malloc(sizeof(void *) * max_elements_);
-  if (linkLists_ == nullptr)
-    throw std::runtime_error(
-        "Not enough memory: HierarchicalNSW failed to allocate linklists");
   size_links_per_element_ = maxM_ * sizeof(tableint) + sizeof(linklistsizeint);
   mult_ = 1 / log(1.0 * M_);
   revSize_ = 1.0 / mult_;
@@ -266,9 +283,13 @@ RetrievalParameters *GammaIndexHNSWLIB::Parse(const std::string &parameters) {
   int do_efSearch_check = 1;
   jp.GetInt("do_efSearch_check", do_efSearch_check);
 
-  RetrievalParameters *retrieval_params =
+  int rerank = -1;
+  jp.GetInt("rerank", rerank);
+
+  HNSWLIBRetrievalParameters *retrieval_params =
       new HNSWLIBRetrievalParameters(type, efSearch > 0 ? efSearch : ef_, 
                                      do_efSearch_check > -1 ? do_efSearch_check : do_efSearch_check_);
+  retrieval_params->SetRerank(rerank);
   return retrieval_params;
 }
 
@@ -294,13 +315,29 @@ int GammaIndexHNSWLIB::AddVertices(size_t n0, size_t n, const float *x) {
     return 0;
   }
 
-  while(n0 + n >= max_elements_) {
-    resizeIndex(max_elements_ * 2);
+  if (n0 + n > max_elements_) {
+    resizeIndex(n0 + n);
+  }
+
+  // the points of a quantized graph are codes
+  const uint8_t *points = reinterpret_cast<const uint8_t *>(x);
+  size_t point_size = d * sizeof(float);
+  std::vector<uint8_t> codes;
+  if (quantizer_ != nullptr) {
+    // the codes of the graph are never encoded by other ranges
+    if (raw_vec_->TrainQuantizer()) {
+      LOG(ERROR) << "train quantizer error, the vertices are not added";
+      return -1;
+    }
+    point_size = quantizer_->CodeSize();
+    codes.resize(n * point_size);
+    quantizer_->Encode(n, x, codes.data());
+    points = codes.data();
   }
 
 #pragma omp parallel for
   for (size_t i = 0; i < n; ++i) {
-    addPoint((const void *)(x + i * d), n0 + i);
+    addPoint((const void *)(points + i * point_size), n0 + i);
   }
 #ifdef PERFORMANCE_TESTING
   add_count_ += n;
@@ -344,34 +381,76 @@ int GammaIndexHNSWLIB::Search(RetrievalContext *retrieval_context, int n,
     fstdistfunc = space_interface_->get_dist_func();
   }
 
+  // explore more candidates for selective filters
+  int ef_search = retrieval_params->EfSearch();
+  GammaSearchCondition *condition =
+      dynamic_cast<GammaSearchCondition *>(retrieval_context);
+  if (condition != nullptr) {
+    ef_search = condition->WidenSearchScope(ef_search, 0);
+  }
+
+  // a quantized graph is searched by the codes of the queries, the top
+  // k * rerank of them are ranked again by the full precision vectors
+  const uint8_t *queries = x;
+  size_t query_size = d * sizeof(float);
+  std::vector<uint8_t> query_codes;
+  int k0 = k;
+  std::vector<float> cand_dis;
+  std::vector<int64_t> cand_labels;
+  float *dis0 = distances;
+  idx_t *idxs0 = idxs;
+  if (quantizer_ != nullptr) {
+    query_size = quantizer_->CodeSize();
+    query_codes.resize(n * query_size);
+    quantizer_->Encode(n, xq, query_codes.data());
+    queries = query_codes.data();
+
+    int rerank = retrieval_params->Rerank() >= 0 ? retrieval_params->Rerank()
+                                                  : raw_vec_->RerankFactor();
+    if (rerank > 1) {
+      k0 = k * rerank;
+      ef_search = std::max(ef_search, k0);
+      cand_dis.resize((size_t)n * k0);
+      cand_labels.resize((size_t)n * k0, -1);
+      dis0 = cand_dis.data();
+      idxs0 = reinterpret_cast<idx_t *>(cand_labels.data());
+    }
+  }
+
 #pragma omp parallel for schedule(dynamic) num_threads(n < omp_get_max_threads() ? n : omp_get_max_threads())
   for (int i = 0; i < n; ++i) {
     int j = 0;
 
-    auto result = searchKnn((const void *)(xq + i * d), k, fstdistfunc,
-                            retrieval_params->EfSearch(), 
+    auto result = searchKnn((const void *)(queries + i * query_size), k0,
+                            fstdistfunc, ef_search,
                             retrieval_params->DoEfSearchCheck(), retrieval_context);
 
     if (retrieval_params->GetDistanceComputeType() ==
         DistanceComputeType::INNER_PRODUCT) {
       while (!result.empty()) {
         auto &top = result.top();
-        idxs[i * k + k - j - 1] = top.second;
-        distances[i * k + k - j - 1] = 1 - top.first;
+        idxs0[i * k0 + k0 - j - 1] = top.second;
+        dis0[i * k0 + k0 - j - 1] = 1 - top.first;
         ++j;
         result.pop();
       }
     } else {
       while (!result.empty()) {
         auto &top = result.top();
-        idxs[i * k + k - j - 1] = top.second;
-        distances[i * k + k - j - 1] = top.first;
+        idxs0[i * k0 + k0 - j - 1] = top.second;
+        dis0[i * k0 + k0 - j - 1] = top.first;
         ++j;
         result.pop();
       }
     }
   }
 
+  if (k0 > k) {
+    Rerank(retrieval_context, n, xq, k0, cand_labels.data(), k,
+           retrieval_params->GetDistanceComputeType() == DistanceComputeType::L2,
+           distances, labels);
+  }
+
 #ifdef PERFORMANCE_TESTING
   std::string compute_msg = "hnsw compute ";
   compute_msg += std::to_string(n);
@@ -382,15 +461,21 @@ int GammaIndexHNSWLIB::Search(RetrievalContext *retrieval_context, int n,
 }
 
 long GammaIndexHNSWLIB::GetTotalMemBytes() {
-  size_t total_mem_bytes = max_elements_ * size_data_per_element_;
-  return total_mem_bytes;
+  return getElementsMemBytes();
 }
 
 int GammaIndexHNSWLIB::Update(const std::vector<int64_t> &ids,
                               const std::vector<const uint8_t *> &vecs) {
   std::unique_lock<std::mutex> templock(dump_mutex_);
+  std::vector<uint8_t> code(quantizer_ != nullptr ? quantizer_->CodeSize() : 0);
   for (size_t i = 0; i < ids.size(); i++) {
-    updatePoint((const void *)vecs[i], ids[i], 1.0);
+    const uint8_t *point = vecs[i];
+    if (quantizer_ != nullptr) {
+      quantizer_->Encode(1, reinterpret_cast<const float *>(vecs[i]),
+                         code.data());
+      point = code.data();
+    }
+    updatePoint((const void *)point, ids[i], 1.0);
   }
   updated_num_ += ids.size();
   LOG(INFO) << "update index success! size=" << ids.size()
@@ -417,23 +502,44 @@ int GammaIndexHNSWLIB::Dump(const std::string &dir) {
     return IO_ERR;
   }
 
-  std::string index_file = index_dir + "/hnswlib.index";
+  std::string graph_file = index_dir + "/hnswlib.graph";
   std::unique_lock<std::mutex> templock(dump_mutex_);
-  saveIndex(index_file);
+  try {
+    saveGraph(graph_file);
+  } catch (std::exception &e) {
+    LOG(ERROR) << "dump hnsw graph error: " << e.what();
+    return IO_ERR;
+  }
   return 0;
 }
 
 int GammaIndexHNSWLIB::Load(const std::string &index_dir) {
   std::string index_name = vector_->MetaInfo()->AbsoluteName();
+  std::string graph_file = index_dir + "/" + index_name + "/hnswlib.graph";
+  // dumped by the versions before the graph file
   std::string index_file = index_dir + "/" + index_name + "/hnswlib.index";
-  if (!utils::file_exist(index_file)) {
-    LOG(INFO) << index_file << " isn't existed, skip loading";
-    return 0;  // it should train again after load
-  }
-  if (metric_type_ == DistanceComputeType::INNER_PRODUCT) {
-    loadIndex(index_file, space_interface_ip_);
-  } else {
-    loadIndex(index_file, space_interface_);
+  SpaceInterface<float> *space =
+      metric_type_ == DistanceComputeType::INNER_PRODUCT ? space_interface_ip_
+                                                         : space_interface_;
+  try {
+    if (utils::file_exist(graph_file)) {
+      double start = utils::getmillisecs();
+      loadGraph(graph_file, space);
+      LOG(INFO) << "map hnsw graph " << graph_file << ", elements "
+                << cur_element_count << ", cost "
+                << utils::getmillisecs() - start << " ms";
+      if (warmup_) {
+        warmup_thread_ = std::thread([this]() { warmupGraph(); });
+      }
+    } else if (utils::file_exist(index_file)) {
+      loadIndex(index_file, space);
+    } else {
+      LOG(INFO) << graph_file << " isn't existed, skip loading";
+      return 0;  // it should train again after load
+    }
+  } catch (std::exception &e) {
+    LOG(ERROR) << "load hnsw graph error: " << e.what();
+    return -1;
   }
   indexed_vec_count_ = cur_element_count;
   return indexed_vec_count_;
@@ -11,6 +11,7 @@
 
 #include <algorithm>
 #include <string>
+#include <thread>
 #include <vector>
 
 #include "util/bitmap.h"
@@ -18,6 +19,7 @@
 #include "common/gamma_common_data.h"
 #include "index/impl/gamma_index_flat.h"
 #include "hnswlib.h"
+#include "space_quantized.h"
 #include "util/log.h"
 #include "vector/raw_vector.h"
 #include "index/retrieval_model.h"
@@ -32,12 +34,14 @@ class HNSWLIBRetrievalParameters : public RetrievalParameters {
   HNSWLIBRetrievalParameters() : RetrievalParameters() { 
     efSearch_ = 64; 
     do_efSearch_check_ = 1;
+    rerank_ = -1;
   }
 
   HNSWLIBRetrievalParameters(enum DistanceComputeType type, int efSearch, int do_efSearch_check) {
     distance_compute_type_ = type;
     efSearch_ = efSearch;
     do_efSearch_check_ = do_efSearch_check;
+    rerank_ = -1;
   }
 
   ~HNSWLIBRetrievalParameters() {}
@@ -49,9 +53,14 @@ class HNSWLIBRetrievalParameters : public RetrievalParameters {
   int DoEfSearchCheck() { return do_efSearch_check_; }
   void SetDoEfSearchCheck(int do_efSearch_check) { do_efSearch_check_ = do_efSearch_check; }
 
+  int Rerank() { return rerank_; }
+  void SetRerank(int rerank) { rerank_ = rerank; }
+
  private:
   int efSearch_;
   int do_efSearch_check_;
+  // rerank factor of quantized vectors, -1 is the one of the raw vector
+  int rerank_;
 };
 
 struct GammaIndexHNSWLIB : public GammaFLATIndex,
@@ -108,7 +117,13 @@ struct GammaIndexHNSWLIB : public GammaFLATIndex,
   SpaceInterface<float> *space_interface_ip_ = nullptr;
   DistanceComputeType metric_type_;
   int do_efSearch_check_;
+  // read the graph file ahead of the searches after it is loaded
+  int warmup_;
+  std::thread warmup_thread_;
   MemoryRawVector *raw_vec_ = nullptr;
+  // not null if the vectors in memory are quantized, the graph is built on
+  // the codes then
+  const VectorQuantizer *quantizer_ = nullptr;
 
   // for dump
   std::mutex dump_mutex_;
@@ -19,12 +19,18 @@
 #pragma once
 
 #include <atomic>
+#include <fstream>
 #include <random>
 #include <stdlib.h>
 #include <assert.h>
+#include <fcntl.h>
 #include <list>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 #include <unordered_set>
 
+#include "chunked_array.h"
 #include "hnswlib.h"
 #include "util/log.h"
 #include "util/thread_util.h"
@@ -34,6 +40,45 @@ namespace hnswlib {
 typedef unsigned int tableint;
 typedef unsigned int linklistsizeint;
 
+// the graph file written by saveGraph, the sections are aligned to
+// kGraphAlign bytes so that it can be mapped and searched in place
+static const char kGraphMagic[8] = {'H', 'N', 'S', 'W', 'G', 'R', 'P', 'H'};
+static const uint32_t kGraphVersion = 1;
+static const size_t kGraphAlign = 4096;
+
+struct GraphHeader {
+  char magic[8];
+  uint32_t version;
+  int32_t maxlevel;
+  uint64_t cur_element_count;
+  uint64_t num_deleted;
+  uint64_t enterpoint_node;
+  uint64_t size_data_per_element;
+  uint64_t size_links_per_element;
+  uint64_t label_offset;
+  uint64_t offset_level0;
+  uint64_t maxM;
+  uint64_t maxM0;
+  uint64_t M;
+  double mult;
+  uint64_t ef_construction;
+  uint64_t ef;
+  // the level 0 records of all the elements
+  uint64_t level0_offset;
+  // a GraphUpper for every element having upper layers
+  uint64_t uppers_offset;
+  uint64_t nuppers;
+  // the upper layer links of them one after another
+  uint64_t links_offset;
+  uint64_t links_size;
+};
+
+struct GraphUpper {
+  uint32_t id;
+  int32_t level;
+  uint64_t offset;  // of the links from links_offset
+};
+
 template <typename dist_t>
 class HierarchicalNSW : public AlgorithmInterface<dist_t> {
  public:
@@ -46,9 +91,7 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   }
 
   HierarchicalNSW(SpaceInterface<dist_t> *s, size_t max_elements, size_t M = 16, size_t ef_construction = 200, size_t random_seed = 100) :
-                link_list_locks_(max_elements), link_list_update_locks_(max_update_element_locks), element_levels_(max_elements) {
-    max_elements_ = max_elements;
-
+                link_list_update_locks_(max_update_element_locks) {
     num_deleted_ = 0;
     data_size_ = s->get_data_size();
     fstdistfunc_ = s->get_dist_func();
@@ -68,21 +111,15 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
     label_offset_ = size_links_level0_ + data_size_;
     offsetLevel0_ = 0;
 
-    data_level0_memory_ = (char *) malloc(max_elements_ * size_data_per_element_);
-    if (data_level0_memory_ == nullptr)
-      throw std::runtime_error("Not enough memory");
-
     cur_element_count = 0;
 
-    visited_list_pool_ = new VisitedListPool(1, max_elements);
+    visited_list_pool_ = new VisitedListPool(1, 0);
+    initElements(max_elements);
 
     //initializations for special treatment of the first node
     enterpoint_node_ = -1;
     maxlevel_ = -1;
 
-    linkLists_ = (char **) malloc(sizeof(void *) * max_elements_);
-    if (linkLists_ == nullptr)
-      throw std::runtime_error("Not enough memory: HierarchicalNSW failed to allocate linklists");
     size_links_per_element_ = maxM_ * sizeof(tableint) + sizeof(linklistsizeint);
     mult_ = 1 / log(1.0 * M_);
     revSize_ = 1.0 / mult_;
@@ -97,12 +134,12 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   };
 
   ~HierarchicalNSW() {
-    free(data_level0_memory_);
     for (tableint i = 0; i < cur_element_count; i++) {
-      if (element_levels_[i] > 0) free(linkLists_[i]);
+      if (element_levels_[i] > 0 && !isGraphMapped(linkLists_[i]))
+        free(linkLists_[i]);
     }
-    free(linkLists_);
     delete visited_list_pool_;
+    if (graph_mmap_ != nullptr) munmap(graph_mmap_, graph_mmap_size_);
   }
 
   size_t max_elements_;
@@ -124,7 +161,7 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   VisitedListPool *visited_list_pool_ = nullptr;
   std::mutex cur_element_count_guard_;
 
-  std::vector<std::mutex> link_list_locks_;
+  ChunkedArray<std::mutex> link_list_locks_;
 
   // Locks to prevent race condition during update/insert of an element at same
   // time. Note: Locks for additions can also be used to prevent this race
@@ -136,9 +173,11 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   size_t size_links_level0_;
   size_t offsetData_, offsetLevel0_;
 
-  char *data_level0_memory_ = nullptr;
-  char **linkLists_ = nullptr;
-  std::vector<int> element_levels_;
+  // the level 0 links and the label of the elements, the vectors are read
+  // by getDataByInternalId
+  ChunkedArray<char> data_level0_;
+  ChunkedArray<char *> linkLists_;
+  ChunkedArray<int> element_levels_;
 
   size_t data_size_;
   size_t vec_data_size_;
@@ -146,36 +185,43 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   size_t label_offset_;
   DISTFUNC<dist_t> fstdistfunc_;
   void *dist_func_param_ = nullptr;
-  std::unordered_map<labeltype, tableint> label_lookup_;
+
+  // the graph file mapped by loadGraph, the level 0 records and the upper
+  // layer links of the loaded elements are read from it
+  char *graph_mmap_ = nullptr;
+  size_t graph_mmap_size_ = 0;
+  std::atomic<bool> stop_warmup_{false};
+
+  inline bool isGraphMapped(const char *p) const {
+    return p >= graph_mmap_ && p < graph_mmap_ + graph_mmap_size_;
+  }
+
+  // the internal ids are the labels, addPoint takes the label as the id
+  inline bool findInternalId(labeltype label, tableint &internal_id) const {
+    if (label >= cur_element_count) return false;
+    internal_id = (tableint)label;
+    return true;
+  }
 
   std::default_random_engine level_generator_;
   std::default_random_engine update_probability_generator_;
 
   inline labeltype getExternalLabel(tableint internal_id) const {
     labeltype return_label;
-    memcpy(&return_label,
-           (data_level0_memory_ + internal_id * size_data_per_element_ +
-            label_offset_),
+    memcpy(&return_label, data_level0_.At(internal_id) + label_offset_,
            sizeof(labeltype));
     return return_label;
   }
 
   inline void setExternalLabel(tableint internal_id, labeltype label) const {
-    memcpy((data_level0_memory_ + internal_id * size_data_per_element_ +
-            label_offset_),
-           &label, sizeof(labeltype));
+    memcpy(data_level0_.At(internal_id) + label_offset_, &label,
+           sizeof(labeltype));
   }
 
   inline labeltype *getExternalLabeLp(tableint internal_id) const {
-    return (labeltype *)(data_level0_memory_ +
-                         internal_id * size_data_per_element_ + label_offset_);
+    return (labeltype *)(data_level0_.At(internal_id) + label_offset_);
   }
 
-  //   inline char *getDataByInternalId(tableint internal_id) const {
-  //     return (data_level0_memory_ + internal_id * size_data_per_element_ +
-  //             offsetData_);
-  //   }
-
   virtual char *getDataByInternalId(tableint internal_id) const = 0;
 
   int getRandomLevel(double reverse_size) {
@@ -239,8 +285,11 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 #ifdef USE_SSE
       _mm_prefetch((char *)(visited_array + *(data + 1)), _MM_HINT_T0);
       _mm_prefetch((char *)(visited_array + *(data + 1) + 64), _MM_HINT_T0);
-      _mm_prefetch(getDataByInternalId(*datal), _MM_HINT_T0);
-      _mm_prefetch(getDataByInternalId(*(datal + 1)), _MM_HINT_T0);
+      // getDataByInternalId reads the raw vector segments, the ids past
+      // the list must not be prefetched
+      if (size > 0) _mm_prefetch(getDataByInternalId(*datal), _MM_HINT_T0);
+      if (size > 1)
+        _mm_prefetch(getDataByInternalId(*(datal + 1)), _MM_HINT_T0);
 #endif
 
       for (size_t j = 0; j < size; j++) {
@@ -248,7 +297,8 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 //                    if (candidate_id == 0) continue;
 #ifdef USE_SSE
         _mm_prefetch((char *)(visited_array + *(datal + j + 1)), _MM_HINT_T0);
-        _mm_prefetch(getDataByInternalId(*(datal + j + 1)), _MM_HINT_T0);
+        if (j + 1 < size)
+          _mm_prefetch(getDataByInternalId(*(datal + j + 1)), _MM_HINT_T0);
 #endif
         if (visited_array[candidate_id] == visited_array_tag) continue;
         visited_array[candidate_id] = visited_array_tag;
@@ -343,7 +393,7 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 #ifdef USE_SSE
       _mm_prefetch((char *)(visited_array + *(data + 1)), _MM_HINT_T0);
       _mm_prefetch((char *)(visited_array + *(data + 1) + 64), _MM_HINT_T0);
-      _mm_prefetch(getDataByInternalId(*(data + 1)), _MM_HINT_T0);
+      if (size > 0) _mm_prefetch(getDataByInternalId(*(data + 1)), _MM_HINT_T0);
       // _mm_prefetch((char *)(data + 2), _MM_HINT_T0);
 #endif
 
@@ -352,8 +402,9 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 //                    if (candidate_id == 0) continue;
 #ifdef USE_SSE
         _mm_prefetch((char *)(visited_array + *(data + j + 1)), _MM_HINT_T0);
-        _mm_prefetch(getDataByInternalId(*(data + j + 1)),
-                     _MM_HINT_T0);  ////////////
+        if (j < size)
+          _mm_prefetch(getDataByInternalId(*(data + j + 1)),
+                       _MM_HINT_T0);  ////////////
 #endif
         if (!(visited_array[candidate_id] == visited_array_tag)) {
           visited_array[candidate_id] = visited_array_tag;
@@ -444,16 +495,7 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
   }
 
   linklistsizeint *get_linklist0(tableint internal_id) const {
-    return (linklistsizeint *)(data_level0_memory_ +
-                               internal_id * size_data_per_element_ +
-                               offsetLevel0_);
-  };
-
-  linklistsizeint *get_linklist0(tableint internal_id,
-                                 char *data_level0_memory_) const {
-    return (linklistsizeint *)(data_level0_memory_ +
-                               internal_id * size_data_per_element_ +
-                               offsetLevel0_);
+    return (linklistsizeint *)(data_level0_.At(internal_id) + offsetLevel0_);
   };
 
   linklistsizeint *get_linklist(tableint internal_id, int level) const {
@@ -605,39 +647,44 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 
   void setEf(size_t ef) { ef_ = ef; }
 
+  // drop the elements, make room for max_elements ones, size_data_per_element_
+  // should be set before
+  void initElements(size_t max_elements) {
+    data_level0_.Reset(size_data_per_element_);
+    linkLists_.Reset(1);
+    element_levels_.Reset(1);
+    link_list_locks_.Reset(1);
+    reserveElements(max_elements);
+  }
+
+  // add chunks of elements, the existing ones are not moved
+  void reserveElements(size_t max_elements) {
+    data_level0_.Reserve(max_elements);
+    linkLists_.Reserve(max_elements);
+    element_levels_.Reserve(max_elements);
+    link_list_locks_.Reserve(max_elements);
+    max_elements_ = data_level0_.Capacity();
+    visited_list_pool_->resize(max_elements_);
+  }
+
   void resizeIndex(size_t new_max_elements) {
-    pthread_rwlock_wrlock(&shared_mutex_);
     if (new_max_elements < cur_element_count)
       throw std::runtime_error(
           "Cannot resize, max element is less than the current number of "
           "elements");
+    if (new_max_elements <= max_elements_) return;
 
-    delete visited_list_pool_;
-    visited_list_pool_ = new VisitedListPool(1, new_max_elements);
-
-    element_levels_.resize(new_max_elements);
-
-    std::vector<std::mutex>(new_max_elements).swap(link_list_locks_);
-
-    // Reallocate base layer
-    char *data_level0_memory_new =
-        (char *)realloc(data_level0_memory_, new_max_elements * size_data_per_element_);
-    if (data_level0_memory_new == nullptr)
-      throw std::runtime_error(
-          "Not enough memory: resizeIndex failed to allocate base layer");
-    data_level0_memory_ = data_level0_memory_new;
-
-    // Reallocate all other layers
-    char **linkLists_new = (char **)realloc(linkLists_, sizeof(void *) * new_max_elements);
-    if (linkLists_new == nullptr)
-      throw std::runtime_error(
-          "Not enough memory: resizeIndex failed to allocate other layers");
-    linkLists_ = linkLists_new;
-
-    max_elements_ = new_max_elements;
+    // the searches grow their visited lists out of it
+    pthread_rwlock_wrlock(&shared_mutex_);
+    reserveElements(new_max_elements);
     pthread_rwlock_unlock(&shared_mutex_);
   }
 
+  long getElementsMemBytes() const {
+    return data_level0_.MemBytes() + linkLists_.MemBytes() +
+           element_levels_.MemBytes() + link_list_locks_.MemBytes();
+  }
+
   void saveIndex(const std::string &location) {
     std::ofstream output(location, std::ios::binary);
     std::streampos position;
@@ -658,8 +705,10 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
     writeBinaryPOD(output, ef_construction_);
     writeBinaryPOD(output, ef_); // addtional
 
-    output.write(data_level0_memory_,
-                 cur_element_count * size_data_per_element_);
+    for (size_t i = 0; i < cur_element_count; i += data_level0_.kChunkSize) {
+      size_t n = std::min(data_level0_.kChunkSize, cur_element_count - i);
+      output.write(data_level0_.At(i), n * size_data_per_element_);
+    }
 
     for (size_t i = 0; i < cur_element_count; i++) {
       unsigned int linkListSize =
@@ -686,9 +735,8 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
     readBinaryPOD(input, max_elements_);
     readBinaryPOD(input, cur_element_count);
 
-    size_t max_elements = max_elements_i;
-    if (max_elements < cur_element_count) max_elements = max_elements_;
-    max_elements_ = max_elements;
+    // the elements grow by chunks later, no room is kept for them
+    size_t max_elements = std::max(max_elements_i, cur_element_count);
     readBinaryPOD(input, size_data_per_element_);
     readBinaryPOD(input, label_offset_);
     readBinaryPOD(input, offsetData_);
@@ -734,30 +782,24 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 
     input.seekg(pos, input.beg);
 
-    data_level0_memory_ = (char *)malloc(max_elements * size_data_per_element_);
-    if (data_level0_memory_ == nullptr)
-      throw std::runtime_error(
-          "Not enough memory: loadIndex failed to allocate level0");
-    input.read(data_level0_memory_, cur_element_count * size_data_per_element_);
+    if (visited_list_pool_ == nullptr) {
+      visited_list_pool_ = new VisitedListPool(1, 0);
+    }
+    initElements(max_elements);
+    for (size_t i = 0; i < cur_element_count; i += data_level0_.kChunkSize) {
+      size_t n = std::min(data_level0_.kChunkSize, cur_element_count - i);
+      input.read(data_level0_.At(i), n * size_data_per_element_);
+    }
 
     size_links_per_element_ =
         maxM_ * sizeof(tableint) + sizeof(linklistsizeint);
 
     size_links_level0_ = maxM0_ * sizeof(tableint) + sizeof(linklistsizeint);
-    std::vector<std::mutex>(max_elements).swap(link_list_locks_);
     std::vector<std::mutex>(max_update_element_locks)
         .swap(link_list_update_locks_);
 
-    visited_list_pool_ = new VisitedListPool(1, max_elements);
-
-    linkLists_ = (char **)malloc(sizeof(void *) * max_elements);
-    if (linkLists_ == nullptr)
-      throw std::runtime_error(
-          "Not enough memory: loadIndex failed to allocate linklists");
-    element_levels_ = std::vector<int>(max_elements);
     revSize_ = 1.0 / mult_;
     for (size_t i = 0; i < cur_element_count; i++) {
-      label_lookup_[getExternalLabel(i)] = i;
       unsigned int linkListSize;
       readBinaryPOD(input, linkListSize);
       if (linkListSize == 0) {
@@ -783,14 +825,189 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
     return;
   }
 
+  static void padGraph(std::ofstream &output, size_t offset) {
+    size_t pos = output.tellp();
+    if (offset > pos) {
+      std::vector<char> zeros(offset - pos, 0);
+      output.write(zeros.data(), zeros.size());
+    }
+  }
+
+  static size_t alignGraph(size_t offset) {
+    return (offset + kGraphAlign - 1) / kGraphAlign * kGraphAlign;
+  }
+
+  // write the graph as GraphHeader describes, to a temporary file renamed to
+  // location at last, so a mapped graph file being searched is not changed
+  void saveGraph(const std::string &location) {
+    GraphHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, kGraphMagic, sizeof(header.magic));
+    header.version = kGraphVersion;
+    header.maxlevel = maxlevel_;
+    header.cur_element_count = cur_element_count;
+    header.num_deleted = num_deleted_;
+    header.enterpoint_node = enterpoint_node_;
+    header.size_data_per_element = size_data_per_element_;
+    header.size_links_per_element = size_links_per_element_;
+    header.label_offset = label_offset_;
+    header.offset_level0 = offsetLevel0_;
+    header.maxM = maxM_;
+    header.maxM0 = maxM0_;
+    header.M = M_;
+    header.mult = mult_;
+    header.ef_construction = ef_construction_;
+    header.ef = ef_;
+
+    std::vector<GraphUpper> uppers;
+    size_t links_size = 0;
+    for (size_t i = 0; i < cur_element_count; i++) {
+      if (element_levels_[i] > 0) {
+        uppers.push_back({(uint32_t)i, element_levels_[i], links_size});
+        links_size += size_links_per_element_ * element_levels_[i];
+      }
+    }
+    header.level0_offset = alignGraph(sizeof(header));
+    header.uppers_offset = alignGraph(
+        header.level0_offset + cur_element_count * size_data_per_element_);
+    header.nuppers = uppers.size();
+    header.links_offset =
+        alignGraph(header.uppers_offset + uppers.size() * sizeof(GraphUpper));
+    header.links_size = links_size;
+
+    std::string tmp_location = location + ".tmp";
+    std::ofstream output(tmp_location, std::ios::binary);
+    if (!output.is_open())
+      throw std::runtime_error("Cannot open file " + tmp_location);
+    output.write((const char *)&header, sizeof(header));
+    padGraph(output, header.level0_offset);
+    for (size_t i = 0; i < cur_element_count; i += data_level0_.kChunkSize) {
+      size_t n = std::min(data_level0_.kChunkSize, cur_element_count - i);
+      output.write(data_level0_.At(i), n * size_data_per_element_);
+    }
+    padGraph(output, header.uppers_offset);
+    output.write((const char *)uppers.data(),
+                 uppers.size() * sizeof(GraphUpper));
+    padGraph(output, header.links_offset);
+    for (const GraphUpper &upper : uppers) {
+      output.write(linkLists_[upper.id],
+                   size_links_per_element_ * upper.level);
+    }
+    output.close();
+    if (!output)
+      throw std::runtime_error("Cannot write file " + tmp_location);
+    if (rename(tmp_location.c_str(), location.c_str()))
+      throw std::runtime_error("Cannot rename file to " + location);
+  }
+
+  // map the graph file written by saveGraph and search it in place, its pages
+  // are read when they are touched first. The graph changed later is private
+  // to the process, the file is not written
+  void loadGraph(const std::string &location, SpaceInterface<dist_t> *s) {
+    if (graph_mmap_ != nullptr)
+      throw std::runtime_error("Graph file is mapped already");
+    int fd = open(location.c_str(), O_RDONLY);
+    if (fd < 0) throw std::runtime_error("Cannot open file " + location);
+    struct stat st;
+    if (fstat(fd, &st) || (size_t)st.st_size < sizeof(GraphHeader)) {
+      close(fd);
+      throw std::runtime_error("Graph file seems to be corrupted");
+    }
+    void *addr = mmap(nullptr, st.st_size, PROT_READ | PROT_WRITE,
+                      MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (addr == MAP_FAILED)
+      throw std::runtime_error("Cannot map file " + location);
+    graph_mmap_ = (char *)addr;
+    graph_mmap_size_ = st.st_size;
+    // the searches jump around the graph, no read ahead
+    madvise(graph_mmap_, graph_mmap_size_, MADV_RANDOM);
+
+    GraphHeader header;
+    memcpy(&header, graph_mmap_, sizeof(header));
+    if (memcmp(header.magic, kGraphMagic, sizeof(header.magic)) ||
+        header.version != kGraphVersion)
+      throw std::runtime_error("Unsupported graph file version");
+    if (header.level0_offset + header.cur_element_count *
+                                   header.size_data_per_element >
+            header.uppers_offset ||
+        header.uppers_offset + header.nuppers * sizeof(GraphUpper) >
+            header.links_offset ||
+        header.links_offset + header.links_size > graph_mmap_size_)
+      throw std::runtime_error("Graph file seems to be corrupted");
+
+    cur_element_count = header.cur_element_count;
+    num_deleted_ = header.num_deleted;
+    maxlevel_ = header.maxlevel;
+    enterpoint_node_ = (tableint)header.enterpoint_node;
+    size_data_per_element_ = header.size_data_per_element;
+    size_links_per_element_ = header.size_links_per_element;
+    label_offset_ = header.label_offset;
+    offsetLevel0_ = header.offset_level0;
+    maxM_ = header.maxM;
+    maxM0_ = header.maxM0;
+    M_ = header.M;
+    mult_ = header.mult;
+    revSize_ = 1.0 / mult_;
+    ef_construction_ = header.ef_construction;
+    ef_ = header.ef;
+    size_links_level0_ = maxM0_ * sizeof(tableint) + sizeof(linklistsizeint);
+    offsetData_ = size_links_level0_;
+
+    vec_data_size_ = s->get_data_size();
+    data_size_ = 0;
+    fstdistfunc_ = s->get_dist_func();
+    dist_func_param_ = s->get_dist_func_param();
+
+    std::vector<std::mutex>(max_update_element_locks)
+        .swap(link_list_update_locks_);
+    if (visited_list_pool_ == nullptr) {
+      visited_list_pool_ = new VisitedListPool(1, 0);
+    }
+    data_level0_.Reset(size_data_per_element_);
+    data_level0_.Attach(graph_mmap_ + header.level0_offset, cur_element_count);
+    linkLists_.Reset(1);
+    element_levels_.Reset(1);
+    link_list_locks_.Reset(1);
+    reserveElements(std::max(cur_element_count, (size_t)1));
+
+    const GraphUpper *uppers =
+        (const GraphUpper *)(graph_mmap_ + header.uppers_offset);
+    char *links = graph_mmap_ + header.links_offset;
+    for (size_t i = 0; i < header.nuppers; i++) {
+      const GraphUpper &upper = uppers[i];
+      if (upper.id >= cur_element_count || upper.level <= 0 ||
+          upper.offset + size_links_per_element_ * upper.level >
+              header.links_size)
+        throw std::runtime_error("Graph file seems to be corrupted");
+      element_levels_[upper.id] = upper.level;
+      linkLists_[upper.id] = links + upper.offset;
+    }
+  }
+
+  // read the pages of the mapped graph file ahead of the searches, it returns
+  // early when stop_warmup_ is set
+  void warmupGraph() {
+    if (graph_mmap_ == nullptr) return;
+    const size_t window = 64 << 20;
+    size_t page_size = sysconf(_SC_PAGESIZE);
+    volatile char c = 0;
+    for (size_t start = 0; start < graph_mmap_size_ && !stop_warmup_;
+         start += window) {
+      size_t len = std::min(window, graph_mmap_size_ - start);
+      madvise(graph_mmap_ + start, len, MADV_WILLNEED);
+      for (size_t off = start; off < start + len; off += page_size) {
+        c += graph_mmap_[off];
+      }
+    }
+  }
+
   template <typename data_t>
   std::vector<data_t> getDataByLabel(labeltype label) {
     tableint label_c;
-    auto search = label_lookup_.find(label);
-    if (search == label_lookup_.end() || isMarkedDeleted(search->second)) {
+    if (!findInternalId(label, label_c) || isMarkedDeleted(label_c)) {
       throw std::runtime_error("Label not found");
     }
-    label_c = search->second;
 
     char *data_ptrv = getDataByInternalId(label_c);
     size_t dim = *((size_t *)dist_func_param_);
@@ -811,12 +1028,11 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
    * @param label
    */
   void markDelete(labeltype label) {
-    auto search = label_lookup_.find(label);
-    if (search == label_lookup_.end()) {
-      LOG(INFO) << label << " not found in label_lookup_";
+    tableint internalId;
+    if (!findInternalId(label, internalId)) {
+      LOG(INFO) << label << " not found in the graph";
       return;
     }
-    tableint internalId = search->second;
     markDeletedInternal(internalId);
   }
 
@@ -841,11 +1057,10 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
    * @param label
   */
   void unmarkDelete(labeltype label) {
-    auto search = label_lookup_.find(label);
-    if (search == label_lookup_.end()) {
+    tableint internalId;
+    if (!findInternalId(label, internalId)) {
       throw std::runtime_error("Label not found");
     }
-    tableint internalId = search->second;
     unmarkDeletedInternal(internalId);
   }
 
@@ -991,11 +1206,12 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
           int size = getListCount(data);
           tableint *datal = (tableint *)(data + 1);
 #ifdef USE_SSE
-          _mm_prefetch(getDataByInternalId(*datal), _MM_HINT_T0);
+          if (size > 0) _mm_prefetch(getDataByInternalId(*datal), _MM_HINT_T0);
 #endif
           for (int i = 0; i < size; i++) {
 #ifdef USE_SSE
-            _mm_prefetch(getDataByInternalId(*(datal + i + 1)), _MM_HINT_T0);
+            if (i + 1 < size)
+              _mm_prefetch(getDataByInternalId(*(datal + i + 1)), _MM_HINT_T0);
 #endif
             tableint cand = datal[i];
             dist_t d = fstdistfunc_(dataPoint, getDataByInternalId(cand),
@@ -1070,7 +1286,6 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
 
       cur_c = label;
       cur_element_count++;
-      label_lookup_[label] = cur_c;
     }
     std::unique_lock<std::mutex> lock_el(link_list_locks_[cur_c]);
     int curlevel = getRandomLevel(mult_);
@@ -1085,8 +1300,7 @@ class HierarchicalNSW : public AlgorithmInterface<dist_t> {
     tableint enterpoint_copy = enterpoint_node_;
 
     pthread_rwlock_wrlock(&shared_mutex_);
-    memset(data_level0_memory_ + cur_c * size_data_per_element_ + offsetLevel0_,
-           0, size_data_per_element_);
+    memset(data_level0_.At(cur_c), 0, size_data_per_element_);
 
     // Initialisation of the data and label
     memcpy(getExternalLabeLp(cur_c), &label, sizeof(labeltype));
@@ -0,0 +1,57 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+#include "hnswlib.h"
+#include "vector/vector_quantizer.h"
+
+namespace hnswlib {
+
+    // the points of a quantized space are the codes of a vector quantizer,
+    // the queries are encoded too
+    static float
+    QuantizedL2Sqr(const void *pVect1v, const void *pVect2v, const void *param) {
+        const tig_gamma::VectorQuantizer *quantizer =
+            (const tig_gamma::VectorQuantizer *) param;
+        return quantizer->CodeL2Sqr((const uint8_t *) pVect1v, (const uint8_t *) pVect2v);
+    }
+
+    static float
+    QuantizedInnerProduct(const void *pVect1v, const void *pVect2v, const void *param) {
+        const tig_gamma::VectorQuantizer *quantizer =
+            (const tig_gamma::VectorQuantizer *) param;
+        return 1.0f - quantizer->CodeInnerProduct((const uint8_t *) pVect1v, (const uint8_t *) pVect2v);
+    }
+
+    class QuantizedSpace : public SpaceInterface<float> {
+
+        DISTFUNC<float> fstdistfunc_;
+        size_t data_size_;
+        const tig_gamma::VectorQuantizer *quantizer_;
+    public:
+        QuantizedSpace(const tig_gamma::VectorQuantizer *quantizer, bool inner_product) {
+            fstdistfunc_ = inner_product ? QuantizedInnerProduct : QuantizedL2Sqr;
+            quantizer_ = quantizer;
+            data_size_ = quantizer->CodeSize();
+        }
+
+        size_t get_data_size() {
+            return data_size_;
+        }
+
+        DISTFUNC<float> get_dist_func() {
+            return fstdistfunc_;
+        }
+
+        void *get_dist_func_param() {
+            return (void *) quantizer_;
+        }
+
+        ~QuantizedSpace() {}
+    };
+
+}
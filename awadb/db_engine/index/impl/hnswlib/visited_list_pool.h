@@ -20,6 +20,7 @@
 
 #include <mutex>
 #include <string.h>
+#include <algorithm>
 #include <deque>
 
 namespace hnswlib {
@@ -65,6 +66,14 @@ namespace hnswlib {
                 pool.push_front(new VisitedList(numelements));
         }
 
+        // the lists smaller than numelements1 are replaced when they are
+        // taken, they grow by doubling so as not to be replaced too often
+        void resize(int numelements1) {
+            std::unique_lock <std::mutex> lock(poolguard);
+            if (numelements1 > numelements)
+                numelements = std::max(numelements1, numelements * 2);
+        }
+
         VisitedList *getFreeVisitedList() {
             VisitedList *rez;
             {
@@ -72,6 +81,10 @@ namespace hnswlib {
                 if (pool.size() > 0) {
                     rez = pool.front();
                     pool.pop_front();
+                    if ((int) rez->numelements < numelements) {
+                        delete rez;
+                        rez = new VisitedList(numelements);
+                    }
                 } else {
                     rez = new VisitedList(numelements);
                 }
@@ -300,6 +300,23 @@ class RetrievalModel {
    */
   virtual int Load(const std::string &dir) = 0;
 
+  /** Dump the index changes since its last dump as a delta of the full
+   *  dump in dir
+   *
+   * @param dir   directory of the full dump
+   * @param seq   sequence number of the delta, starting from 1
+   * @return 0 if successed, otherwise a full dump is needed
+   */
+  virtual int DumpDelta(const std::string &dir, int seq) { return -1; }
+
+  /** Load the delta seq of the full dump in dir after loading it
+   *
+   * @param dir   directory of the full dump
+   * @param seq   sequence number of the delta
+   * @return load number(>=0) if successed
+   */
+  virtual int LoadDelta(const std::string &dir, int seq) { return -1; }
+
   virtual void train(int64_t n, const float *x) {}
 
   VectorReader *vector_;
@@ -40,27 +40,13 @@ int MmapRawVectorIO::Load(int vec_num) {
   }
   raw_vector->MetaInfo()->size_ = vec_num;
 
-  if (dynamic_cast<MemoryRawVector *>(raw_vector)) {
-    MemoryRawVector *memory_vec = dynamic_cast<MemoryRawVector *>(raw_vector);
-    std::vector<const uint8_t *> values;
-    std::vector<int> lens;
-    int ret = memory_vec->storage_mgr_->GetHeaders(0, vec_num, values, lens);
+  MemoryRawVector *memory_vec = dynamic_cast<MemoryRawVector *>(raw_vector);
+  if (memory_vec) {
+    int ret = memory_vec->MapSegments(vec_num);
     if (ret != 0) {
       LOG(ERROR) << "Load mmap vector failed";
       return ret;
     }
-
-    const StorageManagerOptions opt =
-        raw_vector->storage_mgr_->GetStorageManagerOptions();
-
-    int fixed_value_bytes = opt.fixed_value_bytes;
-    for (size_t i = 0; i < lens.size(); ++i) {
-      for (size_t j = 0; j < (size_t)lens[i]; ++j) {
-        memory_vec->AddToStore(
-            const_cast<uint8_t *>(values[i] + j * fixed_value_bytes),
-            fixed_value_bytes);
-      }
-    }
   }
   LOG(INFO) << "mmap load success! vec num=" << vec_num;
   return 0;
@@ -14,11 +14,13 @@ namespace realtime {
 
 RTInvertIndex::RTInvertIndex(size_t nlist, size_t code_size, VIDMgr *vid_mgr,
                              bitmap::BitmapManager *docids_bitmap,
-                             size_t bucket_keys, size_t bucket_keys_limit)
+                             size_t bucket_keys, size_t bucket_keys_limit,
+                             bool block_codes)
     : nlist_(nlist),
       code_size_(code_size),
       bucket_keys_(bucket_keys),
       bucket_keys_limit_(bucket_keys_limit),
+      block_codes_(block_codes),
       vid_mgr_(vid_mgr),
       docids_bitmap_(docids_bitmap) {
   cur_ptr_ = nullptr;
@@ -35,7 +37,7 @@ bool RTInvertIndex::Init() {
   CHECK_DELETE(cur_ptr_);
   cur_ptr_ = new (std::nothrow)
       RealTimeMemData(nlist_, vid_mgr_, docids_bitmap_, bucket_keys_,
-                      bucket_keys_limit_, code_size_);
+                      bucket_keys_limit_, code_size_, block_codes_);
   if (nullptr == cur_ptr_) return false;
 
   if (!cur_ptr_->Init()) return false;
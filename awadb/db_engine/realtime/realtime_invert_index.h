@@ -24,10 +24,12 @@ namespace realtime {
 
 struct RTInvertIndex {
  public:
-  // bucket_keys should not be larger than bucket_keys_limit
+  // bucket_keys should not be larger than bucket_keys_limit, the codes are
+  // stored in blocks of kCodeBlockSize vectors if block_codes is true
   RTInvertIndex(size_t nlist, size_t code_size, VIDMgr *vid_mgr,
                 bitmap::BitmapManager *docids_bitmap,
-                size_t bucket_keys = 10000, size_t bucket_keys_limit = 1000000);
+                size_t bucket_keys = 10000, size_t bucket_keys_limit = 1000000,
+                bool block_codes = false);
 
   ~RTInvertIndex();
 
@@ -56,6 +58,7 @@ struct RTInvertIndex {
   size_t code_size_;
   size_t bucket_keys_;
   size_t bucket_keys_limit_;
+  bool block_codes_;
   VIDMgr *vid_mgr_;
   bitmap::BitmapManager *docids_bitmap_;
 
@@ -34,11 +34,13 @@ RTInvertBucketData::RTInvertBucketData(RTInvertBucketData *other) {
   compacted_num_ = other->compacted_num_;
   buckets_num_ = other->buckets_num_;
   nids_ = other->nids_;
+  block_codes_ = other->block_codes_;
 }
 
 RTInvertBucketData::RTInvertBucketData(VIDMgr *vid_mgr,
-                                       bitmap::BitmapManager *docids_bitmap)
-    : docids_bitmap_(docids_bitmap) {
+                                       bitmap::BitmapManager *docids_bitmap,
+                                       bool block_codes)
+    : docids_bitmap_(docids_bitmap), block_codes_(block_codes) {
   idx_array_ = nullptr;
   retrieve_idx_pos_ = nullptr;
   cur_bucket_keys_ = nullptr;
@@ -67,10 +69,11 @@ bool RTInvertBucketData::Init(const size_t &buckets_num,
   if (idx_array_ == nullptr || codes_array_ == nullptr ||
       cur_bucket_keys_ == nullptr || deleted_nums_ == nullptr)
     return false;
+  size_t codes_bytes =
+      CodesBytes(bucket_keys, code_bytes_per_vec, block_codes_);
   for (size_t i = 0; i < buckets_num; i++) {
     idx_array_[i] = new (std::nothrow) long[bucket_keys];
-    codes_array_[i] =
-        new (std::nothrow) uint8_t[bucket_keys * code_bytes_per_vec];
+    codes_array_[i] = new (std::nothrow) uint8_t[codes_bytes];
     if (idx_array_[i] == nullptr || codes_array_[i] == nullptr) return false;
     cur_bucket_keys_[i] = bucket_keys;
     deleted_nums_[i] = 0;
@@ -80,8 +83,7 @@ bool RTInvertBucketData::Init(const size_t &buckets_num,
   for (size_t i = 0; i < nids_; i++) vid_bucket_no_pos_[i] = -1;
 
   total_mem_bytes += buckets_num * bucket_keys * sizeof(long);
-  total_mem_bytes +=
-      buckets_num * bucket_keys * code_bytes_per_vec * sizeof(uint8_t);
+  total_mem_bytes += buckets_num * codes_bytes * sizeof(uint8_t);
   total_mem_bytes += buckets_num * sizeof(int);
 
   retrieve_idx_pos_ = new (std::nothrow) size_t[buckets_num];
@@ -96,19 +98,19 @@ bool RTInvertBucketData::Init(const size_t &buckets_num,
 }
 
 void RTInvertBucketData::CompactOne(const size_t &bucket_no, long *&dst_idx,
-                                    uint8_t *&dst_code, long *&src_idx,
-                                    uint8_t *&src_code, int &pos,
+                                    uint8_t *dst_codes, long *&src_idx,
+                                    const uint8_t *src_codes, int src_pos,
+                                    int &pos,
                                     const size_t &code_bytes_per_vec) {
   if (!(*src_idx & kDelIdxMask) && not docids_bitmap_->Test(vid_mgr_->VID2DocID(
                                        *src_idx & kRecoverIdxMask))) {
     *dst_idx = *src_idx;
-    memcpy((void *)dst_code, (void *)(src_code), (size_t)code_bytes_per_vec);
+    CopyCode(dst_codes, pos, src_codes, src_pos, code_bytes_per_vec,
+             block_codes_);
     vid_bucket_no_pos_[*dst_idx] = bucket_no << 32 | pos++;
     ++dst_idx;
-    dst_code += code_bytes_per_vec;
   }
   ++src_idx;
-  src_code += code_bytes_per_vec;
 }
 
 double RTInvertBucketData::ExtendCoefficient(uint8_t extend_time) {
@@ -124,14 +126,13 @@ bool RTInvertBucketData::CompactBucket(const size_t &bucket_no,
 
   int pos = 0;
   long *idx_array = (long *)malloc(sizeof(long) * cur_bucket_keys_[bucket_no]);
-  uint8_t *codes_array =
-      (uint8_t *)malloc(code_bytes_per_vec * cur_bucket_keys_[bucket_no]);
+  uint8_t *codes_array = (uint8_t *)malloc(CodesBytes(
+      cur_bucket_keys_[bucket_no], code_bytes_per_vec, block_codes_));
   long *idx_ptr = idx_array;
-  uint8_t *codes_ptr = codes_array;
 
   for (int i = 0; i < old_pos; i++) {
-    CompactOne(bucket_no, idx_ptr, codes_ptr, old_idx_ptr, old_codes_ptr, pos,
-               code_bytes_per_vec);
+    CompactOne(bucket_no, idx_ptr, codes_array, old_idx_ptr, old_codes_ptr, i,
+               pos, code_bytes_per_vec);
   }
 
   idx_array_[bucket_no] = idx_array;
@@ -161,16 +162,19 @@ bool RTInvertBucketData::ExtendBucketMem(const size_t &bucket_no,
     extend_size = (int)(extend_size * coefficient);
   }
 
+  size_t extend_codes_bytes =
+      CodesBytes(extend_size, code_bytes_per_vec, block_codes_);
   uint8_t *extend_code_bytes_array =
-      new (std::nothrow) uint8_t[extend_size * code_bytes_per_vec];
+      new (std::nothrow) uint8_t[extend_codes_bytes];
   if (extend_code_bytes_array == nullptr) {
     LOG(ERROR) << "memory extend_code_bytes_array alloc error!";
     return false;
   }
   memcpy((void *)extend_code_bytes_array, (void *)codes_array_[bucket_no],
-         sizeof(uint8_t) * retrieve_idx_pos_[bucket_no] * code_bytes_per_vec);
+         sizeof(uint8_t) * CodesBytes(retrieve_idx_pos_[bucket_no],
+                                      code_bytes_per_vec, block_codes_));
   codes_array_[bucket_no] = extend_code_bytes_array;
-  total_mem_bytes += extend_size * code_bytes_per_vec * sizeof(uint8_t);
+  total_mem_bytes += extend_codes_bytes * sizeof(uint8_t);
 
   long *extend_idx_array = new (std::nothrow) long[extend_size];
   if (extend_idx_array == nullptr) {
@@ -220,16 +224,18 @@ void RTInvertBucketData::ExtendIDs() {
 RealTimeMemData::RealTimeMemData(size_t buckets_num, VIDMgr *vid_mgr,
                                  bitmap::BitmapManager *docids_bitmap,
                                  size_t bucket_keys, size_t bucket_keys_limit,
-                                 size_t code_bytes_per_vec)
+                                 size_t code_bytes_per_vec, bool block_codes)
     : buckets_num_(buckets_num),
       bucket_keys_(bucket_keys),
       bucket_keys_limit_(bucket_keys_limit),
       code_bytes_per_vec_(code_bytes_per_vec),
+      block_codes_(block_codes),
       vid_mgr_(vid_mgr),
       docids_bitmap_(docids_bitmap) {
   cur_invert_ptr_ = nullptr;
   extend_invert_ptr_ = nullptr;
   total_mem_bytes_ = 0;
+  rewritten_buckets_ = nullptr;
 }
 
 RealTimeMemData::~RealTimeMemData() {
@@ -250,12 +256,20 @@ RealTimeMemData::~RealTimeMemData() {
   }
   CHECK_DELETE(cur_invert_ptr_);
   CHECK_DELETE(extend_invert_ptr_);
+  CHECK_DELETE_ARRAY(rewritten_buckets_);
 }
 
 bool RealTimeMemData::Init() {
   CHECK_DELETE(cur_invert_ptr_);
-  cur_invert_ptr_ =
-      new (std::nothrow) RTInvertBucketData(vid_mgr_, docids_bitmap_);
+  cur_invert_ptr_ = new (std::nothrow)
+      RTInvertBucketData(vid_mgr_, docids_bitmap_, block_codes_);
+
+  CHECK_DELETE_ARRAY(rewritten_buckets_);
+  rewritten_buckets_ = new (std::nothrow) std::atomic<bool>[buckets_num_];
+  if (rewritten_buckets_ == nullptr) return false;
+  for (size_t i = 0; i < buckets_num_; i++) rewritten_buckets_[i] = false;
+  dumped_sizes_.assign(buckets_num_, 0);
+
   return cur_invert_ptr_ &&
          cur_invert_ptr_->Init(buckets_num_, bucket_keys_, code_bytes_per_vec_,
                                total_mem_bytes_);
@@ -280,9 +294,13 @@ bool RealTimeMemData::AddKeys(size_t list_no, size_t n, std::vector<long> &keys,
          (void *)(keys.data()), sizeof(long) * keys.size());
 
   // copy new added codes to codes buffer
-  memcpy((void *)(cur_invert_ptr_->codes_array_[list_no] +
-                  retrive_pos * code_bytes_per_vec_),
-         (void *)(keys_codes.data()), sizeof(uint8_t) * keys_codes.size());
+  if (block_codes_) {
+    SetCodes(list_no, retrive_pos, keys.size(), keys_codes.data());
+  } else {
+    memcpy((void *)(cur_invert_ptr_->codes_array_[list_no] +
+                    retrive_pos * code_bytes_per_vec_),
+           (void *)(keys_codes.data()), sizeof(uint8_t) * keys_codes.size());
+  }
 
   for (size_t i = 0; i < keys.size(); i++) {
     while ((size_t)keys[i] >= cur_invert_ptr_->nids_) {
@@ -310,10 +328,9 @@ int RealTimeMemData::Update(int bucket_no, int vid,
   int old_bucket_no = bucket_no_pos >> 32;
   int old_pos = bucket_no_pos & 0xffffffff;
   assert(code_bytes_per_vec_ == codes.size());
+  rewritten_buckets_[old_bucket_no] = true;
   if (old_bucket_no == bucket_no) {
-    uint8_t *codes_array = cur_invert_ptr_->codes_array_[old_bucket_no];
-    memcpy(codes_array + old_pos * code_bytes_per_vec_, codes.data(),
-           codes.size() * sizeof(uint8_t));
+    SetCodes(old_bucket_no, old_pos, 1, codes.data());
     return 0;
   }
 
@@ -377,7 +394,9 @@ bool RealTimeMemData::Compactable(int bucket_no) {
 }
 
 bool RealTimeMemData::CompactBucket(int bucket_no) {
-  return AdjustBucketMem(bucket_no, 1);
+  if (!AdjustBucketMem(bucket_no, 1)) return false;
+  rewritten_buckets_[bucket_no] = true;
+  return true;
 }
 
 int RealTimeMemData::ExtendBucketIfNeed(int bucket_no, size_t keys_size) {
@@ -434,8 +453,9 @@ bool RealTimeMemData::AdjustBucketMem(const size_t &bucket_no, int type,
   long *old_idx_array = cur_invert_ptr_->idx_array_[bucket_no];
   uint8_t *old_codes_array = cur_invert_ptr_->codes_array_[bucket_no];
   int old_keys = cur_invert_ptr_->cur_bucket_keys_[bucket_no];
-  long free_size = old_keys * sizeof(long) +
-                   old_keys * code_bytes_per_vec_ * sizeof(uint8_t);
+  long free_size =
+      old_keys * sizeof(long) +
+      CodesBytes(old_keys, code_bytes_per_vec_, block_codes_) * sizeof(uint8_t);
 
   if (type == 0) {  // extend bucket
     // WARNING:
@@ -507,10 +527,35 @@ void RealTimeMemData::RetrieveCodes(int bucket_no, int pos, int n,
                                     uint8_t *codes, long *vids) {
   memcpy((void *)vids, (void *)(cur_invert_ptr_->idx_array_[bucket_no] + pos),
          n * sizeof(long));
+  GetCodes(bucket_no, pos, n, codes);
+}
 
-  uint8_t *src_codes =
-      cur_invert_ptr_->codes_array_[bucket_no] + pos * code_bytes_per_vec_;
-  memcpy((void *)codes, (void *)src_codes, n * code_bytes_per_vec_);
+void RealTimeMemData::GetCodes(size_t bucket_no, size_t pos, size_t n,
+                               uint8_t *codes) {
+  const uint8_t *src_codes = cur_invert_ptr_->codes_array_[bucket_no];
+  if (!block_codes_) {
+    memcpy((void *)codes, (void *)(src_codes + pos * code_bytes_per_vec_),
+           n * code_bytes_per_vec_);
+    return;
+  }
+  for (size_t i = 0; i < n; i++) {
+    GetCode(src_codes, pos + i, codes + i * code_bytes_per_vec_,
+            code_bytes_per_vec_, true);
+  }
+}
+
+void RealTimeMemData::SetCodes(size_t bucket_no, size_t pos, size_t n,
+                               const uint8_t *codes) {
+  uint8_t *dst_codes = cur_invert_ptr_->codes_array_[bucket_no];
+  if (!block_codes_) {
+    memcpy((void *)(dst_codes + pos * code_bytes_per_vec_), (void *)codes,
+           n * code_bytes_per_vec_);
+    return;
+  }
+  for (size_t i = 0; i < n; i++) {
+    SetCode(dst_codes, pos + i, codes + i * code_bytes_per_vec_,
+            code_bytes_per_vec_, true);
+  }
 }
 
 }  // namespace realtime
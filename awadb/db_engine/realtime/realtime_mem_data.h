@@ -9,6 +9,7 @@
 
 #include <stdint.h>
 #include <stdlib.h>
+#include <string.h>
 
 #include <atomic>
 #include <string>
@@ -26,9 +27,65 @@ namespace realtime {
 const static long kDelIdxMask = (long)1 << 63;     // 0x8000000000000000
 const static long kRecoverIdxMask = ~kDelIdxMask;  // 0x7fffffffffffffff
 
+// block codes are stored in blocks of kCodeBlockSize vectors, byte j of the
+// codes of a block are kept together, so one simd register loads the byte j
+// of kCodeBlockSize codes
+const static size_t kCodeBlockSize = 32;
+
+// bytes of the codes of n vectors
+inline size_t CodesBytes(size_t n, size_t code_bytes, bool block_codes) {
+  if (block_codes) {
+    n = (n + kCodeBlockSize - 1) / kCodeBlockSize * kCodeBlockSize;
+  }
+  return n * code_bytes;
+}
+
+inline void SetCode(uint8_t *codes, size_t pos, const uint8_t *code,
+                    size_t code_bytes, bool block_codes) {
+  if (!block_codes) {
+    memcpy(codes + pos * code_bytes, code, code_bytes);
+    return;
+  }
+  uint8_t *block = codes + pos / kCodeBlockSize * kCodeBlockSize * code_bytes +
+                   pos % kCodeBlockSize;
+  for (size_t j = 0; j < code_bytes; j++) block[j * kCodeBlockSize] = code[j];
+}
+
+inline void GetCode(const uint8_t *codes, size_t pos, uint8_t *code,
+                    size_t code_bytes, bool block_codes) {
+  if (!block_codes) {
+    memcpy(code, codes + pos * code_bytes, code_bytes);
+    return;
+  }
+  const uint8_t *block = codes +
+                         pos / kCodeBlockSize * kCodeBlockSize * code_bytes +
+                         pos % kCodeBlockSize;
+  for (size_t j = 0; j < code_bytes; j++) code[j] = block[j * kCodeBlockSize];
+}
+
+inline void CopyCode(uint8_t *dst_codes, size_t dst_pos,
+                     const uint8_t *src_codes, size_t src_pos,
+                     size_t code_bytes, bool block_codes) {
+  if (!block_codes) {
+    memcpy(dst_codes + dst_pos * code_bytes, src_codes + src_pos * code_bytes,
+           code_bytes);
+    return;
+  }
+  uint8_t *dst = dst_codes +
+                 dst_pos / kCodeBlockSize * kCodeBlockSize * code_bytes +
+                 dst_pos % kCodeBlockSize;
+  const uint8_t *src = src_codes +
+                       src_pos / kCodeBlockSize * kCodeBlockSize * code_bytes +
+                       src_pos % kCodeBlockSize;
+  for (size_t j = 0; j < code_bytes; j++) {
+    dst[j * kCodeBlockSize] = src[j * kCodeBlockSize];
+  }
+}
+
 struct RTInvertBucketData {
   RTInvertBucketData(RTInvertBucketData *other);
-  RTInvertBucketData(VIDMgr *vid_mgr, bitmap::BitmapManager *docids_bitmap);
+  RTInvertBucketData(VIDMgr *vid_mgr, bitmap::BitmapManager *docids_bitmap,
+                     bool block_codes = false);
 
   bool Init(const size_t &buckets_num, const size_t &bucket_keys,
             const size_t &code_bytes_per_vec,
@@ -46,8 +103,9 @@ struct RTInvertBucketData {
 
  private:
   inline void CompactOne(const size_t &bucket_no, long *&dst_idx,
-                         uint8_t *&dst_code, long *&src_idx, uint8_t *&src_code,
-                         int &pos, const size_t &code_bytes_per_vec);
+                         uint8_t *dst_codes, long *&src_idx,
+                         const uint8_t *src_codes, int src_pos, int &pos,
+                         const size_t &code_bytes_per_vec);
 
   double ExtendCoefficient(uint8_t extend_time);
 
@@ -65,6 +123,7 @@ struct RTInvertBucketData {
   long compacted_num_;
   size_t buckets_num_;
   size_t nids_;
+  bool block_codes_;  // codes in blocks of kCodeBlockSize vectors
 };
 
 struct RealTimeMemData {
@@ -72,7 +131,8 @@ struct RealTimeMemData {
   RealTimeMemData(size_t buckets_num, VIDMgr *vid_mgr,
                   bitmap::BitmapManager *docids_bitmap,
                   size_t bucket_keys = 500, size_t bucket_keys_limit = 1000000,
-                  size_t code_bytes_per_vec = 512 * sizeof(float));
+                  size_t code_bytes_per_vec = 512 * sizeof(float),
+                  bool block_codes = false);
   ~RealTimeMemData();
 
   bool Init();
@@ -95,6 +155,11 @@ struct RealTimeMemData {
   // for unit test
   void RetrieveCodes(int bucket_no, int pos, int n, uint8_t *codes, long *vids);
 
+  // codes of the vectors [pos, pos + n) of the bucket one after another,
+  // whatever the layout of the bucket is
+  void GetCodes(size_t bucket_no, size_t pos, size_t n, uint8_t *codes);
+  void SetCodes(size_t bucket_no, size_t pos, size_t n, const uint8_t *codes);
+
   void PrintBucketSize();
 
   int CompactIfNeed();
@@ -110,10 +175,16 @@ struct RealTimeMemData {
   size_t bucket_keys_limit_;
 
   size_t code_bytes_per_vec_;
+  bool block_codes_;
   std::atomic<long> total_mem_bytes_;
 
   VIDMgr *vid_mgr_;
   bitmap::BitmapManager *docids_bitmap_;
+
+  // buckets changed in place since the last dump, they are dumped whole
+  std::atomic<bool> *rewritten_buckets_;
+  // bucket sizes at the last dump, the keys after them are dumped as appended
+  std::vector<size_t> dumped_sizes_;
 };
 
 }  // namespace realtime
@@ -5,36 +5,185 @@
  * found in the LICENSE file in the root directory of this source tree.
  */
 
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cstring>
+#ifdef __SSE2__
+#include <immintrin.h>
+#endif
+
 #include "util/log.h"
+#include "util/utils.h"
 #include "awadb_retrieval.h"
 
 namespace tig_gamma  {
 
-int DocDetail::Init()  {
-  ids_list_ = new uint32_t[kDefaultListSize];
-  freqs_list_ = new uint8_t[kDefaultListSize];
-  list_capacity_ = kDefaultListSize;
+namespace {
+
+const uint32_t kRetrievalMagic = 0x49525741;  // "AWRI"
+const uint32_t kRetrievalVersion = 1;
+
+void PutVarint(std::string &buf, uint64_t v)  {
+  while (v >= 0x80)  {
+    buf.push_back((char)(v | 0x80));
+    v >>= 7;
+  }
+  buf.push_back((char)v);
+}
+
+// return false if the buffer is exhausted
+bool GetVarint(const uint8_t *&p, const uint8_t *end, uint64_t &v)  {
+  v = 0;
+  for (int shift = 0; shift < 64 && p < end; shift += 7)  {
+    uint8_t byte = *p++;
+    v |= (uint64_t)(byte & 0x7f) << shift;
+    if ((byte & 0x80) == 0)  return true;
+  }
+  return false;
+}
+
+template <typename T>
+void PutFixed(std::string &buf, T v)  {
+  buf.append((const char *)&v, sizeof(T));
+}
+
+template <typename T>
+bool GetFixed(const uint8_t *&p, const uint8_t *end, T &v)  {
+  if (p + sizeof(T) > end)  return false;
+  memcpy((void *)&v, (const void *)p, sizeof(T));
+  p += sizeof(T);
+  return true;
+}
+
+// block: n, first docid, n - 1 docid deltas, n freqs
+void EncodeBlock(std::string &buf, const uint32_t *ids, const uint8_t *freqs,
+                 size_t n)  {
+  PutVarint(buf, n);
+  if (n == 0)  return;
+  PutVarint(buf, ids[0]);
+  for (size_t i = 1; i < n; i++)  {
+    PutVarint(buf, ids[i] - ids[i - 1]);
+  }
+  buf.append((const char *)freqs, n);
+}
+
+bool DecodeBlock(const uint8_t *&p, const uint8_t *end, DocDetail *detail)  {
+  uint64_t n = 0;
+  if (!GetVarint(p, end, n))  return false;
+  if (n == 0)  return true;
+  uint64_t id = 0;
+  if (!GetVarint(p, end, id))  return false;
+  size_t start = detail->ids_len_;
+  if (start + n > detail->list_capacity_)  return false;
+  detail->ids_list_[start] = (uint32_t)id;
+  for (uint64_t i = 1; i < n; i++)  {
+    uint64_t delta = 0;
+    if (!GetVarint(p, end, delta))  return false;
+    id += delta;
+    detail->ids_list_[start + i] = (uint32_t)id;
+  }
+  if (p + n > end)  return false;
+  memcpy((void *)(detail->freqs_list_ + start), (const void *)p, n);
+  p += n;
+  detail->ids_len_ += n;
+  return true;
+}
+
+/**
+ * Intersect two sorted docid lists, out may be a. Blocks of 4 docids of
+ * each list are compared all against all with SSE, the block with the
+ * smaller last docid is moved forward.
+ */
+size_t IntersectBlocks(const uint32_t *a, size_t na, const uint32_t *b,
+                       size_t nb, uint32_t *out)  {
+  size_t i = 0, j = 0, k = 0;
+#ifdef __SSE2__
+  size_t na4 = na & ~(size_t)3, nb4 = nb & ~(size_t)3;
+  while (i < na4 && j < nb4)  {
+    __m128i va = _mm_loadu_si128((const __m128i *)(a + i));
+    __m128i vb = _mm_loadu_si128((const __m128i *)(b + j));
+    __m128i m0 = _mm_cmpeq_epi32(va, vb);
+    __m128i m1 = _mm_cmpeq_epi32(va, _mm_shuffle_epi32(vb, _MM_SHUFFLE(0, 3, 2, 1)));
+    __m128i m2 = _mm_cmpeq_epi32(va, _mm_shuffle_epi32(vb, _MM_SHUFFLE(1, 0, 3, 2)));
+    __m128i m3 = _mm_cmpeq_epi32(va, _mm_shuffle_epi32(vb, _MM_SHUFFLE(2, 1, 0, 3)));
+    __m128i m = _mm_or_si128(_mm_or_si128(m0, m1), _mm_or_si128(m2, m3));
+    int mask = _mm_movemask_ps(_mm_castsi128_ps(m));
+    uint32_t a_max = a[i + 3], b_max = b[j + 3];
+    while (mask)  {
+      int bit = __builtin_ctz(mask);
+      out[k++] = a[i + bit];
+      mask &= mask - 1;
+    }
+    if (a_max <= b_max)  i += 4;
+    if (b_max <= a_max)  j += 4;
+  }
+#endif
+  while (i < na && j < nb)  {
+    if (a[i] < b[j])  {
+      i++;
+    } else if (b[j] < a[i])  {
+      j++;
+    } else  {
+      out[k++] = a[i];
+      i++;
+      j++;
+    }
+  }
+  return k;
+}
+
+/**
+ * Intersect the short sorted docid list a with a long posting list by
+ * galloping over its skip pointers, out may be a.
+ */
+size_t IntersectGalloping(const uint32_t *a, size_t na, const DocDetail *list,
+                          uint32_t *out)  {
+  size_t pos = 0, k = 0;
+  for (size_t i = 0; i < na; i++)  {
+    uint32_t docid = a[i];
+    pos = list->LowerBound(docid, pos);
+    if (pos >= list->ids_len_)  break;
+    if (list->ids_list_[pos] == docid)  out[k++] = docid;
+  }
+  return k;
+}
+
+}  // namespace
+
+int DocDetail::Init(size_t capacity)  {
+  if (capacity < (size_t)kDefaultListSize)  capacity = kDefaultListSize;
+  ids_list_ = new uint32_t[capacity];
+  freqs_list_ = new uint8_t[capacity];
+  list_capacity_ = capacity;
   if (nullptr == ids_list_ || nullptr == freqs_list_)  return -1;
   return 0;
 }
 
 int DocDetail::Add(const uint32_t &id, const uint8_t &freq)  {
+  // posting lists are sorted by docid
+  if (ids_len_ > 0 && id <= ids_list_[ids_len_ - 1])  return 0;
+
   if (ids_len_ >= list_capacity_)  {
-    list_capacity_ += kDefaultListSize;
+    // grow geometrically to keep appending amortized O(1)
+    list_capacity_ *= 2;
     uint32_t *tmp_ids = new uint32_t[list_capacity_];
     uint8_t *tmp_freqs = new uint8_t[list_capacity_];
     if (!tmp_ids || !tmp_freqs)  {
-      fprintf(stderr, "can not allocate new memory!\n"); 
+      fprintf(stderr, "can not allocate new memory!\n");
       return -1;
-    } 
+    }
     memcpy((void *)tmp_ids, (void *)ids_list_, ids_len_ * sizeof(uint32_t));
     memcpy((void *)tmp_freqs, (void *)freqs_list_, ids_len_ * sizeof(uint8_t));
     delete[] ids_list_;
     delete[] freqs_list_;
     ids_list_ = tmp_ids;
     freqs_list_ = tmp_freqs;
-  } 
-  
+  }
+
+  if (ids_len_ % kSkipInterval == 0)  skips_.push_back(id);
   ids_list_[ids_len_] = id;
   freqs_list_[ids_len_] = freq;
   ids_len_++;
@@ -42,21 +191,49 @@ int DocDetail::Add(const uint32_t &id, const uint8_t &freq)  {
 }
 
 int DocDetail::Seek(const uint32_t &docid, size_t &pos)  {
-  int expect_docid = -1;
-  int len = ids_len_;
-  while (true)  {
-    if (pos >= (size_t)len)  return -1;
-    if (ids_list_[pos] >= docid)  {
-      expect_docid = (int)ids_list_[pos];
-      pos++;
-      break;
-    }  
-    pos++; 
+  size_t idx = LowerBound(docid, pos);
+  if (idx >= ids_len_)  {
+    pos = ids_len_;
+    return -1;
+  }
+  pos = idx + 1;
+  return (int)ids_list_[idx];
+}
+
+size_t DocDetail::LowerBound(uint32_t docid, size_t pos) const  {
+  if (pos >= ids_len_)  return ids_len_;
+  if (ids_list_[pos] >= docid)  return pos;
+
+  // gallop over the skip pointers to the last block starting <= docid
+  size_t nblocks = skips_.size();
+  size_t lo = pos / kSkipInterval, hi = lo + 1, step = 1;
+  while (hi < nblocks && skips_[hi] <= docid)  {
+    lo = hi;
+    step <<= 1;
+    hi = lo + step;
+  }
+  if (hi > nblocks)  hi = nblocks;
+  size_t block = std::upper_bound(skips_.begin() + lo, skips_.begin() + hi,
+                                  docid) - skips_.begin() - 1;
+
+  // binary search in the block
+  size_t begin = std::max(pos, block * kSkipInterval);
+  size_t end = std::min(ids_len_, (block + 1) * kSkipInterval);
+  return std::lower_bound(ids_list_ + begin, ids_list_ + end, docid) -
+         ids_list_;
+}
+
+void DocDetail::BuildSkips()  {
+  skips_.clear();
+  skips_.reserve(ids_len_ / kSkipInterval + 1);
+  for (size_t i = 0; i < ids_len_; i += kSkipInterval)  {
+    skips_.push_back(ids_list_[i]);
   }
-  return expect_docid;
 }
 
 AwadbRetrieval::AwadbRetrieval(const std::string &path) : path_(path) {
+  postings_size_ = 0;
+  pthread_rwlock_init(&rw_lock_, nullptr);
 }
 
 AwadbRetrieval::~AwadbRetrieval()  {
@@ -65,23 +242,26 @@ AwadbRetrieval::~AwadbRetrieval()  {
       delete iter.second;
       iter.second = nullptr;
     }
-  }	  
+  }
   inverted_list_.clear();
+  pthread_rwlock_destroy(&rw_lock_);
 }
 
 bool AwadbRetrieval::AddDoc(
-  const uint32_t &docid, 
+  const uint32_t &docid,
   WordsInDoc &words_in_doc)  {
 
   bool ret = true;
-  std::vector<WordCount>::iterator iter = words_in_doc.WordCounts().begin(); 
+  pthread_rwlock_wrlock(&rw_lock_);
+  std::vector<WordCount>::iterator iter = words_in_doc.WordCounts().begin();
   for (; iter != words_in_doc.WordCounts().end(); iter++)  {
     if (inverted_list_.find(iter->word) == inverted_list_.end())  {
       DocDetail *item = new DocDetail();
       if (0 != item->Init())  {
 	ret = false;
+        delete item;
         LOG(ERROR)<<"word "<<iter->word.c_str()<<" init invert list error!";
-        break; 
+        break;
       }
       inverted_list_[iter->word] = item;
     }
@@ -91,7 +271,8 @@ bool AwadbRetrieval::AddDoc(
       break;
     }
   }
-  return ret;  
+  pthread_rwlock_unlock(&rw_lock_);
+  return ret;
 }
 
 
@@ -99,51 +280,295 @@ int AwadbRetrieval::Retrieve(
   const std::vector<std::string> &query,
   std::vector<int> &docids)  {
 
-  int ret = 0;
-  uint32_t start_docid = 0;
-  size_t base_no = 0;
+  pthread_rwlock_rdlock(&rw_lock_);
+  std::vector<DocDetail *> lists;
+  lists.reserve(query.size());
   for (size_t i = 0; i < query.size(); i++)  {
-    if (inverted_list_.find(query[i]) == inverted_list_.end())  {
-      ret = -1;
-      return ret;
-    }
-    
-    uint32_t tmp_docid = inverted_list_[query[i]]->ids_list_[0];
-    if (tmp_docid > start_docid)  {
-      start_docid = tmp_docid;
-      base_no = i;
-    }
-  }
-
-  size_t query_count = query.size();
-  size_t pos_array[query_count];
-  memset((void *)pos_array, 0, query_count * sizeof(size_t));
- 
-  size_t count = 0;
-  int next_docid = -1;
-  while (true)  { 
-    while (count < query_count)  {
-      if (base_no == count)  { count++; continue; }
-      next_docid = inverted_list_[query[count]]->Seek(start_docid, pos_array[count]);
-      if (next_docid == -1)  return docids.size();
-      else if ((uint32_t)next_docid == start_docid) count++;
-      else  {
-        start_docid = next_docid;
-	base_no = count;
-	count = 0;
-      }
+    auto iter = inverted_list_.find(query[i]);
+    if (iter == inverted_list_.end())  {
+      pthread_rwlock_unlock(&rw_lock_);
+      return -1;
     }
-    if (count == query_count) {
-      docids.push_back((int)start_docid);
-      int next_docid = inverted_list_[query[base_no]]->Seek(start_docid, pos_array[base_no]);
-      if (next_docid == -1)  return docids.size();
-      start_docid = (uint32_t)next_docid;
-      count = 0;
+    lists.push_back(iter->second);
+  }
+  if (lists.size() == 0)  {
+    pthread_rwlock_unlock(&rw_lock_);
+    return 0;
+  }
+
+  // intersect the shortest lists first to keep the candidates few
+  std::sort(lists.begin(), lists.end(),
+            [](const DocDetail *a, const DocDetail *b) {
+              return a->ids_len_ < b->ids_len_;
+            });
+
+  std::vector<uint32_t> result(lists[0]->ids_list_,
+                               lists[0]->ids_list_ + lists[0]->ids_len_);
+  for (size_t i = 1; i < lists.size() && result.size() > 0; i++)  {
+    DocDetail *list = lists[i];
+    size_t n = 0;
+    if (list->ids_len_ / result.size() >= (size_t)kGallopRatio)  {
+      n = IntersectGalloping(result.data(), result.size(), list,
+                             result.data());
+    } else  {
+      n = IntersectBlocks(result.data(), result.size(), list->ids_list_,
+                          list->ids_len_, result.data());
     }
+    result.resize(n);
+  }
+  pthread_rwlock_unlock(&rw_lock_);
+
+  docids.reserve(docids.size() + result.size());
+  for (uint32_t docid : result)  {
+    docids.push_back((int)docid);
   }
   return docids.size();
 }
 
+int AwadbRetrieval::Dump()  {
+  std::string dir = path_ + "/retrieval";
+  if (!utils::isFolderExist(dir.c_str()) && utils::make_dir(dir.c_str()))  {
+    LOG(ERROR) << "create retrieval directory error, path=" << dir;
+    return -1;
+  }
+  std::string postings_path = dir + "/postings.dat";
+  std::string dict_path = dir + "/terms.dict";
+
+  // drop the blocks appended by an unfinished dump
+  if (utils::file_exist(postings_path) &&
+      truncate(postings_path.c_str(), (off_t)postings_size_) != 0)  {
+    LOG(ERROR) << "truncate postings error, path=" << postings_path;
+    return -1;
+  }
+  utils::FileIO postings_fio(postings_path);
+  if (postings_fio.Open("ab"))  {
+    LOG(ERROR) << "open postings error, path=" << postings_path;
+    return -1;
+  }
+
+  pthread_rwlock_rdlock(&rw_lock_);
+  // offsets of the new blocks, they are applied after the dump succeeds
+  std::vector<std::pair<DocDetail *, std::vector<uint64_t>>> new_offsets;
+  new_offsets.reserve(inverted_list_.size());
+  uint64_t postings_size = postings_size_;
+  std::string block;
+  std::string dict;
+  std::string prev_term;
+
+  PutFixed<uint32_t>(dict, kRetrievalMagic);
+  PutFixed<uint32_t>(dict, kRetrievalVersion);
+  PutFixed<uint32_t>(dict, kPostingBlockSize);
+  size_t postings_size_pos = dict.size();
+  PutFixed<uint64_t>(dict, 0);
+  PutFixed<uint64_t>(dict, inverted_list_.size());
+
+  for (auto &iter : inverted_list_)  {
+    const std::string &term = iter.first;
+    DocDetail *detail = iter.second;
+    new_offsets.emplace_back(detail, std::vector<uint64_t>());
+    std::vector<uint64_t> &offsets = new_offsets.back().second;
+
+    // append the blocks filled since the last dump
+    size_t flushed = detail->flushed_len_;
+    while (flushed + kPostingBlockSize <= detail->ids_len_)  {
+      block.clear();
+      EncodeBlock(block, detail->ids_list_ + flushed,
+                  detail->freqs_list_ + flushed, kPostingBlockSize);
+      if (postings_fio.Write(block.data(), 1, block.size()) != block.size())  {
+        pthread_rwlock_unlock(&rw_lock_);
+        LOG(ERROR) << "write postings error, path=" << postings_path;
+        return -1;
+      }
+      offsets.push_back(postings_size);
+      postings_size += block.size();
+      flushed += kPostingBlockSize;
+    }
+
+    // front coding: shared prefix length with the previous term and suffix
+    size_t shared = 0;
+    size_t max_shared = std::min(prev_term.size(), term.size());
+    while (shared < max_shared && prev_term[shared] == term[shared])  {
+      shared++;
+    }
+    PutVarint(dict, shared);
+    PutVarint(dict, term.size() - shared);
+    dict.append(term, shared, std::string::npos);
+    prev_term = term;
+
+    PutVarint(dict, detail->ids_len_);
+    size_t nblocks = detail->block_offsets_.size() + offsets.size();
+    PutVarint(dict, nblocks);
+    uint64_t prev_offset = 0;
+    for (uint64_t offset : detail->block_offsets_)  {
+      PutVarint(dict, offset - prev_offset);
+      prev_offset = offset;
+    }
+    for (uint64_t offset : offsets)  {
+      PutVarint(dict, offset - prev_offset);
+      prev_offset = offset;
+    }
+    EncodeBlock(dict, detail->ids_list_ + flushed, detail->freqs_list_ + flushed,
+                detail->ids_len_ - flushed);
+  }
+  pthread_rwlock_unlock(&rw_lock_);
+  memcpy((void *)(&dict[postings_size_pos]), (const void *)&postings_size,
+         sizeof(postings_size));
+
+  if (fflush(postings_fio.fp) != 0 || fsync(fileno(postings_fio.fp)) != 0)  {
+    LOG(ERROR) << "sync postings error, path=" << postings_path;
+    return -1;
+  }
+
+  std::string tmp_dict_path = dict_path + ".tmp";
+  {
+    utils::FileIO dict_fio(tmp_dict_path);
+    if (dict_fio.Open("wb") ||
+        dict_fio.Write(dict.data(), 1, dict.size()) != dict.size())  {
+      LOG(ERROR) << "write term dictionary error, path=" << tmp_dict_path;
+      return -1;
+    }
+  }
+  if (rename(tmp_dict_path.c_str(), dict_path.c_str()) != 0)  {
+    LOG(ERROR) << "rename term dictionary error, path=" << dict_path;
+    return -1;
+  }
+
+  // the dump is done, remember what is flushed
+  pthread_rwlock_wrlock(&rw_lock_);
+  for (auto &iter : new_offsets)  {
+    DocDetail *detail = iter.first;
+    std::vector<uint64_t> &offsets = iter.second;
+    detail->block_offsets_.insert(detail->block_offsets_.end(),
+                                  offsets.begin(), offsets.end());
+    detail->flushed_len_ += offsets.size() * kPostingBlockSize;
+  }
+  postings_size_ = postings_size;
+  pthread_rwlock_unlock(&rw_lock_);
+
+  LOG(INFO) << "dump retrieval success, term num=" << new_offsets.size()
+            << ", postings size=" << postings_size;
+  return 0;
+}
+
+int AwadbRetrieval::Load()  {
+  std::string dir = path_ + "/retrieval";
+  std::string postings_path = dir + "/postings.dat";
+  std::string dict_path = dir + "/terms.dict";
+  if (!utils::file_exist(dict_path))  {
+    LOG(INFO) << "no retrieval to load, path=" << dict_path;
+    return 0;
+  }
+
+  long dict_len = utils::get_file_size(dict_path);
+  std::string dict(dict_len > 0 ? dict_len : 0, '\0');
+  {
+    utils::FileIO dict_fio(dict_path);
+    if (dict_fio.Open("rb") ||
+        dict_fio.Read(&dict[0], 1, dict.size()) != dict.size())  {
+      LOG(ERROR) << "read term dictionary error, path=" << dict_path;
+      return -1;
+    }
+  }
+  const uint8_t *p = (const uint8_t *)dict.data();
+  const uint8_t *end = p + dict.size();
+
+  uint32_t magic = 0, version = 0, block_size = 0;
+  uint64_t postings_size = 0, term_num = 0;
+  if (!GetFixed(p, end, magic) || magic != kRetrievalMagic ||
+      !GetFixed(p, end, version) || version != kRetrievalVersion ||
+      !GetFixed(p, end, block_size) || block_size != kPostingBlockSize ||
+      !GetFixed(p, end, postings_size) || !GetFixed(p, end, term_num))  {
+    LOG(ERROR) << "invalid term dictionary, path=" << dict_path;
+    return -1;
+  }
+
+  const uint8_t *postings = nullptr;
+  int fd = -1;
+  if (postings_size > 0)  {
+    fd = open(postings_path.c_str(), O_RDONLY);
+    if (fd < 0 ||
+        (uint64_t)utils::get_file_size(postings_path) < postings_size)  {
+      LOG(ERROR) << "invalid postings, path=" << postings_path;
+      if (fd >= 0)  close(fd);
+      return -1;
+    }
+    void *addr = mmap(nullptr, postings_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (addr == MAP_FAILED)  {
+      LOG(ERROR) << "mmap postings error, path=" << postings_path;
+      close(fd);
+      return -1;
+    }
+    madvise(addr, postings_size, MADV_SEQUENTIAL);
+    postings = (const uint8_t *)addr;
+  }
+  const uint8_t *postings_end = postings + postings_size;
+
+  int ret = 0;
+  std::string term;
+  pthread_rwlock_wrlock(&rw_lock_);
+  for (uint64_t i = 0; i < term_num; i++)  {
+    uint64_t shared = 0, suffix_len = 0, ids_len = 0, nblocks = 0;
+    if (!GetVarint(p, end, shared) || shared > term.size() ||
+        !GetVarint(p, end, suffix_len) || p + suffix_len > end)  {
+      ret = -1;
+      break;
+    }
+    term.resize(shared);
+    term.append((const char *)p, suffix_len);
+    p += suffix_len;
 
+    if (!GetVarint(p, end, ids_len) || !GetVarint(p, end, nblocks))  {
+      ret = -1;
+      break;
+    }
+    DocDetail *detail = new DocDetail();
+    if (detail->Init(ids_len))  {
+      delete detail;
+      ret = -1;
+      break;
+    }
+    uint64_t offset = 0;
+    for (uint64_t j = 0; j < nblocks; j++)  {
+      uint64_t delta = 0;
+      if (!GetVarint(p, end, delta))  {
+        ret = -1;
+        break;
+      }
+      offset += delta;
+      const uint8_t *bp = postings + offset;
+      if (offset >= postings_size ||
+          !DecodeBlock(bp, postings_end, detail))  {
+        ret = -1;
+        break;
+      }
+      detail->block_offsets_.push_back(offset);
+    }
+    detail->flushed_len_ = detail->ids_len_;
+    if (ret != 0 || !DecodeBlock(p, end, detail) ||
+        detail->ids_len_ != ids_len)  {
+      delete detail;
+      ret = -1;
+      break;
+    }
+    detail->BuildSkips();
+
+    auto iter = inverted_list_.find(term);
+    if (iter != inverted_list_.end())  delete iter->second;
+    inverted_list_[term] = detail;
+  }
+  postings_size_ = postings_size;
+  pthread_rwlock_unlock(&rw_lock_);
+
+  if (postings)  munmap((void *)postings, postings_size);
+  if (fd >= 0)  close(fd);
+
+  if (ret != 0)  {
+    LOG(ERROR) << "load retrieval error, path=" << dir;
+    return ret;
+  }
+  LOG(INFO) << "load retrieval success, term num=" << term_num
+            << ", postings size=" << postings_size;
+  return 0;
+}
 
 }
@@ -7,14 +7,24 @@
 
 #pragma once
 
+#include <pthread.h>
+
 #include <string>
 #include <map>
+#include <vector>
 
 #include "c_api/api_data/gamma_doc.h"
 
 namespace tig_gamma  {
 
 const int kDefaultListSize = 128;
+// docids of a posting list are compressed and flushed in blocks of this size
+const int kPostingBlockSize = 128;
+// a skip pointer is kept for every kSkipInterval docids of a posting list
+const int kSkipInterval = 128;
+// lists kGallopRatio times longer than the candidates are probed by
+// galloping over the skip pointers instead of merged
+const int kGallopRatio = 32;
 
 class DocDetail  {
  public:
@@ -22,51 +32,87 @@ class DocDetail  {
     ids_list_ = nullptr;
     freqs_list_ = nullptr;
     ids_len_= 0;
-    list_capacity_ = 0; 
+    list_capacity_ = 0;
+    flushed_len_ = 0;
   }
 
   ~DocDetail()  {
     if (ids_list_)  {
-      delete ids_list_;
+      delete[] ids_list_;
       ids_list_ = nullptr;
     }
     if (freqs_list_)  {
-      delete freqs_list_;
+      delete[] freqs_list_;
       freqs_list_ = nullptr;
     }
     ids_len_ = 0;
     list_capacity_ = 0;
   }
 
-  int Init();
+  int Init(size_t capacity = kDefaultListSize);
 
   int Add(const uint32_t &id, const uint8_t &freq);
 
   int Seek(const uint32_t &docid, size_t &pos);
 
+  /**
+   * @return the first position not before pos whose docid >= docid,
+   *         ids_len_ if there is none
+   */
+  size_t LowerBound(uint32_t docid, size_t pos) const;
+
+  void BuildSkips();
+
   uint32_t *ids_list_;
   uint8_t *freqs_list_;
 
   size_t ids_len_;
   size_t list_capacity_;
-};	
+
+  // number of docids which are flushed in full blocks
+  size_t flushed_len_;
+  // offsets of the flushed blocks in the postings file
+  std::vector<uint64_t> block_offsets_;
+  // first docid of every kSkipInterval docids
+  std::vector<uint32_t> skips_;
+};
 
 
+/**
+ * Inverted index of the page texts.
+ *
+ * On disk it is made of two files under path/retrieval:
+ *   postings.dat  append-only full blocks of kPostingBlockSize docids,
+ *                 each block is delta + varint encoded with the term
+ *                 frequencies;
+ *   terms.dict    the front-coded sorted term dictionary, each term has
+ *                 its doc number, the offsets of its flushed blocks and
+ *                 the encoded tail which is not a full block yet.
+ * Dump() only appends the blocks filled since the last dump and rewrites
+ * the dictionary, Load() maps the postings file and decodes it.
+ */
 class AwadbRetrieval  {
  public:
   AwadbRetrieval(const std::string &path);
   ~AwadbRetrieval();
-  
+
   bool AddDoc(const uint32_t &docid,
     WordsInDoc &words_in_doc);
 
   int Retrieve(const std::vector<std::string> &query,
     std::vector<int> &docids);
 
+  int Dump();
+
+  int Load();
+
  private:
   std::string path_;
   std::map<std::string, DocDetail *> inverted_list_;
 
+  // valid size of the postings file after the last dump
+  uint64_t postings_size_;
+  pthread_rwlock_t rw_lock_;
 };
 
 }
@@ -21,6 +21,7 @@
 #include <cstring>
 #include <fstream>
 #include <iomanip>
+#include <memory>
 #include <mutex>
 #include <thread>
 #include <vector>
@@ -29,6 +30,7 @@
 #include "cjson/cJSON.h"
 #include "common/gamma_common_data.h"
 #include "gamma_table_io.h"
+#include "index/gamma_index_io.h"
 #include "io/raw_vector_io.h"
 #include "omp.h"
 #include "search/error_code.h"
@@ -158,6 +160,9 @@ static string VectorQueryToString(VectorQuery *vector_query) {
 // }
 #endif  // DEBUG
 
+// a full dump is written after this many deltas of the last one
+static const int kMaxDumpDeltas = 16;
+
 #ifndef __APPLE__
 static std::thread *gMemTrimThread = nullptr;
 void MemTrimHandler() {
@@ -170,9 +175,228 @@ void MemTrimHandler() {
 }
 #endif
 
+// payloads of the write-ahead log records, strings are length prefixed
+static void WalPutUint32(std::string &buf, uint32_t v) {
+  buf.append((const char *)&v, sizeof(v));
+}
+
+static void WalPutString(std::string &buf, const std::string &str) {
+  WalPutUint32(buf, (uint32_t)str.size());
+  buf.append(str);
+}
+
+static void WalPutBytes(std::string &buf, const char *data, size_t len) {
+  WalPutUint32(buf, (uint32_t)len);
+  buf.append(data, len);
+}
+
+static bool WalGetUint32(const char *&p, const char *end, uint32_t &v) {
+  if (end - p < (long)sizeof(v)) return false;
+  memcpy(&v, p, sizeof(v));
+  p += sizeof(v);
+  return true;
+}
+
+static bool WalGetString(const char *&p, const char *end, std::string &str) {
+  uint32_t len = 0;
+  if (!WalGetUint32(p, end, len) || (uint32_t)(end - p) < len) return false;
+  str.assign(p, len);
+  p += len;
+  return true;
+}
+
+static void WalPutFields(std::string &buf, std::vector<struct Field> &fields) {
+  WalPutUint32(buf, (uint32_t)fields.size());
+  for (struct Field &field : fields) {
+    WalPutString(buf, field.name);
+    WalPutString(buf, field.value);
+    WalPutString(buf, field.source);
+    WalPutUint32(buf, (uint32_t)field.datatype);
+    WalPutUint32(buf, (uint32_t)field.mul_str_value.size());
+    for (const std::string &str : field.mul_str_value) {
+      WalPutString(buf, str);
+    }
+  }
+}
+
+static bool WalGetFields(const char *&p, const char *end, Doc &doc) {
+  uint32_t nfields = 0;
+  if (!WalGetUint32(p, end, nfields)) return false;
+  for (uint32_t i = 0; i < nfields; ++i) {
+    struct Field field;
+    uint32_t datatype = 0, nstr = 0;
+    if (!WalGetString(p, end, field.name) ||
+        !WalGetString(p, end, field.value) ||
+        !WalGetString(p, end, field.source) ||
+        !WalGetUint32(p, end, datatype) || !WalGetUint32(p, end, nstr)) {
+      return false;
+    }
+    field.datatype = (DataType)datatype;
+    field.mul_str_value.resize(nstr);
+    for (uint32_t j = 0; j < nstr; ++j) {
+      if (!WalGetString(p, end, field.mul_str_value[j])) return false;
+    }
+    doc.AddField(std::move(field));
+  }
+  return true;
+}
+
+static std::string WalEncodeDocs(Doc *docs, size_t ndocs,
+                                 std::vector<WordsInDoc> *words_in_docs) {
+  std::string buf;
+  WalPutUint32(buf, (uint32_t)ndocs);
+  for (size_t i = 0; i < ndocs; ++i) {
+    WalPutString(buf, docs[i].Key());
+    WalPutFields(buf, docs[i].TableFields());
+    WalPutFields(buf, docs[i].VectorFields());
+  }
+  WalPutUint32(buf, words_in_docs ? 1 : 0);
+  if (words_in_docs) {
+    for (size_t i = 0; i < ndocs; ++i) {
+      std::vector<struct WordCount> &counts = (*words_in_docs)[i].WordCounts();
+      WalPutUint32(buf, (uint32_t)counts.size());
+      for (const struct WordCount &count : counts) {
+        WalPutString(buf, count.word);
+        WalPutUint32(buf, (uint32_t)count.count);
+      }
+    }
+  }
+  return buf;
+}
+
+static int WalDecodeDocs(const std::string &payload, Docs &docs,
+                         std::vector<WordsInDoc> &words_in_docs,
+                         bool &has_words) {
+  const char *p = payload.data();
+  const char *end = p + payload.size();
+  uint32_t ndocs = 0;
+  if (!WalGetUint32(p, end, ndocs)) return -1;
+  docs.Reserve(ndocs);
+  for (uint32_t i = 0; i < ndocs; ++i) {
+    Doc doc;
+    std::string key;
+    if (!WalGetString(p, end, key)) return -1;
+    doc.SetKey(key);
+    // table fields and vector fields
+    if (!WalGetFields(p, end, doc) || !WalGetFields(p, end, doc)) return -1;
+    docs.AddDoc(std::move(doc));
+  }
+  uint32_t words_flag = 0;
+  if (!WalGetUint32(p, end, words_flag)) return -1;
+  has_words = words_flag != 0;
+  if (has_words) {
+    words_in_docs.resize(ndocs);
+    for (uint32_t i = 0; i < ndocs; ++i) {
+      uint32_t nwords = 0;
+      if (!WalGetUint32(p, end, nwords)) return -1;
+      for (uint32_t j = 0; j < nwords; ++j) {
+        struct WordCount count;
+        uint32_t freq = 0;
+        if (!WalGetString(p, end, count.word) ||
+            !WalGetUint32(p, end, freq)) {
+          return -1;
+        }
+        count.count = freq;
+        words_in_docs[i].AddWordCount(count);
+      }
+    }
+  }
+  return 0;
+}
+
+static std::string WalEncodeColumns(ColumnDocs &docs) {
+  std::vector<DocColumn *> columns;
+  size_t size = 0;
+  for (std::vector<DocColumn> *cols :
+       {&docs.TableColumns(), &docs.VectorColumns()}) {
+    for (DocColumn &column : *cols) {
+      columns.push_back(&column);
+      size += docs.DataSize(column) + sizeof(int64_t) * (docs.Size() + 1);
+    }
+  }
+
+  std::string buf;
+  buf.reserve(size + 1024);
+  WalPutUint32(buf, (uint32_t)docs.Size());
+  WalPutString(buf, docs.KeyName());
+  WalPutUint32(buf, (uint32_t)columns.size());
+  for (DocColumn *column : columns) {
+    WalPutString(buf, column->name);
+    WalPutUint32(buf, (uint32_t)column->datatype);
+    WalPutUint32(buf, (uint32_t)column->dimension);
+    WalPutBytes(buf, column->data, docs.DataSize(*column));
+    if (column->datatype == DataType::STRING) {
+      WalPutBytes(buf, (const char *)column->offsets,
+                  sizeof(int64_t) * (docs.Size() + 1));
+    }
+  }
+  return buf;
+}
+
+static int WalDecodeColumns(const std::string &payload,
+                            std::unique_ptr<ColumnDocs> &docs) {
+  const char *p = payload.data();
+  const char *end = p + payload.size();
+  uint32_t ndocs = 0, ncolumns = 0;
+  std::string key_name;
+  if (!WalGetUint32(p, end, ndocs) || !WalGetString(p, end, key_name) ||
+      !WalGetUint32(p, end, ncolumns)) {
+    return -1;
+  }
+  docs.reset(new ColumnDocs(ndocs, key_name));
+  for (uint32_t i = 0; i < ncolumns; ++i) {
+    DocColumn column;
+    uint32_t datatype = 0, dimension = 0;
+    std::string data;
+    if (!WalGetString(p, end, column.name) ||
+        !WalGetUint32(p, end, datatype) || !WalGetUint32(p, end, dimension) ||
+        !WalGetString(p, end, data)) {
+      return -1;
+    }
+    column.datatype = (DataType)datatype;
+    column.dimension = dimension;
+    column.data = docs->Keep(std::move(data));
+    if (column.datatype == DataType::STRING) {
+      std::string offsets;
+      if (!WalGetString(p, end, offsets) ||
+          offsets.size() != sizeof(int64_t) * (ndocs + 1)) {
+        return -1;
+      }
+      column.offsets = (const int64_t *)docs->Keep(std::move(offsets));
+    }
+    docs->AddColumn(column);
+  }
+  return 0;
+}
+
+static std::string WalEncodeKeys(const std::vector<std::string> &keys) {
+  std::string buf;
+  WalPutUint32(buf, (uint32_t)keys.size());
+  for (const std::string &key : keys) {
+    WalPutString(buf, key);
+  }
+  return buf;
+}
+
+static int WalDecodeKeys(const std::string &payload,
+                         std::vector<std::string> &keys) {
+  const char *p = payload.data();
+  const char *end = p + payload.size();
+  uint32_t nkeys = 0;
+  if (!WalGetUint32(p, end, nkeys)) return -1;
+  keys.resize(nkeys);
+  for (uint32_t i = 0; i < nkeys; ++i) {
+    if (!WalGetString(p, end, keys[i])) return -1;
+  }
+  return 0;
+}
+
 GammaEngine::GammaEngine(const string &index_root_path)
     : index_root_path_(index_root_path),
-      date_time_format_("%Y-%m-%d-%H:%M:%S") {
+      date_time_format_("%Y-%m-%d-%H:%M:%S"),
+      search_batcher_([this](Request &request, Response &response_results) {
+        return DoSearch(request, response_results);
+      }) {
   table_ = nullptr;
   vec_manager_ = nullptr;
   index_status_ = IndexStatus::UNINDEXED;
@@ -186,17 +410,37 @@ GammaEngine::GammaEngine(const string &index_root_path)
   b_loading_ = false;
   docids_bitmap_ = nullptr;
   migrate_data_ = nullptr;
+  wal_ = nullptr;
+  wal_applied_lsn_ = 0;
+  dirty_docs_ = 0;
+  dump_waiting_ = 0;
+  first_dirty_ms_ = 0;
+  dump_delta_num_ = 0;
+  full_dump_needed_ = false;
+  checkpoint_running_ = false;
+  indexing_signaled_ = false;
 #ifdef PERFORMANCE_TESTING
   search_num_ = 0;
 #endif
 }
 
 GammaEngine::~GammaEngine() {
-  if (b_running_) {
-    b_running_ = 0;
-    std::mutex running_mutex;
-    std::unique_lock<std::mutex> lk(running_mutex);
-    running_cv_.wait(lk);
+  if (checkpoint_thread_.joinable()) {
+    {
+      std::lock_guard<std::mutex> lk(checkpoint_mutex_);
+      checkpoint_running_ = false;
+    }
+    checkpoint_cv_.notify_one();
+    checkpoint_thread_.join();
+  }
+
+  if (indexing_thread_.joinable()) {
+    {
+      std::lock_guard<std::mutex> lk(indexing_mutex_);
+      b_running_ = 0;
+    }
+    indexing_cv_.notify_one();
+    indexing_thread_.join();
   }
 
   if (b_field_running_) {
@@ -235,6 +479,11 @@ GammaEngine::~GammaEngine() {
     delete migrate_data_;
     migrate_data_ = nullptr;
   }
+
+  if (wal_) {
+    delete wal_;
+    wal_ = nullptr;
+  }
   printf("-----------EXIT GAMMAENGINE--------\n");
 }
 
@@ -287,6 +536,20 @@ int GammaEngine::Setup() {
                                      index_root_path_);
   }
 
+  if (!wal_) {
+    wal_ = new WriteAheadLog(index_root_path_ + "/wal");
+    if (wal_->Init(WalOptions())) {
+      LOG(ERROR) << "init write-ahead log error";
+      return -1;
+    }
+    wal_applied_lsn_ = wal_->LastLsn();
+  }
+
+  if (!checkpoint_thread_.joinable()) {
+    checkpoint_running_ = true;
+    checkpoint_thread_ = std::thread(&GammaEngine::CheckpointHandler, this);
+  }
+
 #ifndef __APPLE__
   if (gMemTrimThread == nullptr) {
     gMemTrimThread = new std::thread(MemTrimHandler);
@@ -305,6 +568,13 @@ int GammaEngine::Setup() {
 }
 
 int GammaEngine::Search(Request &request, Response &response_results) {
+  if (search_batcher_.Enabled() && search_batcher_.Batchable(request)) {
+    return search_batcher_.Search(request, response_results);
+  }
+  return DoSearch(request, response_results);
+}
+
+int GammaEngine::DoSearch(Request &request, Response &response_results) {
 #ifdef DEBUG
 // LOG(INFO) << "search request:" << RequestToString(request);
 #endif
@@ -333,20 +603,9 @@ int GammaEngine::Search(Request &request, Response &response_results) {
 
   int topn = request.TopN();
   bool brute_force_search = request.BruteForceSearch();
+  // the index is used once it is built, before that fall back to brute force
   if (index_status_ != IndexStatus::INDEXED)  brute_force_search = true;
-
-  if ((not brute_force_search) && (index_status_ != IndexStatus::INDEXED)) {
-    string msg = "index not trained!";
-    LOG(WARNING) << msg;
-    for (int i = 0; i < req_num; ++i) {
-      SearchResult result;
-      result.msg = msg;
-      result.result_code = SearchResultCode::INDEX_NOT_TRAINED;
-      response_results.AddResults(std::move(result));
-    }
-    RequestConcurrentController::GetInstance().Release(req_num);
-    return -2;
-  }
+  response_results.SetBruteForceSearch(brute_force_search ? 1 : 0);
 
   std::vector<struct VectorQuery> &vec_fields = request.VecFields();
   GammaQuery gamma_query;
@@ -396,6 +655,10 @@ int GammaEngine::Search(Request &request, Response &response_results) {
       RequestConcurrentController::GetInstance().Release(req_num);
       return 0;
     }
+    if (vec_fields.size() > 0 &&
+        gamma_query.condition->range_query_result != nullptr) {
+      PlanFilteredSearch(gamma_query.condition, &range_query_result);
+    }
   }
 #ifdef PERFORMANCE_TESTING
   gamma_query.condition->GetPerfTool().Perf("filter");
@@ -518,6 +781,41 @@ int GammaEngine::PageTextFilter(Request &request,
     return range_query_result->GetTextFilterIds().size();
 }
 
+void GammaEngine::PlanFilteredSearch(
+    GammaSearchCondition *condition,
+    MultiRangeQueryResults *range_query_result) {
+  int doc_num = GetDocsNum();
+  int estimated = range_query_result->EstimateSize();
+  if (doc_num <= 0 || estimated < 0 || estimated > doc_num) {
+    estimated = doc_num;
+  }
+  condition->filter_selectivity =
+      doc_num > 0 ? static_cast<float>(estimated) / doc_num : 1.0f;
+
+  if (estimated <= FILTER_EXACT_SEARCH_MAX_DOCS) {
+    // few docs are matched, scanning the index costs more than computing
+    // the distances of them directly
+    std::vector<int> docids = range_query_result->MatchedDocs(max_docid_);
+    condition->filter_docids.reserve(docids.size());
+    for (int docid : docids) {
+      if (!docids_bitmap_->Test(docid)) {
+        condition->filter_docids.push_back(docid);
+      }
+    }
+    condition->filter_search_mode = FilterSearchMode::EXACT;
+  } else if (condition->filter_selectivity < FILTER_HYBRID_MAX_SELECTIVITY) {
+    condition->filter_search_mode = FilterSearchMode::HYBRID;
+  } else {
+    condition->filter_search_mode = FilterSearchMode::PUSHDOWN;
+  }
+#ifdef DEBUG
+  LOG(INFO) << "filtered search mode="
+            << static_cast<int>(condition->filter_search_mode)
+            << ", estimated docs=" << estimated
+            << ", selectivity=" << condition->filter_selectivity;
+#endif
+}
+
 int GammaEngine::MultiRangeQuery(Request &request,
                                  GammaSearchCondition *condition,
                                  Response &response_results,
@@ -696,6 +994,10 @@ int GammaEngine::CreateTable(const std::string &table_str) {
   }
 
   LOG(INFO) << "create table [" << table_name << "] success!";
+  if (!b_loading_ && wal_) {
+    // a new table does not replay the records left by an old one
+    wal_->Checkpoint(wal_->LastLsn());
+  }
   created_table_ = true;
   return 0;
 }
@@ -812,6 +1114,10 @@ int GammaEngine::CreateTable(TableInfo &table) {
   }
 
   LOG(INFO) << "create table [" << table_name << "] success!";
+  if (!b_loading_ && wal_) {
+    // a new table does not replay the records left by an old one
+    wal_->Checkpoint(wal_->LastLsn());
+  }
   created_table_ = true;
   return 0;
 }
@@ -829,6 +1135,69 @@ int GammaEngine::AddNewField(const FieldInfo &field_info)  {
 }
 
 int GammaEngine::AddOrUpdate(Doc &doc) {
+  return LoggedWrite(WalRecordType::ADD_DOCS, WalEncodeDocs(&doc, 1, nullptr),
+                     1, [&]() { return DoAddOrUpdate(doc); });
+}
+
+int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result) {
+  std::vector<Doc> &doc_vec = docs.GetDocs();
+  return LoggedWrite(WalRecordType::ADD_DOCS,
+                     WalEncodeDocs(doc_vec.data(), doc_vec.size(), nullptr),
+                     doc_vec.size(),
+                     [&]() { return DoAddOrUpdateDocs(docs, result); });
+}
+
+int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result,
+                                 std::vector<WordsInDoc> &words_in_docs) {
+  std::vector<Doc> &doc_vec = docs.GetDocs();
+  return LoggedWrite(
+      WalRecordType::ADD_DOCS,
+      WalEncodeDocs(doc_vec.data(), doc_vec.size(), &words_in_docs),
+      doc_vec.size(), [&]() { return DoAddOrUpdateDocs(docs, result, words_in_docs); });
+}
+
+int GammaEngine::AddColumns(ColumnDocs &docs, BatchResult &result) {
+  if (docs.Size() <= 0) return 0;
+  if (table_->CheckColumns(docs) || vec_manager_->CheckColumns(docs)) {
+    LOG(ERROR) << "the columns do not match the table";
+    return -1;
+  }
+  return LoggedWrite(WalRecordType::ADD_COLUMNS, WalEncodeColumns(docs),
+                     docs.Size(),
+                     [&]() { return DoAddColumns(docs, result); });
+}
+
+int GammaEngine::LoggedWrite(WalRecordType type, const std::string &payload,
+                             long ndocs, const std::function<int()> &apply) {
+  MarkDirty(ndocs);
+  if (wal_ == nullptr) return apply();
+
+  int64_t lsn = wal_->Append(type, payload);
+  if (lsn < 0) {
+    LOG(ERROR) << "append to write-ahead log error";
+    return -1;
+  }
+  // the write is visible only after its record is durable, the writers
+  // wait for their groups together
+  bool durable = wal_->WaitDurable(lsn) == 0;
+
+  // apply in lsn order, so the writes of a key end in the same state as
+  // when the log is replayed
+  std::unique_lock<std::mutex> lk(wal_apply_mutex_);
+  wal_apply_cv_.wait(lk, [&]() { return wal_applied_lsn_ == lsn - 1; });
+  int ret = -1;
+  if (durable) {
+    ret = apply();
+  } else {
+    LOG(ERROR) << "sync write-ahead log error, lsn=" << lsn;
+  }
+  wal_applied_lsn_ = lsn;
+  lk.unlock();
+  wal_apply_cv_.notify_all();
+  return ret;
+}
+
+int GammaEngine::DoAddOrUpdate(Doc &doc) {
 #ifdef PERFORMANCE_TESTING
   double start = utils::getmillisecs();
 #endif
@@ -893,6 +1262,7 @@ int GammaEngine::AddOrUpdate(Doc &doc) {
       this->BuildIndex();
     }
   }
+  NotifyIndexing();
 #ifdef PERFORMANCE_TESTING
   double end = utils::getmillisecs();
   if (max_docid_ % 10000 == 0) {
@@ -904,7 +1274,132 @@ int GammaEngine::AddOrUpdate(Doc &doc) {
   return 0;
 }
 
-int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result) {
+void GammaEngine::AddRangeIndex(int start_id, int batch_size,
+                                std::vector<Doc> &doc_vec) {
+  // large batches are sorted and built per field instead of queued per doc
+  if (batch_size >= kBulkBuildMinDocs) {
+    std::vector<int> fields;
+    for (int i = start_id; i < start_id + batch_size; ++i) {
+      for (struct Field &field : doc_vec[i].TableFields()) {
+        int idx = table_->GetAttrIdx(field.name);
+        if (std::find(fields.begin(), fields.end(), idx) == fields.end()) {
+          fields.push_back(idx);
+        }
+      }
+    }
+    field_range_index_->BulkBuild(max_docid_, max_docid_ + batch_size, fields);
+    return;
+  }
+
+  for (int i = start_id; i < start_id + batch_size; ++i) {
+    std::vector<struct Field> &fields_table = doc_vec[i].TableFields();
+    for (size_t j = 0; j < fields_table.size(); ++j) {
+      struct Field &field = fields_table[j];
+      int idx = table_->GetAttrIdx(field.name);
+      field_range_index_->Add(max_docid_ + i - start_id, idx);
+    }
+  }
+}
+
+void GammaEngine::AddRangeIndex(int n, const std::vector<int> &fields) {
+  if (n >= kBulkBuildMinDocs) {
+    field_range_index_->BulkBuild(max_docid_, max_docid_ + n, fields);
+    return;
+  }
+  for (int i = 0; i < n; ++i) {
+    for (int field : fields) {
+      field_range_index_->Add(max_docid_ + i, field);
+    }
+  }
+}
+
+int GammaEngine::DoAddColumns(ColumnDocs &docs, BatchResult &result) {
+#ifdef PERFORMANCE_TESTING
+  double start = utils::getmillisecs();
+#endif
+  int n = docs.Size();
+  std::vector<int> fields;
+  for (DocColumn &column : docs.TableColumns()) {
+    fields.push_back(table_->GetAttrIdx(column.name));
+  }
+
+  // the runs of new keys are added in bulk, the others are updated
+  int ret = 0;
+  auto bulkAdd = [&](int start_id, int batch_size) {
+    if (batch_size <= 0) return;
+    if (table_->BulkAdd(max_docid_, docs, start_id, batch_size) != 0) {
+      LOG(ERROR) << "BulkAdd to table error";
+      for (int i = start_id; i < start_id + batch_size; ++i) {
+        result.SetResult(i, -1, "add to table error");
+      }
+      ret = -2;
+      return;
+    }
+    AddRangeIndex(batch_size, fields);
+    if (vec_manager_->BatchAddToStore(max_docid_, docs, start_id,
+                                      batch_size) != 0) {
+      // the table rows are added, so the docids are still taken
+      std::string msg = "Add to vector manager error";
+      LOG(ERROR) << msg;
+      for (int i = start_id; i < start_id + batch_size; ++i) {
+        result.SetResult(i, -1, msg);
+      }
+      ret = -4;
+    }
+    if (migrate_data_) {
+      for (int i = 0; i < batch_size; ++i) {
+        migrate_data_->AddDocid(max_docid_ + i);
+      }
+    }
+    max_docid_ += batch_size;
+    docids_bitmap_->SetMaxID(max_docid_);
+  };
+
+  std::set<std::string> keys;
+  int start_id = 0, batch_size = 0;
+  for (int i = 0; i < n; ++i) {
+    std::string key = docs.Key(i);
+    bool duplicate = !keys.insert(key).second;
+    int docid = -1;
+    if (!duplicate) table_->GetDocIDByKey(key, docid);
+    if (docid == -1 && !duplicate) {
+      ++batch_size;
+      continue;
+    }
+    bulkAdd(start_id, batch_size);
+    batch_size = 0;
+    start_id = i + 1;
+    if (duplicate) table_->GetDocIDByKey(key, docid);
+
+    Doc doc;
+    docs.GetDoc(i, doc);
+    if (Update(docid, doc.TableFields(), doc.VectorFields())) {
+      LOG(ERROR) << "update error, key=" << key << ", docid=" << docid;
+      result.SetResult(i, -3, "update error");
+      continue;
+    }
+    if (docids_bitmap_->Test(docid)) {
+      docids_bitmap_->Unset(docid);
+      docids_bitmap_->Dump(docid, 1);
+    }
+  }
+  bulkAdd(start_id, batch_size);
+
+  if (not b_running_ and index_status_ == UNINDEXED) {
+    if (max_docid_ >= indexing_size_) {
+      this->BuildIndex();
+    }
+  }
+  NotifyIndexing();
+#ifdef PERFORMANCE_TESTING
+  LOG(INFO) << "Doc_num[" << max_docid_ << "], AddColumns[" << n
+            << "] total cost [" << utils::getmillisecs() - start << "]ms";
+#endif
+  is_dirty_ = true;
+  return ret;
+}
+
+int GammaEngine::DoAddOrUpdateDocs(Docs &docs, BatchResult &result) {
 #ifdef PERFORMANCE_TESTING
   double start = utils::getmillisecs();
 #endif
@@ -923,14 +1418,9 @@ int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result) {
       return;
     }
 
+    AddRangeIndex(start_id, batch_size, doc_vec);
     for (int i = start_id; i < start_id + batch_size; ++i) {
       Doc &doc = doc_vec[i];
-      std::vector<struct Field> &fields_table = doc.TableFields();
-      for (size_t j = 0; j < fields_table.size(); ++j) {
-        struct Field &field = fields_table[j];
-        int idx = table_->GetAttrIdx(field.name);
-	field_range_index_->Add(max_docid_ + i - start_id, idx);
-      }
       // add vectors by VectorManager
       std::vector<struct Field> &fields_vec = doc.VectorFields();
       ret = vec_manager_->AddToStore(max_docid_ + i - start_id, fields_vec);
@@ -990,6 +1480,7 @@ int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result) {
       this->BuildIndex();
     }
   }
+  NotifyIndexing();
 #ifdef PERFORMANCE_TESTING
   double end = utils::getmillisecs();
   if (max_docid_ % 10000 == 0) {
@@ -1001,7 +1492,7 @@ int GammaEngine::AddOrUpdateDocs(Docs &docs, BatchResult &result) {
   return 0;
 }
 
-int GammaEngine::AddOrUpdateDocs(
+int GammaEngine::DoAddOrUpdateDocs(
   Docs &docs,
   BatchResult &result,
   std::vector<WordsInDoc> &words_in_docs) {
@@ -1022,14 +1513,9 @@ int GammaEngine::AddOrUpdateDocs(
       return;
     }
 
+    AddRangeIndex(start_id, batch_size, doc_vec);
     for (int i = start_id; i < start_id + batch_size; ++i) {
       Doc &doc = doc_vec[i];
-      std::vector<struct Field> &fields_table = doc.TableFields();
-      for (size_t j = 0; j < fields_table.size(); ++j) {
-        struct Field &field = fields_table[j];
-        int idx = table_->GetAttrIdx(field.name);
-        field_range_index_->Add(max_docid_ + i - start_id, idx);
-      }
 
       // add vectors by VectorManager
       std::vector<struct Field> &fields_vec = doc.VectorFields();
@@ -1083,6 +1569,7 @@ int GammaEngine::AddOrUpdateDocs(
       this->BuildIndex();
     }
   }
+  NotifyIndexing();
 #ifdef PERFORMANCE_TESTING
   double end = utils::getmillisecs();
   if (max_docid_ % 10000 == 0) {
@@ -1122,11 +1609,18 @@ int GammaEngine::Update(int doc_id, std::vector<struct Field> &fields_table,
 #ifdef DEBUG
   LOG(INFO) << "update success! key=" << key;
 #endif
+  NotifyIndexing();
   is_dirty_ = true;
   return 0;
 }
 
 int GammaEngine::Delete(std::string &key) {
+  return LoggedWrite(WalRecordType::DELETE_DOCS,
+                     WalEncodeKeys(std::vector<std::string>(1, key)), 1,
+                     [&]() { return DoDelete(key); });
+}
+
+int GammaEngine::DoDelete(std::string &key) {
   int docid = -1, ret = 0;
   ret = table_->GetDocIDByKey(key, docid);
   if (ret != 0 || docid < 0) return 1;
@@ -1151,13 +1645,17 @@ int GammaEngine::Delete(std::string &key) {
 }
 
 bool GammaEngine::DeleteDocs(std::vector<std::string> &keys)  {
-  bool ret = true;
-  for (auto &key : keys)  {
-    if (Delete(key) < 0)  {
-      ret = false;
+  int ret = LoggedWrite(WalRecordType::DELETE_DOCS, WalEncodeKeys(keys),
+                        keys.size(), [&]() {
+    int ret = 0;
+    for (auto &key : keys)  {
+      if (DoDelete(key) < 0)  {
+        ret = -1;
+      }
     }
-  }
-  return ret;
+    return ret;
+  });
+  return ret == 0;
 }
 
 int GammaEngine::DelDocByQuery(Request &request) {
@@ -1193,18 +1691,28 @@ int GammaEngine::DelDocByQuery(Request &request) {
     return 1;
   }
 
+  // logged as the deletes of the matched keys, replaying them does not
+  // depend on the range index
   std::vector<int> doc_ids = range_query_result.ToDocs();
+  std::vector<std::string> keys;
   for (size_t i = 0; i < doc_ids.size(); ++i) {
     int docid = doc_ids[i];
-    if (docids_bitmap_->Test(docid)) {
+    std::string key;
+    if (docids_bitmap_->Test(docid) || table_->GetKeyByDocid(docid, key)) {
       continue;
     }
-    ++delete_num_;
-    docids_bitmap_->Set(docid);
-    docids_bitmap_->Dump(docid, 1);
+    keys.push_back(key);
   }
-  is_dirty_ = true;
-  return 0;
+  if (keys.size() == 0) return 0;
+
+  int ret = LoggedWrite(WalRecordType::DELETE_DOCS, WalEncodeKeys(keys),
+                        keys.size(), [&]() {
+    for (auto &key : keys) {
+      DoDelete(key);
+    }
+    return 0;
+  });
+  return ret == 0 ? 0 : 1;
 }
 
 int GammaEngine::DelDocByFilter(Request &request, char **del_ids,
@@ -1243,7 +1751,7 @@ int GammaEngine::DelDocByFilter(Request &request, char **del_ids,
 
   int retval = field_range_index_->Search(filters, &range_query_result);
 
-  cJSON *root = cJSON_CreateArray();
+  std::vector<std::string> keys;
   if (retval > 0) {
     for (int del_docid = 0; del_docid < max_docid_; ++del_docid) {
       if (range_query_result.Has(del_docid) == true) {
@@ -1253,32 +1761,37 @@ int GammaEngine::DelDocByFilter(Request &request, char **del_ids,
           continue;
         }
         if (docids_bitmap_->Test(del_docid)) continue;
+        keys.push_back(key);
+      }
+    }
+  }
 
-        docids_bitmap_->Set(del_docid);
-        docids_bitmap_->Dump(del_docid, 1);
-        const auto &name_to_idx = table_->FieldMap();
-        for (const auto &ite : name_to_idx) {
-          field_range_index_->Delete(del_docid, ite.second);
-        }
-        table_->Delete(key);
-        vec_manager_->Delete(del_docid);
-        if (migrate_data_) { migrate_data_->DeleteDocid(del_docid); }
-        if (table_->IdType() == 0) {
-          cJSON_AddItemToArray(root, cJSON_CreateString(key.c_str()));
-        } else {
-          long key_long;
-          memcpy(&key_long, key.c_str(), sizeof(key_long));
-          cJSON_AddItemToArray(root, cJSON_CreateNumber(key_long));
-        }
-        ++delete_num_;
+  // logged as the deletes of the matched keys, like DeleteDocs
+  std::vector<std::string> deleted_keys;
+  if (keys.size() > 0) {
+    LoggedWrite(WalRecordType::DELETE_DOCS, WalEncodeKeys(keys), keys.size(),
+                [&]() {
+      for (auto &key : keys) {
+        if (DoDelete(key) == 0) deleted_keys.push_back(key);
       }
+      return 0;
+    });
+  }
+
+  cJSON *root = cJSON_CreateArray();
+  for (const std::string &key : deleted_keys) {
+    if (table_->IdType() == 0) {
+      cJSON_AddItemToArray(root, cJSON_CreateString(key.c_str()));
+    } else {
+      long key_long;
+      memcpy(&key_long, key.c_str(), sizeof(key_long));
+      cJSON_AddItemToArray(root, cJSON_CreateNumber(key_long));
     }
   }
 
   *del_ids = cJSON_PrintUnformatted(root);
   *str_len = strlen(*del_ids);
   if (root) cJSON_Delete(root);
-  is_dirty_ = true;
   return 0;
 }
 
@@ -1410,30 +1923,43 @@ int GammaEngine::BuildIndex() {
     return 0;
   }
 
-  auto func_indexing = std::bind(&GammaEngine::Indexing, this);
-  std::thread t(func_indexing);
-  t.detach();
+  // the thread of a failed indexing has exited
+  if (indexing_thread_.joinable()) indexing_thread_.join();
+  indexing_thread_ = std::thread(&GammaEngine::Indexing, this);
   return 0;
 }
 
 int GammaEngine::Indexing() {
-  if (vec_manager_->Indexing() != 0) {
-    LOG(ERROR) << "Create index failed!";
-    b_running_ = 0;
-    return -1;
+  {
+    std::lock_guard<std::mutex> lk(dump_mutex_);
+    if (vec_manager_->Indexing() != 0) {
+      LOG(ERROR) << "Create index failed!";
+      b_running_ = 0;
+      return -1;
+    }
   }
 
   int ret = 0;
   bool has_error = false;
   while (b_running_) {
     if (has_error) {
-      usleep(5000 * 1000);  // sleep 5000ms
+      std::unique_lock<std::mutex> lk(indexing_mutex_);
+      indexing_cv_.wait_for(lk, std::chrono::seconds(5),
+                            [this] { return b_running_ == 0; });
       continue;
     }
     index_status_ = IndexStatus::INDEXED;
     bool index_is_dirty = false;
-    int add_ret = vec_manager_->AddRTVecsToIndex(index_is_dirty);
-   
+    int add_ret = 0;
+    // a waiting dump goes before the next round
+    while (dump_waiting_ > 0 && b_running_) {
+      std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+    {
+      std::lock_guard<std::mutex> lk(dump_mutex_);
+      add_ret = vec_manager_->AddRTVecsToIndex(index_is_dirty);
+    }
+
     if (add_ret < 0) {
       has_error = true;
       LOG(ERROR) << "Add real time vectors to index error!";
@@ -1441,13 +1967,51 @@ int GammaEngine::Indexing() {
     }
     if (index_is_dirty == true) {
       is_dirty_ = true;
+      MarkDirty(0);
     }
-    usleep(1000 * 1000);  // sleep 5000ms
+
+    // a backlog is indexed a round at a time without waiting, dump_mutex_
+    // is released between the rounds so checkpoints are not held up
+    std::unique_lock<std::mutex> lk(indexing_mutex_);
+    TrimUnindexedMarks(vec_manager_->MinIndexedNum());
+    if (add_ret > 0 && vec_manager_->UnindexedNum() > 0) continue;
+
+    // wait for new writes, the writes during the last round are indexed
+    // at once
+    indexing_cv_.wait_for(lk, std::chrono::milliseconds(kIndexingIdleMs),
+                          [this] { return indexing_signaled_ || !b_running_; });
+    indexing_signaled_ = false;
   }
-  running_cv_.notify_one();
   return ret;
 }
 
+void GammaEngine::NotifyIndexing() {
+  double now = utils::getmillisecs();
+  {
+    std::lock_guard<std::mutex> lk(indexing_mutex_);
+    if (unindexed_marks_.empty() ||
+        unindexed_marks_.back().first < max_docid_) {
+      // writes within the same millisecond share a mark
+      if (!unindexed_marks_.empty() &&
+          now - unindexed_marks_.back().second < 1) {
+        unindexed_marks_.back().first = max_docid_;
+      } else {
+        unindexed_marks_.emplace_back(max_docid_, now);
+      }
+    }
+    if (!b_running_) return;
+    indexing_signaled_ = true;
+  }
+  indexing_cv_.notify_one();
+}
+
+void GammaEngine::TrimUnindexedMarks(int indexed_num) {
+  while (!unindexed_marks_.empty() &&
+         unindexed_marks_.front().first <= indexed_num) {
+    unindexed_marks_.pop_front();
+  }
+}
+
 int GammaEngine::BuildFieldIndex() {
   b_field_running_ = true;
 
@@ -1500,52 +2064,156 @@ void GammaEngine::GetIndexStatus(EngineStatus &engine_status) {
   engine_status.SetBitmapMem(docids_bitmap_->BytesSize());
   engine_status.SetDocNum(GetDocsNum());
   engine_status.SetMaxDocID(max_docid_ - 1);
-  engine_status.SetMinIndexedNum(vec_manager_->MinIndexedNum());
+  int min_indexed_num = vec_manager_->MinIndexedNum();
+  engine_status.SetMinIndexedNum(min_indexed_num);
+
+  // lag of the index behind the writes, searches are brute force before the
+  // index is built
+  long indexing_lag_ms = 0;
+  if (index_status_ == IndexStatus::INDEXED) {
+    std::lock_guard<std::mutex> lk(indexing_mutex_);
+    TrimUnindexedMarks(min_indexed_num);
+    if (!unindexed_marks_.empty()) {
+      indexing_lag_ms =
+          (long)(utils::getmillisecs() - unindexed_marks_.front().second);
+    }
+  }
+  engine_status.SetUnindexedNum(vec_manager_->UnindexedNum());
+  engine_status.SetIndexingLagMs(indexing_lag_ms);
 }
 
 int GammaEngine::Dump() {
+  if (!created_table_) {
+    LOG(ERROR) << "table is not created, nothing to dump";
+    return -1;
+  }
+  ++dump_waiting_;
+  std::lock_guard<std::mutex> dump_lock(dump_mutex_);
+  --dump_waiting_;
+
+  // the writes which come during the dump are saved by the next one
+  long dumped_docs = 0;
+  {
+    std::lock_guard<std::mutex> lk(checkpoint_mutex_);
+    dumped_docs = dirty_docs_;
+    dirty_docs_ -= dumped_docs;
+    first_dirty_ms_ = 0;
+  }
+
+  // the records up to wal_lsn are applied, they are covered by this dump
+  int64_t wal_lsn = -1;
+  if (wal_) {
+    std::lock_guard<std::mutex> lk(wal_apply_mutex_);
+    wal_lsn = wal_applied_lsn_;
+  }
+
   int ret = table_->Sync();
   if (ret != 0) {
     LOG(ERROR) << "dump table error, ret=" << ret;
+    MarkDirty(dumped_docs);
     return -1;
   }
 
-  if (is_dirty_) {
+  // the writes after this point are saved by the next dump
+  if (is_dirty_.exchange(false)) {
     int max_docid = max_docid_ - 1;
-    std::time_t t = std::time(nullptr);
-    char tm_str[100];
-    std::strftime(tm_str, sizeof(tm_str), date_time_format_.c_str(),
-                  std::localtime(&t));
-
-    string path = dump_path_ + "/" + tm_str;
-    if (!utils::isFolderExist(path.c_str())) {
+    // the changes since the last full dump are appended to it as deltas,
+    // they are folded into a new full dump once there are too many
+    bool full = last_dump_dir_ == "" || full_dump_needed_ ||
+                dump_delta_num_ >= kMaxDumpDeltas;
+    string path = last_dump_dir_;
+
+    index_write_limiter = &dump_rate_limiter_;
+    if (!full) {
+      ret = vec_manager_->DumpDelta(path, dump_delta_num_ + 1, 0, max_docid);
+      full = ret != 0;
+    }
+    if (full) {
+      // every full dump has its own directory, the last one is removed after
+      while (true) {
+        std::time_t t = std::time(nullptr);
+        char tm_str[100];
+        std::strftime(tm_str, sizeof(tm_str), date_time_format_.c_str(),
+                      std::localtime(&t));
+        path = dump_path_ + "/" + tm_str;
+        if (!utils::isFolderExist(path.c_str())) break;
+        std::this_thread::sleep_for(std::chrono::milliseconds(200));
+      }
       mkdir(path.c_str(), S_IRWXU | S_IRWXG | S_IROTH | S_IXOTH);
+      ret = vec_manager_->Dump(path, 0, max_docid);
     }
-
-    ret = vec_manager_->Dump(path, 0, max_docid);
+    index_write_limiter = nullptr;
     if (ret != 0) {
       LOG(ERROR) << "dump vector error, ret=" << ret;
+      full_dump_needed_ = true;
+      is_dirty_ = true;
+      MarkDirty(dumped_docs);
       return -1;
     }
 
+    ret = awadb_retrieval_->Dump();
+    if (ret != 0) {
+      LOG(ERROR) << "dump retrieval error, ret=" << ret;
+      // the delta may be written already without its done file
+      full_dump_needed_ = true;
+      is_dirty_ = true;
+      MarkDirty(dumped_docs);
+      return -1;
+    }
+
+    // a field which is not dumped is rebuilt when loading, so are the docs
+    // added after the dump, a delta keeps the dump until a doc is deleted or
+    // updated and the next full dump writes it again
+    string range_index_dir = path + "/range_index";
+    if (full || !field_range_index_->Dumped(range_index_dir)) {
+      ret = field_range_index_->Dump(range_index_dir, max_docid + 1);
+      if (ret != 0) {
+        LOG(ERROR) << "dump range index error, ret=" << ret;
+      }
+    }
+
+    int delta_num = full ? 0 : dump_delta_num_ + 1;
+    // the done file is replaced at once, a delta counts after it
     const string dump_done_file = path + "/dump.done";
+    const string tmp_done_file = dump_done_file + ".tmp";
     std::ofstream f_done;
-    f_done.open(dump_done_file);
+    f_done.open(tmp_done_file);
     if (!f_done.is_open()) {
-      LOG(ERROR) << "Cannot create file " << dump_done_file;
+      LOG(ERROR) << "Cannot create file " << tmp_done_file;
+      full_dump_needed_ = true;
+      is_dirty_ = true;
+      MarkDirty(dumped_docs);
       return -1;
     }
     f_done << "start_docid " << 0 << std::endl;
     f_done << "end_docid " << max_docid << std::endl;
+    f_done << "delta_num " << delta_num << std::endl;
     f_done.close();
+    if (rename(tmp_done_file.c_str(), dump_done_file.c_str())) {
+      LOG(ERROR) << "rename " << tmp_done_file << " error: " << strerror(errno);
+      full_dump_needed_ = true;
+      is_dirty_ = true;
+      MarkDirty(dumped_docs);
+      return -1;
+    }
 
-    if (last_dump_dir_ != "" && utils::remove_dir(last_dump_dir_.c_str())) {
-      LOG(ERROR) << "remove last dump directory error, path=" << last_dump_dir_;
+    if (full) {
+      if (last_dump_dir_ != "" && utils::remove_dir(last_dump_dir_.c_str())) {
+        LOG(ERROR) << "remove last dump directory error, path="
+                   << last_dump_dir_;
+      }
+      LOG(INFO) << "Dumped to [" << path
+                << "], last dump directory(removed)=" << last_dump_dir_;
+      last_dump_dir_ = path;
+    } else {
+      LOG(INFO) << "Dumped delta " << delta_num << " to [" << path << "]";
     }
-    LOG(INFO) << "Dumped to [" << path
-              << "], last dump directory(removed)=" << last_dump_dir_;
-    last_dump_dir_ = path;
-    is_dirty_ = false;
+    dump_delta_num_ = delta_num;
+    full_dump_needed_ = false;
+  }
+
+  if (wal_ && wal_->Checkpoint(wal_lsn)) {
+    LOG(ERROR) << "checkpoint write-ahead log error, lsn=" << wal_lsn;
   }
   return 0;
 }
@@ -1609,6 +2277,7 @@ int GammaEngine::Load() {
                const std::pair<std::time_t, string> &b) {
               return a.first < b.first;
             });
+  int dump_delta_num = 0;
   if (folders_tm.size() > 0) {
     string dump_done_file =
         folders_tm[folders_tm.size() - 1].second + "/dump.done";
@@ -1622,11 +2291,18 @@ int GammaEngine::Load() {
     fio.Read(buf, 1, fsize);
     string buf_str(buf, fsize);
     std::vector<string> lines = utils::split(buf_str, "\n");
-    assert(lines.size() == 2);
-    std::vector<string> items = utils::split(lines[1], " ");
-    assert(items.size() == 2);
-    int index_dump_num = (int)std::strtol(items[1].c_str(), nullptr, 10) + 1;
-    LOG(INFO) << "read index_dump_num=" << index_dump_num << " from "
+    int index_dump_num = 0;
+    for (const string &line : lines) {
+      std::vector<string> items = utils::split(line, " ");
+      if (items.size() != 2) continue;
+      if (items[0] == "end_docid") {
+        index_dump_num = (int)std::strtol(items[1].c_str(), nullptr, 10) + 1;
+      } else if (items[0] == "delta_num") {
+        dump_delta_num = (int)std::strtol(items[1].c_str(), nullptr, 10);
+      }
+    }
+    LOG(INFO) << "read index_dump_num=" << index_dump_num
+              << ", delta_num=" << dump_delta_num << " from "
               << dump_done_file;
     delete[] buf;
     buf = nullptr;
@@ -1641,7 +2317,7 @@ int GammaEngine::Load() {
     LOG(INFO) << "Loading from " << last_dir;
     dirs.push_back(last_dir);
   }
-  int ret = vec_manager_->Load(dirs, max_docid_);
+  int ret = vec_manager_->Load(dirs, max_docid_, dump_delta_num);
   if (ret != 0) {
     LOG(ERROR) << "load vector error, ret=" << ret << ", path=" << last_dir;
     return ret;
@@ -1653,11 +2329,17 @@ int GammaEngine::Load() {
     return ret;
   }
 
-  int field_num = table_->FieldsNum();
-  for (int i = 0; i < max_docid_; ++i) {
-    for (int j = 0; j < field_num; ++j) {
-      field_range_index_->Add(i, j);
-    }
+  ret = field_range_index_->Load(
+      last_dir == "" ? last_dir : last_dir + "/range_index", max_docid_);
+  if (ret != 0) {
+    LOG(ERROR) << "load range index error, ret=" << ret;
+    return ret;
+  }
+
+  ret = awadb_retrieval_->Load();
+  if (ret != 0) {
+    LOG(ERROR) << "load retrieval error, ret=" << ret;
+    return ret;
   }
 
   delete_num_ = 0;
@@ -1667,6 +2349,12 @@ int GammaEngine::Load() {
     }
   }
 
+  ret = ReplayWal();
+  if (ret != 0) {
+    LOG(ERROR) << "replay write-ahead log error, ret=" << ret;
+    return ret;
+  }
+
   if (not b_running_ and index_status_ == UNINDEXED) {
     if (max_docid_ >= indexing_size_) {
       LOG(INFO) << "Begin indexing. indexing_size=" << indexing_size_;
@@ -1681,6 +2369,7 @@ int GammaEngine::Load() {
   }
 
   last_dump_dir_ = last_dir;
+  dump_delta_num_ = dump_delta_num;
   LOG(INFO) << "load engine success! max docid=" << max_docid_
             << ", load directory=" << last_dir
             << ", clean directorys(not done)="
@@ -1689,6 +2378,61 @@ int GammaEngine::Load() {
   return 0;
 }
 
+int GammaEngine::ReplayWal() {
+  if (wal_ == nullptr) return 0;
+
+  int replayed = 0;
+  auto apply = [&](WalRecordType type, const std::string &payload,
+                   int64_t lsn) {
+    // adding an existing key updates it and deleting a missing key does
+    // nothing, so the records already in the dump are replayed harmlessly
+    if (type == WalRecordType::ADD_DOCS) {
+      Docs docs;
+      std::vector<WordsInDoc> words_in_docs;
+      bool has_words = false;
+      if (WalDecodeDocs(payload, docs, words_in_docs, has_words)) {
+        LOG(ERROR) << "decode write-ahead log record error, lsn=" << lsn;
+        return -1;
+      }
+      MarkDirty(docs.GetDocs().size());
+      BatchResult result(docs.GetDocs().size());
+      if (has_words) {
+        DoAddOrUpdateDocs(docs, result, words_in_docs);
+      } else {
+        DoAddOrUpdateDocs(docs, result);
+      }
+    } else if (type == WalRecordType::ADD_COLUMNS) {
+      std::unique_ptr<ColumnDocs> docs;
+      if (WalDecodeColumns(payload, docs)) {
+        LOG(ERROR) << "decode write-ahead log record error, lsn=" << lsn;
+        return -1;
+      }
+      MarkDirty(docs->Size());
+      BatchResult result(docs->Size());
+      DoAddColumns(*docs, result);
+    } else if (type == WalRecordType::DELETE_DOCS) {
+      std::vector<std::string> keys;
+      if (WalDecodeKeys(payload, keys)) {
+        LOG(ERROR) << "decode write-ahead log record error, lsn=" << lsn;
+        return -1;
+      }
+      MarkDirty(keys.size());
+      for (auto &key : keys) {
+        DoDelete(key);
+      }
+    }
+    ++replayed;
+    return 0;
+  };
+
+  int ret = wal_->Replay(apply);
+  if (replayed > 0) {
+    LOG(INFO) << "replayed " << replayed
+              << " write-ahead log records, max docid=" << max_docid_;
+  }
+  return ret;
+}
+
 int GammaEngine::LoadFromFaiss() {
   std::map<std::string, RetrievalModel *> &vec_indexes =
       vec_manager_->VectorIndexes();
@@ -1769,6 +2513,80 @@ int GammaEngine::GetConfig(Config &conf) {
   return 0;
 }
 
+int GammaEngine::SetWalOptions(int group_commit_ms, int group_commit_bytes) {
+  if (wal_ == nullptr || group_commit_ms < 0 || group_commit_bytes <= 0) {
+    LOG(ERROR) << "invalid write-ahead log options, group_commit_ms="
+               << group_commit_ms
+               << ", group_commit_bytes=" << group_commit_bytes;
+    return -1;
+  }
+  WalOptions options;
+  options.group_commit_ms = group_commit_ms;
+  options.group_commit_bytes = group_commit_bytes;
+  wal_->SetOptions(options);
+  return 0;
+}
+
+int GammaEngine::SetCheckpointOptions(int interval_sec, long dirty_docs,
+                                      long io_bytes_per_sec) {
+  if (interval_sec < 0 || dirty_docs < 0 || io_bytes_per_sec < 0) {
+    LOG(ERROR) << "invalid checkpoint options, interval_sec=" << interval_sec
+               << ", dirty_docs=" << dirty_docs
+               << ", io_bytes_per_sec=" << io_bytes_per_sec;
+    return -1;
+  }
+  {
+    std::lock_guard<std::mutex> lk(checkpoint_mutex_);
+    checkpoint_options_.interval_sec = interval_sec;
+    checkpoint_options_.dirty_docs = dirty_docs;
+    checkpoint_options_.io_bytes_per_sec = io_bytes_per_sec;
+  }
+  dump_rate_limiter_.SetRate(io_bytes_per_sec);
+  checkpoint_cv_.notify_one();
+  return 0;
+}
+
+int GammaEngine::SetSearchBatchOptions(int max_wait_us, int max_batch_size) {
+  return search_batcher_.SetOptions(max_wait_us, max_batch_size);
+}
+
+void GammaEngine::MarkDirty(long ndocs) {
+  long dirty_docs = (dirty_docs_ += ndocs);
+  std::lock_guard<std::mutex> lk(checkpoint_mutex_);
+  if (first_dirty_ms_ == 0) first_dirty_ms_ = utils::getmillisecs();
+  if (checkpoint_options_.dirty_docs > 0 &&
+      dirty_docs >= checkpoint_options_.dirty_docs) {
+    checkpoint_cv_.notify_one();
+  }
+}
+
+void GammaEngine::CheckpointHandler() {
+  LOG(INFO) << "checkpoint thread start......";
+  std::unique_lock<std::mutex> lk(checkpoint_mutex_);
+  while (checkpoint_running_) {
+    checkpoint_cv_.wait_for(lk, std::chrono::seconds(1));
+    if (!checkpoint_running_) break;
+    if (!created_table_ || b_loading_ || first_dirty_ms_ == 0) continue;
+
+    const CheckpointOptions &options = checkpoint_options_;
+    bool by_docs = options.dirty_docs > 0 && dirty_docs_ >= options.dirty_docs;
+    bool by_time =
+        options.interval_sec > 0 &&
+        utils::getmillisecs() - first_dirty_ms_ >= options.interval_sec * 1000.0;
+    if (!by_docs && !by_time) continue;
+
+    lk.unlock();
+    int ret = Dump();
+    lk.lock();
+    if (ret != 0) {
+      LOG(ERROR) << "checkpoint error, ret=" << ret << ", retry in 60s";
+      checkpoint_cv_.wait_for(lk, std::chrono::seconds(60),
+                              [this] { return !checkpoint_running_; });
+    }
+  }
+  LOG(INFO) << "checkpoint thread exit!";
+}
+
 int GammaEngine::SetConfig(Config &conf) {
   int table_cache_size = 0;
   int str_cache_size = 0;
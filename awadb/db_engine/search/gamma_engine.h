@@ -8,9 +8,14 @@
 #pragma once
 
 #include <condition_variable>
+#include <deque>
+#include <functional>
+#include <mutex>
 #include <string>
+#include <thread>
 
 #include "c_api/api_data/gamma_batch_result.h"
+#include "c_api/api_data/gamma_column_docs.h"
 #include "c_api/api_data/gamma_doc.h"
 #include "c_api/api_data/gamma_docs.h"
 #include "c_api/api_data/gamma_engine_status.h"
@@ -22,12 +27,33 @@
 #include "vector/vector_manager.h"
 #include "util/bitmap_manager.h"
 #include "storage/migrate_data.h"
+#include "storage/wal.h"
+#include "util/rate_limiter.h"
 #include "awadb_retrieval.h"
+#include "search_batcher.h"
 
 namespace tig_gamma {
 
+// the indexer wakes up at least this often without new writes
+const int kIndexingIdleMs = 1000;
+
 enum IndexStatus { UNINDEXED = 0, INDEXING, INDEXED };
 
+struct CheckpointOptions {
+  // dump at most this long after the first unsaved write, 0 for never
+  int interval_sec;
+  // dump once this many docs are written since the last dump, 0 for never
+  long dirty_docs;
+  // bytes per second the index files are written at, 0 for no limit
+  long io_bytes_per_sec;
+
+  CheckpointOptions() {
+    interval_sec = 300;
+    dirty_docs = 100000;
+    io_bytes_per_sec = 0;
+  }
+};
+
 class GammaEngine {
  public:
   static GammaEngine *GetInstance(const std::string &index_root_path);
@@ -36,6 +62,10 @@ class GammaEngine {
 
   int Setup();
 
+  /**
+   * search the request, a single query request is searched in a batch
+   * with the compatible concurrent ones if search batching is set
+   */
   int Search(Request &request, Response &response_results);
 
   int CreateTable(TableInfo &table);
@@ -49,6 +79,13 @@ class GammaEngine {
   int AddOrUpdateDocs(Docs &docs, BatchResult &result);
   int AddOrUpdateDocs(Docs &docs, BatchResult &result, std::vector<WordsInDoc> &words_in_docs);
 
+  /**
+   * add or update a batch of docs stored by columns, the runs of new docs
+   * are written to the table and the raw vectors in blocks
+   * @return 0 if successed
+   */
+  int AddColumns(ColumnDocs &docs, BatchResult &result);
+
   int Update(int doc_id, std::vector<struct Field> &fields_table,
              std::vector<struct Field> &fields_vec);
 
@@ -129,6 +166,31 @@ class GammaEngine {
 
   int SetConfig(Config &config);
 
+  /**
+   * set the group commit window of the write-ahead log
+   * @param group_commit_ms  max milliseconds a write waits for its group
+   * @param group_commit_bytes  a group is synced once it reaches this size
+   * @return 0 if successed
+   */
+  int SetWalOptions(int group_commit_ms, int group_commit_bytes);
+
+  /**
+   * set when the background checkpoint dumps the table, see
+   * CheckpointOptions
+   * @return 0 if successed
+   */
+  int SetCheckpointOptions(int interval_sec, long dirty_docs,
+                           long io_bytes_per_sec);
+
+  /**
+   * set how concurrent single query searches are batched, see SearchBatcher
+   * @param max_wait_us  max microseconds a search waits for its batch, 0
+   *                     disables batching
+   * @param max_batch_size  max queries of a batch
+   * @return 0 if successed
+   */
+  int SetSearchBatchOptions(int max_wait_us, int max_batch_size);
+
   int BeginMigrate();
 
   int GetMigrageDoc(Doc &doc, int *is_delete);
@@ -146,8 +208,16 @@ class GammaEngine {
 
   int CreateTableFromLocal(std::string &table_name);
 
+  int DoSearch(Request &request, Response &response_results);
+
   int Indexing();
 
+  // wake up the indexer after writes, marks when the new vectors are added
+  void NotifyIndexing();
+
+  // drop the marks of indexed vectors, indexing_mutex_ should be held
+  void TrimUnindexedMarks(int indexed_num);
+
   int AddNumIndexFields();
 
   int MultiRangeQuery(Request &request, GammaSearchCondition *condition,
@@ -157,6 +227,39 @@ class GammaEngine {
   int PageTextFilter(Request &request,
 		     GammaSearchCondition *condition,
 		     MultiRangeQueryResults *range_query_result);
+
+  void PlanFilteredSearch(GammaSearchCondition *condition,
+                          MultiRangeQueryResults *range_query_result);
+
+  int DoAddOrUpdate(Doc &doc);
+
+  int DoAddOrUpdateDocs(Docs &docs, BatchResult &result);
+  int DoAddOrUpdateDocs(Docs &docs, BatchResult &result,
+                        std::vector<WordsInDoc> &words_in_docs);
+
+  // add the table fields of a batch of new docs to the range index
+  void AddRangeIndex(int start_id, int batch_size, std::vector<Doc> &doc_vec);
+
+  // add fields of the n new docs from max_docid_ to the range index
+  void AddRangeIndex(int n, const std::vector<int> &fields);
+
+  int DoAddColumns(ColumnDocs &docs, BatchResult &result);
+
+  int DoDelete(std::string &key);
+
+  /**
+   * log a write and apply it once the group of its record is synced, the
+   * writes are applied one by one in the order of their lsns
+   */
+  int LoggedWrite(WalRecordType type, const std::string &payload, long ndocs,
+                  const std::function<int()> &apply);
+
+  int ReplayWal();
+
+  // ndocs are written and not dumped yet
+  void MarkDirty(long ndocs);
+
+  void CheckpointHandler();
  
 
  private:
@@ -172,6 +275,26 @@ class GammaEngine {
   
   MigrateData *migrate_data_;
 
+  WriteAheadLog *wal_;
+  // the logged writes up to this lsn are applied, or dropped if their
+  // records failed to sync
+  int64_t wal_applied_lsn_;
+  std::mutex wal_apply_mutex_;
+  std::condition_variable wal_apply_cv_;
+
+  // serializes dumps with each other and with adding vectors to the index
+  std::mutex dump_mutex_;
+  std::atomic<int> dump_waiting_;  // dumps waiting for dump_mutex_
+  CheckpointOptions checkpoint_options_;
+  utils::RateLimiter dump_rate_limiter_;
+  // number of docs written since the last dump
+  std::atomic<long> dirty_docs_;
+  double first_dirty_ms_;  // when the first unsaved doc is written, 0 if none
+  std::mutex checkpoint_mutex_;
+  std::condition_variable checkpoint_cv_;
+  bool checkpoint_running_;
+  std::thread checkpoint_thread_;
+
   int max_docid_;
   int indexing_size_;
 
@@ -180,22 +303,33 @@ class GammaEngine {
   int b_running_; // 0 not run, not 0 running
   bool b_field_running_;
 
-  std::condition_variable running_cv_;
+  std::thread indexing_thread_;
+  std::mutex indexing_mutex_;
+  std::condition_variable indexing_cv_;
+  bool indexing_signaled_;
+  // (max docid, milliseconds) of the writes whose vectors are not indexed
+  std::deque<std::pair<int, double>> unindexed_marks_;
+
   std::condition_variable running_field_cv_;
 
   enum IndexStatus index_status_;
 
   const std::string date_time_format_;
   std::string last_dump_dir_;  // it should be delete after next dump
+  int dump_delta_num_;  // deltas appended to the last full dump
+  bool full_dump_needed_;
 
   bool created_table_;
 
   bool b_loading_;
 
-  bool is_dirty_;
+  // cleared when a dump starts, set again if the dump fails
+  std::atomic<bool> is_dirty_;
 
   std::vector<char *> batch_docs_;
 
+  SearchBatcher search_batcher_;
+
 #ifdef PERFORMANCE_TESTING
   std::atomic<uint64_t> search_num_;
 #endif
@@ -0,0 +1,190 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include "search_batcher.h"
+
+#include <chrono>
+
+#include "util/log.h"
+
+namespace tig_gamma {
+
+namespace {
+
+// requests of topn in the same bucket are searched with the bucket topn and
+// their results are truncated to their own topn
+int TopNBucket(int topn) {
+  int bucket = 1;
+  while (bucket < topn) bucket <<= 1;
+  return bucket;
+}
+
+void AppendKey(std::string &key, const std::string &part) {
+  key.append(std::to_string(part.size())).append(":").append(part);
+}
+
+}  // namespace
+
+SearchBatcher::SearchBatcher(BatchSearchFunc search_func)
+    : search_func_(std::move(search_func)) {
+  max_wait_us_ = 0;
+  max_batch_size_ = 1;
+}
+
+int SearchBatcher::SetOptions(int max_wait_us, int max_batch_size) {
+  if (max_wait_us < 0 || max_batch_size < 1) {
+    LOG(ERROR) << "invalid search batch options, max_wait_us=" << max_wait_us
+               << ", max_batch_size=" << max_batch_size;
+    return -1;
+  }
+  std::lock_guard<std::mutex> lk(mu_);
+  max_wait_us_ = max_wait_us;
+  max_batch_size_ = max_batch_size;
+  return 0;
+}
+
+bool SearchBatcher::Enabled() {
+  std::lock_guard<std::mutex> lk(mu_);
+  return max_wait_us_ > 0 && max_batch_size_ > 1;
+}
+
+bool SearchBatcher::Batchable(Request &request) {
+  return request.ReqNum() == 1 && request.TopN() > 0 &&
+         request.VecFields().size() == 1;
+}
+
+std::string SearchBatcher::BatchKey(Request &request) {
+  struct VectorQuery &vec_query = request.VecFields()[0];
+  std::string key;
+  AppendKey(key, vec_query.name);
+  AppendKey(key, vec_query.retrieval_type);
+  AppendKey(key, std::to_string(vec_query.Size()));
+  AppendKey(key, std::to_string(vec_query.min_score));
+  AppendKey(key, std::to_string(vec_query.max_score));
+  AppendKey(key, std::to_string(vec_query.has_boost) + "," +
+                     std::to_string(vec_query.boost));
+  AppendKey(key, std::to_string(TopNBucket(request.TopN())));
+  AppendKey(key, std::to_string(request.BruteForceSearch()) + "," +
+                     std::to_string(request.MetricType()) + "," +
+                     std::to_string(request.L2Sqrt()) + "," +
+                     std::to_string(request.HasRank()) + "," +
+                     std::to_string(request.MultiVectorRank()));
+  AppendKey(key, request.RetrievalParams());
+
+  for (const std::string &page_text : request.PageTexts()) {
+    AppendKey(key, "p");
+    AppendKey(key, page_text);
+  }
+  for (struct RangeFilter &filter : request.RangeFilters()) {
+    AppendKey(key, "r");
+    AppendKey(key, filter.field);
+    AppendKey(key, filter.lower_value);
+    AppendKey(key, filter.upper_value);
+    AppendKey(key, std::to_string(filter.include_lower) + "," +
+                       std::to_string(filter.include_upper));
+  }
+  for (struct TermFilter &filter : request.TermFilters()) {
+    AppendKey(key, "t");
+    AppendKey(key, filter.field);
+    AppendKey(key, filter.value);
+    AppendKey(key, std::to_string(filter.is_union));
+  }
+  return key;
+}
+
+int SearchBatcher::Search(Request &request, Response &response) {
+  std::string key = BatchKey(request);
+
+  std::unique_lock<std::mutex> lk(mu_);
+  auto it = batches_.find(key);
+  if (it != batches_.end()) {
+    // join the open batch and wait for its leader to search it
+    std::shared_ptr<Batch> batch = it->second;
+    batch->pendings.push_back({&request, &response});
+    if ((int)batch->pendings.size() >= max_batch_size_) {
+      batch->closed = true;
+      batches_.erase(it);
+      batch->cv.notify_all();
+    }
+    batch->cv.wait(lk, [&batch] { return batch->done; });
+    return batch->ret;
+  }
+
+  std::shared_ptr<Batch> batch = std::make_shared<Batch>();
+  batch->pendings.push_back({&request, &response});
+  if (max_wait_us_ > 0 && max_batch_size_ > 1) {
+    batches_[key] = batch;
+    auto deadline = std::chrono::steady_clock::now() +
+                    std::chrono::microseconds(max_wait_us_);
+    batch->cv.wait_until(lk, deadline, [&batch] { return batch->closed; });
+    if (!batch->closed) {
+      batch->closed = true;
+      batches_.erase(key);
+    }
+  }
+  lk.unlock();
+
+  SearchBatch(*batch);
+
+  lk.lock();
+  batch->done = true;
+  lk.unlock();
+  batch->cv.notify_all();
+  return batch->ret;
+}
+
+void SearchBatcher::SearchBatch(Batch &batch) {
+  int n = batch.pendings.size();
+  if (n == 1) {
+    batch.ret = search_func_(*batch.pendings[0].request,
+                             *batch.pendings[0].response);
+    return;
+  }
+
+  // the requests of a batch only differ in their query vectors and topn
+  Request &first = *batch.pendings[0].request;
+  Request batch_request;
+  batch_request.SetReqNum(n);
+  batch_request.SetTopN(TopNBucket(first.TopN()));
+  batch_request.SetBruteForceSearch(first.BruteForceSearch());
+  batch_request.SetRetrievalParams(first.RetrievalParams());
+  batch_request.SetHasRank(first.HasRank());
+  batch_request.SetMultiVectorRank(first.MultiVectorRank());
+  batch_request.SetL2Sqrt(first.L2Sqrt());
+  batch_request.SetMetricType(first.MetricType());
+
+  struct VectorQuery vec_query = first.VecFields()[0];
+  size_t query_size = vec_query.Size();
+  vec_query.value_ptr = nullptr;
+  vec_query.value_len = 0;
+  vec_query.value.clear();
+  vec_query.value.reserve(query_size * n);
+  for (Pending &pending : batch.pendings) {
+    struct VectorQuery &query = pending.request->VecFields()[0];
+    vec_query.value.append(query.Data(), query.Size());
+  }
+  batch_request.AddVectorQuery(vec_query);
+
+  for (const std::string &page_text : first.PageTexts()) {
+    batch_request.AddPageText(page_text);
+  }
+  for (struct RangeFilter &filter : first.RangeFilters()) {
+    batch_request.AddRangeFilter(filter);
+  }
+  for (struct TermFilter &filter : first.TermFilters()) {
+    batch_request.AddTermFilter(filter);
+  }
+
+  Response batch_response;
+  batch.ret = search_func_(batch_request, batch_response);
+  for (int i = 0; i < n; i++) {
+    Pending &pending = batch.pendings[i];
+    batch_response.MoveResult(i, pending.request->TopN(), *pending.response);
+  }
+}
+
+}  // namespace tig_gamma
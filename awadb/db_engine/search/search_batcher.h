@@ -0,0 +1,89 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <condition_variable>
+#include <functional>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include "c_api/api_data/gamma_request.h"
+#include "c_api/api_data/gamma_response.h"
+
+namespace tig_gamma {
+
+/**
+ * Coalesces concurrent single query searches of one table into batched
+ * engine searches. The first request of a batch waits up to max_wait_us for
+ * compatible requests, that is the same vector field, query size, topn
+ * bucket, search options and filters, then searches all of them by one call
+ * of the batch search function and hands every caller its own results.
+ * Batching is disabled while max_wait_us is 0.
+ */
+class SearchBatcher {
+ public:
+  using BatchSearchFunc = std::function<int(Request &, Response &)>;
+
+  explicit SearchBatcher(BatchSearchFunc search_func);
+
+  /**
+   * @param max_wait_us  max microseconds the first request of a batch waits
+   *                     for the others, 0 disables batching
+   * @param max_batch_size  a batch is searched once it has this many queries
+   * @return 0 if successed
+   */
+  int SetOptions(int max_wait_us, int max_batch_size);
+
+  bool Enabled();
+
+  /**
+   * @return whether the request may be searched in a batch, a request of
+   *         several queries or vector fields is not
+   */
+  bool Batchable(Request &request);
+
+  /**
+   * search the request in a batch, response gets the results of the request
+   * only, with at most request.TopN() results
+   * @return the return value of the batch search
+   */
+  int Search(Request &request, Response &response);
+
+ private:
+  struct Pending {
+    Request *request;
+    Response *response;
+  };
+
+  struct Batch {
+    std::vector<Pending> pendings;
+    bool closed = false;
+    bool done = false;
+    int ret = 0;
+    std::condition_variable cv;
+  };
+
+  // requests are compatible if their keys are equal
+  std::string BatchKey(Request &request);
+
+  // search the closed batch and scatter the results to its requests
+  void SearchBatch(Batch &batch);
+
+  BatchSearchFunc search_func_;
+
+  std::mutex mu_;
+  int max_wait_us_;
+  int max_batch_size_;
+  // the open batches, a batch is removed once it is closed
+  std::map<std::string, std::shared_ptr<Batch>> batches_;
+};
+
+}  // namespace tig_gamma
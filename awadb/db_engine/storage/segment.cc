@@ -313,6 +313,15 @@ int Segment::Add(const uint8_t *data, int len) {
   return 0;
 }
 
+int Segment::BatchAdd(const uint8_t *data, int n) {
+  if (buffered_size_ + (uint32_t)n > max_size_) n = max_size_ - buffered_size_;
+  if (n <= 0) return 0;
+  size_t offset = (size_t)buffered_size_ * item_length_;
+  blocks_->Write(data, n * item_length_, offset, disk_io_, &cur_size_);
+  buffered_size_ += n;
+  return n;
+}
+
 str_offset_t Segment::AddString(const char *str, str_len_t len,
                                 uint32_t &block_id,
                                 in_block_pos_t &in_block_pos) {
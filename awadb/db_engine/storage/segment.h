@@ -34,6 +34,12 @@ class Segment {
 
   int Add(const uint8_t *vec, int len);
 
+  /**
+   * add n items stored back to back, it stops at the end of the segment
+   * @return the number of added items, < 0 if failed
+   */
+  int BatchAdd(const uint8_t *data, int n);
+
   str_offset_t AddString(const char *str, str_len_t len, uint32_t &block_id,
                          in_block_pos_t &in_block_pos);
 
@@ -57,6 +63,11 @@ class Segment {
 
   str_offset_t StrOffset();
 
+  const std::string &FilePath() { return file_path_; }
+
+  // the values start after the header in the segment file
+  uint64_t HeaderSize() { return seg_header_size_; }
+
  private:
   uint8_t Version();
 
@@ -273,6 +273,31 @@ int StorageManager::Add(const uint8_t *value, int len) {
   return 0;
 }
 
+int StorageManager::BatchAdd(const uint8_t *values, int n) {
+  // the async writer merges the writes into buffers of kMaxBatchWriteBytes
+  int max_num = kMaxBatchWriteBytes / options_.fixed_value_bytes;
+  if (max_num < 1) max_num = 1;
+
+  while (n > 0) {
+    Segment *segment = nullptr;
+    segments_.GetLastData(segment);
+    int num = segment->BatchAdd(values, n < max_num ? n : max_num);
+    if (num <= 0) {
+      LOG(ERROR) << "Storage[" << name_ << "] segment batch add error[" << num
+                 << "]";
+      return num < 0 ? num : INTERNAL_ERR;
+    }
+    size_ += num;
+    if (segment->IsFull() && Extend()) {
+      LOG(ERROR) << "Storage[" << name_ << "] extend error";
+      return INTERNAL_ERR;
+    }
+    values += (size_t)num * options_.fixed_value_bytes;
+    n -= num;
+  }
+  return 0;
+}
+
 str_offset_t StorageManager::AddString(const char *value, str_len_t len,
                                        uint32_t &block_id,
                                        in_block_pos_t &in_block_pos) {
@@ -322,6 +347,26 @@ int StorageManager::GetHeaders(int start_id, int n,
   return 0;
 }
 
+int StorageManager::GetSegmentFile(int seg_id, std::string &file_path,
+                                   uint64_t &header_size) {
+  if (compressor_ != nullptr || block_type_ != BlockType::VectorBlockType) {
+    LOG(ERROR) << "Storage[" << name_
+               << "] values of compressed or table segments can't be mapped";
+    return PARAM_ERR;
+  }
+  if (seg_id < 0 || (size_t)seg_id >= segments_.Size()) {
+    LOG(ERROR) << "Storage[" << name_ << "], segments_size["
+               << segments_.Size() << "], invalid seg_id[" << seg_id << "]";
+    return PARAM_ERR;
+  }
+  Segment *segment = nullptr;
+  segments_.GetData(seg_id, segment);
+  if (segment == nullptr) return INTERNAL_ERR;
+  file_path = segment->FilePath();
+  header_size = segment->HeaderSize();
+  return 0;
+}
+
 int StorageManager::Update(int id, uint8_t *value, int len) {
   if ((size_t)id >= size_ || id < 0 || len != options_.fixed_value_bytes) {
     LOG(ERROR) << "Storage[" << name_ << "], id [" << id << "] >= size_ ["
@@ -21,6 +21,10 @@
 
 namespace tig_gamma {
 
+// max bytes of one write of BatchAdd, below the 1MB buffer in which the
+// async writer merges its writes
+const int kMaxBatchWriteBytes = 512 * 1024;
+
 struct StorageManagerOptions {
   int segment_size;
   int fixed_value_bytes;
@@ -63,6 +67,13 @@ class StorageManager {
 
   int Add(const uint8_t *value, int len);
 
+  /**
+   * add n fixed size values stored back to back, they are written in a few
+   * large writes instead of one write per value
+   * @return 0 if successed
+   */
+  int BatchAdd(const uint8_t *values, int n);
+
   str_offset_t AddString(const char *value, str_len_t len, uint32_t &block_id,
                          in_block_pos_t &in_block_pos);
 
@@ -81,6 +92,15 @@ class StorageManager {
   int GetHeaders(int start_id, int n, std::vector<const uint8_t *> &values,
                  std::vector<int> &lens);
 
+  /**
+   * get the file of a segment whose values are stored uncompressed and
+   * contiguously after header_size bytes, so it can be mapped into memory
+   *
+   * @return 0 if successed
+   */
+  int GetSegmentFile(int seg_id, std::string &file_path,
+                     uint64_t &header_size);
+
   // currently it must call truncate after loading to set size of gamma db
   int Truncate(size_t size);
 
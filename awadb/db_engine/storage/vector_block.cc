@@ -64,20 +64,21 @@ int VectorBlock::WriteContent(const uint8_t *value, uint32_t n_bytes,
     uint32_t raw_len = compressor_->GetRawLen();
     Compress(value, n_bytes, output);
 
-    LOG(ERROR)<<"size is "<<raw_len;
     start = (start / raw_len) * vec_item_len_;
     value = (const uint8_t *)output.data();
+    n_bytes = output.size();
   }
 #endif
 
+  // n_bytes is a multiple of vec_item_len_ when a batch of vectors is added
   disk_io->Set(header_size_, vec_item_len_);
   struct disk_io::WriterStruct *write_struct =
       new struct disk_io::WriterStruct();
   write_struct->fd = fd_;
-  write_struct->data = new uint8_t[vec_item_len_];
-  memcpy(write_struct->data, value, vec_item_len_);
+  write_struct->data = new uint8_t[n_bytes];
+  memcpy(write_struct->data, value, n_bytes);
   write_struct->start = header_size_ + start;
-  write_struct->len = vec_item_len_;
+  write_struct->len = n_bytes;
   write_struct->cur_size = cur_size;
   disk_io->AsyncWrite(write_struct);
   // disk_io->SyncWrite(write_struct);
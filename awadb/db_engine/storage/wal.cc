@@ -0,0 +1,413 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include "wal.h"
+
+#include <fcntl.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cerrno>
+#include <chrono>
+#include <cstring>
+
+#include "util/log.h"
+#include "util/utils.h"
+
+namespace tig_gamma {
+
+namespace {
+
+const char *kWalPrefix = "wal-";
+const char *kWalSuffix = ".log";
+const char *kCheckpointFile = "wal.checkpoint";
+const size_t kRecordHeaderSize = 4 + 4 + 1 + 8;
+
+uint32_t Crc32(const uint8_t *data, size_t len, uint32_t crc = 0) {
+  static uint32_t table[256];
+  static std::once_flag once;
+  std::call_once(once, []() {
+    for (uint32_t i = 0; i < 256; ++i) {
+      uint32_t c = i;
+      for (int k = 0; k < 8; ++k) {
+        c = (c & 1) ? 0xEDB88320u ^ (c >> 1) : c >> 1;
+      }
+      table[i] = c;
+    }
+  });
+  crc = ~crc;
+  for (size_t i = 0; i < len; ++i) {
+    crc = table[(crc ^ data[i]) & 0xff] ^ (crc >> 8);
+  }
+  return ~crc;
+}
+
+// make the creations, renames and removals in dir durable
+int SyncDir(const std::string &dir) {
+  int dir_fd = open(dir.c_str(), O_RDONLY);
+  if (dir_fd < 0) return -1;
+  int ret = fsync(dir_fd);
+  close(dir_fd);
+  return ret;
+}
+
+int64_t NowMs() {
+  return std::chrono::duration_cast<std::chrono::milliseconds>(
+             std::chrono::steady_clock::now().time_since_epoch())
+      .count();
+}
+
+std::string SegmentName(int64_t first_lsn) {
+  char name[64];
+  snprintf(name, sizeof(name), "%s%020lld%s", kWalPrefix,
+           (long long)first_lsn, kWalSuffix);
+  return name;
+}
+
+int ReadFile(const std::string &path, std::string &content) {
+  long len = utils::get_file_size(path);
+  content.resize(len > 0 ? len : 0);
+  if (content.size() == 0) return 0;
+  utils::FileIO fio(const_cast<std::string &>(path));
+  if (fio.Open("rb") ||
+      fio.Read(&content[0], 1, content.size()) != content.size()) {
+    return -1;
+  }
+  return 0;
+}
+
+/**
+ * Walk through the valid records of a log file.
+ *
+ * @return the length of the valid prefix of content
+ */
+size_t ScanRecords(
+    const std::string &content,
+    const std::function<int(WalRecordType, const std::string &, int64_t)>
+        &visit,
+    int64_t &last_lsn) {
+  const uint8_t *data = (const uint8_t *)content.data();
+  size_t pos = 0;
+  while (pos + kRecordHeaderSize <= content.size()) {
+    uint32_t len = 0, crc = 0;
+    int64_t lsn = 0;
+    memcpy(&len, data + pos, 4);
+    memcpy(&crc, data + pos + 4, 4);
+    if (pos + kRecordHeaderSize + len > content.size()) break;
+    if (Crc32(data + pos + 8, 1 + 8 + len) != crc) break;
+    WalRecordType type = static_cast<WalRecordType>(data[pos + 8]);
+    memcpy(&lsn, data + pos + 9, 8);
+    if (visit) {
+      std::string payload((const char *)data + pos + kRecordHeaderSize, len);
+      if (visit(type, payload, lsn)) break;
+    }
+    last_lsn = lsn;
+    pos += kRecordHeaderSize + len;
+  }
+  return pos;
+}
+
+}  // namespace
+
+WriteAheadLog::WriteAheadLog(const std::string &dir) : dir_(dir) {
+  pending_first_lsn_ = 0;
+  pending_num_ = 0;
+  first_pending_ms_ = 0;
+  next_lsn_ = 1;
+  durable_lsn_ = 0;
+  checkpoint_lsn_ = 0;
+  io_error_ = 0;
+  fd_ = -1;
+  segment_size_ = 0;
+  running_ = false;
+}
+
+WriteAheadLog::~WriteAheadLog() {
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    running_ = false;
+  }
+  flush_cv_.notify_all();
+  if (flush_thread_.joinable()) flush_thread_.join();
+  if (fd_ >= 0) {
+    close(fd_);
+    fd_ = -1;
+  }
+}
+
+int WriteAheadLog::Init(const WalOptions &options) {
+  options_ = options;
+  if (utils::make_dir(dir_.c_str())) {
+    LOG(ERROR) << "create wal directory error, path=" << dir_;
+    return -1;
+  }
+
+  std::string checkpoint_path = dir_ + "/" + kCheckpointFile;
+  if (utils::file_exist(checkpoint_path)) {
+    std::string content;
+    if (ReadFile(checkpoint_path, content)) {
+      LOG(ERROR) << "read wal checkpoint error, path=" << checkpoint_path;
+      return -1;
+    }
+    checkpoint_lsn_ = std::strtoll(content.c_str(), nullptr, 10);
+  }
+
+  // the last lsn is in the last log file, drop its torn tail if any
+  int64_t last_lsn = checkpoint_lsn_;
+  std::vector<std::pair<int64_t, std::string>> segments;
+  ListSegments(segments);
+  if (segments.size() > 0) {
+    const std::string &path = segments.back().second;
+    std::string content;
+    if (ReadFile(path, content)) {
+      LOG(ERROR) << "read wal error, path=" << path;
+      return -1;
+    }
+    size_t valid_len = ScanRecords(content, nullptr, last_lsn);
+    if (valid_len < content.size()) {
+      LOG(WARNING) << "drop torn wal tail, path=" << path
+                   << ", valid length=" << valid_len
+                   << ", file length=" << content.size();
+      if (truncate(path.c_str(), (off_t)valid_len)) {
+        LOG(ERROR) << "truncate wal error, path=" << path;
+        return -1;
+      }
+    }
+  }
+  next_lsn_ = std::max(last_lsn, checkpoint_lsn_) + 1;
+  durable_lsn_ = next_lsn_ - 1;
+
+  running_ = true;
+  flush_thread_ = std::thread(&WriteAheadLog::FlushHandler, this);
+  LOG(INFO) << "init wal success, path=" << dir_
+            << ", checkpoint lsn=" << checkpoint_lsn_
+            << ", next lsn=" << next_lsn_;
+  return 0;
+}
+
+void WriteAheadLog::SetOptions(const WalOptions &options) {
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    options_ = options;
+  }
+  flush_cv_.notify_all();
+}
+
+int64_t WriteAheadLog::Append(WalRecordType type,
+                              const std::string &payload) {
+  std::string header(kRecordHeaderSize, '\0');
+  uint32_t len = payload.size();
+  memcpy(&header[0], &len, 4);
+  header[8] = static_cast<char>(type);
+
+  int64_t lsn = 0;
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    if (!running_ || io_error_) return -1;
+    lsn = next_lsn_++;
+    memcpy(&header[9], &lsn, 8);
+    uint32_t crc = Crc32((const uint8_t *)header.data() + 8, 1 + 8);
+    crc = Crc32((const uint8_t *)payload.data(), payload.size(), crc);
+    memcpy(&header[4], &crc, 4);
+
+    if (pending_.empty()) {
+      pending_first_lsn_ = lsn;
+      first_pending_ms_ = NowMs();
+    }
+    pending_.append(header);
+    pending_.append(payload);
+    ++pending_num_;
+  }
+  flush_cv_.notify_one();
+  return lsn;
+}
+
+int WriteAheadLog::WaitDurable(int64_t lsn) {
+  std::unique_lock<std::mutex> lk(mu_);
+  durable_cv_.wait(lk, [&]() {
+    return durable_lsn_ >= lsn || io_error_ != 0 || !running_;
+  });
+  return durable_lsn_ >= lsn ? 0 : -1;
+}
+
+int64_t WriteAheadLog::CheckpointLsn() {
+  std::lock_guard<std::mutex> lk(mu_);
+  return checkpoint_lsn_;
+}
+
+int64_t WriteAheadLog::LastLsn() {
+  std::lock_guard<std::mutex> lk(mu_);
+  return next_lsn_ - 1;
+}
+
+void WriteAheadLog::FlushHandler() {
+  std::unique_lock<std::mutex> lk(mu_);
+  while (true) {
+    flush_cv_.wait(lk, [&]() { return !running_ || !pending_.empty(); });
+    if (pending_.empty()) break;  // stopped
+
+    // a group of several writers grows until its window ends or it is large
+    // enough, a lone record doesn't wait for others
+    while (running_ && pending_num_ > 1 &&
+           pending_.size() < options_.group_commit_bytes) {
+      int64_t wait_ms = first_pending_ms_ + options_.group_commit_ms - NowMs();
+      if (wait_ms <= 0) break;
+      flush_cv_.wait_for(lk, std::chrono::milliseconds(wait_ms));
+    }
+
+    std::string group;
+    group.swap(pending_);
+    pending_num_ = 0;
+    int64_t first_lsn = pending_first_lsn_;
+    int64_t last_lsn = next_lsn_ - 1;
+    size_t segment_bytes = options_.segment_bytes;
+    lk.unlock();
+
+    int ret = 0;
+    if (fd_ < 0 || segment_size_ + group.size() > segment_bytes) {
+      ret = OpenSegment(first_lsn);
+    }
+    size_t written = 0;
+    while (ret == 0 && written < group.size()) {
+      ssize_t n = write(fd_, group.data() + written, group.size() - written);
+      if (n < 0) {
+        if (errno == EINTR) continue;
+        ret = -1;
+        break;
+      }
+      written += n;
+    }
+    if (ret == 0 && fdatasync(fd_) != 0) ret = -1;
+    segment_size_ += written;
+
+    lk.lock();
+    if (ret != 0) {
+      LOG(ERROR) << "write wal error, errno=" << errno << ", path=" << dir_;
+      io_error_ = ret;
+    } else {
+      durable_lsn_ = last_lsn;
+    }
+    durable_cv_.notify_all();
+  }
+}
+
+int WriteAheadLog::OpenSegment(int64_t first_lsn) {
+  if (fd_ >= 0) {
+    close(fd_);
+    fd_ = -1;
+  }
+  std::string path = dir_ + "/" + SegmentName(first_lsn);
+  fd_ = open(path.c_str(), O_WRONLY | O_CREAT | O_APPEND, 0644);
+  if (fd_ < 0) {
+    LOG(ERROR) << "open wal error, path=" << path;
+    return -1;
+  }
+  segment_size_ = 0;
+  // make the new file itself durable
+  SyncDir(dir_);
+  return 0;
+}
+
+int WriteAheadLog::ListSegments(
+    std::vector<std::pair<int64_t, std::string>> &segments) {
+  size_t prefix_len = strlen(kWalPrefix), suffix_len = strlen(kWalSuffix);
+  for (const std::string &path : utils::ls(dir_)) {
+    std::string name = path.substr(path.rfind('/') + 1);
+    if (name.size() <= prefix_len + suffix_len ||
+        name.compare(0, prefix_len, kWalPrefix) != 0 ||
+        name.compare(name.size() - suffix_len, suffix_len, kWalSuffix) != 0) {
+      continue;
+    }
+    int64_t first_lsn = std::strtoll(name.c_str() + prefix_len, nullptr, 10);
+    segments.emplace_back(first_lsn, dir_ + "/" + name);
+  }
+  std::sort(segments.begin(), segments.end());
+  return 0;
+}
+
+int WriteAheadLog::Replay(
+    const std::function<int(WalRecordType, const std::string &, int64_t)>
+        &apply) {
+  std::vector<std::pair<int64_t, std::string>> segments;
+  ListSegments(segments);
+  int64_t checkpoint_lsn = CheckpointLsn();
+
+  int64_t replayed = 0;
+  int ret = 0;
+  for (size_t i = 0; i < segments.size(); ++i) {
+    // all the records of this file are before the checkpoint
+    if (i + 1 < segments.size() && segments[i + 1].first <= checkpoint_lsn + 1)
+      continue;
+    std::string content;
+    if (ReadFile(segments[i].second, content)) {
+      LOG(ERROR) << "read wal error, path=" << segments[i].second;
+      return -1;
+    }
+    int64_t last_lsn = 0;
+    ScanRecords(
+        content,
+        [&](WalRecordType type, const std::string &payload, int64_t lsn) {
+          if (lsn <= checkpoint_lsn) return 0;
+          if (apply(type, payload, lsn)) {
+            LOG(ERROR) << "apply wal record error, lsn=" << lsn;
+            ret = -1;
+            return -1;
+          }
+          ++replayed;
+          return 0;
+        },
+        last_lsn);
+    if (ret) return ret;
+  }
+  LOG(INFO) << "replay wal success, replayed records=" << replayed
+            << ", checkpoint lsn=" << checkpoint_lsn;
+  return 0;
+}
+
+int WriteAheadLog::Checkpoint(int64_t lsn) {
+  std::lock_guard<std::mutex> checkpoint_lk(checkpoint_mu_);
+  if (lsn <= CheckpointLsn()) return 0;
+  std::string checkpoint_path = dir_ + "/" + kCheckpointFile;
+  std::string tmp_path = checkpoint_path + ".tmp";
+  {
+    std::string content = std::to_string(lsn);
+    utils::FileIO fio(tmp_path);
+    if (fio.Open("w") ||
+        fio.Write(content.data(), 1, content.size()) != content.size() ||
+        fflush(fio.fp) || fsync(fileno(fio.fp))) {
+      LOG(ERROR) << "write wal checkpoint error, path=" << tmp_path;
+      return -1;
+    }
+  }
+  if (rename(tmp_path.c_str(), checkpoint_path.c_str())) {
+    LOG(ERROR) << "rename wal checkpoint error, path=" << checkpoint_path;
+    return -1;
+  }
+  // the files are removed only after the new checkpoint is durable
+  if (SyncDir(dir_)) {
+    LOG(ERROR) << "sync wal directory error, path=" << dir_;
+    return -1;
+  }
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    checkpoint_lsn_ = lsn;
+  }
+
+  // a file can be removed when the next one starts after the checkpoint,
+  // the last file may still be written
+  std::vector<std::pair<int64_t, std::string>> segments;
+  ListSegments(segments);
+  for (size_t i = 0; i + 1 < segments.size(); ++i) {
+    if (segments[i + 1].first > lsn + 1) break;
+    if (remove(segments[i].second.c_str())) {
+      LOG(ERROR) << "remove wal error, path=" << segments[i].second;
+    }
+  }
+  return 0;
+}
+
+}  // namespace tig_gamma
@@ -0,0 +1,125 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <stdint.h>
+
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+namespace tig_gamma {
+
+enum class WalRecordType : std::uint8_t {
+  ADD_DOCS = 1,
+  DELETE_DOCS = 2,
+  ADD_COLUMNS = 3
+};
+
+struct WalOptions {
+  // a group of records of several writers is synced at most this long after
+  // its first record, 0 for syncing every commit at once. A lone record is
+  // synced at once
+  int group_commit_ms;
+  // a group is synced as soon as this many bytes are pending
+  size_t group_commit_bytes;
+  // roll to a new log file after this size
+  size_t segment_bytes;
+
+  WalOptions() {
+    group_commit_ms = 10;
+    group_commit_bytes = 4 * 1024 * 1024;
+    segment_bytes = 256 * 1024 * 1024;
+  }
+};
+
+/**
+ * Append-only write-ahead log with group commit.
+ *
+ * A record is [payload length:4][crc32:4][type:1][lsn:8][payload], the crc
+ * covers the type, lsn and payload. Records are numbered by a log sequence
+ * number (lsn) and kept in files named by the lsn of their first record.
+ * Append() only buffers a record, a background thread writes the buffered
+ * records and calls fdatasync once per group, WaitDurable() returns after
+ * the group of a record is synced. The records appended while a group is
+ * synced form the next group, which waits for more records only if it
+ * already has several.
+ */
+class WriteAheadLog {
+ public:
+  explicit WriteAheadLog(const std::string &dir);
+
+  ~WriteAheadLog();
+
+  int Init(const WalOptions &options);
+
+  void SetOptions(const WalOptions &options);
+
+  /**
+   * @return lsn of the record, -1 if failed
+   */
+  int64_t Append(WalRecordType type, const std::string &payload);
+
+  /**
+   * wait until the record of lsn is synced to disk
+   *
+   * @return 0 if successed
+   */
+  int WaitDurable(int64_t lsn);
+
+  /**
+   * apply the valid records after the checkpoint in order, a torn or corrupt
+   * tail is dropped
+   */
+  int Replay(const std::function<int(WalRecordType, const std::string &,
+                                     int64_t)> &apply);
+
+  /**
+   * the records up to lsn are persisted elsewhere, their files are removed
+   */
+  int Checkpoint(int64_t lsn);
+
+  int64_t CheckpointLsn();
+
+  int64_t LastLsn();
+
+ private:
+  void FlushHandler();
+
+  int OpenSegment(int64_t first_lsn);
+
+  int ListSegments(std::vector<std::pair<int64_t, std::string>> &segments);
+
+  std::string dir_;
+  WalOptions options_;
+
+  std::mutex mu_;
+  std::mutex checkpoint_mu_;  // one checkpoint at a time
+  std::condition_variable flush_cv_;
+  std::condition_variable durable_cv_;
+
+  std::string pending_;      // records which are not written yet
+  int64_t pending_first_lsn_;
+  int pending_num_;           // records in pending_
+  int64_t first_pending_ms_;  // when the first pending record is appended
+  int64_t next_lsn_;
+  int64_t durable_lsn_;
+  int64_t checkpoint_lsn_;
+  int io_error_;
+
+  int fd_;
+  size_t segment_size_;
+
+  bool running_;
+  std::thread flush_thread_;
+};
+
+}  // namespace tig_gamma
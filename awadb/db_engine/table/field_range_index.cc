@@ -7,8 +7,11 @@
 
 #include "field_range_index.h"
 
+#include <fcntl.h>
 #include <math.h>
 #include <string.h>
+#include <sys/mman.h>
+#include <unistd.h>
 
 #include <algorithm>
 #include <cassert>
@@ -308,6 +311,86 @@ class Node {
     }
   }
 
+  /**
+   * build an empty node from docids in ascending order at once
+   */
+  int Build(const int *vals, int n) {
+    int op_len = sizeof(BM_OPERATE_TYPE) * 8;
+    if (n <= 0) return 0;
+
+    min_ = vals[0];
+    max_ = vals[n - 1];
+    min_aligned_ = (min_ / op_len) * op_len;
+    max_aligned_ = (max_ / op_len + 1) * op_len - 1;
+    size_ = n;
+
+    // the same density rule as Add()
+    int offset = max_ - min_;
+    double density = (size_ * 1.) / offset;
+    if (offset > 100000 && density > 0.1) {
+      int bytes_count = -1;
+      if (bitmap::create(data_dense_, bytes_count,
+                         max_aligned_ - min_aligned_ + 1) != 0) {
+        LOG(ERROR) << "Cannot create bitmap!";
+        return -1;
+      }
+      for (int i = 0; i < n; ++i) {
+        bitmap::set(data_dense_, vals[i] - min_aligned_);
+      }
+      type_ = Dense;
+    } else {
+      capacity_ = n;
+      data_sparse_ = (int *)malloc(capacity_ * sizeof(int));
+      memcpy(data_sparse_, vals, n * sizeof(int));
+      type_ = Sparse;
+    }
+    return 0;
+  }
+
+  /**
+   * restore an empty node from its dumped data
+   */
+  int Restore(NodeType type, int min, int max, int min_aligned,
+              int max_aligned, int size, const char *data) {
+    min_ = min;
+    max_ = max;
+    min_aligned_ = min_aligned;
+    max_aligned_ = max_aligned;
+    size_ = size;
+    type_ = type;
+    if (type_ == Dense) {
+      int bytes_count = -1;
+      if (bitmap::create(data_dense_, bytes_count,
+                         max_aligned_ - min_aligned_ + 1) != 0) {
+        LOG(ERROR) << "Cannot create bitmap!";
+        return -1;
+      }
+      memcpy(data_dense_, data, DenseBytes());
+    } else {
+      capacity_ = size_ > 0 ? size_ : 1;
+      data_sparse_ = (int *)malloc(capacity_ * sizeof(int));
+      memcpy(data_sparse_, data, size_ * sizeof(int));
+    }
+    return 0;
+  }
+
+  // bytes of the dense bitmap in use
+  size_t DenseBytes() { return (size_t)(max_aligned_ - min_aligned_ + 1) / 8; }
+
+  // the docids of the node which are less than end
+  void GetValues(int end, std::vector<int> &vals) {
+    if (type_ == Dense) {
+      int offset = max_aligned_ - min_aligned_ + 1;
+      for (int i = 0; i < offset && i + min_aligned_ < end; ++i) {
+        if (bitmap::test(data_dense_, i)) vals.push_back(i + min_aligned_);
+      }
+    } else {
+      for (int i = 0; i < size_; ++i) {
+        if (data_sparse_[i] < end) vals.push_back(data_sparse_[i]);
+      }
+    }
+  }
+
   int Min() { return min_; }
   int Max() { return max_; }
 
@@ -369,6 +452,27 @@ class FieldRangeIndex {
 
   int Search(const string &tags, RangeQueryResult *result);
 
+  /**
+   * add (raw value, docid) pairs at once, the keys are sorted and the nodes
+   * of new keys are built directly
+   */
+  int BulkAdd(std::vector<std::pair<std::string, int>> &values);
+
+  /**
+   * write the sorted keys and their nodes with the docids less than doc_num
+   *
+   * @return 0 if successed
+   */
+  int Dump(const std::string &file, int doc_num);
+
+  /**
+   * load the keys and nodes dumped by Dump() into an empty index
+   *
+   * @return the doc num of the dump, < 0 if failed or the dump has more
+   *         than max_doc_num docs
+   */
+  int Load(const std::string &file, int max_doc_num);
+
   bool IsNumeric() { return is_numeric_; }
 
   char *Delim() { return kDelim_; }
@@ -377,6 +481,12 @@ class FieldRangeIndex {
   long ScanMemory(long &dense, long &sparse);
 
  private:
+  // call visit for every key and node in the order of keys
+  void ForEachNode(
+      const std::function<void(const unsigned char *, uint, Node *)> &visit);
+
+  int InsertNode(BtDb *bt, unsigned char *key, uint key_len, Node *p_node);
+
   BtMgr *main_mgr_;
 #ifndef __APPLE__
   BtMgr *cache_mgr_;
@@ -505,6 +615,27 @@ static int ReverseEndian(const unsigned char *in, unsigned char *out,
   return 0;
 }
 
+int FieldRangeIndex::InsertNode(BtDb *bt, unsigned char *key, uint key_len,
+                                Node *p_node) {
+#ifdef __APPLE__
+  BTERR bterr = bt_insertkey(bt, key, key_len, 0, static_cast<void *>(&p_node),
+                             sizeof(Node *), Update);
+  if (bterr) {
+    LOG(ERROR) << "Error " << bt->err;
+    return -1;
+  }
+#else
+  BTERR bterr = bt_insertkey(bt->main, key, key_len, 0,
+                             static_cast<void *>(&p_node), sizeof(Node *),
+                             Unique);
+  if (bterr) {
+    LOG(ERROR) << "Error " << bt->mgr->err;
+    return -1;
+  }
+#endif
+  return 0;
+}
+
 int FieldRangeIndex::Add(std::string &key, int value) {
 #ifdef __APPLE__
   BtDb *bt = bt_open(main_mgr_);
@@ -523,21 +654,7 @@ int FieldRangeIndex::Add(std::string &key, int value) {
         if (ret < 0) {
           p_node = new Node;
           p_node->Add(value);
-#ifdef __APPLE__
-          BTERR bterr = bt_insertkey(bt, key_to_add, key_len, 0,
-                                     static_cast<void *>(&p_node),
-                                     sizeof(Node *), Update);
-          if (bterr) {
-            LOG(ERROR) << "Error " << bt->err;
-          }
-#else
-          BTERR bterr = bt_insertkey(bt->main, key_to_add, key_len, 0,
-                                     static_cast<void *>(&p_node),
-                                     sizeof(Node *), Unique);
-          if (bterr) {
-            LOG(ERROR) << "Error " << bt->mgr->err;
-          }
-#endif
+          InsertNode(bt, key_to_add, key_len, p_node);
         } else {
           pthread_rwlock_wrlock(&rw_lock_);
           p_node->Add(value);
@@ -896,6 +1013,336 @@ long FieldRangeIndex::ScanMemory(long &dense, long &sparse) {
   return total;
 }
 
+void FieldRangeIndex::ForEachNode(
+    const std::function<void(const unsigned char *, uint, Node *)> &visit) {
+#ifdef __APPLE__
+  BtDb *bt = bt_open(main_mgr_);
+
+  uint slot = bt_startkey(bt, nullptr, 0);
+  while (slot) {
+    BtKey *key = bt_key(bt, slot);
+    BtVal *val = bt_val(bt, slot);
+    if (val->len == 0) {
+      slot = bt_nextkey(bt, slot);
+      continue;
+    }
+    Node *p_node = nullptr;
+    memcpy(&p_node, val->value, sizeof(Node *));
+    visit(key->key, key->len, p_node);
+    slot = bt_nextkey(bt, slot);
+  }
+#else
+  BtDb *bt = bt_open(cache_mgr_, main_mgr_);
+
+  if (bt_startkey(bt, nullptr, 0) == 0) {
+    while (bt_nextkey(bt)) {
+      if (bt->phase == 1) {
+        Node *p_node = nullptr;
+        memcpy(&p_node, bt->mainval->value, sizeof(Node *));
+        visit(bt->mainkey->key, bt->mainkey->len, p_node);
+      }
+    }
+  }
+
+  bt_unlockpage(BtLockRead, bt->cacheset->latch, __LINE__);
+  bt_unpinlatch(bt->cacheset->latch);
+
+  bt_unlockpage(BtLockRead, bt->mainset->latch, __LINE__);
+  bt_unpinlatch(bt->mainset->latch);
+#endif
+
+  bt_close(bt);
+}
+
+int FieldRangeIndex::BulkAdd(std::vector<std::pair<std::string, int>> &values) {
+  // turn the raw values into the keys of the tree
+  std::vector<std::pair<std::string, int>> keys;
+  keys.reserve(values.size());
+  for (auto &value : values) {
+    size_t key_len = value.first.size();
+    if (key_len == 0) continue;
+    if (is_numeric_) {
+      std::string key(key_len, '\0');
+      ReverseEndian((const unsigned char *)value.first.data(),
+                    (unsigned char *)&key[0], key_len);
+      keys.emplace_back(std::move(key), value.second);
+    } else {
+      char key_s[key_len + 1];
+      memcpy(key_s, value.first.data(), key_len);
+      key_s[key_len] = 0;
+
+      char *p, *k;
+      k = strtok_r(key_s, kDelim_, &p);
+      while (k != nullptr) {
+        keys.emplace_back(std::string(k), value.second);
+        k = strtok_r(NULL, kDelim_, &p);
+      }
+    }
+  }
+  std::sort(keys.begin(), keys.end());
+  keys.erase(std::unique(keys.begin(), keys.end()), keys.end());
+
+#ifdef __APPLE__
+  BtDb *bt = bt_open(main_mgr_);
+#else
+  BtDb *bt = bt_open(cache_mgr_, main_mgr_);
+#endif
+  std::vector<int> docids;
+  size_t i = 0;
+  while (i < keys.size()) {
+    docids.clear();
+    size_t j = i;
+    for (; j < keys.size() && keys[j].first == keys[i].first; ++j) {
+      docids.push_back(keys[j].second);
+    }
+
+    unsigned char *key = (unsigned char *)&keys[i].first[0];
+    uint key_len = keys[i].first.size();
+    Node *p_node = nullptr;
+    int ret = bt_findkey(bt, key, key_len, (unsigned char *)&p_node,
+                         sizeof(Node *));
+    if (ret < 0) {
+      p_node = new Node;
+      if (p_node->Build(docids.data(), docids.size()) ||
+          InsertNode(bt, key, key_len, p_node)) {
+        delete p_node;
+      }
+    } else {
+      pthread_rwlock_wrlock(&rw_lock_);
+      for (int docid : docids) {
+        p_node->Add(docid);
+      }
+      pthread_rwlock_unlock(&rw_lock_);
+    }
+    i = j;
+  }
+  bt_close(bt);
+  return 0;
+}
+
+namespace {
+
+const char kRangeIndexMagic[4] = {'F', 'R', 'I', 'X'};
+const uint32_t kRangeIndexVersion = 1;
+
+// magic, version, doc num, is numeric, key num
+const size_t kRangeIndexHeaderSize = sizeof(kRangeIndexMagic) +
+                                     sizeof(uint32_t) + sizeof(int32_t) +
+                                     sizeof(uint8_t) + sizeof(uint64_t);
+
+struct NodeHeader {
+  uint8_t type;
+  int32_t min;
+  int32_t max;
+  int32_t min_aligned;
+  int32_t max_aligned;
+  int32_t size;
+} __attribute__((packed));
+
+}  // namespace
+
+/**
+ * The file has a header followed by the keys in order, each key is
+ * [key len:1][key][NodeHeader][data], the data of a dense node is its
+ * bitmap and the data of a sparse node is its docids.
+ */
+int FieldRangeIndex::Dump(const std::string &file, int doc_num) {
+  std::string tmp_file = file + ".tmp";
+  FILE *fp = fopen(tmp_file.c_str(), "wb");
+  if (fp == nullptr) {
+    LOG(ERROR) << "open range index file error, path=" << tmp_file;
+    return IO_ERR;
+  }
+
+  int32_t dump_doc_num = doc_num;
+  uint8_t is_numeric = is_numeric_ ? 1 : 0;
+  uint64_t key_num = 0;
+  fwrite(kRangeIndexMagic, sizeof(kRangeIndexMagic), 1, fp);
+  fwrite(&kRangeIndexVersion, sizeof(kRangeIndexVersion), 1, fp);
+  fwrite(&dump_doc_num, sizeof(dump_doc_num), 1, fp);
+  fwrite(&is_numeric, sizeof(is_numeric), 1, fp);
+  fwrite(&key_num, sizeof(key_num), 1, fp);
+
+  bool write_error = false;
+  std::vector<int> docids;
+  pthread_rwlock_rdlock(&rw_lock_);
+  ForEachNode([&](const unsigned char *key, uint key_len, Node *p_node) {
+    if (write_error || p_node->Size() <= 0) return;
+    // the docids added after doc_num are left to the next load
+    Node filtered;
+    if (p_node->Max() >= doc_num) {
+      docids.clear();
+      p_node->GetValues(doc_num, docids);
+      std::sort(docids.begin(), docids.end());
+      if (docids.size() == 0 || filtered.Build(docids.data(), docids.size())) {
+        return;
+      }
+      p_node = &filtered;
+    }
+
+    uint8_t len = key_len;
+    NodeHeader header;
+    header.type = p_node->Type() == Node::Dense ? 1 : 0;
+    header.min = p_node->Min();
+    header.max = p_node->Max();
+    header.min_aligned = p_node->MinAligned();
+    header.max_aligned = p_node->MaxAligned();
+    header.size = p_node->Size();
+    const void *data = nullptr;
+    size_t data_len = 0;
+    if (p_node->Type() == Node::Dense) {
+      data = p_node->DataDense();
+      data_len = p_node->DenseBytes();
+    } else {
+      data = p_node->DataSparse();
+      data_len = (size_t)p_node->Size() * sizeof(int);
+    }
+    if (fwrite(&len, sizeof(len), 1, fp) != 1 ||
+        fwrite(key, key_len, 1, fp) != 1 ||
+        fwrite(&header, sizeof(header), 1, fp) != 1 ||
+        (data_len > 0 && fwrite(data, data_len, 1, fp) != 1)) {
+      write_error = true;
+      return;
+    }
+    ++key_num;
+  });
+  pthread_rwlock_unlock(&rw_lock_);
+
+  if (!write_error) {
+    fseek(fp, kRangeIndexHeaderSize - sizeof(key_num), SEEK_SET);
+    write_error = fwrite(&key_num, sizeof(key_num), 1, fp) != 1 ||
+                  fflush(fp) != 0 || fsync(fileno(fp)) != 0;
+  }
+  fclose(fp);
+  if (write_error || rename(tmp_file.c_str(), file.c_str())) {
+    LOG(ERROR) << "write range index file error, path=" << file;
+    remove(tmp_file.c_str());
+    return IO_ERR;
+  }
+  return 0;
+}
+
+int FieldRangeIndex::Load(const std::string &file, int max_doc_num) {
+  long file_size = utils::get_file_size(file.c_str());
+  if (file_size < (long)kRangeIndexHeaderSize) {
+    LOG(ERROR) << "invalid range index file, path=" << file
+               << ", size=" << file_size;
+    return -1;
+  }
+  int fd = open(file.c_str(), O_RDONLY);
+  if (fd == -1) {
+    LOG(ERROR) << "open range index file error, path=" << file;
+    return -1;
+  }
+  void *addr = mmap(nullptr, file_size, PROT_READ, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (addr == MAP_FAILED) {
+    LOG(ERROR) << "mmap range index file error, path=" << file;
+    return -1;
+  }
+  madvise(addr, file_size, MADV_SEQUENTIAL);
+
+  const char *data = (const char *)addr;
+  const char *end = data + file_size;
+  uint32_t version = 0;
+  int32_t doc_num = 0;
+  uint8_t is_numeric = 0;
+  uint64_t key_num = 0;
+  const char *p = data + sizeof(kRangeIndexMagic);
+  memcpy(&version, p, sizeof(version));
+  p += sizeof(version);
+  memcpy(&doc_num, p, sizeof(doc_num));
+  p += sizeof(doc_num);
+  memcpy(&is_numeric, p, sizeof(is_numeric));
+  p += sizeof(is_numeric);
+  memcpy(&key_num, p, sizeof(key_num));
+  p += sizeof(key_num);
+
+  if (memcmp(data, kRangeIndexMagic, sizeof(kRangeIndexMagic)) ||
+      version != kRangeIndexVersion || (is_numeric != 0) != is_numeric_) {
+    LOG(ERROR) << "invalid range index file header, path=" << file;
+    munmap(addr, file_size);
+    return -1;
+  }
+  if (doc_num < 0 || doc_num > max_doc_num) {
+    LOG(ERROR) << "range index file has " << doc_num << " docs, but only "
+               << max_doc_num << " are loaded, path=" << file;
+    munmap(addr, file_size);
+    return -1;
+  }
+
+  // parse all nodes first so that a broken file changes nothing
+  std::vector<std::pair<std::string, Node *>> nodes;
+  nodes.reserve(key_num);
+  int ret = 0;
+  for (uint64_t i = 0; i < key_num; ++i) {
+    uint8_t key_len = 0;
+    NodeHeader header;
+    if (p + sizeof(key_len) > end) {
+      ret = FORMAT_ERR;
+      break;
+    }
+    memcpy(&key_len, p, sizeof(key_len));
+    p += sizeof(key_len);
+    if (p + key_len + sizeof(header) > end) {
+      ret = FORMAT_ERR;
+      break;
+    }
+    std::string key(p, key_len);
+    p += key_len;
+    memcpy(&header, p, sizeof(header));
+    p += sizeof(header);
+
+    Node::NodeType type = header.type ? Node::Dense : Node::Sparse;
+    size_t data_len = 0;
+    if (type == Node::Dense) {
+      data_len = (size_t)(header.max_aligned - header.min_aligned + 1) / 8;
+    } else {
+      data_len = (size_t)header.size * sizeof(int);
+    }
+    if (header.size < 0 || header.max_aligned < header.min_aligned ||
+        p + data_len > end) {
+      ret = FORMAT_ERR;
+      break;
+    }
+    Node *p_node = new Node;
+    if (p_node->Restore(type, header.min, header.max, header.min_aligned,
+                        header.max_aligned, header.size, p)) {
+      delete p_node;
+      ret = INTERNAL_ERR;
+      break;
+    }
+    p += data_len;
+    nodes.emplace_back(std::move(key), p_node);
+  }
+  munmap(addr, file_size);
+
+  if (ret) {
+    LOG(ERROR) << "load range index file error, path=" << file
+               << ", ret=" << ret;
+    for (auto &node : nodes) {
+      delete node.second;
+    }
+    return -1;
+  }
+
+#ifdef __APPLE__
+  BtDb *bt = bt_open(main_mgr_);
+#else
+  BtDb *bt = bt_open(cache_mgr_, main_mgr_);
+#endif
+  for (auto &node : nodes) {
+    if (InsertNode(bt, (unsigned char *)&node.first[0], node.first.size(),
+                   node.second)) {
+      delete node.second;
+    }
+  }
+  bt_close(bt);
+  LOG(INFO) << "load range index success, path=" << file
+            << ", key num=" << key_num << ", doc num=" << doc_num;
+  return doc_num;
+}
+
 MultiFieldsRangeIndex::MultiFieldsRangeIndex(std::string &path,
                                              Table *table)
     : path_(path) {
@@ -905,20 +1352,19 @@ MultiFieldsRangeIndex::MultiFieldsRangeIndex(std::string &path,
 
   b_operate_running_ = true;
   b_running_ = true;
+  pushed_ops_ = 0;
+  applied_ops_ = 0;
+  update_version_ = 0;
   field_operate_q_ = new FieldOperateQueue;
-  {
-    auto func_operate =
-        std::bind(&MultiFieldsRangeIndex::FieldOperateWorker, this);
-    std::thread t(func_operate);
-    t.detach();
-  }
+  operate_thread_ =
+      std::thread(&MultiFieldsRangeIndex::FieldOperateWorker, this);
 }
 
 MultiFieldsRangeIndex::~MultiFieldsRangeIndex() {
   b_running_ = false;
-  while (field_operate_q_->size() > 0) {
-    std::this_thread::sleep_for(std::chrono::seconds(1));
-  }
+  // the worker stops at the null operate after applying the ones before it
+  field_operate_q_->push(nullptr);
+  if (operate_thread_.joinable()) operate_thread_.join();
   for (size_t i = 0; i < fields_.size(); i++) {
     if (fields_[i]) {
       delete fields_[i];
@@ -931,25 +1377,49 @@ MultiFieldsRangeIndex::~MultiFieldsRangeIndex() {
 }
 
 void MultiFieldsRangeIndex::FieldOperateWorker() {
-  bool ret = false;
-  while (b_running_ || ret) {
+  while (true) {
     FieldOperate *field_op = nullptr;
-    ret = field_operate_q_->try_pop(field_op);
-
-    if (not ret) {
-      std::this_thread::sleep_for(std::chrono::milliseconds(10));
-      continue;
-    }
+    field_operate_q_->pop(field_op);
+    if (field_op == nullptr) break;
 
     int doc_id = field_op->doc_id;
     int field_id = field_op->field_id;
 
-    auto op = field_op->type;
-    if (op == FieldOperate::ADD) {
-      AddDoc(doc_id, field_id);
-    } else {
-      DeleteDoc(doc_id, field_id, field_op->value);
+    bool apply = true;
+    if (field_op->type == FieldOperate::ADD) {
+      // the values of an added doc are read now, a delete of the doc waits
+      // for the reading instead of reading a value which is changed later
+      std::unique_lock<std::mutex> lk(pending_mutex_);
+      if (field_op->state == FieldOperate::CANCELED) {
+        apply = false;
+      } else {
+        field_op->state = FieldOperate::READING;
+        lk.unlock();
+        GetKeys(doc_id, field_id, field_op->values);
+        lk.lock();
+        field_op->state = FieldOperate::READ;
+        auto ite = pending_adds_.find(PendingKey(doc_id, field_id));
+        if (ite != pending_adds_.end() && ite->second == field_op) {
+          pending_adds_.erase(ite);
+        }
+        lk.unlock();
+        pending_cv_.notify_all();
+      }
+    }
+
+    if (apply) {
+      std::lock_guard<std::mutex> lk(build_mutex_);
+      if (field_op->type == FieldOperate::ADD) {
+        AddDoc(doc_id, field_id, field_op->values);
+      } else {
+        DeleteDoc(doc_id, field_id, field_op->values);
+      }
+    }
+    {
+      std::lock_guard<std::mutex> lk(applied_mutex_);
+      ++applied_ops_;
     }
+    applied_cv_.notify_all();
 
     delete field_op;
   }
@@ -963,7 +1433,13 @@ int MultiFieldsRangeIndex::Add(int docid, int field) {
     return 0;
   }
   FieldOperate *field_op = new FieldOperate(FieldOperate::ADD, docid, field);
+  {
+    std::lock_guard<std::mutex> lk(pending_mutex_);
+    pending_adds_[PendingKey(docid, field)] = field_op;
+  }
 
+  // counted before it is queued, see WaitForOperates()
+  ++pushed_ops_;
   field_operate_q_->push(field_op);
 
   return 0;
@@ -974,52 +1450,250 @@ int MultiFieldsRangeIndex::Delete(int docid, int field) {
   if (index == nullptr) {
     return 0;
   }
-  FieldOperate *field_op = new FieldOperate(FieldOperate::DELETE, docid, field);
-  table_->GetFieldRawValue(docid, field, field_op->value);
 
-  while (field_operate_q_->size()) {
-    std::this_thread::sleep_for(std::chrono::milliseconds(10));
+  FieldOperate *field_op = new FieldOperate(FieldOperate::DELETE, docid, field);
+  {
+    std::unique_lock<std::mutex> lk(pending_mutex_);
+    auto ite = pending_adds_.find(PendingKey(docid, field));
+    if (ite != pending_adds_.end() &&
+        ite->second->state == FieldOperate::READING) {
+      pending_cv_.wait(lk, [&]() {
+        ite = pending_adds_.find(PendingKey(docid, field));
+        return ite == pending_adds_.end() ||
+               ite->second->state != FieldOperate::READING;
+      });
+    }
+    if (ite != pending_adds_.end() &&
+        ite->second->state == FieldOperate::PENDING) {
+      // the doc is not in the index yet, so the add is dropped instead
+      ite->second->state = FieldOperate::CANCELED;
+      pending_adds_.erase(ite);
+      delete field_op;
+      field_op = nullptr;
+    }
+  }
+  if (field_op) {
+    GetKeys(docid, field, field_op->values);
+    ++pushed_ops_;
+    field_operate_q_->push(field_op);
   }
 
-
-  field_operate_q_->push(field_op);
-
+  // the dumped index would still have the old key of the doc, it is
+  // counted after the delete is queued, see Dump()
+  ++update_version_;
+  std::lock_guard<std::mutex> lk(dump_mutex_);
+  RemoveDump();
   return 0;
 }
 
-int MultiFieldsRangeIndex::AddDoc(int docid, int field) {
+int MultiFieldsRangeIndex::AddDoc(int docid, int field,
+                                  std::vector<std::string> &keys) {
   FieldRangeIndex *index = fields_[field];
   if (index == nullptr) {
     return 0;
   }
 
+  for (size_t i = 0; i < keys.size(); i++)  {
+    index->Add(keys[i], docid);
+  }
+
+  return 0;
+}
+
+int MultiFieldsRangeIndex::GetKeys(int docid, int field,
+                                   std::vector<std::string> &keys) {
   std::string key;
   int ret = table_->GetFieldRawValue(docid, field, key);
   if (ret != 0)  {
-    std::vector<std::string> keys;
-
     if (table_->GetColFieldRawValue(docid, (uint8_t)field, keys))
       return -1;
-   
-    for (size_t i = 0; i < keys.size(); i++)  {
-      index->Add(keys[i], docid);
+    return 0;
+  }
+  keys.push_back(std::move(key));
+  return 0;
+}
+
+void MultiFieldsRangeIndex::WaitForOperates() {
+  // the queue is applied in order, so the operates queued before are done
+  // once as many operates are applied
+  long pushed = pushed_ops_;
+  std::unique_lock<std::mutex> lk(applied_mutex_);
+  applied_cv_.wait(lk, [&]() { return applied_ops_ >= pushed; });
+}
+
+int MultiFieldsRangeIndex::BuildFields(int start_docid, int end_docid,
+                                       const std::vector<int> &fields) {
+  std::atomic<size_t> next(0);
+  std::atomic<int> ret(0);
+  auto build = [&]() {
+    std::vector<std::pair<std::string, int>> values;
+    std::vector<std::string> keys;
+    for (size_t i = next++; i < fields.size(); i = next++) {
+      int field = fields[i];
+      FieldRangeIndex *index = fields_[field];
+      // a chunk of docs at a time to bound the memory of the pairs
+      for (int begin = start_docid; begin < end_docid;
+           begin += kBulkBuildChunkDocs) {
+        int end = std::min(end_docid, begin + kBulkBuildChunkDocs);
+        values.clear();
+        for (int docid = begin; docid < end; ++docid) {
+          keys.clear();
+          if (GetKeys(docid, field, keys)) continue;
+          for (std::string &key : keys) {
+            values.emplace_back(std::move(key), docid);
+          }
+        }
+        if (index->BulkAdd(values)) {
+          LOG(ERROR) << "bulk add range index error, field=" << field;
+          ret = INTERNAL_ERR;
+          break;
+        }
+      }
     }
-    return 0; 
-  } 
-  index->Add(key, docid);
+  };
 
-  return 0;
+  size_t thread_num = std::min<size_t>(
+      fields.size(), std::max(1u, std::thread::hardware_concurrency()));
+  std::vector<std::thread> threads;
+  for (size_t i = 1; i < thread_num; ++i) {
+    threads.emplace_back(build);
+  }
+  build();
+  for (std::thread &t : threads) {
+    t.join();
+  }
+  return ret;
+}
+
+int MultiFieldsRangeIndex::BulkBuild(int start_docid, int end_docid,
+                                     const std::vector<int> &fields) {
+  std::vector<int> build_fields;
+  for (int field : fields) {
+    if (field >= 0 && (size_t)field < fields_.size() && fields_[field] &&
+        std::find(build_fields.begin(), build_fields.end(), field) ==
+            build_fields.end()) {
+      build_fields.push_back(field);
+    }
+  }
+  if (start_docid >= end_docid || build_fields.size() == 0) return 0;
+
+  std::lock_guard<std::mutex> lk(build_mutex_);
+  double start = utils::getmillisecs();
+  int ret = BuildFields(start_docid, end_docid, build_fields);
+  LOG(INFO) << "bulk build range index of " << build_fields.size()
+            << " fields, docid [" << start_docid << ", " << end_docid
+            << "), cost " << utils::getmillisecs() - start << "ms";
+  return ret;
+}
+
+int MultiFieldsRangeIndex::Dump(const std::string &dir, int doc_num) {
+  long update_version = update_version_;
+  // the docs before doc_num may be still queued
+  WaitForOperates();
+
+  if (utils::make_dir(dir.c_str())) {
+    LOG(ERROR) << "mkdir error, path=" << dir;
+    return IO_ERR;
+  }
+  int ret = 0;
+  for (size_t i = 0; i < fields_.size(); ++i) {
+    if (fields_[i] == nullptr) continue;
+    // every field file stands alone, a failed one is rebuilt on load
+    int field_ret = fields_[i]->Dump(FieldDumpFile(dir, i), doc_num);
+    if (field_ret) {
+      LOG(ERROR) << "dump range index error, field=" << i
+                 << ", ret=" << field_ret;
+      ret = field_ret;
+    }
+  }
+
+  std::lock_guard<std::mutex> lk(dump_mutex_);
+  dump_dir_ = dir;
+  // a doc deleted or updated during the dump may be dumped with its old key
+  if (update_version_ != update_version) {
+    RemoveDump();
+  }
+  return ret;
+}
+
+int MultiFieldsRangeIndex::Load(const std::string &dir, int doc_num) {
+  std::lock_guard<std::mutex> lk(build_mutex_);
+  double start = utils::getmillisecs();
+  // the docs of every field from its dump to doc_num are built in bulk
+  std::vector<int> fields;
+  std::vector<int> loaded_nums;
+  for (size_t i = 0; i < fields_.size(); ++i) {
+    if (fields_[i] == nullptr) continue;
+    fields.push_back(i);
+    loaded_nums.push_back(0);
+  }
+
+  std::atomic<size_t> next(0);
+  std::atomic<int> ret(0);
+  auto load = [&]() {
+    for (size_t i = next++; i < fields.size(); i = next++) {
+      int field = fields[i];
+      std::string file = FieldDumpFile(dir, field);
+      if (dir != "" && utils::file_exist(file)) {
+        int loaded_num = fields_[field]->Load(file, doc_num);
+        if (loaded_num > 0) loaded_nums[i] = loaded_num;
+      }
+      if (BuildFields(loaded_nums[i], doc_num, {field})) {
+        ret = INTERNAL_ERR;
+      }
+    }
+  };
+
+  size_t thread_num = std::min<size_t>(
+      fields.size(), std::max(1u, std::thread::hardware_concurrency()));
+  std::vector<std::thread> threads;
+  for (size_t i = 1; i < thread_num; ++i) {
+    threads.emplace_back(load);
+  }
+  load();
+  for (std::thread &t : threads) {
+    t.join();
+  }
+
+  {
+    std::lock_guard<std::mutex> dump_lk(dump_mutex_);
+    dump_dir_ = dir;
+  }
+  LOG(INFO) << "load range index of " << fields.size() << " fields, doc num="
+            << doc_num << ", dumped doc num=" << utils::join(loaded_nums.data(), loaded_nums.size(), ',')
+            << ", cost " << utils::getmillisecs() - start << "ms";
+  return ret;
+}
+
+bool MultiFieldsRangeIndex::Dumped(const std::string &dir) {
+  std::lock_guard<std::mutex> lk(dump_mutex_);
+  return dump_dir_ != "" && dump_dir_ == dir;
+}
+
+std::string MultiFieldsRangeIndex::FieldDumpFile(const std::string &dir,
+                                                 int field) {
+  return dir + "/field_" + std::to_string(field) + ".idx";
+}
+
+void MultiFieldsRangeIndex::RemoveDump() {
+  if (dump_dir_ == "") return;
+  if (utils::remove_dir(dump_dir_.c_str())) {
+    LOG(ERROR) << "remove range index dump error, path=" << dump_dir_;
+  }
+  dump_dir_ = "";
 }
 
-int MultiFieldsRangeIndex::DeleteDoc(int docid, int field, std::string &key) {
+int MultiFieldsRangeIndex::DeleteDoc(int docid, int field,
+                                     std::vector<std::string> &keys) {
   FieldRangeIndex *index = fields_[field];
   if (index == nullptr) {
     return 0;
   }
 
-  if (key.length() == 0)  return -1;
-
-  index->Delete(key, docid);
+  for (std::string &key : keys) {
+    if (key.length() == 0) continue;
+    index->Delete(key, docid);
+  }
 
   return 0;
 }
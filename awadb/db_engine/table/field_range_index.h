@@ -7,8 +7,13 @@
 
 #pragma once
 
+#include <atomic>
+#include <condition_variable>
 #include <map>
+#include <mutex>
 #include <string>
+#include <thread>
+#include <unordered_map>
 #include <vector>
 #include <tbb/concurrent_queue.h>
 
@@ -18,6 +23,11 @@
 
 #define    STR_MAX_INDEX_LEN    2048
 
+// batches of at least this many docs are added to the range index in bulk
+const int kBulkBuildMinDocs = 10000;
+// docs whose values are sorted together in a bulk build
+const int kBulkBuildChunkDocs = 1 << 20;
+
 namespace tig_gamma {
 
 enum class FilterOperator : uint8_t { And = 0, Or, Not };
@@ -32,13 +42,16 @@ typedef struct {
 class FieldOperate {
  public:
   typedef enum { ADD, DELETE } operate_type;
+  // an add reads the values of the doc when it is applied
+  typedef enum { PENDING, READING, READ, CANCELED } operate_state;
   explicit FieldOperate(operate_type type, int doc_id, int field_id)
-      : type(type), doc_id(doc_id), field_id(field_id) {}
+      : type(type), doc_id(doc_id), field_id(field_id), state(PENDING) {}
 
   operate_type type;
   int doc_id;
   int field_id;
-  std::string value;
+  operate_state state;
+  std::vector<std::string> values;
 };
 
 typedef tbb::concurrent_bounded_queue<FieldOperate *> FieldOperateQueue;
@@ -60,6 +73,36 @@ class MultiFieldsRangeIndex {
   int Search(const std::vector<FilterInfo> &origin_filters,
              MultiRangeQueryResults *out);
 
+  /**
+   * add the docs in [start_docid, end_docid) of the fields at once, the
+   * fields are built in parallel
+   *
+   * @return 0 if successed
+   */
+  int BulkBuild(int start_docid, int end_docid, const std::vector<int> &fields);
+
+  /**
+   * write every field with the docs less than doc_num into dir, the dump is
+   * removed once a doc is deleted or updated
+   *
+   * @return 0 if successed
+   */
+  int Dump(const std::string &dir, int doc_num);
+
+  /**
+   * load the fields dumped into dir and build the docs after the dump up to
+   * doc_num in bulk, an empty dir builds all docs
+   *
+   * @return 0 if successed
+   */
+  int Load(const std::string &dir, int doc_num);
+
+  /**
+   * whether the dump in dir is still valid, the docs added after it are
+   * built from the table when loading
+   */
+  bool Dumped(const std::string &dir);
+
   // for debug
   long MemorySize(long &dense, long &sparse);
 
@@ -68,15 +111,48 @@ class MultiFieldsRangeIndex {
                 RangeQueryResult *out);
   void FieldOperateWorker();
 
-  int AddDoc(int docid, int field);
+  int AddDoc(int docid, int field, std::vector<std::string> &keys);
+
+  int DeleteDoc(int docid, int field, std::vector<std::string> &keys);
+
+  static long PendingKey(int docid, int field) {
+    return ((long)docid << 32) | (uint32_t)field;
+  }
+
+  int GetKeys(int docid, int field, std::vector<std::string> &keys);
+
+  // wait until the operates queued before are applied
+  void WaitForOperates();
+
+  int BuildFields(int start_docid, int end_docid,
+                  const std::vector<int> &fields);
+
+  std::string FieldDumpFile(const std::string &dir, int field);
+
+  void RemoveDump();
 
-  int DeleteDoc(int docid, int field, std::string &key);
   std::vector<FieldRangeIndex *> fields_;
   Table *table_;
   std::string path_;
   bool b_running_;
   bool b_operate_running_;
   FieldOperateQueue *field_operate_q_;
+  std::thread operate_thread_;
+  std::atomic<long> pushed_ops_;
+  long applied_ops_;
+  std::mutex applied_mutex_;
+  std::condition_variable applied_cv_;
+
+  // the queued adds whose values are not read yet, by docid and field
+  std::unordered_map<long, FieldOperate *> pending_adds_;
+  std::mutex pending_mutex_;
+  std::condition_variable pending_cv_;
+
+  // the queued operates and the bulk builds change the trees in turn
+  std::mutex build_mutex_;
+  std::mutex dump_mutex_;
+  std::string dump_dir_;  // where the fields are dumped, empty if none
+  std::atomic<long> update_version_;  // counts the deletes and updates
 };
 
 }  // namespace tig_gamma
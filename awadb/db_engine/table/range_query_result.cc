@@ -7,6 +7,8 @@
 
 #include "range_query_result.h"
 
+#include <algorithm>
+
 namespace tig_gamma {
 
 std::vector<int> RangeQueryResult::ToDocs() const {
@@ -65,4 +67,59 @@ std::vector<int> MultiRangeQueryResults::ToDocs() const {
   return docIDs;
 }
 
+int MultiRangeQueryResults::EstimateSize() const {
+  int size = -1;
+  for (auto &result : all_results_) {
+    // the size of a "not in" result is the number of excluded docs
+    if (result.NotIn() || result.Size() < 0) continue;
+    if (size < 0 || result.Size() < size) {
+      size = result.Size();
+    }
+  }
+  int text_size = static_cast<int>(text_filter_ids_.size());
+  if (text_size > 0 && (size < 0 || text_size < size)) {
+    size = text_size;
+  }
+  return size;
+}
+
+std::vector<int> MultiRangeQueryResults::MatchedDocs(int max_docid) const {
+  std::vector<int> docIDs;
+
+  if (all_results_.size() == 0) {
+    for (int id : text_filter_ids_) {
+      if (id < max_docid) docIDs.emplace_back(id);
+    }
+    return docIDs;
+  }
+
+  // walk through the shortest result and check the others
+  const RangeQueryResult *shortest = nullptr;
+  for (auto &result : all_results_) {
+    if (result.NotIn() || result.Size() < 0) continue;
+    if (shortest == nullptr || result.Size() < shortest->Size()) {
+      shortest = &result;
+    }
+  }
+
+  int start = std::max(min_, 0);
+  int end = std::min(max_, max_docid - 1);
+  if (shortest != nullptr) {
+    start = std::max(start, shortest->Min());
+    end = std::min(end, shortest->Max());
+  }
+  if (text_filter_ids_.size() > 0) {
+    for (int id : text_filter_ids_) {
+      if (id >= start && id <= end && Has(id)) docIDs.emplace_back(id);
+    }
+    return docIDs;
+  }
+
+  for (int id = start; id <= end; id++) {
+    if (shortest != nullptr && not shortest->Has(id)) continue;
+    if (Has(id)) docIDs.emplace_back(id);
+  }
+  return docIDs;
+}
+
 }  // namespace tig_gamma
@@ -137,7 +137,7 @@ class RangeQueryResult {
 
   void SetNotIn(bool b_not_in) { b_not_in_ = b_not_in; }
 
-  bool NotIn() { return b_not_in_; }
+  bool NotIn() const { return b_not_in_; }
 
   /**
    * @return sorted docIDs
@@ -239,6 +239,17 @@ class MultiRangeQueryResults {
    */
   std::vector<int> ToDocs() const;
 
+  /**
+   * @return the upper bound of the number of matched docs, -1 for unknown
+   */
+  int EstimateSize() const;
+
+  /** WARNING: build dynamically
+   * @param max_docid  docIDs are less than it
+   * @return sorted docIDs which match all the results
+   */
+  std::vector<int> MatchedDocs(int max_docid) const;
+
   const RangeQueryResult *GetAllResult() const { return &all_results_[0]; }
 
  private:
@@ -507,6 +507,127 @@ int Table::BatchAdd(int start_id, int batch_size, int docid,
   return 0;
 }
 
+int Table::CheckColumns(ColumnDocs &docs) {
+  bool has_key = false;
+  for (DocColumn &column : docs.TableColumns()) {
+    auto it = attr_type_map_.find(column.name);
+    if (it == attr_type_map_.end() ||
+        attr_offset_map_.find(column.name) == attr_offset_map_.end()) {
+      LOG(ERROR) << "column " << column.name << " is not a table field";
+      return -1;
+    }
+    if (it->second != column.datatype) {
+      LOG(ERROR) << "column " << column.name << " type ["
+                 << (int)column.datatype << "] != field type ["
+                 << (int)it->second << "]";
+      return -1;
+    }
+    if (column.datatype == DataType::STRING && column.offsets == nullptr) {
+      LOG(ERROR) << "string column " << column.name << " has no offsets";
+      return -1;
+    }
+    if (column.name == key_field_name_) has_key = true;
+  }
+  if (!has_key) {
+    LOG(ERROR) << "key column " << key_field_name_ << " is missing";
+    return -1;
+  }
+  return 0;
+}
+
+int Table::BulkAdd(int docid, ColumnDocs &docs, int start, int n) {
+#ifdef PERFORMANCE_TESTING
+  double begin = utils::getmillisecs();
+#endif
+  std::vector<DocColumn> &columns = docs.TableColumns();
+
+#pragma omp parallel for
+  for (int i = 0; i < n; ++i) {
+    std::string key = docs.Key(start + i);
+    if (id_type_ == 0) {
+      item_to_docid_.insert(utils::StringToInt64(key), docid + i);
+    } else {
+      long key_long = -1;
+      memcpy(&key_long, key.data(), sizeof(key_long));
+      item_to_docid_.insert(key_long, docid + i);
+    }
+  }
+
+  std::vector<std::string> missing_strs;
+  for (auto &it : attr_type_map_) {
+    if (it.second != DataType::STRING ||
+        attr_offset_map_.find(it.first) == attr_offset_map_.end()) {
+      continue;
+    }
+    bool found = false;
+    for (DocColumn &column : columns) {
+      if (column.name == it.first) found = true;
+    }
+    if (!found) missing_strs.push_back(it.first);
+  }
+
+  // the rows are built in blocks of about one storage batch write
+  int block_docs = kMaxBatchWriteBytes / item_length_;
+  if (block_docs < 1) block_docs = 1;
+  std::vector<uint8_t> rows((size_t)std::min(block_docs, n) * item_length_);
+
+  for (int begin_i = 0; begin_i < n; begin_i += block_docs) {
+    int num = std::min(block_docs, n - begin_i);
+    memset(rows.data(), 0, (size_t)num * item_length_);
+
+    for (DocColumn &column : columns) {
+      size_t offset = attr_offset_map_[column.name];
+      if (column.datatype != DataType::STRING) {
+        int type_size = FTypeSize(column.datatype);
+        const char *src = column.data + (size_t)(start + begin_i) * type_size;
+        for (int i = 0; i < num; ++i) {
+          memcpy(rows.data() + (size_t)i * item_length_ + offset,
+                 src + (size_t)i * type_size, type_size);
+        }
+        continue;
+      }
+      for (int i = 0; i < num; ++i) {
+        const char *value = nullptr;
+        size_t value_len = 0;
+        docs.GetValue(column, start + begin_i + i, value, value_len);
+        str_len_t len = value_len;
+        CheckStrLen(column.name, len);
+        uint32_t block_id;
+        in_block_pos_t in_block_pos;
+        storage_mgr_->AddString(value, len, block_id, in_block_pos);
+        SetStrPosition(rows.data() + (size_t)i * item_length_ + offset,
+                       block_id, in_block_pos, len);
+      }
+    }
+    for (const std::string &name : missing_strs) {
+      size_t offset = attr_offset_map_[name];
+      for (int i = 0; i < num; ++i) {
+        uint32_t block_id;
+        in_block_pos_t in_block_pos;
+        storage_mgr_->AddString("", 0, block_id, in_block_pos);
+        SetStrPosition(rows.data() + (size_t)i * item_length_ + offset,
+                       block_id, in_block_pos, 0);
+      }
+    }
+
+    int ret = storage_mgr_->BatchAdd(rows.data(), num);
+    if (ret != 0) {
+      LOG(ERROR) << "bulk add rows error, docid=" << docid + begin_i
+                 << ", ret=" << ret;
+      return ret;
+    }
+  }
+
+  LOG(INFO) << "bulk add " << n << " docs, docid [" << docid << ", "
+            << docid + n << ")";
+#ifdef PERFORMANCE_TESTING
+  LOG(INFO) << "table bulk add cost [" << utils::getmillisecs() - begin
+            << "]ms";
+#endif
+  last_docid_ = docid + n;
+  return 0;
+}
+
 int Table::Update(const std::vector<Field> &fields, int docid) {
   if (fields.size() == 0) return 0;
 
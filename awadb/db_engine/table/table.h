@@ -14,6 +14,7 @@
 
 #include "util/log.h"
 #include "c_api/api_data/gamma_batch_result.h"
+#include "c_api/api_data/gamma_column_docs.h"
 #include "c_api/api_data/gamma_doc.h"
 #include "c_api/api_data/gamma_table.h"
 #include "util/bitmap_manager.h"
@@ -64,6 +65,21 @@ class Table {
   int BatchAdd(int start_id, int batch_size, int docid,
                std::vector<Doc> &doc_vec, BatchResult &result);
 
+  /** check the table columns of docs are fields of the table with the same
+   * types, and the key column is given
+   *
+   * @return 0 if successed
+   */
+  int CheckColumns(ColumnDocs &docs);
+
+  /** add docs [start, start + n) of a batch stored by columns, the rows
+   * are built and written in blocks, the fields without a column are zero
+   *
+   * @param docid   doc index number of doc start
+   * @return 0 if successed
+   */
+  int BulkAdd(int docid, ColumnDocs &docs, int start, int n);
+
   /** update a doc
    *
    * @param doc     doc to update
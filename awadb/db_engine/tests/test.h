@@ -58,6 +58,16 @@ string kIVFPQParam = R"(
     }
 )";
 
+string kIVFPQ4Param = R"(
+    {
+        "nprobe" : 10,
+        "metric_type" : "L2",
+        "ncentroids" : 256,
+        "nsubvector" : 64,
+        "nbits_per_idx" : 4
+    }
+)";
+
 string kIVFPQOPQParam = R"(
     {
         "nprobe" : 10,
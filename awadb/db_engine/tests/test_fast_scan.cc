@@ -0,0 +1,193 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include <gtest/gtest.h>
+
+#include <map>
+#include <random>
+#include <vector>
+
+#include "faiss/IndexFlat.h"
+#include "faiss/IndexIVFPQ.h"
+#include "faiss/utils/Heap.h"
+#include "index/impl/gamma_index_ivfpq.h"
+#include "realtime/realtime_mem_data.h"
+
+namespace test {
+
+using tig_gamma::FastScanAccumulate;
+using tig_gamma::GammaIVFPQFastScanScanner;
+using tig_gamma::realtime::CodesBytes;
+using tig_gamma::realtime::GetCode;
+using tig_gamma::realtime::kCodeBlockSize;
+using tig_gamma::realtime::kDelIdxMask;
+using tig_gamma::realtime::SetCode;
+using idx_t = faiss::Index::idx_t;
+
+const int kSubDimension = 2;  // dimensions of a sub quantizer
+const int kKsub = 16;         // centroids of a 4-bit sub quantizer
+
+// every doc but the filtered ones is valid
+class FilterContext : public RetrievalContext {
+ public:
+  explicit FilterContext(int filtered) : filtered_(filtered) {}
+
+  bool IsValid(int id) const override { return id % filtered_ != 0; }
+
+  bool IsSimilarScoreValid(float score) const override { return true; }
+
+ private:
+  int filtered_;
+};
+
+// n random 4-bit codes of M sub quantizers, row by row
+static std::vector<uint8_t> RandomCodes(size_t n, size_t M,
+                                        std::mt19937 &rng) {
+  size_t code_size = (M + 1) / 2;
+  std::vector<uint8_t> codes(n * code_size);
+  for (uint8_t &c : codes) c = rng() & 0xff;
+  return codes;
+}
+
+// the codes of n vectors in blocks of kCodeBlockSize, the last one padded
+static std::vector<uint8_t> ToBlocks(const std::vector<uint8_t> &codes,
+                                     size_t n, size_t code_size) {
+  std::vector<uint8_t> blocks(CodesBytes(n, code_size, true), 0);
+  for (size_t i = 0; i < n; i++) {
+    SetCode(blocks.data(), i, codes.data() + i * code_size, code_size, true);
+  }
+  return blocks;
+}
+
+// sub quantizer m of a code, the low half of a byte comes first
+static int SubCode(const uint8_t *code, size_t m) {
+  return m % 2 == 0 ? code[m / 2] & 0x0f : code[m / 2] >> 4;
+}
+
+TEST(FastScanTest, Accumulate) {
+  std::mt19937 rng(1234);
+  for (size_t code_size : {1, 3, 4, 8}) {
+    for (size_t n : {1, 31, 32, 100}) {
+      std::vector<uint8_t> codes = RandomCodes(n, code_size * 2, rng);
+      std::vector<uint8_t> blocks = ToBlocks(codes, n, code_size);
+      ASSERT_EQ(blocks.size() % (kCodeBlockSize * code_size), 0);
+
+      std::vector<uint8_t> lut(code_size * 2 * kKsub);
+      for (uint8_t &v : lut) v = rng() & 0xff;
+
+      uint16_t accu[kCodeBlockSize];
+      for (size_t j0 = 0; j0 < n; j0 += kCodeBlockSize) {
+        FastScanAccumulate(code_size, lut.data(),
+                           blocks.data() + j0 * code_size, accu);
+        for (size_t i = 0; i < kCodeBlockSize && j0 + i < n; i++) {
+          std::vector<uint8_t> code(code_size);
+          GetCode(blocks.data(), j0 + i, code.data(), code_size, true);
+          ASSERT_EQ(code, std::vector<uint8_t>(
+                              codes.begin() + (j0 + i) * code_size,
+                              codes.begin() + (j0 + i + 1) * code_size));
+          int expected = 0;
+          for (size_t m = 0; m < code_size * 2; m++) {
+            expected += lut[m * kKsub + SubCode(code.data(), m)];
+          }
+          ASSERT_EQ(accu[i], expected)
+              << "code_size=" << code_size << ", n=" << n
+              << ", vector=" << j0 + i;
+        }
+      }
+    }
+  }
+}
+
+// the distances of the scanner against the ones of the decoded codes
+template <faiss::MetricType METRIC_TYPE, class C>
+static void CheckScanner(size_t M, size_t n) {
+  std::mt19937 rng(M * 1000 + n);
+  std::uniform_real_distribution<float> uniform(-1, 1);
+  int d = M * kSubDimension;
+  size_t code_size = (M + 1) / 2;
+
+  faiss::IndexFlatL2 coarse(d);
+  faiss::IndexIVFPQ ivfpq(&coarse, d, 1, M, 4, METRIC_TYPE);
+  ASSERT_EQ(ivfpq.pq.code_size, code_size);
+  ivfpq.by_residual = false;
+  for (float &v : ivfpq.pq.centroids) v = uniform(rng);
+
+  std::vector<float> query(d);
+  for (float &v : query) v = uniform(rng);
+  std::vector<uint8_t> codes = RandomCodes(n, M, rng);
+  std::vector<uint8_t> blocks = ToBlocks(codes, n, code_size);
+  std::vector<idx_t> ids(n);
+  for (size_t i = 0; i < n; i++) {
+    ids[i] = i;
+    if (i % 11 == 5) ids[i] |= kDelIdxMask;
+  }
+
+  FilterContext context(7);
+  GammaIVFPQFastScanScanner<METRIC_TYPE, C> scanner(ivfpq, false);
+  scanner.set_search_context(&context);
+  scanner.set_query(query.data());
+  scanner.set_list(0, 0);
+
+  std::vector<float> heap_sim(n);
+  std::vector<idx_t> heap_ids(n);
+  faiss::heap_heapify<C>(n, heap_sim.data(), heap_ids.data());
+  scanner.scan_codes(n, blocks.data(), ids.data(), heap_sim.data(),
+                     heap_ids.data(), n);
+  std::map<idx_t, float> scanned;
+  for (size_t i = 0; i < n; i++) {
+    if (heap_ids[i] >= 0) scanned[heap_ids[i]] = heap_sim[i];
+  }
+
+  // every entry of the quantized tables is rounded by half a step at most
+  ASSERT_GT(scanner.lut_scale, 0);
+  float max_error = M * 0.5f / scanner.lut_scale + 1e-4f;
+  size_t valid_num = 0;
+  for (size_t i = 0; i < n; i++) {
+    if ((ids[i] & kDelIdxMask) || !context.IsValid(i)) {
+      ASSERT_EQ(scanned.count(i), 0) << "vector " << i << " is skipped";
+      continue;
+    }
+    ++valid_num;
+    ASSERT_EQ(scanned.count(i), 1) << "vector " << i << " is scanned";
+
+    const uint8_t *code = codes.data() + i * code_size;
+    float expected = 0;
+    for (size_t m = 0; m < M; m++) {
+      const float *centroid =
+          ivfpq.pq.get_centroids(m, SubCode(code, m));
+      for (int k = 0; k < kSubDimension; k++) {
+        float q = query[m * kSubDimension + k];
+        expected += METRIC_TYPE == faiss::METRIC_L2
+                        ? (q - centroid[k]) * (q - centroid[k])
+                        : q * centroid[k];
+      }
+    }
+    ASSERT_NEAR(scanned[i], expected, max_error)
+        << "M=" << M << ", n=" << n << ", vector=" << i;
+    ASSERT_NEAR(scanner.distance_to_code(code), expected, 1e-4);
+  }
+  ASSERT_EQ(scanned.size(), valid_num);
+}
+
+TEST(FastScanTest, ScannerL2) {
+  for (size_t M : {1, 7, 8, 13}) {
+    for (size_t n : {1, 32, 45, 100}) {
+      CheckScanner<faiss::METRIC_L2, faiss::CMax<float, idx_t>>(M, n);
+    }
+  }
+}
+
+TEST(FastScanTest, ScannerInnerProduct) {
+  for (size_t M : {1, 7, 8, 13}) {
+    for (size_t n : {1, 32, 45, 100}) {
+      CheckScanner<faiss::METRIC_INNER_PRODUCT, faiss::CMin<float, idx_t>>(
+          M, n);
+    }
+  }
+}
+
+}  // namespace test
@@ -55,6 +55,18 @@ TEST_F(GammaTest, IVFPQ) {
   ASSERT_EQ(TestIndexes(opt), 0);
 }
 
+TEST_F(GammaTest, IVFPQ_FASTSCAN) {
+  struct Options opt;
+  opt.profile_file = my_argv[1];
+  opt.feature_file = my_argv[2];
+  opt.retrieval_type = "IVFPQ";
+  opt.retrieval_param = kIVFPQ4Param;
+  ASSERT_EQ(TestIndexes(opt), 0);
+
+  opt.b_load = true;
+  ASSERT_EQ(TestIndexes(opt), 0);
+}
+
 TEST_F(GammaTest, IVFPQ_BATCH) {
   struct Options opt;
   opt.profile_file = my_argv[1];
@@ -0,0 +1,144 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include <gtest/gtest.h>
+
+#include <algorithm>
+#include <random>
+#include <string>
+#include <vector>
+
+#include "index/impl/gamma_index_flat.h"
+#include "util/bitmap_manager.h"
+#include "util/utils.h"
+#include "vector/memory_raw_vector.h"
+#include "vector/mmap_raw_vector.h"
+
+namespace test {
+
+using tig_gamma::FlatRetrievalParameters;
+using tig_gamma::GammaFLATIndex;
+using tig_gamma::MemoryRawVector;
+using tig_gamma::MmapRawVector;
+using tig_gamma::RawVector;
+using tig_gamma::StoreParams;
+
+const int kDimension = 24;
+const int kVectorNum = 2500;  // blocks of 1024 vectors, segments of 1000
+const int kQueryNum = 7;
+const int kTopK = 10;
+
+// every vector but the filtered ones is valid
+class FilterContext : public RetrievalContext {
+ public:
+  explicit FilterContext(DistanceComputeType type) {
+    retrieval_params_ = new FlatRetrievalParameters(true, type);
+  }
+
+  bool IsValid(int id) const override { return id % 9 != 4; }
+
+  bool IsSimilarScoreValid(float score) const override { return true; }
+};
+
+class FlatSearchTest : public ::testing::TestWithParam<std::string> {
+ protected:
+  void SetUp() override {
+    root_path_ = "./flat_search_test";
+    utils::remove_dir(root_path_.c_str());
+    utils::make_dir(root_path_.c_str());
+    bitmap_ = new bitmap::BitmapManager();
+    bitmap_->Init(kVectorNum);
+
+    std::mt19937 rng(7);
+    std::uniform_real_distribution<float> uniform(-1, 1);
+    vectors_.resize((size_t)kVectorNum * kDimension);
+    for (float &v : vectors_) v = uniform(rng);
+    queries_.resize((size_t)kQueryNum * kDimension);
+    for (float &v : queries_) v = uniform(rng);
+
+    StoreParams store_params;
+    store_params.segment_size = 1000;
+    // the raw vector owns its meta info
+    VectorMetaInfo *meta_info =
+        new VectorMetaInfo("embedding", kDimension, VectorValueType::FLOAT);
+    if (GetParam() == "Mmap") {
+      raw_vec_ =
+          new MmapRawVector(meta_info, root_path_, store_params, bitmap_);
+    } else {
+      raw_vec_ =
+          new MemoryRawVector(meta_info, root_path_, store_params, bitmap_);
+    }
+    ASSERT_EQ(raw_vec_->Init("embedding", false, false), 0);
+    for (int i = 0; i < kVectorNum; ++i) {
+      ASSERT_EQ(raw_vec_->Add(i, vectors_.data() + (size_t)i * kDimension),
+                0);
+    }
+    index_.vector_ = raw_vec_;
+    ASSERT_EQ(index_.Init("", 0), 0);
+  }
+
+  void TearDown() override {
+    delete raw_vec_;
+    delete bitmap_;
+    utils::remove_dir(root_path_.c_str());
+  }
+
+  // the top k of the valid vectors by brute force
+  void CheckSearch(DistanceComputeType type, int n) {
+    bool is_l2 = type == DistanceComputeType::L2;
+    FilterContext context(type);
+    std::vector<float> distances((size_t)n * kTopK);
+    std::vector<int64_t> labels((size_t)n * kTopK);
+    ASSERT_EQ(index_.Search(&context, n, (const uint8_t *)queries_.data(),
+                            kTopK, distances.data(), labels.data()),
+              0);
+
+    for (int q = 0; q < n; ++q) {
+      const float *xq = queries_.data() + (size_t)q * kDimension;
+      std::vector<std::pair<float, int64_t>> all;
+      for (int i = 0; i < kVectorNum; ++i) {
+        if (!context.IsValid(i)) continue;
+        const float *y = vectors_.data() + (size_t)i * kDimension;
+        float dis = 0;
+        for (int j = 0; j < kDimension; ++j) {
+          dis += is_l2 ? (xq[j] - y[j]) * (xq[j] - y[j]) : xq[j] * y[j];
+        }
+        all.emplace_back(is_l2 ? dis : -dis, i);
+      }
+      std::sort(all.begin(), all.end());
+      for (int j = 0; j < kTopK; ++j) {
+        float expected = is_l2 ? all[j].first : -all[j].first;
+        ASSERT_EQ(labels[(size_t)q * kTopK + j], all[j].second)
+            << "query " << q << ", rank " << j;
+        ASSERT_NEAR(distances[(size_t)q * kTopK + j], expected, 1e-3);
+      }
+    }
+  }
+
+  std::string root_path_;
+  bitmap::BitmapManager *bitmap_;
+  RawVector *raw_vec_;
+  GammaFLATIndex index_;
+  std::vector<float> vectors_;
+  std::vector<float> queries_;
+};
+
+// a batch is searched by tiles, a single query vector by vector
+TEST_P(FlatSearchTest, L2) {
+  CheckSearch(DistanceComputeType::L2, kQueryNum);
+  CheckSearch(DistanceComputeType::L2, 1);
+}
+
+TEST_P(FlatSearchTest, InnerProduct) {
+  CheckSearch(DistanceComputeType::INNER_PRODUCT, kQueryNum);
+  CheckSearch(DistanceComputeType::INNER_PRODUCT, 1);
+}
+
+INSTANTIATE_TEST_CASE_P(StoreTypes, FlatSearchTest,
+                        ::testing::Values("MemoryOnly", "Mmap"));
+
+}  // namespace test
@@ -0,0 +1,164 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include <gtest/gtest.h>
+
+#include <string>
+#include <vector>
+
+#include "util/bitmap_manager.h"
+#include "util/utils.h"
+#include "vector/memory_raw_vector.h"
+
+namespace test {
+
+using tig_gamma::MemoryRawVector;
+using tig_gamma::StoreParams;
+
+const int kDimension = 16;
+const int kTrainSize = 8192;  // the vectors which train SQ8 when added
+
+class QuantizerTest : public ::testing::Test {
+ protected:
+  void SetUp() override {
+    root_path_ = "./quantizer_test";
+    utils::remove_dir(root_path_.c_str());
+    utils::make_dir(root_path_.c_str());
+    bitmap_ = new bitmap::BitmapManager();
+    bitmap_->Init(kTrainSize * 2);
+  }
+
+  void TearDown() override {
+    delete bitmap_;
+    utils::remove_dir(root_path_.c_str());
+  }
+
+  // the raw vector owns its meta info
+  MemoryRawVector *NewRawVector() {
+    StoreParams store_params;
+    store_params.segment_size = 1000;
+    store_params.quantizer = "SQ8";
+    VectorMetaInfo *meta_info = new VectorMetaInfo(
+        "embedding", kDimension, VectorValueType::FLOAT);
+    MemoryRawVector *raw_vec =
+        new MemoryRawVector(meta_info, root_path_, store_params, bitmap_);
+    EXPECT_EQ(raw_vec->Init("embedding", false, false), 0);
+    return raw_vec;
+  }
+
+  // the values of the dimensions of vector i are in [0, 1]
+  static std::vector<float> Vector(int i) {
+    std::vector<float> v(kDimension);
+    for (int j = 0; j < kDimension; ++j) {
+      v[j] = (float)((i * 31 + j * 17) % 101) / 100;
+    }
+    return v;
+  }
+
+  static int Add(MemoryRawVector *raw_vec, std::vector<float> v) {
+    return raw_vec->AddToStore((uint8_t *)v.data(), v.size() * sizeof(float));
+  }
+
+  std::string root_path_;
+  bitmap::BitmapManager *bitmap_;
+};
+
+TEST_F(QuantizerTest, TrainOnce) {
+  MemoryRawVector *raw_vec = NewRawVector();
+  const tig_gamma::VectorQuantizer *quantizer = raw_vec->Quantizer();
+  ASSERT_NE(quantizer, nullptr);
+
+  for (int i = 0; i < kTrainSize - 1; ++i) {
+    ASSERT_EQ(Add(raw_vec, Vector(i)), 0);
+  }
+  ASSERT_FALSE(raw_vec->QuantizerTrained());
+  ASSERT_EQ(Add(raw_vec, Vector(kTrainSize - 1)), 0);
+  ASSERT_TRUE(raw_vec->QuantizerTrained());
+
+  std::vector<float> decoded(kDimension);
+  for (int i = 0; i < kTrainSize; i += 97) {
+    ASSERT_FALSE(raw_vec->Clipped(i));
+    quantizer->Decode(1, raw_vec->GetFromMem(i), decoded.data());
+    std::vector<float> v = Vector(i);
+    for (int j = 0; j < kDimension; ++j) {
+      ASSERT_NEAR(decoded[j], v[j], 1.0 / 255);
+    }
+  }
+
+  // the ranges are never changed, the out of range vectors are marked
+  std::vector<uint8_t> code(raw_vec->GetFromMem(0),
+                            raw_vec->GetFromMem(0) + quantizer->CodeSize());
+  std::vector<float> large(kDimension, 5.0f);
+  ASSERT_EQ(Add(raw_vec, large), 0);
+  ASSERT_TRUE(raw_vec->Clipped(kTrainSize));
+  ASSERT_EQ(Add(raw_vec, Vector(1)), 0);
+  ASSERT_FALSE(raw_vec->Clipped(kTrainSize + 1));
+  for (int i = 0; i < 2 * kTrainSize; ++i) {
+    ASSERT_EQ(Add(raw_vec, Vector(i)), 0);
+  }
+  ASSERT_EQ(std::vector<uint8_t>(
+                raw_vec->GetFromMem(0),
+                raw_vec->GetFromMem(0) + quantizer->CodeSize()),
+            code);
+
+  // updated out of range and back
+  ASSERT_EQ(raw_vec->UpdateToStore(0, (uint8_t *)large.data(),
+                                   kDimension * sizeof(float)),
+            0);
+  ASSERT_TRUE(raw_vec->Clipped(0));
+  std::vector<float> v = Vector(0);
+  ASSERT_EQ(raw_vec->UpdateToStore(0, (uint8_t *)v.data(),
+                                   kDimension * sizeof(float)),
+            0);
+  ASSERT_FALSE(raw_vec->Clipped(0));
+  delete raw_vec;
+
+  // the saved ranges are used after a restart
+  raw_vec = NewRawVector();
+  ASSERT_TRUE(raw_vec->QuantizerTrained());
+  ASSERT_EQ(Add(raw_vec, Vector(0)), 0);
+  ASSERT_EQ(std::vector<uint8_t>(raw_vec->GetFromMem(0),
+                                 raw_vec->GetFromMem(0) + code.size()),
+            code);
+  delete raw_vec;
+}
+
+TEST_F(QuantizerTest, TrainByIndex) {
+  MemoryRawVector *raw_vec = NewRawVector();
+  ASSERT_NE(raw_vec->TrainQuantizer(), 0);
+  ASSERT_FALSE(raw_vec->QuantizerTrained());
+
+  // the vectors added before are encoded by the training
+  int num = 100;
+  for (int i = 0; i < num; ++i) {
+    ASSERT_EQ(Add(raw_vec, Vector(i)), 0);
+  }
+  ASSERT_EQ(raw_vec->TrainQuantizer(), 0);
+  ASSERT_TRUE(raw_vec->QuantizerTrained());
+  ASSERT_EQ(Add(raw_vec, Vector(0)), 0);
+
+  const tig_gamma::VectorQuantizer *quantizer = raw_vec->Quantizer();
+  std::vector<float> decoded(kDimension);
+  for (int i = 0; i <= num; ++i) {
+    ASSERT_FALSE(raw_vec->Clipped(i));
+    quantizer->Decode(1, raw_vec->GetFromMem(i), decoded.data());
+    std::vector<float> v = Vector(i < num ? i : 0);
+    for (int j = 0; j < kDimension; ++j) {
+      ASSERT_NEAR(decoded[j], v[j], 1.0 / 255);
+    }
+  }
+
+  // the exact vectors are kept in the storage
+  ScopeVector scope_vec;
+  ASSERT_EQ(((tig_gamma::RawVector *)raw_vec)->GetVector(num, scope_vec), 0);
+  ASSERT_EQ(std::vector<float>((const float *)scope_vec.Get(),
+                               (const float *)scope_vec.Get() + kDimension),
+            Vector(0));
+  delete raw_vec;
+}
+
+}  // namespace test
@@ -0,0 +1,209 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include <gtest/gtest.h>
+
+#include <string>
+#include <vector>
+
+#include "table/field_range_index.h"
+#include "table/table.h"
+#include "util/bitmap_manager.h"
+#include "util/utils.h"
+
+namespace test {
+
+using tig_gamma::DataType;
+using tig_gamma::Field;
+using tig_gamma::FieldInfo;
+using tig_gamma::FilterInfo;
+using tig_gamma::FilterOperator;
+using tig_gamma::MultiFieldsRangeIndex;
+using tig_gamma::MultiRangeQueryResults;
+using tig_gamma::Table;
+using tig_gamma::TableInfo;
+using tig_gamma::TableParams;
+
+const int kDocNum = 30000;
+const int kNewDocNum = 1000;  // docs added after the dump
+const int kPriceNum = 1000;
+const int kTagNum = 50;
+
+class RangeIndexTest : public ::testing::Test {
+ protected:
+  // the table is shared by the tests and kept to the end, deleting it waits
+  // for its flush thread
+  static void SetUpTestCase() {
+    root_path_ = "./range_index_test";
+    utils::remove_dir(root_path_.c_str());
+    utils::make_dir(root_path_.c_str());
+
+    bitmap_ = new bitmap::BitmapManager();
+    bitmap_->Init(kDocNum * 2);
+    table_ = new Table(root_path_);
+    TableInfo table_info;
+    table_info.SetName("test");
+    FieldInfo fields[] = {{"_id", DataType::STRING, false},
+                          {"price", DataType::INT, true},
+                          {"tag", DataType::STRING, true}};
+    for (FieldInfo &field : fields) {
+      table_info.AddField(field);
+    }
+    TableParams table_params;
+    ASSERT_EQ(table_->CreateTable(table_info, table_params, bitmap_), 0);
+    price_ = table_->GetAttrIdx("price");
+    tag_ = table_->GetAttrIdx("tag");
+    AddDocs(0, kDocNum + kNewDocNum);
+  }
+
+  void SetUp() override {
+    dump_dir_ = root_path_ + "/dump";
+    utils::remove_dir(dump_dir_.c_str());
+  }
+
+  static void AddDocs(int start_docid, int end_docid) {
+    for (int docid = start_docid; docid < end_docid; ++docid) {
+      std::vector<Field> fields(3);
+      fields[0].name = "_id";
+      fields[0].value = "key" + std::to_string(docid);
+      fields[0].datatype = DataType::STRING;
+      int price = Price(docid);
+      fields[1].name = "price";
+      fields[1].value = std::string((const char *)&price, sizeof(price));
+      fields[1].datatype = DataType::INT;
+      fields[2].name = "tag";
+      fields[2].value = "tag" + std::to_string(docid % kTagNum);
+      fields[2].datatype = DataType::STRING;
+      ASSERT_EQ(table_->Add(fields[0].value, fields, docid), 0);
+    }
+  }
+
+  static int Price(int docid) { return (docid * 7) % kPriceNum; }
+
+  MultiFieldsRangeIndex *NewIndex() {
+    MultiFieldsRangeIndex *index =
+        new MultiFieldsRangeIndex(root_path_, table_);
+    index->AddField(price_, DataType::INT);
+    index->AddField(tag_, DataType::STRING);
+    return index;
+  }
+
+  // the docs in [0, doc_num) are found by the filters of both fields
+  void CheckSearch(MultiFieldsRangeIndex *index, int doc_num) {
+    int lower = 100, upper = 199;
+    FilterInfo price_filter;
+    price_filter.field = price_;
+    price_filter.lower_value = std::string((const char *)&lower, sizeof(lower));
+    price_filter.upper_value = std::string((const char *)&upper, sizeof(upper));
+    price_filter.is_union = FilterOperator::And;
+
+    FilterInfo tag_filter;
+    tag_filter.field = tag_;
+    tag_filter.lower_value = "tag7";
+    tag_filter.is_union = FilterOperator::Or;
+
+    std::vector<int> price_docs, tag_docs;
+    for (int docid = 0; docid < doc_num; ++docid) {
+      if (Price(docid) >= lower && Price(docid) <= upper) {
+        price_docs.push_back(docid);
+      }
+      if (docid % kTagNum == 7) tag_docs.push_back(docid);
+    }
+
+    MultiRangeQueryResults result;
+    ASSERT_GT(index->Search({price_filter}, &result), 0);
+    ASSERT_EQ(result.ToDocs(), price_docs);
+    ASSERT_GT(index->Search({tag_filter}, &result), 0);
+    ASSERT_EQ(result.ToDocs(), tag_docs);
+  }
+
+  static std::string root_path_;
+  static bitmap::BitmapManager *bitmap_;
+  static Table *table_;
+  static int price_;
+  static int tag_;
+
+  std::string dump_dir_;
+};
+
+std::string RangeIndexTest::root_path_;
+bitmap::BitmapManager *RangeIndexTest::bitmap_ = nullptr;
+Table *RangeIndexTest::table_ = nullptr;
+int RangeIndexTest::price_ = -1;
+int RangeIndexTest::tag_ = -1;
+
+TEST_F(RangeIndexTest, BulkBuild) {
+  MultiFieldsRangeIndex *index = NewIndex();
+  ASSERT_EQ(index->BulkBuild(0, kDocNum / 2, {price_, tag_}), 0);
+  ASSERT_EQ(index->BulkBuild(kDocNum / 2, kDocNum, {price_, tag_, price_}), 0);
+  CheckSearch(index, kDocNum);
+  delete index;
+}
+
+TEST_F(RangeIndexTest, DumpLoad) {
+  MultiFieldsRangeIndex *index = NewIndex();
+  ASSERT_EQ(index->BulkBuild(0, kDocNum, {price_, tag_}), 0);
+  ASSERT_EQ(index->Dump(dump_dir_, kDocNum), 0);
+  delete index;
+  ASSERT_TRUE(utils::file_exist(dump_dir_ + "/field_" +
+                                std::to_string(price_) + ".idx"));
+  ASSERT_TRUE(utils::file_exist(dump_dir_ + "/field_" +
+                                std::to_string(tag_) + ".idx"));
+
+  // the docs added after the dump are built on load, the dump stays valid
+  index = NewIndex();
+  ASSERT_EQ(index->Load(dump_dir_, kDocNum + kNewDocNum), 0);
+  CheckSearch(index, kDocNum + kNewDocNum);
+  ASSERT_TRUE(index->Dumped(dump_dir_));
+  delete index;
+
+  // a dump of more docs than are loaded is not used
+  index = NewIndex();
+  ASSERT_EQ(index->Load(dump_dir_, kDocNum / 2), 0);
+  CheckSearch(index, kDocNum / 2);
+  delete index;
+}
+
+TEST_F(RangeIndexTest, LoadWithoutDump) {
+  MultiFieldsRangeIndex *index = NewIndex();
+  ASSERT_EQ(index->Load("", kDocNum), 0);
+  CheckSearch(index, kDocNum);
+  delete index;
+
+  // a corrupt field file is rebuilt from the table
+  index = NewIndex();
+  ASSERT_EQ(index->BulkBuild(0, kDocNum, {price_, tag_}), 0);
+  ASSERT_EQ(index->Dump(dump_dir_, kDocNum), 0);
+  delete index;
+  {
+    std::string file = dump_dir_ + "/field_" + std::to_string(price_) + ".idx";
+    utils::FileIO fio(file);
+    ASSERT_EQ(fio.Open("wb"), 0);
+    fio.Write("FRIX", 1, 4);
+  }
+  index = NewIndex();
+  ASSERT_EQ(index->Load(dump_dir_, kDocNum), 0);
+  CheckSearch(index, kDocNum);
+  delete index;
+}
+
+TEST_F(RangeIndexTest, DeleteRemovesDump) {
+  MultiFieldsRangeIndex *index = NewIndex();
+  ASSERT_EQ(index->BulkBuild(0, kDocNum, {price_, tag_}), 0);
+  ASSERT_EQ(index->Dump(dump_dir_, kDocNum), 0);
+  ASSERT_TRUE(utils::isFolderExist(dump_dir_.c_str()));
+  ASSERT_TRUE(index->Dumped(dump_dir_));
+  ASSERT_FALSE(index->Dumped(dump_dir_ + "_other"));
+
+  // the dumped keys of the doc are stale
+  ASSERT_EQ(index->Delete(3, price_), 0);
+  ASSERT_FALSE(utils::isFolderExist(dump_dir_.c_str()));
+  ASSERT_FALSE(index->Dumped(dump_dir_));
+  delete index;
+}
+
+}  // namespace test
@@ -0,0 +1,223 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include <gtest/gtest.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "storage/wal.h"
+#include "util/utils.h"
+
+namespace test {
+
+using tig_gamma::WalOptions;
+using tig_gamma::WalRecordType;
+using tig_gamma::WriteAheadLog;
+
+struct Record {
+  WalRecordType type;
+  std::string payload;
+  int64_t lsn;
+};
+
+class WalTest : public ::testing::Test {
+ protected:
+  void SetUp() override {
+    dir_ = "./wal_test";
+    utils::remove_dir(dir_.c_str());
+  }
+
+  void TearDown() override { utils::remove_dir(dir_.c_str()); }
+
+  int Replay(WriteAheadLog &wal, std::vector<Record> &records) {
+    records.clear();
+    return wal.Replay([&](WalRecordType type, const std::string &payload,
+                          int64_t lsn) {
+      records.push_back({type, payload, lsn});
+      return 0;
+    });
+  }
+
+  std::vector<std::string> Segments() {
+    std::vector<std::string> segments;
+    for (const std::string &path : utils::ls(dir_)) {
+      if (path.find("/wal-") != std::string::npos) segments.push_back(path);
+    }
+    std::sort(segments.begin(), segments.end());
+    return segments;
+  }
+
+  std::string dir_;
+};
+
+TEST_F(WalTest, AppendReplay) {
+  {
+    WriteAheadLog wal(dir_);
+    ASSERT_EQ(wal.Init(WalOptions()), 0);
+    ASSERT_EQ(wal.Append(WalRecordType::ADD_DOCS, "doc1"), 1);
+    ASSERT_EQ(wal.Append(WalRecordType::DELETE_DOCS, "key1"), 2);
+    int64_t lsn = wal.Append(WalRecordType::ADD_COLUMNS, std::string(1000, 'c'));
+    ASSERT_EQ(lsn, 3);
+    ASSERT_EQ(wal.WaitDurable(lsn), 0);
+  }
+
+  WriteAheadLog wal(dir_);
+  ASSERT_EQ(wal.Init(WalOptions()), 0);
+  ASSERT_EQ(wal.LastLsn(), 3);
+  std::vector<Record> records;
+  ASSERT_EQ(Replay(wal, records), 0);
+  ASSERT_EQ(records.size(), 3);
+  ASSERT_EQ(records[0].type, WalRecordType::ADD_DOCS);
+  ASSERT_EQ(records[0].payload, "doc1");
+  ASSERT_EQ(records[1].type, WalRecordType::DELETE_DOCS);
+  ASSERT_EQ(records[1].payload, "key1");
+  ASSERT_EQ(records[2].type, WalRecordType::ADD_COLUMNS);
+  ASSERT_EQ(records[2].payload, std::string(1000, 'c'));
+  for (size_t i = 0; i < records.size(); ++i) {
+    ASSERT_EQ(records[i].lsn, (int64_t)i + 1);
+  }
+
+  // new records follow the replayed ones
+  ASSERT_EQ(wal.Append(WalRecordType::ADD_DOCS, "doc2"), 4);
+}
+
+TEST_F(WalTest, TornTail) {
+  {
+    WriteAheadLog wal(dir_);
+    ASSERT_EQ(wal.Init(WalOptions()), 0);
+    wal.Append(WalRecordType::ADD_DOCS, "doc1");
+    ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, "doc2")), 0);
+  }
+  // a crash in the middle of writing the third record
+  std::vector<std::string> segments = Segments();
+  ASSERT_EQ(segments.size(), 1);
+  long valid_len = utils::get_file_size(segments[0]);
+  {
+    utils::FileIO fio(segments[0]);
+    ASSERT_EQ(fio.Open("ab"), 0);
+    const char torn[] = {0x20, 0x00, 0x00, 0x00, 0x12, 0x34};
+    fio.Write(torn, 1, sizeof(torn));
+  }
+
+  {
+    WriteAheadLog wal(dir_);
+    ASSERT_EQ(wal.Init(WalOptions()), 0);
+    ASSERT_EQ(utils::get_file_size(segments[0]), valid_len);
+    std::vector<Record> records;
+    ASSERT_EQ(Replay(wal, records), 0);
+    ASSERT_EQ(records.size(), 2);
+    ASSERT_EQ(records[1].payload, "doc2");
+    ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, "doc3")), 0);
+  }
+
+  WriteAheadLog wal(dir_);
+  ASSERT_EQ(wal.Init(WalOptions()), 0);
+  std::vector<Record> records;
+  ASSERT_EQ(Replay(wal, records), 0);
+  ASSERT_EQ(records.size(), 3);
+  ASSERT_EQ(records[2].payload, "doc3");
+  ASSERT_EQ(records[2].lsn, 3);
+}
+
+TEST_F(WalTest, CorruptTail) {
+  {
+    WriteAheadLog wal(dir_);
+    ASSERT_EQ(wal.Init(WalOptions()), 0);
+    wal.Append(WalRecordType::ADD_DOCS, "doc1");
+    ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, "doc2")), 0);
+  }
+  // flip the last byte of the payload of the last record
+  std::vector<std::string> segments = Segments();
+  ASSERT_EQ(segments.size(), 1);
+  long len = utils::get_file_size(segments[0]);
+  {
+    FILE *fp = fopen(segments[0].c_str(), "r+b");
+    ASSERT_NE(fp, nullptr);
+    fseek(fp, len - 1, SEEK_SET);
+    fputc('x', fp);
+    fclose(fp);
+  }
+
+  WriteAheadLog wal(dir_);
+  ASSERT_EQ(wal.Init(WalOptions()), 0);
+  ASSERT_EQ(wal.LastLsn(), 1);
+  std::vector<Record> records;
+  ASSERT_EQ(Replay(wal, records), 0);
+  ASSERT_EQ(records.size(), 1);
+  ASSERT_EQ(records[0].payload, "doc1");
+}
+
+TEST_F(WalTest, GroupCommit) {
+  WalOptions options;
+  options.group_commit_ms = 2000;
+  WriteAheadLog wal(dir_);
+  ASSERT_EQ(wal.Init(options), 0);
+
+  // a lone writer doesn't wait for the window
+  double start = utils::getmillisecs();
+  ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, "doc1")), 0);
+  ASSERT_LT(utils::getmillisecs() - start, 1000);
+
+  // the records of several writers are synced in one group
+  std::vector<std::thread> writers;
+  for (int i = 0; i < 4; ++i) {
+    writers.emplace_back([&wal, i]() {
+      std::string payload = "doc" + std::to_string(i + 2);
+      ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, payload)),
+                0);
+    });
+  }
+  for (std::thread &writer : writers) writer.join();
+  ASSERT_EQ(wal.LastLsn(), 5);
+}
+
+TEST_F(WalTest, Checkpoint) {
+  WalOptions options;
+  options.group_commit_ms = 0;
+  options.segment_bytes = 48;  // two records per file
+  {
+    WriteAheadLog wal(dir_);
+    ASSERT_EQ(wal.Init(options), 0);
+    for (int i = 1; i <= 6; ++i) {
+      std::string payload = "doc" + std::to_string(i);
+      ASSERT_EQ(wal.WaitDurable(wal.Append(WalRecordType::ADD_DOCS, payload)),
+                0);
+    }
+    size_t nsegments = Segments().size();
+    ASSERT_GT(nsegments, 2);
+
+    ASSERT_EQ(wal.Checkpoint(4), 0);
+    ASSERT_EQ(wal.CheckpointLsn(), 4);
+    ASSERT_LT(Segments().size(), nsegments);
+    // an older checkpoint does nothing
+    ASSERT_EQ(wal.Checkpoint(2), 0);
+    ASSERT_EQ(wal.CheckpointLsn(), 4);
+  }
+
+  WriteAheadLog wal(dir_);
+  ASSERT_EQ(wal.Init(options), 0);
+  ASSERT_EQ(wal.CheckpointLsn(), 4);
+  ASSERT_EQ(wal.LastLsn(), 6);
+  std::vector<Record> records;
+  ASSERT_EQ(Replay(wal, records), 0);
+  ASSERT_EQ(records.size(), 2);
+  ASSERT_EQ(records[0].lsn, 5);
+  ASSERT_EQ(records[0].payload, "doc5");
+  ASSERT_EQ(records[1].lsn, 6);
+
+  // all the records are saved, the next ones start after the checkpoint
+  ASSERT_EQ(wal.Checkpoint(wal.LastLsn()), 0);
+  ASSERT_EQ(Replay(wal, records), 0);
+  ASSERT_EQ(records.size(), 0);
+  ASSERT_EQ(wal.Append(WalRecordType::ADD_DOCS, "doc7"), 7);
+}
+
+}  // namespace test
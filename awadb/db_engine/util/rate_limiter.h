@@ -0,0 +1,66 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <chrono>
+#include <mutex>
+#include <thread>
+
+namespace utils {
+
+/**
+ * Token bucket limiting the bytes written per second, Acquire() sleeps
+ * until the bytes are allowed. A rate of 0 means no limit.
+ */
+class RateLimiter {
+ public:
+  RateLimiter() : bytes_per_sec_(0), available_(0) {
+    last_ = std::chrono::steady_clock::now();
+  }
+
+  void SetRate(long bytes_per_sec) {
+    std::lock_guard<std::mutex> lk(mu_);
+    bytes_per_sec_ = bytes_per_sec > 0 ? bytes_per_sec : 0;
+    available_ = 0;
+    last_ = std::chrono::steady_clock::now();
+  }
+
+  long Rate() {
+    std::lock_guard<std::mutex> lk(mu_);
+    return bytes_per_sec_;
+  }
+
+  void Acquire(size_t bytes) {
+    double wait_sec = 0;
+    {
+      std::lock_guard<std::mutex> lk(mu_);
+      if (bytes_per_sec_ == 0) return;
+
+      auto now = std::chrono::steady_clock::now();
+      double elapsed = std::chrono::duration<double>(now - last_).count();
+      last_ = now;
+      // at most one second of burst
+      available_ += elapsed * bytes_per_sec_;
+      if (available_ > bytes_per_sec_) available_ = bytes_per_sec_;
+
+      available_ -= bytes;
+      if (available_ < 0) wait_sec = -available_ / bytes_per_sec_;
+    }
+    if (wait_sec > 0) {
+      std::this_thread::sleep_for(std::chrono::duration<double>(wait_sec));
+    }
+  }
+
+ private:
+  std::mutex mu_;
+  long bytes_per_sec_;
+  double available_;
+  std::chrono::steady_clock::time_point last_;
+};
+
+}  // namespace utils
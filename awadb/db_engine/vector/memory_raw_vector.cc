@@ -7,18 +7,29 @@
 
 #include "memory_raw_vector.h"
 
+#include <errno.h>
+#include <fcntl.h>
+#include <string.h>
+#include <sys/mman.h>
 #include <unistd.h>
 
+#include <algorithm>
+
 #include "search/error_code.h"
 
 namespace tig_gamma {
 
+// SQ8 is trained once by this many vectors, or by the vectors added so far if
+// an index needs the codes before
+const int kQuantizerTrainSize = 8192;
+
 MemoryRawVector::MemoryRawVector(VectorMetaInfo *meta_info,
                                  const std::string &root_path,
                                  const StoreParams &store_params,
                                  bitmap::BitmapManager *docids_bitmap)
     : RawVector(meta_info, root_path, docids_bitmap, store_params) {
   segments_ = nullptr;
+  clipped_ = nullptr;
   nsegments_ = 0;
   segment_size_ = store_params.segment_size;
   vector_byte_size_ = meta_info->DataSize() * meta_info->Dimension();
@@ -26,17 +37,36 @@ MemoryRawVector::MemoryRawVector(VectorMetaInfo *meta_info,
   curr_idx_in_seg_ = 0;
   storage_mgr_ = nullptr;
   allow_use_zfp = false;
+  allow_use_quantizer = true;
+  mem_item_size_ = vector_byte_size_;
+  mapped_header_size_ = 0;
+  prefetch_running_ = false;
+  quantizer_trained_ = false;
 }
 
 MemoryRawVector::~MemoryRawVector() {
+  prefetch_running_ = false;
+  if (prefetch_thread_.joinable()) prefetch_thread_.join();
   for (int i = 0; i < nsegments_; i++) {
+    if (i < (int)mapped_lens_.size() && mapped_lens_[i] > 0) {
+      munmap(segments_[i] - mapped_header_size_, mapped_lens_[i]);
+      segments_[i] = nullptr;
+      continue;
+    }
     CHECK_DELETE_ARRAY(segments_[i]);
+    if (clipped_) CHECK_DELETE_ARRAY(clipped_[i]);
   }
   CHECK_DELETE_ARRAY(segments_);
+  CHECK_DELETE_ARRAY(clipped_);
   CHECK_DELETE(storage_mgr_);
 }
 
 int MemoryRawVector::InitStore(std::string &vec_name) {
+  if (quantizer_.Enabled()) {
+    mem_item_size_ = quantizer_.CodeSize();
+    clipped_ = new uint8_t *[kMaxSegments];
+    std::fill_n(clipped_, kMaxSegments, nullptr);
+  }
   segments_ = new uint8_t *[kMaxSegments];
   std::fill_n(segments_, kMaxSegments, nullptr);
   if (ExtendSegments()) return -2;
@@ -66,8 +96,18 @@ int MemoryRawVector::InitStore(std::string &vec_name) {
     return ret;
   }
 
+  if (quantizer_.Type() == QuantizerType::FP16) {
+    quantizer_trained_ = true;
+  } else if (quantizer_.Type() == QuantizerType::SQ8 &&
+             utils::file_exist(QuantizerPath())) {
+    // the codes of a dumped index are encoded by the saved ranges
+    if (quantizer_.Load(QuantizerPath())) return FORMAT_ERR;
+    quantizer_trained_ = true;
+  }
+
   LOG(INFO) << "init memory raw vector success! vector byte size="
-            << vector_byte_size_ << ", path=" << vec_dir;
+            << vector_byte_size_ << ", memory byte size=" << mem_item_size_
+            << ", path=" << vec_dir;
   return SUCC;
 }
 
@@ -78,27 +118,120 @@ int MemoryRawVector::AddToStore(uint8_t *v, int len) {
   return ret;
 }
 
+int MemoryRawVector::BatchAddToStore(const uint8_t *v, int n) {
+  int ret = storage_mgr_->BatchAdd(v, n);
+  if (ret) return ret;
+  for (int i = 0; i < n; ++i) {
+    ret = AddToMem(v + (size_t)i * vector_byte_size_, vector_byte_size_);
+    if (ret) return ret;
+  }
+  return 0;
+}
+
 int MemoryRawVector::AddToMem(const uint8_t *v, int len) {
   assert(len == vector_byte_size_);
+  if (quantizer_.Enabled() && !quantizer_trained_) {
+    // the vectors are encoded when it is trained, maybe by the indexing
+    std::lock_guard<std::mutex> lock(quantizer_mutex_);
+    if (!quantizer_trained_) {
+      if (curr_idx_in_seg_ == segment_size_ && ExtendSegments()) return -2;
+      ++curr_idx_in_seg_;
+      int vec_num = MemVecNum();
+      return vec_num < kQuantizerTrainSize ? 0 : TrainQuantizer(vec_num);
+    }
+  }
+
   if (curr_idx_in_seg_ == segment_size_ && ExtendSegments()) return -2;
-  memcpy((void *)(current_segment_ + curr_idx_in_seg_ * vector_byte_size_),
-         (void *)v, vector_byte_size_);
+  long vid = MemVecNum();
+  if (quantizer_.Enabled()) {
+    Encode(vid, (const float *)v);
+  } else {
+    memcpy((void *)GetFromMem(vid), (void *)v, vector_byte_size_);
+  }
   ++curr_idx_in_seg_;
   return 0;
 }
 
+void MemoryRawVector::Encode(long vid, const float *v) {
+  quantizer_.Encode(1, v, GetFromMem(vid));
+  clipped_[vid / segment_size_][vid % segment_size_] =
+      quantizer_.InRange(v) ? 0 : 1;
+}
+
+std::string MemoryRawVector::QuantizerPath() const {
+  return root_path_ + "/" + meta_info_->Name() + "/quantizer.sq8";
+}
+
+int MemoryRawVector::TrainQuantizer() {
+  if (quantizer_trained_) return 0;
+  std::lock_guard<std::mutex> lock(quantizer_mutex_);
+  if (quantizer_trained_) return 0;
+  return TrainQuantizer(MemVecNum());
+}
+
+int MemoryRawVector::TrainQuantizer(int vec_num) {
+  if (vec_num <= 0) {
+    LOG(ERROR) << desc_ << "no vectors to train quantizer";
+    return PARAM_ERR;
+  }
+  std::vector<const uint8_t *> values;
+  std::vector<int> lens;
+  int ret = storage_mgr_->GetHeaders(0, vec_num, values, lens);
+  if (ret == 0) {
+    const float *x = (const float *)values[0];
+    std::vector<float> buf;
+    if (values.size() > 1) {
+      buf.resize((size_t)vec_num * meta_info_->Dimension());
+      size_t offset = 0;
+      for (size_t i = 0; i < values.size(); ++i) {
+        memcpy((void *)((uint8_t *)buf.data() + offset), (void *)values[i],
+               (size_t)lens[i] * vector_byte_size_);
+        offset += (size_t)lens[i] * vector_byte_size_;
+      }
+      x = buf.data();
+    }
+    // no code is read before they are all encoded
+    quantizer_.Train(vec_num, x);
+    int nclipped = 0;
+    for (int vid = 0; vid < vec_num; ++vid) {
+      Encode(vid, x + (size_t)vid * meta_info_->Dimension());
+      nclipped += Clipped(vid);
+    }
+    if (quantizer_.Dump(QuantizerPath())) {
+      LOG(ERROR) << desc_ << "dump quantizer error, it is trained again "
+                 << "after a restart";
+    }
+    quantizer_trained_ = true;
+    LOG(INFO) << desc_ << "train quantizer by " << vec_num
+              << " vectors, clipped=" << nclipped;
+  } else {
+    LOG(ERROR) << desc_ << "get vectors to train quantizer error, ret=" << ret;
+  }
+  for (const uint8_t *value : values) {
+    delete[] value;
+  }
+  return ret;
+}
+
 int MemoryRawVector::ExtendSegments() {
   if (nsegments_ >= kMaxSegments) {
     LOG(ERROR) << this->desc_ << "segment number can't be > " << kMaxSegments;
     return LIMIT_ERR;
   }
   segments_[nsegments_] =
-      new (std::nothrow) uint8_t[segment_size_ * vector_byte_size_];
+      new (std::nothrow) uint8_t[(size_t)segment_size_ * mem_item_size_];
   current_segment_ = segments_[nsegments_];
-  if (current_segment_ == nullptr) {
+  if (clipped_) {
+    clipped_[nsegments_] = new (std::nothrow) uint8_t[segment_size_]();
+  }
+  if (current_segment_ == nullptr ||
+      (clipped_ && clipped_[nsegments_] == nullptr)) {
     LOG(ERROR) << this->desc_
                << "malloc new segment failed, segment num=" << nsegments_
                << ", segment size=" << segment_size_;
+    CHECK_DELETE_ARRAY(segments_[nsegments_]);
+    if (clipped_) CHECK_DELETE_ARRAY(clipped_[nsegments_]);
+    current_segment_ = nullptr;
     return ALLOC_ERR;
   }
   curr_idx_in_seg_ = 0;
@@ -107,13 +240,135 @@ int MemoryRawVector::ExtendSegments() {
   return SUCC;
 }
 
+int MemoryRawVector::MapSegments(int vec_num) {
+  if (vec_num <= 0) return SUCC;
+  // the storage may shrink its segments for long vectors, and it keeps the
+  // full precision vectors of a quantized raw vector
+  if (storage_mgr_->GetStorageManagerOptions().segment_size != segment_size_ ||
+      storage_mgr_->GetCompressor() != nullptr || quantizer_.Enabled()) {
+    return CopySegments(vec_num);
+  }
+
+  int seg_num = (vec_num - 1) / segment_size_ + 1;
+  if (seg_num > kMaxSegments) {
+    LOG(ERROR) << desc_ << "segment number can't be > " << kMaxSegments;
+    return LIMIT_ERR;
+  }
+  std::vector<uint8_t *> bases(seg_num, nullptr);
+  std::vector<size_t> lens(seg_num, 0);
+  uint64_t header_size = 0;
+  int ret = SUCC;
+  for (int i = 0; i < seg_num; ++i) {
+    std::string file_path;
+    ret = storage_mgr_->GetSegmentFile(i, file_path, header_size);
+    if (ret) break;
+    // the segment file is allocated to its full size when it is created
+    size_t len = header_size + (size_t)segment_size_ * vector_byte_size_;
+    int fd = open(file_path.c_str(), O_RDONLY);
+    if (fd == -1) {
+      LOG(ERROR) << desc_ << "open segment file error, path=" << file_path;
+      ret = IO_ERR;
+      break;
+    }
+    long file_size = utils::get_file_size(file_path.c_str());
+    void *addr = MAP_FAILED;
+    if (file_size >= (long)len) {
+      addr = mmap(nullptr, len, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    }
+    close(fd);
+    if (addr == MAP_FAILED) {
+      LOG(ERROR) << desc_ << "mmap segment file error, path=" << file_path
+                 << ", file size=" << file_size << ", expect size=" << len;
+      ret = IO_ERR;
+      break;
+    }
+    bases[i] = (uint8_t *)addr;
+    lens[i] = len;
+  }
+  if (ret) {
+    for (int i = 0; i < seg_num; ++i) {
+      if (bases[i]) munmap(bases[i], lens[i]);
+    }
+    return CopySegments(vec_num);
+  }
+
+  for (int i = 0; i < nsegments_; ++i) {
+    CHECK_DELETE_ARRAY(segments_[i]);
+  }
+  mapped_header_size_ = header_size;
+  mapped_lens_.assign(kMaxSegments, 0);
+  for (int i = 0; i < seg_num; ++i) {
+    segments_[i] = bases[i] + header_size;
+    mapped_lens_[i] = lens[i];
+  }
+  nsegments_ = seg_num;
+  current_segment_ = segments_[seg_num - 1];
+  // new vectors go on filling the last mapped segment
+  curr_idx_in_seg_ = vec_num - (seg_num - 1) * segment_size_;
+
+  if (store_params_.prefetch) {
+    prefetch_running_ = true;
+    prefetch_thread_ = std::thread(&MemoryRawVector::PrefetchHandler, this);
+  }
+  LOG(INFO) << desc_ << "map " << seg_num << " segments, vector num="
+            << vec_num << ", prefetch=" << store_params_.prefetch;
+  return SUCC;
+}
+
+int MemoryRawVector::CopySegments(int vec_num) {
+  std::vector<const uint8_t *> values;
+  std::vector<int> lens;
+  int ret = storage_mgr_->GetHeaders(0, vec_num, values, lens);
+  if (ret == 0) {
+    for (size_t i = 0; i < lens.size() && ret == 0; ++i) {
+      for (int j = 0; j < lens[i]; ++j) {
+        ret = AddToMem(values[i] + (size_t)j * vector_byte_size_,
+                       vector_byte_size_);
+        if (ret) break;
+      }
+    }
+  }
+  for (const uint8_t *value : values) {
+    delete[] value;
+  }
+  return ret;
+}
+
+void MemoryRawVector::PrefetchHandler() {
+  // advise a few megabytes at a time so that a quick close stops it
+  const size_t kPrefetchBytes = 8 * 1024 * 1024;
+  for (int i = 0; i < nsegments_ && prefetch_running_; ++i) {
+    if (mapped_lens_[i] == 0) continue;
+    uint8_t *base = segments_[i] - mapped_header_size_;
+    for (size_t off = 0; off < mapped_lens_[i] && prefetch_running_;
+         off += kPrefetchBytes) {
+      size_t len = std::min(kPrefetchBytes, mapped_lens_[i] - off);
+      if (madvise(base + off, len, MADV_WILLNEED)) {
+        LOG(WARNING) << desc_ << "madvise error: " << strerror(errno);
+        return;
+      }
+    }
+  }
+  LOG(INFO) << desc_ << "prefetch mapped segments finished";
+}
+
 int MemoryRawVector::GetVectorHeader(int start, int n, ScopeVectors &vecs,
                                      std::vector<int> &lens) {
+  if (!quantizer_.Enabled()) return GetMemHeader(start, n, vecs, lens);
+
+  if (start + n > (int)meta_info_->Size()) return -1;
+  int ret = storage_mgr_->GetHeaders(start, n, vecs.ptr_, lens);
+  vecs.deletable_.resize(vecs.ptr_.size(), true);
+  return ret;
+}
+
+int MemoryRawVector::GetMemHeader(int start, int n, ScopeVectors &vecs,
+                                  std::vector<int> &lens) {
   if (start + n > (int)meta_info_->Size()) return -1;
 
   while (n) {
     uint8_t *cmprs_v = segments_[start / segment_size_] +
-                       (size_t)start % segment_size_ * vector_byte_size_;
+                       (size_t)start % segment_size_ * mem_item_size_;
     int len = segment_size_ - start % segment_size_;
     if (len > n) len = n;
 
@@ -127,23 +382,33 @@ int MemoryRawVector::GetVectorHeader(int start, int n, ScopeVectors &vecs,
 }
 
 int MemoryRawVector::UpdateToStore(int vid, uint8_t *v, int len) {
-  memcpy((void *)(segments_[vid / segment_size_] +
-                  (size_t)vid % segment_size_ * vector_byte_size_),
-         (void *)v, vector_byte_size_);
+  if (quantizer_.Enabled()) {
+    if (!quantizer_trained_) {
+      // it is encoded from the storage when it is trained
+      std::lock_guard<std::mutex> lock(quantizer_mutex_);
+      if (!quantizer_trained_) return storage_mgr_->Update(vid, v, len);
+    }
+    Encode(vid, (const float *)v);
+  } else {
+    memcpy((void *)GetFromMem(vid), (void *)v, vector_byte_size_);
+  }
   return storage_mgr_->Update(vid, v, len);
 }
 
 int MemoryRawVector::GetVector(long vid, const uint8_t *&vec,
                                bool &deletable) const {
+  if (quantizer_.Enabled()) {
+    deletable = true;
+    return storage_mgr_->Get(vid, vec);
+  }
   deletable = false;
-  vec = segments_[vid / segment_size_] +
-        (size_t)vid % segment_size_ * vector_byte_size_;
+  vec = GetFromMem(vid);
   return SUCC;
 }
 
 uint8_t *MemoryRawVector::GetFromMem(long vid) const {
   uint8_t *cmprs_v = segments_[vid / segment_size_] +
-                     (size_t)vid % segment_size_ * vector_byte_size_;
+                     (size_t)vid % segment_size_ * mem_item_size_;
   return cmprs_v;
 }
 
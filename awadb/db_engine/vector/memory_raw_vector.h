@@ -7,7 +7,11 @@
 
 #pragma once
 
+#include <atomic>
+#include <mutex>
 #include <string>
+#include <thread>
+#include <vector>
 
 #include "raw_vector.h"
 
@@ -27,13 +31,46 @@ class MemoryRawVector : public RawVector {
 
   int AddToStore(uint8_t *v, int len) override;
 
+  int BatchAddToStore(const uint8_t *v, int n) override;
+
+  /**
+   * the full precision vectors, they are read from the storage if the
+   * vectors in memory are quantized
+   */
   int GetVectorHeader(int start, int n, ScopeVectors &vecs,
                       std::vector<int> &lens) override;
 
+  /**
+   * the vectors in memory, they are the codes of the quantizer if it is
+   * enabled
+   */
+  int GetMemHeader(int start, int n, ScopeVectors &vecs,
+                   std::vector<int> &lens);
+
   int UpdateToStore(int vid, uint8_t *v, int len) override;
 
+  // the vector in memory, a code if quantized
   uint8_t *GetFromMem(long vid) const;
 
+  /**
+   * the codes in memory are read only after the quantizer is trained, the
+   * exact vectors of the storage are searched before
+   */
+  bool QuantizerTrained() const { return quantizer_trained_; }
+
+  /**
+   * train SQ8 by the vectors added so far if it is not trained yet, an
+   * index calls it before it needs the codes
+   *
+   * @return 0 if successed
+   */
+  int TrainQuantizer();
+
+  // the code of the vector is clipped, its exact vector should be used
+  bool Clipped(long vid) const {
+    return clipped_[vid / segment_size_][vid % segment_size_] != 0;
+  }
+
  protected:
   int GetVector(long vid, const uint8_t *&vec, bool &deleteable) const override;
 
@@ -42,11 +79,54 @@ class MemoryRawVector : public RawVector {
   int ExtendSegments();
   int AddToMem(const uint8_t *v, int len);
 
+  /**
+   * train the SQ8 quantizer by the first vec_num vectors of the storage and
+   * encode them, quantizer_mutex_ should be held
+   *
+   * @return 0 if successed
+   */
+  int TrainQuantizer(int vec_num);
+
+  // encode the vector of vid and mark it if it is clipped
+  void Encode(long vid, const float *v);
+
+  int MemVecNum() const {
+    return nsegments_ > 0 ? (nsegments_ - 1) * segment_size_ + curr_idx_in_seg_
+                          : 0;
+  }
+
+  std::string QuantizerPath() const;
+
+  /**
+   * serve the first vec_num vectors from private mappings of the storage
+   * segment files instead of copying them, a write to a mapped segment
+   * only copies the page it touches
+   *
+   * @return 0 if successed
+   */
+  int MapSegments(int vec_num);
+
+  // copy the first vec_num vectors from the storage into memory
+  int CopySegments(int vec_num);
+
+  void PrefetchHandler();
+
   uint8_t **segments_;
+  // a byte of each vector, 1 if its code is clipped by the quantizer
+  uint8_t **clipped_;
+  // mapped_lens_[i] > 0 if segments_[i] is mapped rather than allocated
+  std::vector<size_t> mapped_lens_;
+  size_t mapped_header_size_;
+  std::atomic<bool> prefetch_running_;
+  std::thread prefetch_thread_;
   int nsegments_;
   int segment_size_;
   uint8_t *current_segment_;
   int curr_idx_in_seg_;
+  int mem_item_size_;  // bytes of a vector in memory
+  std::atomic<bool> quantizer_trained_;
+  // adding the vectors while SQ8 is not trained and training it
+  std::mutex quantizer_mutex_;
 };
 
 }  // namespace tig_gamma
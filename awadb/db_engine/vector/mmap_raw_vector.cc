@@ -88,6 +88,10 @@ int MmapRawVector::AddToStore(uint8_t *v, int len) {
   return storage_mgr_->Add(v, len);
 }
 
+int MmapRawVector::BatchAddToStore(const uint8_t *v, int n) {
+  return storage_mgr_->BatchAdd(v, n);
+}
+
 int MmapRawVector::UpdateToStore(int vid, uint8_t *v, int len) {
   return storage_mgr_->Update(vid, v, len);
 }
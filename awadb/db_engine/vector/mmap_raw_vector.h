@@ -24,6 +24,7 @@ class MmapRawVector : public RawVector {
   ~MmapRawVector();
   int InitStore(std::string &vec_name) override;
   int AddToStore(uint8_t *v, int len) override;
+  int BatchAddToStore(const uint8_t *v, int n) override;
   int GetVectorHeader(int start, int n, ScopeVectors &vecs,
                       std::vector<int> &lens) override;
   int UpdateToStore(int vid, uint8_t *v, int len) override;
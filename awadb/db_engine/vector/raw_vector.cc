@@ -36,6 +36,7 @@ RawVector::RawVector(VectorMetaInfo *meta_info, const string &root_path,
   zfp_compressor_ = nullptr;
 #endif
   allow_use_zfp = true;
+  allow_use_quantizer = false;
 }
 
 RawVector::~RawVector() {
@@ -68,6 +69,20 @@ int RawVector::Init(std::string vec_name, bool has_source, bool multi_vids) {
 
   vector_byte_size_ = meta_info_->Dimension() * data_size_;
 
+  if (store_params_.quantizer != "") {
+    if (!allow_use_quantizer) {
+      LOG(ERROR) << "quantizer is only supported by MemoryOnly store type";
+      return PARAM_ERR;
+    }
+    if (meta_info_->DataType() != VectorValueType::FLOAT) {
+      LOG(ERROR) << "data type is not float, quantizer is unsupported";
+      return PARAM_ERR;
+    }
+    if (quantizer_.Init(store_params_.quantizer, meta_info_->Dimension())) {
+      return PARAM_ERR;
+    }
+  }
+
 #ifdef WITH_ZFP
   if (!store_params_.compress.IsEmpty() && allow_use_zfp) {
     if (meta_info_->DataType() != VectorValueType::FLOAT) {
@@ -88,7 +103,9 @@ int RawVector::Init(std::string vec_name, bool has_source, bool multi_vids) {
             << ", has source=" << has_source << ", multi_vids=" << multi_vids
             << ", vector_byte_size=" << vector_byte_size_
             << ", dimension=" << meta_info_->Dimension()
-            << ", compress=" << store_params_.compress.ToStr();
+            << ", compress=" << store_params_.compress.ToStr()
+            << ", quantizer=" << store_params_.quantizer
+            << ", rerank=" << store_params_.rerank;
   return 0;
 }
 
@@ -155,6 +172,34 @@ int RawVector::Add(int docid, float *data) {
   return vid_mgr_->Add(meta_info_->size_++, docid);
 }
 
+int RawVector::BatchAdd(int docid, const uint8_t *data, int n) {
+  int ret = BatchAddToStore(data, n);
+  if (ret) {
+    LOG(ERROR) << "batch add to store error, docid=" << docid
+               << ", n=" << n << ", ret=" << ret;
+    return -2;
+  }
+
+  for (int i = 0; i < n; ++i) {
+    if (has_source_) {
+      size_t size = meta_info_->Size();
+      source_mem_pos_[size + 1] = source_mem_pos_[size];
+    }
+    ret = vid_mgr_->Add(meta_info_->size_++, docid + i);
+    if (ret) return ret;
+  }
+  return 0;
+}
+
+int RawVector::BatchAddToStore(const uint8_t *v, int n) {
+  int len = data_size_ * meta_info_->Dimension();
+  for (int i = 0; i < n; ++i) {
+    int ret = AddToStore((uint8_t *)v + (size_t)i * len, len);
+    if (ret) return ret;
+  }
+  return 0;
+}
+
 int RawVector::Update(int docid, struct Field &field) {
   if (vid_mgr_->MultiVids() || docid >= (int)meta_info_->Size()) {
     return -1;
@@ -242,6 +287,25 @@ int StoreParams::Parse(utils::JsonParser &jp) {
     }
   }
 
+  if (jp.Contains("prefetch")) {
+    int prefetch = 0;
+    if (jp.GetBool("prefetch", this->prefetch) &&
+        jp.GetInt("prefetch", prefetch) == 0) {
+      this->prefetch = prefetch != 0;
+    }
+  }
+
+  if (jp.Contains("quantizer")) {
+    jp.GetString("quantizer", quantizer);
+  }
+
+  if (!jp.GetInt("rerank", rerank)) {
+    if (rerank < 0) {
+      LOG(ERROR) << "invalid rerank=" << rerank;
+      return -1;
+    }
+  }
+
   if (jp.Contains("compress") && jp.GetObject("compress", compress)) {
     LOG(ERROR) << "parse compress error";
     return -1;
@@ -253,6 +317,9 @@ int StoreParams::Parse(utils::JsonParser &jp) {
 int StoreParams::MergeRight(StoreParams &other) {
   cache_size = other.cache_size;
   segment_size = other.segment_size;
+  prefetch = other.prefetch;
+  quantizer = other.quantizer;
+  rerank = other.rerank;
   // compress.MergeRight(other.compress);
   return 0;
 }
@@ -19,6 +19,7 @@
 #include "util/log.h"
 #include "util/utils.h"
 #include "vector/raw_vector_common.h"
+#include "vector/vector_quantizer.h"
 
 namespace tig_gamma {
 
@@ -30,18 +31,31 @@ static const int kInitSize = 1000 * 1000;
 struct StoreParams : DumpConfig {
   long cache_size;  // bytes
   int segment_size;
+  // fault the mapped segments in by a background thread after loading
+  bool prefetch;
   utils::JsonParser compress;
+  // "SQ8" or "FP16" to keep the vectors quantized in memory, the full
+  // precision vectors are kept on disk only
+  std::string quantizer;
+  // the top k * rerank candidates of the quantized vectors are ranked again
+  // by the full precision vectors, 0 or 1 doesn't rerank
+  int rerank;
 
   StoreParams(std::string name_ = "") : DumpConfig(name_) {
     cache_size = 1024;  // 1024M
     segment_size = 500000;
+    prefetch = false;
+    rerank = 0;
   }
 
   StoreParams(const StoreParams &other) {
     name = other.name;
     cache_size = other.cache_size;
     segment_size = other.segment_size;
+    prefetch = other.prefetch;
     compress = other.compress;
+    quantizer = other.quantizer;
+    rerank = other.rerank;
   }
 
   int Parse(const char *str);
@@ -53,6 +67,9 @@ struct StoreParams : DumpConfig {
     ss << "{";
     ss << "\"cache_size\":" << cache_size << ",";
     ss << "\"segment_size\":" << segment_size << ",";
+    ss << "\"prefetch\":" << (prefetch ? "true" : "false") << ",";
+    ss << "\"quantizer\":\"" << quantizer << "\",";
+    ss << "\"rerank\":" << rerank << ",";
     ss << "\"compress\":" << compress.ToStr();
     ss << "}";
     return ss.str();
@@ -61,6 +78,9 @@ struct StoreParams : DumpConfig {
   int ToJson(utils::JsonParser &jp) {
     jp.PutDouble("cache_size", cache_size);
     jp.PutInt("segment_size", segment_size);
+    jp.PutInt("prefetch", prefetch ? 1 : 0);
+    jp.PutString("quantizer", quantizer);
+    jp.PutInt("rerank", rerank);
     jp.PutObject("compress", compress);
     return 0;
   }
@@ -143,6 +163,14 @@ class RawVector : public VectorReader {
   
   int Add(int docid, float *data);
 
+  /** add the vectors of n docs without sources
+   *
+   * @param docid id of the first doc, the others follow it
+   * @param data n vectors stored back to back
+   * @return 0 if successed
+   */
+  int BatchAdd(int docid, const uint8_t *data, int n);
+
   int Update(int docid, struct Field &field);
 
   virtual size_t GetStoreMemUsage() { return 0; }
@@ -158,6 +186,10 @@ class RawVector : public VectorReader {
    */
   virtual int AddToStore(uint8_t *v, int len) = 0;
 
+  /** add n vectors stored back to back, by default one by one
+   */
+  virtual int BatchAddToStore(const uint8_t *v, int n);
+
   virtual int UpdateToStore(int vid, uint8_t *v, int len) = 0;
 
   virtual int GetCacheSize(int &cache_size) { return -1; };
@@ -177,6 +209,16 @@ class RawVector : public VectorReader {
 
   StorageManager *storage_mgr_;
   
+  /**
+   * @return the quantizer of the in-memory vectors, null if they are not
+   *         quantized
+   */
+  const VectorQuantizer *Quantizer() const {
+    return quantizer_.Enabled() ? &quantizer_ : nullptr;
+  }
+
+  int RerankFactor() const { return store_params_.rerank; }
+
   int HaveZFPCompressor() {
 #ifdef WITH_ZFP
     if(zfp_compressor_) return 1;
@@ -210,6 +252,8 @@ class RawVector : public VectorReader {
   std::string desc_;  // description of this raw vector
   StoreParams store_params_;
   bool allow_use_zfp;
+  bool allow_use_quantizer;
+  VectorQuantizer quantizer_;
 #ifdef WITH_ZFP
   ZFPCompressor *zfp_compressor_;
 #endif
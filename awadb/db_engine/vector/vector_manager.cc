@@ -7,6 +7,15 @@
 
 #include "vector/vector_manager.h"
 
+#include <strings.h>
+
+#include <algorithm>
+#include <climits>
+#include <memory>
+
+#include "faiss/utils/Heap.h"
+#include "faiss/utils/distances.h"
+#include "omp.h"
 #include "raw_vector_factory.h"
 #include "util/utils.h"
 
@@ -212,6 +221,51 @@ int VectorManager::AddToStore(int docid, std::vector<struct Field> &fields) {
   return ret;
 }
 
+int VectorManager::CheckColumns(ColumnDocs &docs) {
+  std::vector<DocColumn> &columns = docs.VectorColumns();
+  for (DocColumn &column : columns) {
+    auto it = raw_vectors_.find(column.name);
+    if (it == raw_vectors_.end()) {
+      LOG(ERROR) << "column " << column.name << " is not a vector field";
+      return -1;
+    }
+    if (ColumnDocs::ValueSize(column) != it->second->VectorByteSize()) {
+      LOG(ERROR) << "column " << column.name << " vector bytes ["
+                 << ColumnDocs::ValueSize(column) << "] != ["
+                 << it->second->VectorByteSize() << "]";
+      return -1;
+    }
+  }
+  // the vectors of a doc are found by its docid, none of them may be missing
+  for (auto &it : raw_vectors_) {
+    bool found = false;
+    for (DocColumn &column : columns) {
+      if (column.name == it.first) found = true;
+    }
+    if (!found) {
+      LOG(ERROR) << "vector field " << it.first << " has no column";
+      return -1;
+    }
+  }
+  return 0;
+}
+
+int VectorManager::BatchAddToStore(int docid, ColumnDocs &docs, int start,
+                                   int n) {
+  for (DocColumn &column : docs.VectorColumns()) {
+    size_t value_size = ColumnDocs::ValueSize(column);
+    const uint8_t *data =
+        (const uint8_t *)column.data + (size_t)start * value_size;
+    int ret = raw_vectors_[column.name]->BatchAdd(docid, data, n);
+    if (ret != 0) {
+      LOG(ERROR) << "batch add vectors of " << column.name
+                 << " error, docid=" << docid << ", ret=" << ret;
+      return ret;
+    }
+  }
+  return 0;
+}
+
 int VectorManager::Update(int docid, std::vector<Field> &fields) {
   for (size_t i = 0; i < fields.size(); i++) {
     string &name = fields[i].name;
@@ -277,106 +331,141 @@ int VectorManager::Indexing() {
 }
 
 int VectorManager::AddRTVecsToIndex(bool &index_is_dirty) {
-  int ret = 0;
   index_is_dirty = false;
+  std::vector<std::string> index_names;
+  std::vector<RetrievalModel *> retrieval_models;
+  std::vector<int *> chunk_sizes;
   for (const auto &iter : vector_indexes_) {
-    RetrievalModel *retrieval_model = iter.second;
-    RawVector *raw_vec = dynamic_cast<RawVector *>(retrieval_model->vector_);
-    int total_stored_vecs = raw_vec->MetaInfo()->Size();
-    int indexed_vec_count = retrieval_model->indexed_count_;
-
-    if (indexed_vec_count > total_stored_vecs) {
-      LOG(ERROR) << "internal error : indexed_vec_count=" << indexed_vec_count
-                 << " should not greater than total_stored_vecs="
-                 << total_stored_vecs;
-      ret = -1;
-    } else if (indexed_vec_count == total_stored_vecs) {
+    index_names.push_back(iter.first);
+    retrieval_models.push_back(iter.second);
+    auto chunk = index_chunk_sizes_.insert({iter.first, kMinIndexChunk});
+    chunk_sizes.push_back(&chunk.first->second);
+  }
+
+  // the fields are indexed one by one, the adds of the indexes parallelise
+  // with omp themselves
+  int ret = 0;
+  for (size_t i = 0; i < retrieval_models.size(); i++) {
+    bool dirty = false;
+    int field_ret = AddRTVecsToIndex(index_names[i], retrieval_models[i],
+                                     *chunk_sizes[i], dirty);
+    if (dirty) index_is_dirty = true;
+    if (field_ret < 0) {
+      if (ret >= 0) ret = field_ret;
+    } else if (ret >= 0) {
+      ret += field_ret;
+    }
+  }
+  return ret;
+}
+
+int VectorManager::AddRTVecsToIndex(const std::string &index_name,
+                                    RetrievalModel *retrieval_model,
+                                    int &chunk_size, bool &index_is_dirty) {
+  int ret = 0;
+  index_is_dirty = false;
+  RawVector *raw_vec = dynamic_cast<RawVector *>(retrieval_model->vector_);
+  int total_stored_vecs = raw_vec->MetaInfo()->Size();
+  int indexed_vec_count = retrieval_model->indexed_count_;
+
+  if (indexed_vec_count > total_stored_vecs) {
+    LOG(ERROR) << "internal error : indexed_vec_count=" << indexed_vec_count
+               << " should not greater than total_stored_vecs="
+               << total_stored_vecs;
+    ret = -1;
+  } else if (indexed_vec_count == total_stored_vecs) {
 #ifdef DEBUG
-      LOG(INFO) << "no extra vectors existed for indexing";
+    LOG(INFO) << "no extra vectors existed for indexing";
 #endif
-    } else {
-      int MAX_NUM_PER_INDEX = 1000;
-      int index_count =
-          (total_stored_vecs - indexed_vec_count) / MAX_NUM_PER_INDEX + 1;
-
-      for (int i = 0; i < index_count; i++) {
-        int start_docid = retrieval_model->indexed_count_;
-        size_t count_per_index =
-            (i == (index_count - 1) ? total_stored_vecs - start_docid
-                                    : MAX_NUM_PER_INDEX);
-        if (count_per_index == 0) break;
-
-        std::vector<int> lens;
-        ScopeVectors vector_head;
-        raw_vec->GetVectorHeader(start_docid, count_per_index, vector_head,
-                                 lens);
-        const uint8_t *add_vec = nullptr;
-        utils::ScopeDeleter1<uint8_t> del_vec;
-
-        if (lens.size() == 1) {
-          add_vec = vector_head.Get(0);
+  } else {
+    // a round adds one chunk, the rest is left to the next rounds
+    int end_docid =
+        std::min(total_stored_vecs, indexed_vec_count + chunk_size);
+    while (retrieval_model->indexed_count_ < end_docid) {
+      int start_docid = retrieval_model->indexed_count_;
+      size_t count_per_index = std::min(chunk_size, end_docid - start_docid);
+
+      std::vector<int> lens;
+      ScopeVectors vector_head;
+      raw_vec->GetVectorHeader(start_docid, count_per_index, vector_head,
+                               lens);
+      const uint8_t *add_vec = nullptr;
+      utils::ScopeDeleter1<uint8_t> del_vec;
+
+      if (lens.size() == 1) {
+        add_vec = vector_head.Get(0);
+      } else {
+        int raw_d = raw_vec->MetaInfo()->Dimension();
+        if (raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY) {
+          add_vec = new uint8_t[raw_d * count_per_index];
         } else {
-          int raw_d = raw_vec->MetaInfo()->Dimension();
+          add_vec = new uint8_t[raw_d * count_per_index * sizeof(float)];
+        }
+        del_vec.set(add_vec);
+        size_t offset = 0;
+        size_t element_size =
+            raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY
+                ? sizeof(char)
+                : sizeof(float);
+        for (size_t i = 0; i < vector_head.Size(); ++i) {
+          memcpy((void *)(add_vec + offset), (void *)vector_head.Get(i),
+                 element_size * raw_d * lens[i]);
+
           if (raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY) {
-            add_vec = new uint8_t[raw_d * count_per_index];
+            offset += raw_d * lens[i];
           } else {
-            add_vec = new uint8_t[raw_d * count_per_index * sizeof(float)];
-          }
-          del_vec.set(add_vec);
-          size_t offset = 0;
-          size_t element_size =
-              raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY
-                  ? sizeof(char)
-                  : sizeof(float);
-          for (size_t i = 0; i < vector_head.Size(); ++i) {
-            memcpy((void *)(add_vec + offset), (void *)vector_head.Get(i),
-                   element_size * raw_d * lens[i]);
-
-            if (raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY) {
-              offset += raw_d * lens[i];
-            } else {
-              offset += sizeof(float) * raw_d * lens[i];
-            }
+            offset += sizeof(float) * raw_d * lens[i];
           }
         }
-        if (!retrieval_model->Add(count_per_index, add_vec)) {
-          LOG(ERROR) << "add index from docid " << start_docid << " error!";
-          ret = -2;
-        } else {
-          retrieval_model->indexed_count_ += count_per_index;
-          index_is_dirty = true;
-        }
       }
-      if (ret == 0) {
-        ret = total_stored_vecs - indexed_vec_count;
-      }
-    }
-    std::vector<int64_t> vids;
-    int vid;
-    while (retrieval_model->updated_vids_.try_pop(vid)) {
-      if (raw_vec->Bitmap()->Test(raw_vec->VidMgr()->VID2DocID(vid)))
-        continue;
-      if (vid >= retrieval_model->indexed_count_) {
-        retrieval_model->updated_vids_.push(vid);
+      double start = utils::getmillisecs();
+      if (!retrieval_model->Add(count_per_index, add_vec)) {
+        LOG(ERROR) << "add index " << index_name << " from docid "
+                   << start_docid << " error!";
+        ret = -2;
         break;
-      } else {
-        vids.push_back(vid);
       }
-      if (vids.size() >= 20000) break;
+      retrieval_model->indexed_count_ += count_per_index;
+      index_is_dirty = true;
+
+      // the chunk grows while a full chunk is added quickly, so a backlog is
+      // caught up in few large adds, and shrinks when an add takes too long
+      double cost = utils::getmillisecs() - start;
+      if ((int)count_per_index == chunk_size &&
+          cost < kIndexChunkTargetMs / 2 && chunk_size < kMaxIndexChunk) {
+        chunk_size = std::min(chunk_size * 2, kMaxIndexChunk);
+      } else if (cost > kIndexChunkTargetMs && chunk_size > kMinIndexChunk) {
+        chunk_size = std::max(chunk_size / 2, kMinIndexChunk);
+      }
     }
-    if (vids.size() == 0) continue;
-    ScopeVectors scope_vecs;
-    if (raw_vec->Gets(vids, scope_vecs)) {
-        LOG(ERROR) << "get update vector error!";
-        ret = -3;
-        return ret;
+    if (ret == 0) {
+      ret = end_docid - indexed_vec_count;
     }
-    if (retrieval_model->Update(vids, scope_vecs.Get())) {
-      LOG(ERROR) << "update index error!";
-      ret = -4;
+  }
+  std::vector<int64_t> vids;
+  int vid;
+  while (retrieval_model->updated_vids_.try_pop(vid)) {
+    if (raw_vec->Bitmap()->Test(raw_vec->VidMgr()->VID2DocID(vid)))
+      continue;
+    if (vid >= retrieval_model->indexed_count_) {
+      retrieval_model->updated_vids_.push(vid);
+      break;
+    } else {
+      vids.push_back(vid);
     }
-    index_is_dirty = true;
+    if (vids.size() >= 20000) break;
+  }
+  if (vids.size() == 0) return ret;
+  ScopeVectors scope_vecs;
+  if (raw_vec->Gets(vids, scope_vecs)) {
+    LOG(ERROR) << "get update vector error!";
+    return -3;
+  }
+  if (retrieval_model->Update(vids, scope_vecs.Get())) {
+    LOG(ERROR) << "update index error!";
+    ret = -4;
   }
+  index_is_dirty = true;
   return ret;
 }
 
@@ -430,6 +519,226 @@ int parse_index_search_result(int n, int k, VectorResult &result,
   return 0;
 }
 
+template <class C>
+void search_docs_impl(GammaSearchCondition *condition, RawVector *raw_vec,
+                      int n, const float *xq, int k, bool is_l2,
+                      float *distances, int64_t *labels) {
+  int d = raw_vec->MetaInfo()->Dimension();
+  const std::vector<int> &docids = condition->filter_docids;
+
+#pragma omp parallel for schedule(dynamic)
+  for (int i = 0; i < n; i++) {
+    const float *xi = xq + (size_t)i * d;
+    float *simi = distances + (size_t)i * k;
+    int64_t *idxi = labels + (size_t)i * k;
+    faiss::heap_heapify<C>(k, simi, idxi);
+
+    std::vector<int64_t> vids;
+    for (int docid : docids) {
+      raw_vec->VidMgr()->DocID2VID(docid, vids);
+      for (int64_t vid : vids) {
+        ScopeVector scope_vec;
+        if (raw_vec->GetVector(vid, scope_vec) != 0) continue;
+        const float *yi = reinterpret_cast<const float *>(scope_vec.Get());
+        if (yi == nullptr) continue;
+
+        float dis = is_l2 ? faiss::fvec_L2sqr(xi, yi, d)
+                          : faiss::fvec_inner_product(xi, yi, d);
+        if (!condition->IsSimilarScoreValid(dis)) continue;
+        if (C::cmp(simi[0], dis)) {
+          faiss::heap_replace_top<C>(k, simi, idxi, dis, vid);
+        }
+      }
+    }
+    faiss::heap_reorder<C>(k, simi, idxi);
+  }
+}
+
+/**
+ * Exact search over the matched docs of the filters, it is used instead of
+ * the index when the filters are selective (FilterSearchMode::EXACT).
+ * The labels are vector ids like the ones returned by the indexes.
+ */
+int search_filtered_docs(GammaSearchCondition *condition, RawVector *raw_vec,
+                         int n, const uint8_t *x, int k, float *distances,
+                         int64_t *labels) {
+  const float *xq = reinterpret_cast<const float *>(x);
+  if (condition->retrieval_params_->GetDistanceComputeType() ==
+      DistanceComputeType::INNER_PRODUCT) {
+    search_docs_impl<faiss::CMin<float, int64_t>>(condition, raw_vec, n, xq, k,
+                                                  false, distances, labels);
+  } else {
+    search_docs_impl<faiss::CMax<float, int64_t>>(condition, raw_vec, n, xq, k,
+                                                  true, distances, labels);
+  }
+  return 0;
+}
+
+/**
+ * Fusion of the scores of the vector fields of a multi-vector search,
+ * NONE keeps the boosted sum of the distances.
+ */
+enum class FusionType { NONE, WEIGHTED, RRF };
+
+const int kDefaultRRFK = 60;
+
+void parse_fusion(const std::string &parameters, FusionType &fusion,
+                  int &rrf_k) {
+  fusion = FusionType::NONE;
+  rrf_k = kDefaultRRFK;
+  if (parameters == "") return;
+
+  utils::JsonParser jp;
+  if (jp.Parse(parameters.c_str())) return;
+
+  std::string type;
+  if (!jp.GetString("fusion", type)) {
+    if (!strcasecmp("weighted", type.c_str())) {
+      fusion = FusionType::WEIGHTED;
+    } else if (!strcasecmp("rrf", type.c_str())) {
+      fusion = FusionType::RRF;
+    } else if (type != "" && strcasecmp("none", type.c_str())) {
+      LOG(ERROR) << "invalid fusion = " << type << ", so use none.";
+    }
+  }
+  if (!jp.GetInt("rrf_k", rrf_k) && rrf_k < 0) {
+    LOG(ERROR) << "invalid rrf_k = " << rrf_k << ", so use "
+               << kDefaultRRFK;
+    rrf_k = kDefaultRRFK;
+  }
+}
+
+/**
+ * Merge the results of the vector fields of query req_no by docid.
+ *
+ * The valid results of each field are ordered by docid into order (vec_num *
+ * topn scratch positions) and merged with a k-way min-heap, so every doc is
+ * visited once together with all of the fields returning it. The merged docs
+ * are written to result.docs in docid order.
+ *
+ * @return number of merged docs
+ */
+int merge_vector_results(VectorResult *vec_results, size_t vec_num, int req_no,
+                         const float *boosts, float total_boost, bool and_op,
+                         bool is_l2, FusionType fusion, int rrf_k, int *order,
+                         GammaResult &result) {
+  int topn = vec_results[0].topn;
+  int counts[vec_num];
+  int cursors[vec_num];
+  int present[vec_num];
+  float min_dists[vec_num];
+  float max_dists[vec_num];
+
+  for (size_t j = 0; j < vec_num; j++) {
+    VectorResult &vec_result = vec_results[j];
+    int base = req_no * topn;
+    int *field_order = order + j * topn;
+    int count = 0;
+    // valid results are compacted to the front by parse_index_search_result
+    while (count < topn && vec_result.docids[base + count] != -1) {
+      field_order[count] = base + count;
+      count++;
+    }
+    std::sort(field_order, field_order + count, [&](int a, int b) {
+      return vec_result.docids[a] < vec_result.docids[b];
+    });
+    counts[j] = count;
+    cursors[j] = 0;
+    if (count > 0) {
+      auto minmax = std::minmax_element(vec_result.dists + base,
+                                        vec_result.dists + base + count);
+      min_dists[j] = *minmax.first;
+      max_dists[j] = *minmax.second;
+    }
+  }
+
+  // min-heap of (docid, field) on the current doc of every field
+  std::pair<int64_t, int> heap[vec_num];
+  auto heap_cmp = [](const std::pair<int64_t, int> &a,
+                     const std::pair<int64_t, int> &b) { return a > b; };
+  size_t heap_size = 0;
+  for (size_t j = 0; j < vec_num; j++) {
+    if (counts[j] == 0) continue;
+    heap[heap_size++] = {vec_results[j].docids[order[j * topn]], (int)j};
+  }
+  std::make_heap(heap, heap + heap_size, heap_cmp);
+
+  int result_idx = 0;
+  int total = and_op ? INT_MAX : -1;
+  while (heap_size > 0) {
+    int64_t docid = heap[0].first;
+    size_t present_num = 0;
+    std::fill_n(present, vec_num, -1);
+    while (heap_size > 0 && heap[0].first == docid) {
+      int j = heap[0].second;
+      std::pop_heap(heap, heap + heap_size, heap_cmp);
+      heap_size--;
+      present[j] = order[j * topn + cursors[j]];
+      present_num++;
+      if (++cursors[j] < counts[j]) {
+        heap[heap_size++] = {vec_results[j].docids[order[j * topn + cursors[j]]],
+                             j};
+        std::push_heap(heap, heap + heap_size, heap_cmp);
+      }
+    }
+    if (and_op && present_num < vec_num) continue;
+    if (result_idx >= result.topn) break;
+
+    VectorDoc *doc = result.docs[result_idx];
+    double score = 0;
+    for (size_t j = 0; j < vec_num; j++) {
+      VectorResult &vec_result = vec_results[j];
+      int idx = present[j];
+      if (idx == -1) {
+        // a missing field is scored as its worst returned distance for L2
+        if (fusion == FusionType::NONE && !and_op && is_l2) {
+          score += boosts[j] * vec_result.limit_value[req_no];
+        }
+        continue;
+      }
+      float dist = vec_result.dists[idx];
+      doc->fields[j].score = dist * boosts[j];
+      doc->fields[j].source = vec_result.sources[idx];
+      doc->fields[j].source_len = vec_result.source_lens[idx];
+
+      switch (fusion) {
+        case FusionType::NONE:
+          score += dist * boosts[j];
+          break;
+        case FusionType::WEIGHTED: {
+          // min-max normalized to [0, 1] where 1 is the best of the field
+          float range = max_dists[j] - min_dists[j];
+          float norm = range > 0 ? (dist - min_dists[j]) / range : 1.0f;
+          if (is_l2) norm = 1.0f - norm;
+          score += boosts[j] * norm;
+          break;
+        }
+        case FusionType::RRF: {
+          int rank = idx - req_no * topn;
+          score += boosts[j] / (rrf_k + rank + 1);
+          break;
+        }
+      }
+
+      if (and_op) {
+        if (vec_result.total[req_no] < total) total = vec_result.total[req_no];
+      } else if (vec_result.total[req_no] > total) {
+        total = vec_result.total[req_no];
+      }
+    }
+    if ((fusion == FusionType::NONE && !is_l2) ||
+        fusion == FusionType::WEIGHTED) {
+      score /= total_boost;
+    }
+    doc->docid = (int)docid;
+    doc->score = score;
+    result_idx++;
+  }
+
+  if (result_idx > 0 && total > 0 && total != INT_MAX) result.total = total;
+  return result_idx;
+}
+
 }  // namespace
 
 int VectorManager::Search(GammaQuery &query, GammaResult *results) {
@@ -440,8 +749,15 @@ int VectorManager::Search(GammaQuery &query, GammaResult *results) {
 
   query.condition->sort_by_docid = vec_num > 1 ? true : false;
   bool is_l2 = query.condition->metric_type == DistanceComputeType::L2 ? true : false;
-  float max_vec_boost = 0.0; 
   std::string vec_names[vec_num];
+
+  // the first field is searched with the query condition, the others with
+  // copies of it, so that the fields can be searched concurrently
+  std::vector<std::unique_ptr<GammaSearchCondition>> field_conditions(vec_num);
+  GammaSearchCondition *conditions[vec_num];
+  RetrievalModel *indexes[vec_num];
+  int field_ns[vec_num];
+
   for (size_t i = 0; i < vec_num; i++) {
     struct VectorQuery &vec_query = query.vec_query[i];
 
@@ -466,162 +782,138 @@ int VectorManager::Search(GammaQuery &query, GammaResult *results) {
     RawVector *raw_vec = dynamic_cast<RawVector *>(iter->second->vector_);
     int d = raw_vec->MetaInfo()->Dimension();
     if (raw_vec->MetaInfo()->DataType() == VectorValueType::BINARY) {
-      n = vec_query.value.size() / d;
+      n = vec_query.Size() / d;
     } else {
       //LOG(INFO)<<"vec_query value size is "<<vec_query.value.size()<<", datasize is "<<raw_vec->MetaInfo()->DataSize()<<", d is "<<d;
-      n = vec_query.value.size() / (raw_vec->MetaInfo()->DataSize() * d);
+      n = vec_query.Size() / (raw_vec->MetaInfo()->DataSize() * d);
     }
 
     if (n <= 0) {
       LOG(ERROR) << "Search n shouldn't less than 0!";
       return -1;
     }
+    if (i > 0 && n != field_ns[0]) {
+      LOG(ERROR) << "Query name " << index_name << " has " << n
+                 << " queries, but " << vec_names[0] << " has "
+                 << field_ns[0];
+      return -1;
+    }
+    field_ns[i] = n;
 
     if (!all_vector_results[i].init(n, query.condition->topn)) {
       LOG(ERROR) << "Query name " << index_name << "init vector result error";
       return -2;
     }
 
-    query.condition->Init(vec_query.min_score, vec_query.max_score,
-                          docids_bitmap_, raw_vec);
-    query.condition->retrieval_params_ =
-        index->Parse(query.condition->retrieval_parameters);
-    query.condition->metric_type =
-        query.condition->retrieval_params_->GetDistanceComputeType();
+    GammaSearchCondition *condition = query.condition;
+    if (i > 0) {
+      field_conditions[i].reset(new GammaSearchCondition(query.condition));
+      condition = field_conditions[i].get();
+    }
+    condition->Init(vec_query.min_score, vec_query.max_score, docids_bitmap_,
+                    raw_vec);
+    if (condition->retrieval_params_ != nullptr) {
+      delete condition->retrieval_params_;
+    }
+    condition->retrieval_params_ = index->Parse(condition->retrieval_parameters);
+    if (condition->retrieval_params_ == nullptr) {
+      LOG(ERROR) << "Query name " << index_name
+                 << " parse retrieval parameters error";
+      return -1;
+    }
+    condition->metric_type =
+        condition->retrieval_params_->GetDistanceComputeType();
+    conditions[i] = condition;
+    indexes[i] = index;
+  }
 
-    if (vec_query.boost > max_vec_boost) max_vec_boost = vec_query.boost;
+  int field_rets[vec_num];
+  auto search_field = [&](size_t i) {
+    struct VectorQuery &vec_query = query.vec_query[i];
+    GammaSearchCondition *condition = conditions[i];
+    RetrievalModel *index = indexes[i];
+    RawVector *raw_vec = dynamic_cast<RawVector *>(index->vector_);
 
     const uint8_t *x =
-        reinterpret_cast<const uint8_t *>(vec_query.value.c_str());
-    int ret_vec = index->Search(query.condition, n, x, query.condition->topn,
-                                all_vector_results[i].dists,
-                                all_vector_results[i].docids);
-
-    if (ret_vec != 0) {
-      ret = ret_vec;
-      LOG(ERROR) << "faild search of query " << index_name;
-      return -3;
+        reinterpret_cast<const uint8_t *>(vec_query.Data());
+    int ret_vec = 0;
+    if (condition->filter_search_mode == FilterSearchMode::EXACT &&
+        raw_vec->MetaInfo()->DataType() == VectorValueType::FLOAT) {
+      ret_vec = search_filtered_docs(condition, raw_vec, n, x, condition->topn,
+                                     all_vector_results[i].dists,
+                                     all_vector_results[i].docids);
     } else {
-      parse_index_search_result(n, query.condition->topn, all_vector_results[i],
+      ret_vec = index->Search(condition, n, x, condition->topn,
+                              all_vector_results[i].dists,
+                              all_vector_results[i].docids);
+    }
+    if (ret_vec == 0) {
+      parse_index_search_result(n, condition->topn, all_vector_results[i],
                                 index, is_l2);
+    }
+    field_rets[i] = ret_vec;
+  };
+
+  // the fields are searched one by one, the indexes parallelise a search
+  // with omp themselves and would run serially inside a parallel loop here
+  for (size_t i = 0; i < vec_num; i++) {
+    search_field(i);
+  }
 
-      /*
-      if (query.condition->sort_by_docid) {
-        all_vector_results[i].sort_by_docid();
-      }*/
+  for (size_t i = 0; i < vec_num; i++) {
+    if (field_rets[i] != 0) {
+      ret = field_rets[i];
+      LOG(ERROR) << "faild search of query " << vec_names[i];
+      return -3;
     }
+  }
+  if (vec_num > 0) {
+    query.condition->metric_type = conditions[vec_num - 1]->metric_type;
+  }
 #ifdef PERFORMANCE_TESTING
-    std::string msg;
-    msg += "search " + std::to_string(i);
-    query.condition->GetPerfTool().Perf(msg);
+  query.condition->GetPerfTool().Perf("search " + std::to_string(vec_num) +
+                                      " fields");
 #endif
-  }
 
   query.condition->batch_req_num = n;
   if (query.condition->sort_by_docid) {
+    FusionType fusion;
+    int rrf_k;
+    parse_fusion(query.condition->retrieval_parameters, fusion, rrf_k);
+
+    float fields_boost_array[vec_num];
+    float total_boost = 0.0;
+    for (size_t j = 0; j < vec_num; j++) {
+      float field_boost = 1.0;
+      if (query.vec_query[j].has_boost == 1) {
+        field_boost = query.vec_query[j].boost;
+      }
+      fields_boost_array[j] = field_boost;
+      total_boost += field_boost;
+    }
+
+    int total_return_results = query.condition->multi_vec_and_op
+                                   ? query.condition->topn
+                                   : query.condition->topn * vec_num;
+    std::vector<int> order(vec_num * query.condition->topn);
     for (int i = 0; i < n; i++) {
-      int total_return_results = query.condition->multi_vec_and_op 
-	      ? query.condition->topn : query.condition->topn * vec_num;  
       if (!results[i].init(total_return_results, vec_names, vec_num)) {
         LOG(ERROR) << "init gamma result(sort by docid) error, topn="
                    << query.condition->topn << ", vector number=" << vec_num;
         return -4;
       }
 
-      std::unordered_map<int, float> doc2vec_scores;
-      std::unordered_map<int, int> doc2vec_count;
-      std::unordered_map<int, std::unordered_map<int, int>> doc2vec_idx;
-      doc2vec_scores.reserve(total_return_results);
-      doc2vec_count.reserve(total_return_results);
-      doc2vec_idx.reserve(total_return_results); 
-      
-      float fields_boost_array[vec_num]; 
-      float total_boost = 0.0;
-      float accu_score = 0.0; 
-      for (size_t j = 0; j < vec_num; j++) {
-        float field_boost = 1.0; 
-	if (query.vec_query[j].has_boost == 1)  {
-          /*if (!is_l2) {
-            field_boost = query.vec_query[j].boost;	
-	  }  else {
-	    field_boost = query.vec_query[j].boost / max_vec_boost;
-	  }*/
-          field_boost = query.vec_query[j].boost;	
-	}
-	fields_boost_array[j] = field_boost;
-        total_boost += field_boost;
-	   
-	all_vector_results[j].logic_op(
-	        i,
-		j,
-		query.condition->multi_vec_and_op,
-		doc2vec_scores,
-		field_boost,
-		doc2vec_count,
-		is_l2,
-		accu_score,
-		doc2vec_idx);
-      }
-
-      if (!is_l2)  {
-	for (auto &iter: doc2vec_scores)  {
-	  iter.second /= total_boost;
-	}	
-      }
-
-      int result_idx = 0;
-      if (query.condition->multi_vec_and_op)  {
-        for (auto iter: doc2vec_count)  {
-	  if ((size_t)iter.second == vec_num)  {
-            results[i].docs[result_idx]->docid = iter.first;
-            results[i].docs[result_idx]->score = doc2vec_scores[iter.first];
-            int total_and_op = INT_MAX; 
-	    for (auto iter_field: doc2vec_idx[iter.first])  {
-	      int vec_no = iter_field.first;
-              int idx = iter_field.second;
-              char *source = all_vector_results[vec_no].sources[idx];
-	      int source_len = all_vector_results[vec_no].source_lens[idx]; 
-              float dist = all_vector_results[vec_no].dists[idx];
-	      results[i].docs[result_idx]->fields[vec_no].score = 
-		      dist * fields_boost_array[vec_no];
-	      results[i].docs[result_idx]->fields[vec_no].source = source;
-	      results[i].docs[result_idx]->fields[vec_no].source_len = source_len;
-	      if (all_vector_results[vec_no].total[i] < total_and_op)  {
-	        total_and_op = all_vector_results[vec_no].total[i];
-	      }
-	    } 
-	    
-	    results[i].total = total_and_op;
-	    result_idx++; 
-	  }
-	}	
-      }  else  {
-	for (auto iter: doc2vec_scores)  {
-          results[i].docs[result_idx]->docid = iter.first;
-          results[i].docs[result_idx]->score = doc2vec_scores[iter.first];
-	  int total_or_op = -1; 
-	  for (auto iter_field: doc2vec_idx[iter.first])  {
-	    int vec_no = iter_field.first;
-            int idx = iter_field.second;
-            char *source = all_vector_results[vec_no].sources[idx];
-	    int source_len = all_vector_results[vec_no].source_lens[idx]; 
-            float dist = all_vector_results[vec_no].dists[idx];
-	    results[i].docs[result_idx]->fields[vec_no].score = 
-		      dist * fields_boost_array[vec_no];
-	    results[i].docs[result_idx]->fields[vec_no].source = source;
-	    results[i].docs[result_idx]->fields[vec_no].source_len = source_len;
-	    if (all_vector_results[vec_no].total[i] > total_or_op)  {
-	      total_or_op = all_vector_results[vec_no].total[i];
-	    }
-	  } 
-	   
-	  results[i].total = total_or_op > 0 ?  total_or_op : results[i].total;
-	  result_idx++; 
-	}
-      }  
-
+      int result_idx = merge_vector_results(
+          all_vector_results, vec_num, i, fields_boost_array, total_boost,
+          query.condition->multi_vec_and_op, is_l2, fusion, rrf_k,
+          order.data(), results[i]);
       results[i].results_count = result_idx;
-      if (query.condition->multi_vector_rank) {
+
+      if (fusion != FusionType::NONE) {
+        // fused scores are higher for better docs
+        std::sort(results[i].docs, results[i].docs + result_idx,
+                  InnerProductCmp);
+      } else if (query.condition->multi_vector_rank) {
         switch (query.condition->metric_type) {
           case DistanceComputeType::INNER_PRODUCT:
             std::sort(results[i].docs, results[i].docs + result_idx,
@@ -819,8 +1111,36 @@ int VectorManager::Dump(const string &path, int dump_docid, int max_docid) {
   return 0;
 }
 
+int VectorManager::DumpDelta(const string &path, int seq, int dump_docid,
+                             int max_docid) {
+  for (const auto &iter : vector_indexes_) {
+    const string &vec_name = iter.first;
+    int ret = iter.second->DumpDelta(path, seq);
+    if (ret != 0) {
+      LOG(INFO) << "vector " << vec_name << " dump delta " << seq
+                << " failed, it needs a full dump, ret=" << ret;
+      return ret;
+    }
+  }
+
+  for (const auto &iter : raw_vectors_) {
+    const string &vec_name = iter.first;
+    RawVector *raw_vector = dynamic_cast<RawVector *>(iter.second);
+    if (raw_vector->GetIO()) {
+      int start = raw_vector->VidMgr()->GetFirstVID(dump_docid);
+      int end = raw_vector->VidMgr()->GetLastVID(max_docid);
+      int ret = raw_vector->GetIO()->Dump(start, end + 1);
+      if (ret != 0) {
+        LOG(ERROR) << "vector " << vec_name << " dump failed!";
+        return -1;
+      }
+    }
+  }
+  return 0;
+}
+
 int VectorManager::Load(const std::vector<std::string> &index_dirs,
-                        int &doc_num) {
+                        int &doc_num, int delta_num) {
   int min_vec_num = doc_num;
   for (const auto &iter : raw_vectors_) {
     if (iter.second->GetIO()) {
@@ -854,6 +1174,16 @@ int VectorManager::Load(const std::vector<std::string> &index_dirs,
                      << " > raw_vec_num=" << min_vec_num;
           return -1;
         }
+        // an empty index is rebuilt from the raw vectors, its deltas are
+        // not needed
+        for (int seq = 1; seq <= delta_num && load_num > 0; ++seq) {
+          load_num = iter.second->LoadDelta(index_dirs[0], seq);
+          if (load_num < 0 || load_num > min_vec_num) {
+            LOG(ERROR) << "vector [" << iter.first << "] load delta " << seq
+                       << " failed, load_num=" << load_num;
+            return -1;
+          }
+        }
         iter.second->indexed_count_ = load_num;
         LOG(INFO) << "vector [" << iter.first << "] load gamma index success!";
       }
@@ -908,6 +1238,17 @@ void VectorManager::Close() {
   LOG(INFO) << "VectorManager closed.";
 }
 
+long VectorManager::UnindexedNum() {
+  long num = 0;
+  for (const auto &iter : vector_indexes_) {
+    if (iter.second == nullptr) continue;
+    RawVector *raw_vec = dynamic_cast<RawVector *>(iter.second->vector_);
+    long unindexed = raw_vec->MetaInfo()->Size() - iter.second->indexed_count_;
+    if (unindexed > 0) num += unindexed;
+  }
+  return num;
+}
+
 int VectorManager::MinIndexedNum() {
   int min = 0;
   for (const auto &iter : vector_indexes_) {
@@ -11,6 +11,7 @@
 #include <map>
 #include <string>
 
+#include "c_api/api_data/gamma_column_docs.h"
 #include "c_api/api_data/gamma_config.h"
 #include "common/gamma_common_data.h"
 #include "index/retrieval_model.h"
@@ -20,6 +21,12 @@
 
 namespace tig_gamma {
 
+// bounds of the number of vectors added to an index at a time
+const int kMinIndexChunk = 1000;
+const int kMaxIndexChunk = 64 * 1024;
+// the chunk is resized so that adding one takes about this long
+const double kIndexChunkTargetMs = 200;
+
 class VectorManager {
  public:
   VectorManager(const VectorStorageType &store_type,
@@ -31,10 +38,29 @@ class VectorManager {
 
   int AddToStore(int docid, std::vector<struct Field> &fields);
 
+  /**
+   * check every vector field has a column of its vector size in docs
+   * @return 0 if successed
+   */
+  int CheckColumns(ColumnDocs &docs);
+
+  /**
+   * add the vectors of docs [start, start + n) of a batch stored by columns
+   * to the raw vectors in blocks, docid is the id of doc start
+   * @return 0 if successed
+   */
+  int BatchAddToStore(int docid, ColumnDocs &docs, int start, int n);
+
   int Update(int docid, std::vector<struct Field> &fields);
 
   int Indexing();
 
+  /**
+   * add a chunk of the stored vectors which are not indexed yet to the index
+   * of every field, a backlog is added by several calls
+   *
+   * @return number of added vectors, < 0 if failed
+   */
   int AddRTVecsToIndex(bool &index_is_dirty);
 
   // int Add(int docid, const std::vector<Field *> &field_vecs);
@@ -50,7 +76,16 @@ class VectorManager {
                         long &vector_total_mem_bytes);
 
   int Dump(const std::string &path, int dump_docid, int max_docid);
-  int Load(const std::vector<std::string> &path, int &doc_num);
+
+  /**
+   * dump the index changes since the last dump as the delta seq of the full
+   * dump in path
+   * @return 0 if successed, otherwise a full dump is needed
+   */
+  int DumpDelta(const std::string &path, int seq, int dump_docid,
+                int max_docid);
+  int Load(const std::vector<std::string> &path, int &doc_num,
+           int delta_num = 0);
 
   bool CheckDocVecFields(Doc &doc);
 
@@ -75,6 +110,9 @@ class VectorManager {
 
   int MinIndexedNum();
 
+  // number of stored vectors which are not indexed yet, of all fields
+  long UnindexedNum();
+
   int AlterCacheSize(struct CacheInfo &cache_info);
 
   int GetAllCacheSize(Config &conf);
@@ -90,6 +128,12 @@ class VectorManager {
     return field_name + "_" + retrieval_type;
   }
 
+  // add at most chunk_size vectors to the index of a field, the chunk is
+  // resized by the cost of the add
+  int AddRTVecsToIndex(const std::string &index_name,
+                       RetrievalModel *retrieval_model, int &chunk_size,
+                       bool &index_is_dirty);
+
  private:
   VectorStorageType default_store_type_;
   bitmap::BitmapManager *docids_bitmap_;
@@ -99,6 +143,8 @@ class VectorManager {
   std::map<std::string, RawVector *> raw_vectors_;
   std::map<std::string, RetrievalModel *> vector_indexes_;
   std::vector<std::string> retrieval_types_;
+  // adaptive number of vectors added at a time, per index
+  std::map<std::string, int> index_chunk_sizes_;
 };
 
 }  // namespace tig_gamma
@@ -0,0 +1,455 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include "vector_quantizer.h"
+
+#include <string.h>
+#include <strings.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cmath>
+
+#include "util/log.h"
+#include "util/utils.h"
+
+#if defined(__x86_64__) || defined(__i386__)
+#define GAMMA_X86_SIMD
+#include <immintrin.h>
+// the kernels are compiled for their instructions whatever the build flags
+// are, and only called if the cpu supports them
+#define TARGET_AVX2 __attribute__((target("avx2,fma,f16c")))
+#define TARGET_AVX512 __attribute__((target("avx512f")))
+#endif
+
+namespace tig_gamma {
+
+namespace {
+
+float HalfToFloat(uint16_t h) {
+  uint32_t sign = (uint32_t)(h & 0x8000) << 16;
+  uint32_t exp = (h >> 10) & 0x1f;
+  uint32_t mant = h & 0x3ff;
+  uint32_t bits;
+  if (exp == 0) {
+    if (mant == 0) {
+      bits = sign;
+    } else {
+      // subnormal, normalize it
+      exp = 127 - 15 + 1;
+      while ((mant & 0x400) == 0) {
+        mant <<= 1;
+        exp--;
+      }
+      bits = sign | (exp << 23) | ((mant & 0x3ff) << 13);
+    }
+  } else if (exp == 31) {
+    bits = sign | 0x7f800000 | (mant << 13);
+  } else {
+    bits = sign | ((exp + 127 - 15) << 23) | (mant << 13);
+  }
+  float f;
+  memcpy(&f, &bits, sizeof(f));
+  return f;
+}
+
+// round to nearest even
+uint16_t FloatToHalf(float f) {
+  uint32_t x;
+  memcpy(&x, &f, sizeof(x));
+  uint32_t sign = (x >> 16) & 0x8000;
+  uint32_t mant = x & 0x7fffff;
+  if (((x >> 23) & 0xff) == 0xff) {
+    return sign | 0x7c00 | (mant ? 0x200 : 0);
+  }
+  int exp = (int)((x >> 23) & 0xff) - 127 + 15;
+  if (exp >= 31) return sign | 0x7c00;
+  if (exp <= 0) {
+    if (exp < -10) return sign;
+    mant |= 0x800000;
+    int shift = 14 - exp;
+    uint32_t h = mant >> shift;
+    uint32_t rem = mant & ((1u << shift) - 1);
+    uint32_t half = 1u << (shift - 1);
+    if (rem > half || (rem == half && (h & 1))) h++;
+    return sign | h;
+  }
+  uint32_t h = sign | ((uint32_t)exp << 10) | (mant >> 13);
+  uint32_t rem = mant & 0x1fff;
+  // a carry goes on to the exponent, which is still right
+  if (rem > 0x1000 || (rem == 0x1000 && (h & 1))) h++;
+  return h;
+}
+
+template <bool kL2>
+float Sq8Scalar(const float *x, const uint8_t *xc, const uint8_t *y,
+                const float *scale, const float *base, int d) {
+  float res = 0;
+  for (int j = 0; j < d; ++j) {
+    float a = x ? x[j] : base[j] + xc[j] * scale[j];
+    float b = base[j] + y[j] * scale[j];
+    res += kL2 ? (a - b) * (a - b) : a * b;
+  }
+  return res;
+}
+
+template <bool kL2>
+float Fp16Scalar(const float *x, const uint8_t *xc, const uint8_t *y,
+                 const float *scale, const float *base, int d) {
+  const uint16_t *xh = reinterpret_cast<const uint16_t *>(xc);
+  const uint16_t *yh = reinterpret_cast<const uint16_t *>(y);
+  float res = 0;
+  for (int j = 0; j < d; ++j) {
+    float a = x ? x[j] : HalfToFloat(xh[j]);
+    float b = HalfToFloat(yh[j]);
+    res += kL2 ? (a - b) * (a - b) : a * b;
+  }
+  return res;
+}
+
+#ifdef GAMMA_X86_SIMD
+
+TARGET_AVX2 inline float ReduceAddAvx2(__m256 v) {
+  __m128 s = _mm_add_ps(_mm256_castps256_ps128(v), _mm256_extractf128_ps(v, 1));
+  s = _mm_hadd_ps(s, s);
+  s = _mm_hadd_ps(s, s);
+  return _mm_cvtss_f32(s);
+}
+
+TARGET_AVX2 inline __m256 Sq8LoadAvx2(const uint8_t *c, const float *scale,
+                                      const float *base) {
+  __m256 v = _mm256_cvtepi32_ps(
+      _mm256_cvtepu8_epi32(_mm_loadl_epi64((const __m128i *)c)));
+  return _mm256_fmadd_ps(v, _mm256_loadu_ps(scale), _mm256_loadu_ps(base));
+}
+
+TARGET_AVX2 inline __m256 Fp16LoadAvx2(const uint8_t *c) {
+  return _mm256_cvtph_ps(_mm_loadu_si128((const __m128i *)c));
+}
+
+// x is a float vector, or the code xc if kCode
+template <bool kL2, bool kCode>
+TARGET_AVX2 float Sq8Avx2(const float *x, const uint8_t *xc, const uint8_t *y,
+                          const float *scale, const float *base, int d) {
+  __m256 acc = _mm256_setzero_ps();
+  int j = 0;
+  for (; j + 8 <= d; j += 8) {
+    __m256 a = kCode ? Sq8LoadAvx2(xc + j, scale + j, base + j)
+                     : _mm256_loadu_ps(x + j);
+    __m256 b = Sq8LoadAvx2(y + j, scale + j, base + j);
+    if (kL2) {
+      __m256 diff = _mm256_sub_ps(a, b);
+      acc = _mm256_fmadd_ps(diff, diff, acc);
+    } else {
+      acc = _mm256_fmadd_ps(a, b, acc);
+    }
+  }
+  float res = ReduceAddAvx2(acc);
+  if (j < d) {
+    res += Sq8Scalar<kL2>(kCode ? nullptr : x + j, kCode ? xc + j : nullptr,
+                          y + j, scale + j, base + j, d - j);
+  }
+  return res;
+}
+
+template <bool kL2, bool kCode>
+TARGET_AVX2 float Fp16Avx2(const float *x, const uint8_t *xc, const uint8_t *y,
+                           const float *scale, const float *base, int d) {
+  __m256 acc = _mm256_setzero_ps();
+  int j = 0;
+  for (; j + 8 <= d; j += 8) {
+    __m256 a = kCode ? Fp16LoadAvx2(xc + j * 2) : _mm256_loadu_ps(x + j);
+    __m256 b = Fp16LoadAvx2(y + j * 2);
+    if (kL2) {
+      __m256 diff = _mm256_sub_ps(a, b);
+      acc = _mm256_fmadd_ps(diff, diff, acc);
+    } else {
+      acc = _mm256_fmadd_ps(a, b, acc);
+    }
+  }
+  float res = ReduceAddAvx2(acc);
+  if (j < d) {
+    res += Fp16Scalar<kL2>(kCode ? nullptr : x + j,
+                           kCode ? xc + j * 2 : nullptr, y + j * 2, scale,
+                           base, d - j);
+  }
+  return res;
+}
+
+TARGET_AVX2 void Fp16EncodeAvx2(long n, const float *x, uint16_t *h) {
+  long i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i v =
+        _mm256_cvtps_ph(_mm256_loadu_ps(x + i), _MM_FROUND_TO_NEAREST_INT);
+    _mm_storeu_si128((__m128i *)(h + i), v);
+  }
+  for (; i < n; ++i) h[i] = FloatToHalf(x[i]);
+}
+
+TARGET_AVX512 inline __m512 Sq8LoadAvx512(const uint8_t *c, const float *scale,
+                                          const float *base) {
+  __m512 v = _mm512_cvtepi32_ps(
+      _mm512_cvtepu8_epi32(_mm_loadu_si128((const __m128i *)c)));
+  return _mm512_fmadd_ps(v, _mm512_loadu_ps(scale), _mm512_loadu_ps(base));
+}
+
+TARGET_AVX512 inline __m512 Fp16LoadAvx512(const uint8_t *c) {
+  return _mm512_cvtph_ps(_mm256_loadu_si256((const __m256i *)c));
+}
+
+template <bool kL2, bool kCode>
+TARGET_AVX512 float Sq8Avx512(const float *x, const uint8_t *xc,
+                              const uint8_t *y, const float *scale,
+                              const float *base, int d) {
+  __m512 acc = _mm512_setzero_ps();
+  int j = 0;
+  for (; j + 16 <= d; j += 16) {
+    __m512 a = kCode ? Sq8LoadAvx512(xc + j, scale + j, base + j)
+                     : _mm512_loadu_ps(x + j);
+    __m512 b = Sq8LoadAvx512(y + j, scale + j, base + j);
+    if (kL2) {
+      __m512 diff = _mm512_sub_ps(a, b);
+      acc = _mm512_fmadd_ps(diff, diff, acc);
+    } else {
+      acc = _mm512_fmadd_ps(a, b, acc);
+    }
+  }
+  float res = _mm512_reduce_add_ps(acc);
+  if (j < d) {
+    res += Sq8Scalar<kL2>(kCode ? nullptr : x + j, kCode ? xc + j : nullptr,
+                          y + j, scale + j, base + j, d - j);
+  }
+  return res;
+}
+
+template <bool kL2, bool kCode>
+TARGET_AVX512 float Fp16Avx512(const float *x, const uint8_t *xc,
+                               const uint8_t *y, const float *scale,
+                               const float *base, int d) {
+  __m512 acc = _mm512_setzero_ps();
+  int j = 0;
+  for (; j + 16 <= d; j += 16) {
+    __m512 a = kCode ? Fp16LoadAvx512(xc + j * 2) : _mm512_loadu_ps(x + j);
+    __m512 b = Fp16LoadAvx512(y + j * 2);
+    if (kL2) {
+      __m512 diff = _mm512_sub_ps(a, b);
+      acc = _mm512_fmadd_ps(diff, diff, acc);
+    } else {
+      acc = _mm512_fmadd_ps(a, b, acc);
+    }
+  }
+  float res = _mm512_reduce_add_ps(acc);
+  if (j < d) {
+    res += Fp16Scalar<kL2>(kCode ? nullptr : x + j,
+                           kCode ? xc + j * 2 : nullptr, y + j * 2, scale,
+                           base, d - j);
+  }
+  return res;
+}
+
+bool CpuHasAvx512() {
+  __builtin_cpu_init();
+  return __builtin_cpu_supports("avx512f");
+}
+
+// every cpu with avx2 and fma has f16c
+bool CpuHasAvx2() {
+  __builtin_cpu_init();
+  return __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma");
+}
+
+#endif  // GAMMA_X86_SIMD
+
+const char kSq8Magic[] = "SQ8Q";
+
+}  // namespace
+
+VectorQuantizer::VectorQuantizer() {
+  type_ = QuantizerType::NONE;
+  d_ = 0;
+  code_size_ = 0;
+  ip_ = nullptr;
+  l2_ = nullptr;
+  code_ip_ = nullptr;
+  code_l2_ = nullptr;
+  simd_name_ = "none";
+  f16c_ = false;
+}
+
+int VectorQuantizer::Init(const std::string &type, int dimension) {
+  d_ = dimension;
+  if (type == "") {
+    type_ = QuantizerType::NONE;
+    code_size_ = 0;
+    return 0;
+  }
+  if (!strcasecmp(type.c_str(), "SQ8")) {
+    type_ = QuantizerType::SQ8;
+    code_size_ = d_;
+    // the ranges are set by Train or Load before a code is encoded
+    base_.assign(d_, -1.0f);
+    scale_.assign(d_, 2.0f / 255);
+  } else if (!strcasecmp(type.c_str(), "FP16")) {
+    type_ = QuantizerType::FP16;
+    code_size_ = d_ * 2;
+  } else {
+    LOG(ERROR) << "invalid quantizer type=" << type
+               << ", it should be SQ8 or FP16";
+    return -1;
+  }
+
+  bool sq8 = type_ == QuantizerType::SQ8;
+  ip_ = sq8 ? Sq8Scalar<false> : Fp16Scalar<false>;
+  l2_ = sq8 ? Sq8Scalar<true> : Fp16Scalar<true>;
+  code_ip_ = ip_;
+  code_l2_ = l2_;
+  simd_name_ = "none";
+#ifdef GAMMA_X86_SIMD
+  if (CpuHasAvx512()) {
+    ip_ = sq8 ? Sq8Avx512<false, false> : Fp16Avx512<false, false>;
+    l2_ = sq8 ? Sq8Avx512<true, false> : Fp16Avx512<true, false>;
+    code_ip_ = sq8 ? Sq8Avx512<false, true> : Fp16Avx512<false, true>;
+    code_l2_ = sq8 ? Sq8Avx512<true, true> : Fp16Avx512<true, true>;
+    simd_name_ = "avx512";
+    f16c_ = true;
+  } else if (CpuHasAvx2()) {
+    ip_ = sq8 ? Sq8Avx2<false, false> : Fp16Avx2<false, false>;
+    l2_ = sq8 ? Sq8Avx2<true, false> : Fp16Avx2<true, false>;
+    code_ip_ = sq8 ? Sq8Avx2<false, true> : Fp16Avx2<false, true>;
+    code_l2_ = sq8 ? Sq8Avx2<true, true> : Fp16Avx2<true, true>;
+    simd_name_ = "avx2";
+    f16c_ = true;
+  }
+#endif
+  LOG(INFO) << "init quantizer " << TypeName() << ", dimension=" << d_
+            << ", simd=" << simd_name_;
+  return 0;
+}
+
+std::string VectorQuantizer::TypeName() const {
+  switch (type_) {
+    case QuantizerType::SQ8:
+      return "SQ8";
+    case QuantizerType::FP16:
+      return "FP16";
+    default:
+      return "";
+  }
+}
+
+void VectorQuantizer::Train(long n, const float *x) {
+  if (type_ != QuantizerType::SQ8 || n <= 0) return;
+  std::vector<float> vmin(x, x + d_);
+  std::vector<float> vmax(x, x + d_);
+  for (long i = 1; i < n; ++i) {
+    const float *xi = x + i * d_;
+    for (int j = 0; j < d_; ++j) {
+      vmin[j] = std::min(vmin[j], xi[j]);
+      vmax[j] = std::max(vmax[j], xi[j]);
+    }
+  }
+  for (int j = 0; j < d_; ++j) {
+    float diff = vmax[j] - vmin[j];
+    if (!(diff > 0)) diff = 1.0f;
+    base_[j] = vmin[j];
+    scale_[j] = diff / 255;
+  }
+}
+
+void VectorQuantizer::Encode(long n, const float *x, uint8_t *codes) const {
+  if (type_ == QuantizerType::SQ8) {
+    for (long i = 0; i < n; ++i) {
+      const float *xi = x + i * d_;
+      uint8_t *ci = codes + i * code_size_;
+      for (int j = 0; j < d_; ++j) {
+        float v = std::round((xi[j] - base_[j]) / scale_[j]);
+        ci[j] = (uint8_t)std::min(255.0f, std::max(0.0f, v));
+      }
+    }
+  } else if (type_ == QuantizerType::FP16) {
+    uint16_t *h = reinterpret_cast<uint16_t *>(codes);
+#ifdef GAMMA_X86_SIMD
+    if (f16c_) {
+      Fp16EncodeAvx2(n * d_, x, h);
+      return;
+    }
+#endif
+    for (long i = 0; i < n * d_; ++i) h[i] = FloatToHalf(x[i]);
+  }
+}
+
+bool VectorQuantizer::InRange(const float *x) const {
+  if (type_ == QuantizerType::SQ8) {
+    for (int j = 0; j < d_; ++j) {
+      float v = (x[j] - base_[j]) / scale_[j];
+      if (!(v >= -0.5f && v <= 255.5f)) return false;
+    }
+  } else if (type_ == QuantizerType::FP16) {
+    // the max finite half float
+    for (int j = 0; j < d_; ++j) {
+      if (!(std::fabs(x[j]) <= 65504.0f)) return false;
+    }
+  }
+  return true;
+}
+
+int VectorQuantizer::Dump(const std::string &path) const {
+  if (type_ != QuantizerType::SQ8) return 0;
+  std::string tmp_path = path + ".tmp";
+  {
+    utils::FileIO fio(tmp_path);
+    if (fio.Open("wb") || fio.Write(kSq8Magic, 1, 4) != 4 ||
+        fio.Write(&d_, sizeof(d_), 1) != 1 ||
+        fio.Write(base_.data(), sizeof(float), d_) != (size_t)d_ ||
+        fio.Write(scale_.data(), sizeof(float), d_) != (size_t)d_ ||
+        fflush(fio.fp) || fsync(fileno(fio.fp))) {
+      LOG(ERROR) << "write quantizer error, path=" << tmp_path;
+      return -1;
+    }
+  }
+  if (rename(tmp_path.c_str(), path.c_str())) {
+    LOG(ERROR) << "rename quantizer error, path=" << path;
+    return -1;
+  }
+  return 0;
+}
+
+int VectorQuantizer::Load(const std::string &path) {
+  if (type_ != QuantizerType::SQ8) return 0;
+  std::string file_path = path;
+  utils::FileIO fio(file_path);
+  if (fio.Open("rb")) return -1;
+  char magic[4];
+  int d = 0;
+  std::vector<float> base(d_), scale(d_);
+  if (fio.Read(magic, 1, 4) != 4 || memcmp(magic, kSq8Magic, 4) ||
+      fio.Read(&d, sizeof(d), 1) != 1 || d != d_ ||
+      fio.Read(base.data(), sizeof(float), d_) != (size_t)d_ ||
+      fio.Read(scale.data(), sizeof(float), d_) != (size_t)d_) {
+    LOG(ERROR) << "invalid quantizer file, path=" << path
+               << ", dimension=" << d_;
+    return -1;
+  }
+  base_.swap(base);
+  scale_.swap(scale);
+  return 0;
+}
+
+void VectorQuantizer::Decode(long n, const uint8_t *codes, float *x) const {
+  if (type_ == QuantizerType::SQ8) {
+    for (long i = 0; i < n; ++i) {
+      const uint8_t *ci = codes + i * code_size_;
+      float *xi = x + i * d_;
+      for (int j = 0; j < d_; ++j) xi[j] = base_[j] + ci[j] * scale_[j];
+    }
+  } else if (type_ == QuantizerType::FP16) {
+    const uint16_t *h = reinterpret_cast<const uint16_t *>(codes);
+    for (long i = 0; i < n * d_; ++i) x[i] = HalfToFloat(h[i]);
+  }
+}
+
+}  // namespace tig_gamma
@@ -0,0 +1,112 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace tig_gamma {
+
+enum class QuantizerType : std::uint8_t { NONE = 0, SQ8 = 1, FP16 = 2 };
+
+/**
+ * Scalar quantizer of the in-memory copy of float vectors.
+ *
+ * SQ8 stores a dimension in one byte, value = min + code * scale, the min and
+ * scale of every dimension are trained from the vectors. FP16 stores a
+ * dimension as a half float and needs no training. The distances are computed
+ * on the codes by AVX-512 or AVX2 kernels chosen by the cpu at runtime.
+ */
+class VectorQuantizer {
+ public:
+  VectorQuantizer();
+
+  /**
+   * @param type  "", "SQ8" or "FP16", case insensitive
+   * @return 0 if successed
+   */
+  int Init(const std::string &type, int dimension);
+
+  QuantizerType Type() const { return type_; }
+
+  std::string TypeName() const;
+
+  bool Enabled() const { return type_ != QuantizerType::NONE; }
+
+  int CodeSize() const { return code_size_; }
+
+  /**
+   * train the per-dimension min and max of SQ8 by n vectors, the codes of
+   * the vectors encoded before must be encoded again. It is trained once
+   * before the codes are read, the ranges are never changed after
+   */
+  void Train(long n, const float *x);
+
+  void Encode(long n, const float *x, uint8_t *codes) const;
+
+  // false if the code of x is clipped to the ranges of the quantizer
+  bool InRange(const float *x) const;
+
+  /**
+   * save and load the trained ranges of SQ8, the codes encoded by them stay
+   * valid after a restart
+   *
+   * @return 0 if successed
+   */
+  int Dump(const std::string &path) const;
+
+  int Load(const std::string &path);
+
+  void Decode(long n, const uint8_t *codes, float *x) const;
+
+  // distances between a float vector and a code
+  float InnerProduct(const float *x, const uint8_t *code) const {
+    return ip_(x, nullptr, code, scale_.data(), base_.data(), d_);
+  }
+
+  float L2Sqr(const float *x, const uint8_t *code) const {
+    return l2_(x, nullptr, code, scale_.data(), base_.data(), d_);
+  }
+
+  // distances between two codes
+  float CodeInnerProduct(const uint8_t *a, const uint8_t *b) const {
+    return code_ip_(nullptr, a, b, scale_.data(), base_.data(), d_);
+  }
+
+  float CodeL2Sqr(const uint8_t *a, const uint8_t *b) const {
+    return code_l2_(nullptr, a, b, scale_.data(), base_.data(), d_);
+  }
+
+  // the simd instructions of the distance kernels, for logging
+  const char *SimdName() const { return simd_name_; }
+
+  /**
+   * the distance of x and y, x is a float vector or the code xc if x is null
+   */
+  using DistanceFunc = float (*)(const float *x, const uint8_t *xc,
+                                 const uint8_t *y, const float *scale,
+                                 const float *base, int d);
+
+ private:
+  QuantizerType type_;
+  int d_;
+  int code_size_;
+  // SQ8 value = base + code * scale, base is the min of the dimension
+  std::vector<float> scale_;
+  std::vector<float> base_;
+
+  DistanceFunc ip_;
+  DistanceFunc l2_;
+  DistanceFunc code_ip_;
+  DistanceFunc code_l2_;
+  const char *simd_name_;
+  bool f16c_;  // whether the cpu converts half floats
+};
+
+}  // namespace tig_gamma
@@ -0,0 +1,241 @@
+# -*- coding:utf-8 -*-
+#!/usr/bin/python3
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_ROWS = 1000000
+DEFAULT_LRU_SIZE = 10000
+DIGEST_BYTES = 16
+
+# Opened caches of this process, keyed by (cache_dir, model_name)
+embedding_caches = {}
+embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: str, model_name: str):
+    """Get the embedding cache of the model under cache_dir, it is opened only once per process.
+
+    Args:
+        cache_dir: The root directory of embedding caches.
+        model_name: The embedding model id, e.g. "sentence-transformers/all-mpnet-base-v2".
+
+    Returns:
+        The embedding cache.
+    """
+    key = (os.path.abspath(cache_dir), model_name)
+    with embedding_caches_lock:
+        cache = embedding_caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(cache_dir, model_name)
+            embedding_caches[key] = cache
+            atexit.register(cache.flush)
+    return cache
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by model name and the md5 digest of the text.
+
+    The embeddings are fixed-width float32 rows of a memory-mapped file, the digest of
+    each row is kept in a memory-mapped keys file and the digest to row hash index is
+    rebuilt from it on open. When all the rows are used the oldest ones are evicted.
+    Recently used embeddings are also kept in an in-memory LRU.
+
+    A row is written before its key and the next row is persisted with every append,
+    so a crash never maps a key to a vector which isn't its own.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        max_rows: int = DEFAULT_CACHE_ROWS,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ):
+        """Open or create the embedding cache.
+
+        Args:
+            cache_dir: The root directory of embedding caches.
+            model_name: The embedding model id, each model has its own cache.
+            max_rows: The max number of cached embeddings on disk.
+            lru_size: The max number of embeddings kept in memory.
+
+        Returns:
+            None.
+        """
+        self.cache_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+        self.meta_file = os.path.join(self.cache_dir, "cache.meta")
+        self.vectors_file = os.path.join(self.cache_dir, "vectors.f32")
+        self.keys_file = os.path.join(self.cache_dir, "keys.bin")
+        self.max_rows = max_rows
+        self.lru_size = lru_size
+
+        self.lock = threading.Lock()
+        self.lru = OrderedDict()
+        self.index = {}
+        self.vectors = None
+        self.keys = None
+        self.dimension = 0
+        self.next_row = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.isfile(self.meta_file):
+            self.__load()
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.md5(text.encode(encoding="utf-8")).digest()
+
+    def __load(self):
+        with open(self.meta_file, "r") as f:
+            meta = json.load(f)
+        self.dimension = meta["dimension"]
+        self.max_rows = meta["max_rows"]
+        self.next_row = meta["next_row"]
+        self.__open(mode="r+")
+        keys = np.ascontiguousarray(self.keys).view(np.dtype((np.void, DIGEST_BYTES)))
+        keys = keys.reshape(-1)
+        rows = np.flatnonzero(self.keys.any(axis=1))
+        self.index = dict(zip(keys[rows].tolist(), rows.tolist()))
+
+    def __open(self, mode):
+        self.vectors = np.memmap(
+            self.vectors_file,
+            dtype=np.float32,
+            mode=mode,
+            shape=(self.max_rows, self.dimension),
+        )
+        self.keys = np.memmap(
+            self.keys_file,
+            dtype=np.uint8,
+            mode=mode,
+            shape=(self.max_rows, DIGEST_BYTES),
+        )
+
+    def __write_meta(self):
+        meta = {
+            "dimension": self.dimension,
+            "max_rows": self.max_rows,
+            "next_row": self.next_row,
+        }
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+    def __lru_put(self, key, vector):
+        self.lru[key] = vector
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def __get(self, key) -> Optional[np.ndarray]:
+        vector = self.lru.get(key)
+        if vector is not None:
+            self.lru.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+        row = self.index.get(key)
+        if row is not None:
+            vector = np.array(self.vectors[row])
+            self.__lru_put(key, vector)
+            self.disk_hits += 1
+            return vector
+        self.misses += 1
+        return None
+
+    def __put_batch(self, keys, vectors):
+        # row -> (key, vector) of the new embeddings
+        pending = {}
+        for key, vector in zip(keys, vectors):
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            if self.vectors is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self.dimension = vector.shape[0]
+                self.__open(mode="w+")
+                self.__write_meta()
+            if vector.shape[0] != self.dimension:
+                continue
+            self.__lru_put(key, vector)
+            if key in self.index:
+                continue
+
+            row = self.next_row
+            # evict the oldest embedding in this row
+            if row in pending:
+                old_key = pending.pop(row)[0]
+            else:
+                old_key = self.keys[row].tobytes()
+            self.index.pop(old_key, None)
+            self.lru.pop(old_key, None)
+            self.next_row = (self.next_row + 1) % self.max_rows
+            self.index[key] = row
+            pending[row] = (key, vector)
+        if len(pending) == 0:
+            return
+
+        # the evicted keys are cleared, then the vectors are written before their keys
+        rows = list(pending.keys())
+        self.keys[rows] = 0
+        self.keys.flush()
+        self.vectors[rows] = np.stack([vector for _, vector in pending.values()])
+        self.vectors.flush()
+        self.keys[rows] = np.frombuffer(
+            b"".join(key for key, _ in pending.values()), dtype=np.uint8
+        ).reshape(-1, DIGEST_BYTES)
+        self.keys.flush()
+        self.__write_meta()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Get the cached embedding of text, None if not cached."""
+        key = self.digest(text)
+        with self.lock:
+            return self.__get(key)
+
+    def put(self, text: str, vector):
+        """Cache the embedding of text."""
+        key = self.digest(text)
+        with self.lock:
+            self.__put_batch([key], [vector])
+
+    def get_batch(self, texts: Iterable[str]) -> List[Optional[np.ndarray]]:
+        """Get the cached embeddings of texts, None for the texts not cached."""
+        keys = [self.digest(text) for text in texts]
+        with self.lock:
+            return [self.__get(key) for key in keys]
+
+    def put_batch(self, texts: Iterable[str], vectors):
+        """Cache the embeddings of texts."""
+        keys = [self.digest(text) for text in texts]
+        with self.lock:
+            self.__put_batch(keys, vectors)
+
+    def flush(self):
+        """Persist the cached embeddings."""
+        with self.lock:
+            if self.vectors is None:
+                return
+            self.vectors.flush()
+            self.keys.flush()
+            self.__write_meta()
+
+    def stats(self) -> dict:
+        """Hit and miss counters of the cache."""
+        with self.lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self.index),
+                "max_rows": self.max_rows,
+            }
@@ -1,4 +1,5 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 #include <pybind11/stl_bind.h>
 #include <iostream>
@@ -8,6 +9,7 @@
 #include "c_api/gamma_api.h"
 #include "c_api/api_data/gamma_table.h"
 #include "c_api/api_data/gamma_doc.h"
+#include "c_api/api_data/gamma_column_docs.h"
 #include "search/gamma_engine.h"
 
 namespace awadb = tig_gamma;
@@ -45,7 +47,8 @@ bool LoadFromLocal(void *engine)  {
 
 
 bool AddDoc(void *engine, const std::string &name, awadb::Doc &doc)  {
-
+  // the write waits for the group commit of the write-ahead log
+  py::gil_scoped_release release;
   int ret = static_cast<awadb::GammaEngine *>(engine)->AddOrUpdate(doc);
   
   return ret == 0 ? true : false;
@@ -54,6 +57,7 @@ bool AddDoc(void *engine, const std::string &name, awadb::Doc &doc)  {
 bool AddDocs(
   void *engine,
   std::vector<awadb::Doc> &docs) {
+  py::gil_scoped_release release;
   awadb::Docs batch_docs;
   for (auto &doc: docs)  {
     batch_docs.AddDoc(doc);
@@ -70,6 +74,7 @@ bool AddTexts(
   void *engine,
   std::vector<awadb::Doc> &docs,
   std::vector<awadb::WordsInDoc> &words_count_in_docs)  {
+  py::gil_scoped_release release;
   awadb::Docs batch_docs;
   for (auto &doc: docs)  {
     batch_docs.AddDoc(doc);
@@ -82,16 +87,133 @@ bool AddTexts(
   return ret == 0 ? true : false;
 }
 
+// Add n docs given column by column, the engine reads the numpy buffers
+// without copying them into Docs. A column is a C-contiguous numpy array,
+// int32 INT, int64 LONG, float32 FLOAT, float64 DOUBLE or an (n, d) float32
+// VECTOR, or an (offsets, data) tuple of a STRING column whose string i is
+// data[offsets[i]:offsets[i + 1]].
+bool AddColumns(
+  void *engine,
+  const std::string &key_name,
+  int n,
+  py::dict columns)  {
+  awadb::ColumnDocs docs(n, key_name);
+  // the arrays are referenced until the docs are added
+  std::vector<py::array> arrays;
+  for (auto item : columns)  {
+    awadb::DocColumn column;
+    column.name = py::cast<std::string>(item.first);
+    if (py::isinstance<py::tuple>(item.second))  {
+      py::tuple str_column = py::cast<py::tuple>(item.second);
+      if (str_column.size() != 2)  {
+        throw std::invalid_argument("string column " + column.name + " should be (offsets, data)");
+      }
+      py::array_t<int64_t, py::array::c_style | py::array::forcecast> offsets(str_column[0]);
+      py::array_t<uint8_t, py::array::c_style | py::array::forcecast> data(str_column[1]);
+      if (offsets.size() != n + 1)  {
+        throw std::invalid_argument("string column " + column.name + " should have n + 1 offsets");
+      }
+      column.datatype = awadb::DataType::STRING;
+      column.offsets = offsets.data();
+      column.data = reinterpret_cast<const char *>(data.data());
+      arrays.push_back(offsets);
+      arrays.push_back(data);
+      docs.AddColumn(column);
+      continue;
+    }
+
+    py::array array = py::array::ensure(item.second, py::array::c_style);
+    if (!array || array.ndim() == 0 || array.shape(0) != n)  {
+      throw std::invalid_argument("column " + column.name + " should be an array of n values");
+    }
+    char kind = array.dtype().kind();
+    py::ssize_t itemsize = array.itemsize();
+    if (array.ndim() == 2 && kind == 'f' && itemsize == 4)  {
+      column.datatype = awadb::DataType::VECTOR;
+      column.dimension = array.shape(1);
+    } else if (array.ndim() != 1)  {
+      throw std::invalid_argument("column " + column.name + " should be 1-D, or 2-D float32 vectors");
+    } else if (kind == 'i' && itemsize == 4)  {
+      column.datatype = awadb::DataType::INT;
+    } else if (kind == 'i' && itemsize == 8)  {
+      column.datatype = awadb::DataType::LONG;
+    } else if (kind == 'f' && itemsize == 4)  {
+      column.datatype = awadb::DataType::FLOAT;
+    } else if (kind == 'f' && itemsize == 8)  {
+      column.datatype = awadb::DataType::DOUBLE;
+    } else  {
+      throw std::invalid_argument("column " + column.name + " has an unsupported dtype");
+    }
+    column.data = reinterpret_cast<const char *>(array.data());
+    arrays.push_back(array);
+    docs.AddColumn(column);
+  }
+
+  py::gil_scoped_release release;
+  awadb::BatchResult batch_results(n);
+  int ret = static_cast<awadb::GammaEngine *>(engine)
+    ->AddColumns(docs, batch_results);
+  return ret == 0 ? true : false;
+}
+
 bool Delete(void *engine, std::vector<std::string> &keys)  {
+  py::gil_scoped_release release;
   return static_cast<awadb::GammaEngine *>(engine)->DeleteDocs(keys);
 }
 
 
+bool SetWalOptions(void *engine, int group_commit_ms, int group_commit_bytes)  {
+  int ret = static_cast<awadb::GammaEngine *>(engine)
+    ->SetWalOptions(group_commit_ms, group_commit_bytes);
+  return ret == 0 ? true : false;
+}
+
+bool SetCheckpointOptions(
+  void *engine,
+  int interval_sec,
+  long dirty_docs,
+  long io_bytes_per_sec)  {
+  int ret = static_cast<awadb::GammaEngine *>(engine)
+    ->SetCheckpointOptions(interval_sec, dirty_docs, io_bytes_per_sec);
+  return ret == 0 ? true : false;
+}
+
+bool SetSearchBatchOptionsPy(void *engine, int max_wait_us, int max_batch_size)  {
+  int ret = static_cast<awadb::GammaEngine *>(engine)
+    ->SetSearchBatchOptions(max_wait_us, max_batch_size);
+  return ret == 0 ? true : false;
+}
+
+bool DumpEngine(void *engine)  {
+  py::gil_scoped_release release;
+  int ret = static_cast<awadb::GammaEngine *>(engine)->Dump();
+  return ret == 0 ? true : false;
+}
+
+py::dict GetTableStatus(void *engine)  {
+  awadb::EngineStatus engine_status;
+  static_cast<awadb::GammaEngine *>(engine)->GetIndexStatus(engine_status);
+
+  py::dict status;
+  status["index_status"] = engine_status.IndexStatus();
+  status["doc_num"] = engine_status.DocNum();
+  status["max_docid"] = engine_status.MaxDocID();
+  status["min_indexed_num"] = engine_status.MinIndexedNum();
+  status["unindexed_num"] = engine_status.UnindexedNum();
+  status["indexing_lag_ms"] = engine_status.IndexingLagMs();
+  status["table_mem"] = engine_status.TableMem();
+  status["index_mem"] = engine_status.IndexMem();
+  status["vector_mem"] = engine_status.VectorMem();
+  status["field_range_mem"] = engine_status.FieldRangeMem();
+  status["bitmap_mem"] = engine_status.BitmapMem();
+  return status;
+}
+
 bool GetDocs(
   void *engine,
   const std::vector<std::string> &keys,
   std::map<std::string, awadb::Doc> &docs)  {
-
+  py::gil_scoped_release release;
   int ret = static_cast<awadb::GammaEngine *>(engine)->GetDocs(keys, docs);
 
   return ret == 0 ? true : false;
@@ -99,17 +221,158 @@ bool GetDocs(
 
 
 bool Update(void *engine, awadb::Doc &doc)  {
+  py::gil_scoped_release release;
   int ret = static_cast<awadb::GammaEngine *>(engine)->AddOrUpdate(doc);
   return ret == 0 ? true : false;
 }
 
 int DoSearch(void *engine, awadb::Request &request, awadb::Response &results)  {
- 
+  py::gil_scoped_release release;
   int ret = static_cast<awadb::GammaEngine *>(engine)->Search(request, results);
 
   return ret;  
 }
 
+// Hand the buffer of a packed column over to numpy without copying it, the
+// returned array owns the moved buffer.
+template <typename T, typename Buffer>
+py::array_t<T> MoveToArray(Buffer &&buffer, std::vector<py::ssize_t> shape)  {
+  auto *holder = new Buffer(std::move(buffer));
+  py::capsule owner(holder, [](void *p) { delete static_cast<Buffer *>(p); });
+  return py::array_t<T>(shape, reinterpret_cast<const T *>(holder->data()), owner);
+}
+
+// Pack the search results column by column, see awadb::ColumnarResult.
+py::dict PackColumns(
+  awadb::Response &response,
+  const std::vector<std::string> &fields_name)  {
+  awadb::ColumnarResult result;
+  {
+    py::gil_scoped_release release;
+    response.PackColumns(fields_name, result);
+  }
+
+  py::ssize_t hits_num = result.docids.size();
+  py::dict columns;
+  py::dict valid;
+  for (auto &column : result.columns)  {
+    py::ssize_t rows = column.valid.size();
+    valid[py::str(column.name)] = MoveToArray<bool>(std::move(column.valid), {rows});
+
+    py::object values;
+    switch (column.datatype)  {
+      case awadb::DataType::INT:
+        values = MoveToArray<int32_t>(std::move(column.data), {rows});
+        break;
+      case awadb::DataType::LONG:
+        values = MoveToArray<int64_t>(std::move(column.data), {rows});
+        break;
+      case awadb::DataType::FLOAT:
+        values = MoveToArray<float>(std::move(column.data), {rows});
+        break;
+      case awadb::DataType::DOUBLE:
+        values = MoveToArray<double>(std::move(column.data), {rows});
+        break;
+      case awadb::DataType::VECTOR:  {
+        py::ssize_t row_bytes = rows > 0 ? column.data.size() / rows : 0;
+        if (row_bytes == (py::ssize_t)(column.dimension * sizeof(float)))  {
+          values = MoveToArray<float>(std::move(column.data), {rows, column.dimension});
+        } else {
+          values = MoveToArray<uint8_t>(std::move(column.data), {rows, row_bytes});
+        }
+        break;
+      }
+      case awadb::DataType::STRING:
+      case awadb::DataType::MULTI_STRING:  {
+        py::dict str_column;
+        py::ssize_t data_size = column.data.size();
+        py::ssize_t offsets_size = column.offsets.size();
+        str_column["offsets"] = MoveToArray<int64_t>(std::move(column.offsets), {offsets_size});
+        str_column["data"] = MoveToArray<uint8_t>(std::move(column.data), {data_size});
+        if (column.datatype == awadb::DataType::MULTI_STRING)  {
+          py::ssize_t list_size = column.list_offsets.size();
+          str_column["list_offsets"] = MoveToArray<int64_t>(std::move(column.list_offsets), {list_size});
+        }
+        values = str_column;
+        break;
+      }
+    }
+    columns[py::str(column.name)] = values;
+  }
+
+  py::ssize_t queries_num = result.totals.size();
+  py::ssize_t query_offsets_size = result.query_offsets.size();
+  py::dict packed;
+  packed["query_offsets"] = MoveToArray<int64_t>(std::move(result.query_offsets), {query_offsets_size});
+  packed["totals"] = MoveToArray<int32_t>(std::move(result.totals), {queries_num});
+  packed["ids"] = MoveToArray<int64_t>(std::move(result.docids), {hits_num});
+  packed["scores"] = MoveToArray<float>(std::move(result.scores), {hits_num});
+  packed["columns"] = columns;
+  packed["valid"] = valid;
+  return packed;
+}
+
+// Search n queries at once. The float32 C-contiguous queries buffer of shape
+// (n, d) is handed to the engine as is (other dtypes/layouts are converted
+// once by pybind11), ids and scores are written into preallocated (n, topn)
+// arrays and padded with -1 when fewer than topn documents are found.
+py::tuple SearchBatch(
+  void *engine,
+  const std::string &field_name,
+  py::array_t<float, py::array::c_style | py::array::forcecast> queries,
+  int topn,
+  bool brute_force_search,
+  bool is_l2,
+  const std::string &retrieval_params)  {
+  if (queries.ndim() != 2) {
+    throw std::invalid_argument("queries should be a 2-D array of shape (n, d)");
+  }
+  if (topn <= 0) {
+    throw std::invalid_argument("topn should be greater than 0");
+  }
+
+  py::ssize_t n = queries.shape(0);
+  py::ssize_t d = queries.shape(1);
+  py::array_t<int64_t> ids({n, (py::ssize_t)topn});
+  py::array_t<float> scores({n, (py::ssize_t)topn});
+  if (n == 0)  return py::make_tuple(ids, scores);
+
+  awadb::VectorQuery vec_query;
+  vec_query.name = field_name;
+  vec_query.value_ptr = reinterpret_cast<const char *>(queries.data());
+  vec_query.value_len = n * d * sizeof(float);
+  vec_query.min_score = -1;
+  vec_query.max_score = 999999;
+  vec_query.boost = 1.0;
+  vec_query.has_boost = 0;
+
+  awadb::Request request;
+  request.AddVectorQuery(vec_query);
+  request.SetReqNum((int)n);
+  request.SetTopN(topn);
+  request.SetBruteForceSearch(brute_force_search ? 1 : 0);
+  request.SetMetricType(is_l2);
+  if (retrieval_params != "")  {
+    request.SetRetrievalParams(retrieval_params);
+  } else {
+    request.SetRetrievalParams(is_l2 ? "{\"metric_type\":\"L2\"}"
+                                     : "{\"metric_type\":\"InnerProduct\"}");
+  }
+
+  awadb::Response response;
+  int ret = 0;
+  {
+    py::gil_scoped_release release;
+    ret = static_cast<awadb::GammaEngine *>(engine)->Search(request, response);
+  }
+  if (ret != 0) {
+    throw std::runtime_error("search error [" + std::to_string(ret) + "]");
+  }
+
+  response.PackIdsScores((int)n, topn, ids.mutable_data(), scores.mutable_data());
+  return py::make_tuple(ids, scores);
+}
+
 
 PYBIND11_MODULE(awa, m) {
     m.doc() = "AwaDB Python SDK";
@@ -264,6 +527,7 @@ PYBIND11_MODULE(awa, m) {
     py::class_<awadb::Response>(m, "Response").def(py::init<>())
         .def("AddResults", (void(awadb::Response::*)(const awadb::SearchResult &)) &awadb::Response::AddResults)
         .def("Results", &awadb::Response::Results)
+        .def("BruteForceSearch", &awadb::Response::BruteForceSearch)
         .def("PackResults", (void(awadb::Response::*)(std::vector<std::string> &)) &awadb::Response::PackResults);
 
     py::bind_vector<std::vector<awadb::Doc>>(m, "DocsVec");
@@ -281,10 +545,21 @@ PYBIND11_MODULE(awa, m) {
     m.def("AddDoc", &AddDoc, "Add Or UpdateDoc");   
     m.def("AddDocs", &AddDocs, "Add Or UpdateDocs");   
     m.def("AddNewField", &AddNewField, "Add New Field");
+    m.def("AddColumns", &AddColumns, "Add or update docs given column by column");
     m.def("AddTexts", &AddTexts, "Add Or Update Texts and Embeddings");
     m.def("Delete", &Delete, "Delete Document");
+    m.def("SetWalOptions", &SetWalOptions, "Set the group commit window of the write-ahead log");
+    m.def("SetCheckpointOptions", &SetCheckpointOptions, "Set when the table is dumped in background");
+    m.def("SetSearchBatchOptions", &SetSearchBatchOptionsPy, "Set how the concurrent single query searches are batched");
+    m.def("Dump", &DumpEngine, "Dump the table and its vector indexes");
+    m.def("GetEngineStatus", &GetTableStatus, "Get the index status, indexing lag and memory of the table");
     m.def("GetDocs", &GetDocs, "GetDocs");
     m.def("Update", &Update, "Update");
     m.def("DoSearch", &DoSearch, "DoSearch");
+    m.def("PackColumns", &PackColumns, "Pack search results column by column");
+    m.def("SearchBatch", &SearchBatch, "Search a batch of queries, return (ids, scores)",
+          py::arg("engine"), py::arg("field_name"), py::arg("queries"), py::arg("topn"),
+          py::arg("brute_force_search") = false, py::arg("is_l2") = true,
+          py::arg("retrieval_params") = "");
 
 }
@@ -8,7 +8,9 @@ import logging
 import json
 import os
 import struct
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import Any, Dict, Iterable, List, Optional, Set
 
@@ -31,6 +33,18 @@ __all__ = [
     "HuggingFace",
 ]
 
+RETRIEVAL_TYPES = ["FLAT", "IVFPQ", "IVFFLAT", "HNSW"]
+DEFAULT_RETRIEVAL_TYPE = "IVFPQ"
+DEFAULT_RETRIEVAL_PARAM = {"ncentroids": 256, "nsubvector": 16}
+QUANTIZER_TYPES = ["SQ8", "FP16"]
+DEFAULT_INDEXING_SIZE = 10000
+DEFAULT_CHECKPOINT_INTERVAL = 300
+DEFAULT_CHECKPOINT_DIRTY_DOCS = 100000
+DEFAULT_SEARCH_BATCH_WAIT_US = 200
+DEFAULT_SEARCH_BATCH_SIZE = 32
+DEFAULT_VECTOR_FIELD = "embedding"
+DEFAULT_ADD_COLUMNS_BATCH_BYTES = 64 * 1024 * 1024
+
 class FieldDataType(Enum):
     INT = 1
     LONG = 2
@@ -40,6 +54,13 @@ class FieldDataType(Enum):
     ERROR = 6 
     MULTI_STRING = 7
 
+# the numpy dtypes of the numeric columns of add_columns
+BULK_COLUMN_DTYPES = {
+    FieldDataType.INT: np.int32,
+    FieldDataType.LONG: np.int64,
+    FieldDataType.FLOAT: np.float32,
+}
+
 def typeof(variate):
     v_type = FieldDataType.ERROR
     if isinstance(variate, int):
@@ -71,7 +92,15 @@ def typeof(variate):
     return v_type
 
 class AwaLocal(AwaAPI):
-    """Interface implemented by AwaDB local library client"""
+    """Interface implemented by AwaDB local library client
+
+    Thread safety:
+        One AwaLocal instance and its table engines can be shared by many threads.
+        The engine calls release the GIL, so search, search_batch, search_many and get
+        run in parallel with each other and with writes.
+        Writes (add, delete, load, close) are serialized by a per-client lock.
+        Changing the table schema or closing a table while searching it is not supported.
+    """
     def __init__(
         self,
         root_dir = ".",
@@ -110,6 +139,10 @@ class AwaLocal(AwaAPI):
         self.english_word_stemmer = PorterStemmer()
         self.tables_extra_new_fields = {} 
         self.row_fields = {}
+        self.tables_index_config = {}
+        self.tables_checkpoint_config = {}
+        self.tables_search_batch_config = {}
+        self.write_lock = threading.RLock()
 
         existed_meta_file = data_dir + "/tables.meta"
         if os.path.isfile(existed_meta_file):
@@ -124,6 +157,7 @@ class AwaLocal(AwaAPI):
 
         self.model_name = model_name 
         self.llm = None 
+        self.embedding_cache_dir = root_dir + "/embedding_cache"
         #AwaEmbedding(self.model_name)
        
     def __write(self):
@@ -163,6 +197,9 @@ class AwaLocal(AwaAPI):
         tables_meta["vector_field_name"] = self.tables_vector_fields_type
 
         tables_meta["doc_count"] = self.tables_doc_count
+        tables_meta["index_config"] = self.tables_index_config
+        tables_meta["checkpoint_config"] = self.tables_checkpoint_config
+        tables_meta["search_batch_config"] = self.tables_search_batch_config
 
         tables_dict = {}
         for key in self.tables_attr:
@@ -232,6 +269,11 @@ class AwaLocal(AwaAPI):
 
             self.tables_fields_check = tables_meta["fields_check"]
             self.tables_doc_count = tables_meta["doc_count"]
+            self.tables_index_config = tables_meta.get("index_config", {})
+            self.tables_checkpoint_config = tables_meta.get("checkpoint_config", {})
+            self.tables_search_batch_config = tables_meta.get(
+                "search_batch_config", {}
+            )
 
             for table_name in tables_meta["fields_type"]:
                 table_field_dict = {}
@@ -296,9 +338,7 @@ class AwaLocal(AwaAPI):
                     vec_info.store_param = each_vec_info["store_param"]
                     table_info.AddVectorInfo(vec_info)
 
-                table_info.SetIndexingSize(10000)
-                table_info.SetRetrievalType("IVFPQ")
-                table_info.SetRetrievalParam('{"ncentroids" : 256, "nsubvector" : 16}')
+                self.__set_table_index(table_name, table_info)
                 self.tables_attr[table_name] = table_info
 
         
@@ -338,6 +378,227 @@ class AwaLocal(AwaAPI):
                 return []
             return self.tables_fields_type[db_table_name]
 
+    def set_index(
+        self,
+        table_name: str,
+        retrieval_type: str = DEFAULT_RETRIEVAL_TYPE,
+        retrieval_param: Optional[dict] = None,
+        indexing_size: int = DEFAULT_INDEXING_SIZE,
+        db_name: str = DEFAULT_DB_NAME,
+        quantizer: Optional[str] = None,
+        rerank: int = 0,
+    ) -> bool:
+        """Set the vector index of the specified table, before the table is created by add.
+
+        Args:
+            table_name: The specified table.
+
+            retrieval_type: The vector index type, "FLAT", "IVFPQ", "IVFFLAT" or "HNSW".
+                            Default to "IVFPQ".
+
+            retrieval_param: The index parameters. Default to None, the engine default.
+
+            E.g. `{"ncentroids": 256, "nsubvector": 16, "nprobe": 20}` for IVFPQ.
+
+            E.g. `{"ncentroids": 256, "nprobe": 20}` for IVFFLAT.
+
+            E.g. `{"nlinks": 32, "efConstruction": 160, "efSearch": 64}` for HNSW.
+
+            indexing_size: The index is built in background once the number of
+                           documents reaches indexing_size. Default to 10000.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+            quantizer: "SQ8" or "FP16", the vectors are kept in memory as 8-bit
+                       or half float codes and searched by them, the full
+                       precision vectors stay on disk. Only for "FLAT" and
+                       "HNSW". Default to None, not quantized.
+
+            rerank: The top k * rerank results of the codes are ranked again by
+                    the full precision vectors. Default to 0, no reranking.
+
+        Returns:
+            True or False, whether the index is set.
+        """
+        retrieval_type = retrieval_type.upper()
+        if retrieval_type not in RETRIEVAL_TYPES:
+            print("Retrieval type should be one of %s!" % RETRIEVAL_TYPES)
+            return False
+
+        if quantizer is not None:
+            quantizer = quantizer.upper()
+            if quantizer not in QUANTIZER_TYPES:
+                print("Quantizer should be one of %s!" % QUANTIZER_TYPES)
+                return False
+            if retrieval_type not in ("FLAT", "HNSW"):
+                print("Quantizer only works with FLAT or HNSW!")
+                return False
+        if rerank < 0:
+            print("Rerank should not be negative!")
+            return False
+
+        db_table_name = db_name + "/" + table_name
+        with self.write_lock:
+            if self.tables_fields_check.get(db_table_name, False):
+                print("Table %s is created, its index can not be changed!" % db_table_name)
+                return False
+            if retrieval_param is None:
+                retrieval_param = (
+                    DEFAULT_RETRIEVAL_PARAM if retrieval_type == DEFAULT_RETRIEVAL_TYPE else {}
+                )
+            self.tables_index_config[db_table_name] = {
+                "retrieval_type": retrieval_type,
+                "retrieval_param": dict(retrieval_param),
+                "indexing_size": indexing_size,
+                "quantizer": quantizer,
+                "rerank": rerank,
+            }
+        return True
+
+    def set_checkpoint(
+        self,
+        table_name: str,
+        interval_sec: int = DEFAULT_CHECKPOINT_INTERVAL,
+        dirty_docs: int = DEFAULT_CHECKPOINT_DIRTY_DOCS,
+        io_mb_per_sec: float = 0,
+        db_name: str = DEFAULT_DB_NAME,
+    ) -> bool:
+        """Set when the specified table is checkpointed in background.
+
+        A checkpoint dumps the trained vector indexes of the table, so loading
+        the table does not retrain them.
+
+        Args:
+            table_name: The specified table.
+
+            interval_sec: Checkpoint at most interval_sec seconds after the first
+                          unsaved write. Default to 300, 0 for never.
+
+            dirty_docs: Checkpoint once dirty_docs documents are written since
+                        the last checkpoint. Default to 100000, 0 for never.
+
+            io_mb_per_sec: The index files are written at most at this rate.
+                           Default to 0, no limit.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+        Returns:
+            True or False, whether the checkpoint options are set.
+        """
+        if interval_sec < 0 or dirty_docs < 0 or io_mb_per_sec < 0:
+            print("Checkpoint options should not be negative!")
+            return False
+
+        db_table_name = db_name + "/" + table_name
+        with self.write_lock:
+            self.tables_checkpoint_config[db_table_name] = {
+                "interval_sec": interval_sec,
+                "dirty_docs": dirty_docs,
+                "io_mb_per_sec": io_mb_per_sec,
+            }
+            if db_table_name in self.tables and self.tables[db_table_name] is not None:
+                if not self.__set_table_checkpoint(db_table_name):
+                    return False
+            if db_table_name in self.tables_attr:
+                self.__write()
+        return True
+
+    def set_search_batching(
+        self,
+        table_name: str,
+        max_wait_us: int = DEFAULT_SEARCH_BATCH_WAIT_US,
+        max_batch_size: int = DEFAULT_SEARCH_BATCH_SIZE,
+        db_name: str = DEFAULT_DB_NAME,
+    ) -> bool:
+        """Batch the concurrent single query searches of the specified table.
+
+        A search waits up to max_wait_us for the concurrent searches of the same
+        vector field, similar topn, options and filters, then all of them are
+        searched as one batch. It trades a little latency for throughput when
+        many threads search the table at the same time.
+
+        Args:
+            table_name: The specified table.
+
+            max_wait_us: Max microseconds a search waits for its batch.
+                         Default to 200, 0 disables batching.
+
+            max_batch_size: A batch is searched once it has max_batch_size
+                            queries. Default to 32.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+        Returns:
+            True or False, whether the batching options are set.
+        """
+        if max_wait_us < 0 or max_batch_size < 1:
+            print("Search batching options are invalid!")
+            return False
+
+        db_table_name = db_name + "/" + table_name
+        with self.write_lock:
+            self.tables_search_batch_config[db_table_name] = {
+                "max_wait_us": max_wait_us,
+                "max_batch_size": max_batch_size,
+            }
+            if db_table_name in self.tables and self.tables[db_table_name] is not None:
+                if not self.__set_table_search_batch(db_table_name):
+                    return False
+            if db_table_name in self.tables_attr:
+                self.__write()
+        return True
+
+    def checkpoint(
+        self,
+        table_name: str,
+        db_name: str = DEFAULT_DB_NAME,
+    ) -> bool:
+        """Checkpoint the specified table now, see set_checkpoint.
+
+        Searches are not blocked while the table is being checkpointed.
+
+        Args:
+            table_name: The specified table.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+        Returns:
+            True or False, whether the table is checkpointed.
+        """
+        db_table_name = db_name + "/" + table_name
+        if db_table_name not in self.tables or self.tables[db_table_name] is None:
+            print("Table %s is not existed!" % db_table_name)
+            return False
+        if not self.tables_fields_check.get(db_table_name, False):
+            print("Table %s has no documents yet!" % db_table_name)
+            return False
+        return awa.Dump(self.tables[db_table_name])
+
+    def status(
+        self,
+        table_name: str,
+        db_name: str = DEFAULT_DB_NAME,
+    ) -> dict:
+        """Get the status of the specified table.
+
+        Args:
+            table_name: The specified table.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+        Returns:
+            Dict of the table status, {} if the table is not existed.
+            `unindexed_num` is the number of vectors which are not indexed yet,
+            `indexing_lag_ms` is the age of the oldest of them, 0 before the index
+            is built. The others are the index status, document numbers and the
+            memory bytes of the table parts.
+        """
+        db_table_name = db_name + "/" + table_name
+        if db_table_name not in self.tables or self.tables[db_table_name] is None:
+            print("Table %s is not existed!" % db_table_name)
+            return {}
+        return awa.GetEngineStatus(self.tables[db_table_name])
+
     def add(
         self,
         table_name: str,
@@ -358,7 +619,169 @@ class AwaLocal(AwaAPI):
         Returns:
             Success or failure of adding the documents into the specified table.
         """
+        with self.write_lock:
+            return self.__add(table_name, docs, db_name)
+
+    def add_columns(
+        self,
+        table_name: str,
+        ids=None,
+        vectors=None,
+        db_name: str = DEFAULT_DB_NAME,
+        vector_field: str = DEFAULT_VECTOR_FIELD,
+        batch_bytes: int = DEFAULT_ADD_COLUMNS_BATCH_BYTES,
+        **columns,
+    ) -> bool:
+        """Add documents given column by column into the specified table.
+           If table not existed, it will be created from the first document.
+
+        The columns are passed to the engine as buffers, no document or field is
+        built for each row, which makes it much faster than add for bulk loading.
+        Documents whose ids are existed are updated. Texts are not embedded, the
+        vectors of all the vector fields should be given.
+
+        Args:
+            table_name: The specified table for search and storage.
+
+            ids: The primary keys, list or array of n ints or strings.
+                 Generated if None.
+
+            vectors: Float array of shape (n, dimension) of the vector field
+                     vector_field, or a pyarrow FixedSizeListArray.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+            vector_field: The vector field name of vectors, default to "embedding".
+
+            batch_bytes: Max bytes of the columns added by one engine call.
+                         Default to 64MB.
+
+            columns: The other fields, field name to a numpy array, list or
+                     pyarrow array of n values. A 2-D array is a vector field.
+
+        Returns:
+            Success or failure of adding the documents into the specified table.
+
+        Raises:
+            ValueError: If the values of an integer column are out of the range
+                        of its field.
+        """
+        if db_name == "" or table_name == "":
+            print("Please specify your database and table name!")
+            return False
+
+        if vectors is not None:
+            columns[vector_field] = vectors
+        if ids is not None:
+            columns[self.key_confirmed_name] = ids
+        if not columns:
+            print("No columns to add!")
+            return False
+
+        n = -1
+        for name in columns:
+            column = self.__bulk_column(columns[name])
+            if column is None:
+                print("Column %s should be a numpy array, list or pyarrow array!" % name)
+                return False
+            columns[name] = column
+            size = column[0].shape[0] - 1 if isinstance(column, tuple) else column.shape[0]
+            if n >= 0 and size != n:
+                print("Column %s has %d values, but others have %d!" % (name, size, n))
+                return False
+            n = size
+        if n == 0:
+            return True
+
+        if self.key_confirmed_name not in columns:
+            columns[self.key_confirmed_name] = self.__bulk_column(
+                [str(uuid.uuid4()).split("-")[-1] for _ in range(n)]
+            )
+
+        db_table_name = db_name + "/" + table_name
+        with self.write_lock:
+            start = 0
+            if not self.tables_fields_check.get(db_table_name, False):
+                # the table schema is inferred from the first document by add,
+                # check the integer columns fit it before the table is created
+                for name, column in columns.items():
+                    if not isinstance(column, tuple) and column.ndim == 1 and column.dtype.kind in "iu":
+                        f_type = FieldDataType.LONG if name == DOC_PRIMARY_KEY_NAME else FieldDataType.INT
+                        self.__bulk_numeric(name, column, f_type)
+                doc = {}
+                for name, column in columns.items():
+                    if isinstance(column, tuple):
+                        offsets, data = column
+                        doc[name] = data[offsets[0] : offsets[1]].tobytes().decode()
+                    elif column.ndim == 2:
+                        doc[name] = np.ascontiguousarray(column[0], dtype=np.float32)
+                    else:
+                        doc[name] = column[0].item()
+                if not self.__add(table_name, doc, db_name):
+                    return False
+                start = 1
+
+            fields_type = self.tables_fields_type[db_table_name]
+            for name in list(columns):
+                column = columns[name]
+                f_type = fields_type.get(name)
+                if f_type is None:
+                    print("Field %s is not existed, add it by add first!" % name)
+                    return False
+                if f_type == FieldDataType.STRING:
+                    if not isinstance(column, tuple):
+                        print("Field %s should be a string column!" % name)
+                        return False
+                elif f_type == FieldDataType.VECTOR:
+                    dimension = self.tables_vector_fields_type[db_table_name][name]
+                    if isinstance(column, tuple) or column.ndim != 2 or column.shape[1] != dimension:
+                        print("Vector field %s should be an array of dimension %d!" % (name, dimension))
+                        return False
+                    columns[name] = np.ascontiguousarray(column, dtype=np.float32)
+                elif f_type in BULK_COLUMN_DTYPES:
+                    kinds = "iuf" if f_type == FieldDataType.FLOAT else "iu"
+                    if isinstance(column, tuple) or column.ndim != 1 or column.dtype.kind not in kinds:
+                        print("Field %s should be a numeric column!" % name)
+                        return False
+                    columns[name] = self.__bulk_numeric(name, column, f_type)
+                else:
+                    print("Field %s of type %s can not be added by column!" % (name, f_type.name))
+                    return False
 
+            row_bytes = 0
+            for column in columns.values():
+                if isinstance(column, tuple):
+                    row_bytes += column[1].nbytes // n + 8
+                else:
+                    row_bytes += column.nbytes // n
+            batch_size = max(1, batch_bytes // max(1, row_bytes))
+
+            for begin in range(start, n, batch_size):
+                end = min(n, begin + batch_size)
+                batch = {}
+                for name, column in columns.items():
+                    if isinstance(column, tuple):
+                        offsets, data = column
+                        batch[name] = (
+                            offsets[begin : end + 1] - offsets[begin],
+                            data[offsets[begin] : offsets[end]],
+                        )
+                    else:
+                        batch[name] = column[begin:end]
+                if not awa.AddColumns(
+                    self.tables[db_table_name], self.key_confirmed_name, end - begin, batch
+                ):
+                    print("add columns error")
+                    return False
+                self.tables_doc_count[db_table_name] += end - begin
+        return True
+
+    def __add(
+        self,
+        table_name: str,
+        docs,
+        db_name: str,
+    ) -> bool:
         if db_name == "" or table_name == "":
             print("Please specify your database and table name!")
             return False
@@ -435,11 +858,7 @@ class AwaLocal(AwaAPI):
                     awadb_docs.append(doc)
 
         if not self.tables_fields_check[db_table_name]:
-            self.tables_attr[db_table_name].SetIndexingSize(10000)
-            self.tables_attr[db_table_name].SetRetrievalType("IVFPQ")
-            self.tables_attr[db_table_name].SetRetrievalParam(
-                '{"ncentroids" : 256, "nsubvector" : 16}'
-            )
+            self.__set_table_index(db_table_name, self.tables_attr[db_table_name])
 
             table_engine = None
             if db_table_name in self.tables:
@@ -491,6 +910,11 @@ class AwaLocal(AwaAPI):
         brute_force_search: bool = False,
         metric_type: MetricType = MetricType.L2,
         mul_vec_weight: Optional[Dict[str, float]] = None,
+        result_format: str = "row",
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        fusion: Optional[str] = None,
+        rrf_k: Optional[int] = None,
         **kwargs: Any,
     ):
         """Vector search in the specified table.
@@ -520,6 +944,7 @@ class AwaLocal(AwaAPI):
 
             brute_force_search: Brute force search or not. Default to not.
                                         If vectors not indexed, automatically to use brute force search.
+                                        Once the index is built it is used automatically.
 
             metric_type: The distance type of computing vectors. Default to L2.
 
@@ -529,12 +954,41 @@ class AwaLocal(AwaAPI):
 
             Notice that field f1 and f2 should have the same dimension compared to vec_query.
 
+            result_format: The format of search results, "row", "columnar" or "arrow". Default to "row".
+
+            "row": each result item is a dict of fields.
+
+            "columnar": the hits of all queries are packed column by column, `Ids`, `Scores`
+            and each numeric field are numpy arrays, a vector field is a 2-D numpy array,
+            a string field is a dict of `offsets` and `data` bytes (plus `list_offsets` for
+            multiple strings). The hits of query i are rows [QueryOffsets[i], QueryOffsets[i+1]).
+
+            "arrow": the columnar results as a pyarrow.Table with a `query_no` column.
+
+            nprobe: The number of probed buckets of IVFPQ and IVFFLAT index for this query.
+                    Default to the index setting.
+
+            ef_search: The efSearch of HNSW index for this query. Default to the index setting.
+
+            fusion: How the scores of multiple vector fields are fused, "weighted" or "rrf".
+                    Default to the boosted sum of the distances.
+
+            "weighted": the sum of the min-max normalized scores weighted by mul_vec_weight.
+
+            "rrf": reciprocal rank fusion, the sum of weight / (rrf_k + rank) of each field.
+
+            rrf_k: The rank constant of "rrf" fusion. Default to 60.
+
             kwargs: Any possible extended parameters.
 
         Returns:
-            Results of searching.
+            Results of searching. `SearchPath` of each query result tells whether it is
+            served by the vector index ("index") or by brute force search ("brute_force").
         """
         show_results = {} 
+        if result_format not in ("row", "columnar", "arrow"):
+            print("result_format should be row, columnar or arrow!")
+            return show_results
         db_table_name = db_name + "/" + table_name
         if db_table_name not in self.tables:
             return show_results 
@@ -552,24 +1006,27 @@ class AwaLocal(AwaAPI):
         vec_value = None
         query_dimension = 0
         if query_type == FieldDataType.STRING:  # semantic text search
-            embedding = self.llm.Embedding(query)
-            if metric_type == MetricType.INNER_PRODUCT:
-                vec_value = self.__normalize(embedding)
-                req.SetRetrievalParams('{"metric_type":"InnerProduct"}')
-                req.SetMetricType(False) 
-            elif metric_type == MetricType.L2:
-                vec_value = embedding
-                req.SetRetrievalParams('{"metric_type":"L2"}')
-                req.SetMetricType(True)
-        elif query_type == FieldDataType.VECTOR:  # vector search
+            query = self.__get_llm().Embedding(query)
+        if query_type == FieldDataType.STRING or query_type == FieldDataType.VECTOR:
+            retrieval_params = {}
             if metric_type == MetricType.INNER_PRODUCT:
                 vec_value = self.__normalize(query)
-                req.SetRetrievalParams('{"metric_type":"InnerProduct"}')
+                retrieval_params["metric_type"] = "InnerProduct"
                 req.SetMetricType(False)
             elif metric_type == MetricType.L2:
                 vec_value = np.array(query, dtype=np.dtype("float32"))
-                req.SetRetrievalParams('{"metric_type":"L2"}')
+                retrieval_params["metric_type"] = "L2"
                 req.SetMetricType(True)
+            # per query overrides of the index search parameters
+            if nprobe is not None:
+                retrieval_params["nprobe"] = nprobe
+            if ef_search is not None:
+                retrieval_params["efSearch"] = ef_search
+            if fusion is not None:
+                retrieval_params["fusion"] = fusion
+            if rrf_k is not None:
+                retrieval_params["rrf_k"] = rrf_k
+            req.SetRetrievalParams(json.dumps(retrieval_params))
         if vec_value is not None:
             query_dimension = vec_value.__len__()
         
@@ -598,7 +1055,7 @@ class AwaLocal(AwaAPI):
 
         req.SetReqNum(1)
         req.SetTopN(topn)
-        req.SetBruteForceSearch(1)
+        req.SetBruteForceSearch(1 if brute_force_search else 0)
         self.__add_filter(db_table_name, req, filters)
 
         response = awa.Response()
@@ -608,10 +1065,28 @@ class AwaLocal(AwaAPI):
                 fvec_names.append(field_name)
         
         ret = awa.DoSearch(self.tables[db_table_name], req, response)
-        response.PackResults(fvec_names)
 
         show_results["Db"] = db_name
         show_results["Table"] = table_name
+        search_path = self.__search_path(db_table_name, response)
+
+        if result_format != "row":
+            packed = awa.PackColumns(response, fvec_names)
+            if result_format == "arrow":
+                show_results["SearchResults"] = self.__columns_to_arrow(packed)
+            else:
+                show_results["SearchResults"] = {
+                    "ResultSize": packed["totals"],
+                    "QueryOffsets": packed["query_offsets"],
+                    "Ids": packed["ids"],
+                    "Scores": packed["scores"],
+                    "Columns": packed["columns"],
+                    "Valid": packed["valid"],
+                    "SearchPath": search_path,
+                }
+            return show_results
+
+        response.PackResults(fvec_names)
 
         search_result_vec = response.Results()
         search_result_index = 0
@@ -620,6 +1095,7 @@ class AwaLocal(AwaAPI):
             search_result = search_result_vec[search_result_index]
             result_per_request = {}
             result_per_request["ResultSize"] = search_result.total
+            result_per_request["SearchPath"] = search_path
 
             result_items_list = []
             items = search_result.result_items
@@ -690,6 +1166,127 @@ class AwaLocal(AwaAPI):
             show_results["SearchResults"] = search_results
         return show_results
 
+    def search_many(
+        self,
+        table_name: str,
+        queries: list,
+        db_name: str = DEFAULT_DB_NAME,
+        max_workers: Optional[int] = None,
+        **kwargs: Any,
+    ) -> list:
+        """Search many queries in the specified table concurrently.
+
+        Args:
+            table_name: The specified table for search.
+
+            queries: List of queries, each one is a vector or text as in search.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+            max_workers: The number of searching threads. Default to the number of CPUs.
+
+            kwargs: The other arguments of search, e.g. topn, filters, metric_type.
+
+        Returns:
+            Results of searching, in the same order as queries.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, len(queries)))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.search, table_name, query, db_name, **kwargs)
+                for query in queries
+            ]
+            return [future.result() for future in futures]
+
+    def search_batch(
+        self,
+        table_name: str,
+        queries,
+        db_name: str = DEFAULT_DB_NAME,
+        topn: int = DEFAULT_TOPN,
+        vector_field: Optional[str] = None,
+        brute_force_search: bool = False,
+        metric_type: MetricType = MetricType.L2,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ):
+        """Vector search of a batch of queries in the specified table.
+
+        Args:
+            table_name: The specified table for search.
+
+            queries: Querying vectors, numpy array of shape (n, d).
+                     A C-contiguous float32 array is passed to the engine without copying.
+
+            db_name: Database name, default to DEFAULT_DB_NAME.
+
+            topn: The topn nearest neighborhood documents to return for each query.
+
+            vector_field: The vector field to search. Default to the first vector field
+                          whose dimension is d.
+
+            brute_force_search: Brute force search or not. Default to not.
+                                If vectors not indexed, automatically to use brute force search.
+
+            metric_type: The distance type of computing vectors. Default to L2.
+
+            nprobe: The number of probed buckets of IVFPQ and IVFFLAT index. Default to the index setting.
+
+            ef_search: The efSearch of HNSW index. Default to the index setting.
+
+        Returns:
+            (ids, scores), int64 and float32 numpy arrays of shape (n, topn).
+            ids are the engine document ids, missing results are padded with -1.
+        """
+        db_table_name = db_name + "/" + table_name
+        if db_table_name not in self.tables:
+            print("Table %s is not existed!" % db_table_name)
+            return None
+
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if queries.ndim != 2:
+            print("Queries should be a 2-D array of shape (n, d)!")
+            return None
+
+        if metric_type == MetricType.INNER_PRODUCT:
+            norms = np.linalg.norm(queries, ord=2, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            queries = queries / norms
+
+        query_dimension = queries.shape[1]
+        vec_fields_type = self.tables_vector_fields_type[db_table_name]
+        if vector_field is None:
+            for vec_field_name in vec_fields_type:
+                if vec_fields_type[vec_field_name] == query_dimension:
+                    vector_field = vec_field_name
+                    break
+        if vector_field is None or vec_fields_type.get(vector_field) != query_dimension:
+            print("Query vector dimension is not valid!")
+            return None
+
+        retrieval_params = {
+            "metric_type": "L2" if metric_type == MetricType.L2 else "InnerProduct"
+        }
+        if nprobe is not None:
+            retrieval_params["nprobe"] = nprobe
+        if ef_search is not None:
+            retrieval_params["efSearch"] = ef_search
+
+        return awa.SearchBatch(
+            self.tables[db_table_name],
+            vector_field,
+            np.ascontiguousarray(queries),
+            topn,
+            brute_force_search,
+            metric_type == MetricType.L2,
+            json.dumps(retrieval_params),
+        )
+
     def get(
         self,
         table_name: str,
@@ -944,7 +1541,11 @@ class AwaLocal(AwaAPI):
                     ids_list.append(str(each_id))
                 else:
                     ids_list.append(each_id)
-            return awa.Delete(db_table_name, ids_list)
+            if db_table_name not in self.tables:
+                print("Table %s is not existed!" % db_table_name)
+                return False
+            with self.write_lock:
+                return awa.Delete(self.tables[db_table_name], ids_list)
 
         if filters is not None:
             # todo : delete ids which satisfy the filter conditions
@@ -973,8 +1574,12 @@ class AwaLocal(AwaAPI):
             print("Database %s and table %s not exist!" % (db_name, table_name))
             return False
 
-        if awa.Close(self.tables[db_table_name]) == 0:
-            return True
+        with self.write_lock:
+            # save the trained indexes, loading the table does not retrain them
+            if self.tables_fields_check.get(db_table_name, False):
+                awa.Dump(self.tables[db_table_name])
+            if awa.Close(self.tables[db_table_name]) == 0:
+                return True
         return False
 
     def load(
@@ -997,17 +1602,18 @@ class AwaLocal(AwaAPI):
 
         db_table_name = db_name + "/" + table_name
 
-        if not db_table_name in self.tables:
-            self.__create(db_table_name)
-        
-        if self.tables[db_table_name] is None:
-            print("Db table %s created failed!", db_table_name)
-            return False
+        with self.write_lock:
+            if not db_table_name in self.tables:
+                self.__create(db_table_name)
+
+            if self.tables[db_table_name] is None:
+                print("Db table %s created failed!", db_table_name)
+                return False
+
+            if not awa.LoadFromLocal(self.tables[db_table_name]):
+                print("Table %s can not be loaded!" % db_table_name)
+                return False
 
-        if not awa.LoadFromLocal(self.tables[db_table_name]):
-            print("Table %s can not be loaded!" % db_table_name)
-            return False
-        
         return True
     
     def __text_preprocess(
@@ -1046,22 +1652,133 @@ class AwaLocal(AwaAPI):
                 words_count_dict[word] = 1
         return words_count_dict
 
-    def __process_doc_embedding(
-        self,
-        doc: dict,
-    ):
-        """Preprocess text embedding.
+    def __columns_to_arrow(self, packed):
+        """Zero-copy pyarrow.Table view of the columnar search results."""
+        try:
+            import pyarrow as pa
+        except ImportError as exc:
+            raise ImportError(
+                "Could not import pyarrow python package. "
+                "Please install it with `pip install pyarrow`."
+            ) from exc
+
+        query_offsets = packed["query_offsets"]
+        arrays = [
+            pa.array(np.repeat(np.arange(len(query_offsets) - 1), np.diff(query_offsets))),
+            pa.array(packed["scores"]),
+        ]
+        names = ["query_no", "score"]
+        for name, values in packed["columns"].items():
+            valid = packed["valid"][name]
+            null_bitmap = pa.py_buffer(np.packbits(valid, bitorder="little"))
+            rows = len(valid)
+            if isinstance(values, dict):
+                if "list_offsets" in values:
+                    strings = pa.LargeStringArray.from_buffers(
+                        len(values["offsets"]) - 1,
+                        pa.py_buffer(values["offsets"]),
+                        pa.py_buffer(values["data"]),
+                    )
+                    array = pa.LargeListArray.from_arrays(
+                        pa.array(values["list_offsets"]), strings, mask=pa.array(~valid)
+                    )
+                else:
+                    array = pa.LargeStringArray.from_buffers(
+                        rows,
+                        pa.py_buffer(values["offsets"]),
+                        pa.py_buffer(values["data"]),
+                        null_bitmap,
+                    )
+            elif values.ndim == 2:
+                array = pa.FixedSizeListArray.from_arrays(
+                    pa.array(values.reshape(-1)), values.shape[1]
+                )
+            else:
+                array = pa.Array.from_buffers(
+                    pa.from_numpy_dtype(values.dtype),
+                    rows,
+                    [null_bitmap, pa.py_buffer(values)],
+                )
+            arrays.append(array)
+            names.append(name)
+        return pa.Table.from_arrays(arrays, names=names)
+
+    @staticmethod
+    def __bulk_numeric(name, column, f_type):
+        """Cast a numeric column of add_columns to the dtype of its field.
+
+        Raises:
+            ValueError: If a value is out of the range of the integer field.
+        """
+        dtype = BULK_COLUMN_DTYPES[f_type]
+        if column.dtype.kind in "iu" and column.size > 0 and np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            if column.min() < info.min or column.max() > info.max:
+                raise ValueError(
+                    "Field %s of type %s should be in [%d, %d]!"
+                    % (name, f_type.name, info.min, info.max)
+                )
+        return np.ascontiguousarray(column, dtype=dtype)
+
+    @staticmethod
+    def __bulk_column(values):
+        """Numpy view of a column of add_columns.
 
-        Args:
-            doc: the document to be processed for its texts.
         Returns:
-            None.
+            A numpy array, a tuple of the int64 offsets and uint8 data of a string
+            column, or None if the values are not supported.
         """
-        for field_name in doc:
-            if field_name == "embedding_text":
-                from awadb import AwaEmbedding 
-                self.llm = AwaEmbedding(self.model_name)
-                doc["text_embedding"] = self.llm.Embedding(doc[field_name])
+        if type(values).__module__.startswith("pyarrow"):
+            import pyarrow as pa
+
+            if isinstance(values, pa.ChunkedArray):
+                values = values.combine_chunks()
+            if not isinstance(values, pa.Array):
+                return None
+            if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+                values = values.cast(pa.large_string())
+                n = len(values)
+                buffers = values.buffers()
+                offsets = np.frombuffer(buffers[1], dtype=np.int64)[
+                    values.offset : values.offset + n + 1
+                ]
+                data = (
+                    np.frombuffer(buffers[2], dtype=np.uint8)
+                    if buffers[2] is not None
+                    else np.zeros(0, dtype=np.uint8)
+                )
+                # rebase the offsets on the first string
+                return offsets - offsets[0], data[offsets[0] : offsets[-1]]
+            if pa.types.is_fixed_size_list(values.type):
+                return values.flatten().to_numpy(zero_copy_only=False).reshape(
+                    len(values), values.type.list_size
+                )
+            return values.to_numpy(zero_copy_only=False)
+
+        if isinstance(values, (list, tuple)):
+            values = np.asarray(values) if values and not isinstance(values[0], str) \
+                else np.asarray(values, dtype=object)
+        if type(values).__name__ != "ndarray":
+            return None
+        if values.dtype.kind in "OUS":
+            if values.ndim != 1:
+                return None
+            encoded = [v if isinstance(v, bytes) else str(v).encode() for v in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(v) for v in encoded], out=offsets[1:])
+            return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        if values.ndim not in (1, 2):
+            return None
+        return values
+
+    def __get_llm(self):
+        """Create the embedding model once and share it between threads."""
+        if self.llm is None:
+            with self.write_lock:
+                if self.llm is None:
+                    from awadb import AwaEmbedding
+                    self.llm = AwaEmbedding(self.model_name, self.embedding_cache_dir)
+        return self.llm
 
     def __process_docs_embedding(
         self, 
@@ -1076,13 +1793,24 @@ class AwaLocal(AwaAPI):
         """
 
         if isinstance(docs, dict):
-            self.__process_doc_embedding(docs)
-            return
+            docs = [docs]
+
+        # embed all the texts of the call in one batch
+        texts = []
+        texts_docs = []
         for doc in docs:
-            if type(doc).__name__ == "dict":
-                self.__process_doc_embedding(doc)
-            else:
+            if type(doc).__name__ != "dict":
                 print("field should be the format of dict")
+                continue
+            if "embedding_text" in doc:
+                texts.append(doc["embedding_text"])
+                texts_docs.append(doc)
+        if len(texts) == 0:
+            return
+
+        embeddings = self.__get_llm().EmbeddingBatch(texts)
+        for doc, embedding in zip(texts_docs, embeddings):
+            doc["text_embedding"] = embedding
         return
 
     def drop(
@@ -1101,6 +1829,27 @@ class AwaLocal(AwaAPI):
             the database can be dropped successfully, otherwise failed.
         """
 
+    def __set_table_index(self, db_table_name, table_info):
+        """Set the index configuration of the table info, see set_index."""
+        index_config = self.tables_index_config.get(db_table_name)
+        if index_config is None:
+            index_config = {
+                "retrieval_type": DEFAULT_RETRIEVAL_TYPE,
+                "retrieval_param": dict(DEFAULT_RETRIEVAL_PARAM),
+                "indexing_size": DEFAULT_INDEXING_SIZE,
+            }
+            self.tables_index_config[db_table_name] = index_config
+        table_info.SetIndexingSize(index_config["indexing_size"])
+        table_info.SetRetrievalType(index_config["retrieval_type"])
+        table_info.SetRetrievalParam(json.dumps(index_config["retrieval_param"]))
+
+    def __search_path(self, db_table_name, response) -> str:
+        """Whether the search is served by the vector index or by brute force search."""
+        index_config = self.tables_index_config.get(db_table_name, {})
+        if response.BruteForceSearch() or index_config.get("retrieval_type") == "FLAT":
+            return "brute_force"
+        return "index"
+
     def __create(self, db_table_name):
         """Create a new table.
         
@@ -1124,8 +1873,40 @@ class AwaLocal(AwaAPI):
 
         new_table = awa.Init(table_log_dir, table_data_dir)
         self.tables[db_table_name] = new_table
+        if new_table is not None:
+            self.__set_table_checkpoint(db_table_name)
+            self.__set_table_search_batch(db_table_name)
         return new_table
 
+    def __set_table_checkpoint(self, db_table_name) -> bool:
+        """Pass the checkpoint options of the table to its engine, see set_checkpoint."""
+        checkpoint_config = self.tables_checkpoint_config.get(db_table_name)
+        if checkpoint_config is None:
+            return True
+        if not awa.SetCheckpointOptions(
+            self.tables[db_table_name],
+            checkpoint_config["interval_sec"],
+            checkpoint_config["dirty_docs"],
+            int(checkpoint_config["io_mb_per_sec"] * 1024 * 1024),
+        ):
+            print("Checkpoint options of table %s can not be set!" % db_table_name)
+            return False
+        return True
+
+    def __set_table_search_batch(self, db_table_name) -> bool:
+        """Pass the search batching options of the table to its engine, see set_search_batching."""
+        batch_config = self.tables_search_batch_config.get(db_table_name)
+        if batch_config is None:
+            return True
+        if not awa.SetSearchBatchOptions(
+            self.tables[db_table_name],
+            batch_config["max_wait_us"],
+            batch_config["max_batch_size"],
+        ):
+            print("Search batching options of table %s can not be set!" % db_table_name)
+            return False
+        return True
+
     def __load(self, db_table_name) -> bool:
         """Load the specified table.
         
@@ -1148,6 +1929,7 @@ class AwaLocal(AwaAPI):
             return False
         return True
 
+    @staticmethod
     def __normalize(vec_array):
         x = None
         if isinstance(vec_array, list):
@@ -1480,14 +2262,22 @@ class AwaLocal(AwaAPI):
 
             awadb_field.datatype = awa.DataType.VECTOR
             if ret != 2:
+                # quantized vectors are kept in memory
+                index_config = self.tables_index_config.get(db_table_name, {})
+                store_type = "Mmap"
+                store_param = {"cache_size": 2000}
+                if index_config.get("quantizer"):
+                    store_type = "MemoryOnly"
+                    store_param["quantizer"] = index_config["quantizer"]
+                    store_param["rerank"] = index_config.get("rerank", 0)
                 self.__add_vector_field(
                     db_table_name,
                     field_name,
                     awadb_field.datatype,
                     True,
                     len(field_value),
-                    "Mmap",
-                    '{"cache_size" : 2000}',
+                    store_type,
+                    json.dumps(store_param),
                     False,
                 )
                 self.tables_vector_fields_type[db_table_name][field_name] = dimension 
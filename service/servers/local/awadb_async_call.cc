@@ -66,6 +66,8 @@ int CreateCall::ProcessCreateRequest()  {
           status = false;
 	  continue;
 	}
+        SetSearchBatchOptions(engine, data_->search_batch_wait_us_,
+                              data_->search_batch_size_);
 	is_init_engine = true;
       }	
 
@@ -186,23 +188,26 @@ void CreateCall::Proceed() {
     // part of its FINISH state.
     new CreateCall(data_);
 
-    int ret = ProcessCreateRequest();
-
-    if (0 == ret)  {
-      reply_.set_code(awadb_grpc::OK);
-    }  else if (-1 == ret || -2 == ret)  {
-      reply_.set_code(awadb_grpc::INPUT_PARAMETER_ERROR);
-    }  else if (1 == ret) {
-      reply_.set_code(awadb_grpc::TABLE_EXIST);
-    }  else {
-      reply_.set_code(awadb_grpc::INTERNAL_ERROR);
-    }
-
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
+    // The actual processing is done by a worker, which finishes the rpc.
     status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
+    bool queued = data_->write_lane_->Submit([this]()  {
+      int ret = ProcessCreateRequest();
+
+      if (0 == ret)  {
+        reply_.set_code(awadb_grpc::OK);
+      }  else if (-1 == ret || -2 == ret)  {
+        reply_.set_code(awadb_grpc::INPUT_PARAMETER_ERROR);
+      }  else if (1 == ret) {
+        reply_.set_code(awadb_grpc::TABLE_EXIST);
+      }  else {
+        reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      }
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
+    }
   } else {
     GPR_ASSERT(status_ == FINISH);
     // Once in the FINISH state, deallocate ourselves (CallData).
@@ -545,20 +550,22 @@ void AddFieldsCall::Proceed() {
     // part of its FINISH state.
     new AddFieldsCall(data_);
 
-    // The actual processing.
-    bool ret = ProcessAddFieldsRequest();
+    // The actual processing is done by a worker, which finishes the rpc.
+    status_ = FINISH;
+    bool queued = data_->write_lane_->Submit([this]()  {
+      bool ret = ProcessAddFieldsRequest();
 
-    if (ret)  {
-      reply_.set_code(awadb_grpc::OK);
-    }  else  {
-      reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      if (ret)  {
+        reply_.set_code(awadb_grpc::OK);
+      }  else  {
+        reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      }
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
     }
-
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
-    status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
   } else {
     GPR_ASSERT(status_ == FINISH);
     // Once in the FINISH state, deallocate ourselves (CallData).
@@ -665,20 +672,22 @@ void AddOrUpdateCall::Proceed() {
     // part of its FINISH state.
     new AddOrUpdateCall(data_);
 
-    // The actual processing.
-    bool ret = ProcessAddOrUpdateRequest();
+    // The actual processing is done by a worker, which finishes the rpc.
+    status_ = FINISH;
+    bool queued = data_->write_lane_->Submit([this]()  {
+      bool ret = ProcessAddOrUpdateRequest();
 
-    if (ret)  {
-      reply_.set_code(awadb_grpc::OK);
-    }  else  {
-      reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      if (ret)  {
+        reply_.set_code(awadb_grpc::OK);
+      }  else  {
+        reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      }
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
     }
-
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
-    status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
   } else {
     GPR_ASSERT(status_ == FINISH);
     // Once in the FINISH state, deallocate ourselves (CallData).
@@ -817,14 +826,16 @@ void GetCall::Proceed() {
     // part of its FINISH state.
     new GetCall(data_);
 
-    // The actual processing.
-    ProcessGetRequest();
-    
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
+    // The actual processing is done by a worker, which finishes the rpc.
     status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
+    bool queued = data_->get_lane_->Submit([this]()  {
+      ProcessGetRequest();
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
+    }
   } else {
     GPR_ASSERT(status_ == FINISH);
     // Once in the FINISH state, deallocate ourselves (CallData).
@@ -1010,13 +1021,16 @@ void SearchCall::Proceed() {
     // part of its FINISH state.
     new SearchCall(data_);
 
-    // The actual processing.
-    ProcessSearchRequest();
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
+    // The actual processing is done by a worker, which finishes the rpc.
     status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
+    bool queued = data_->search_lane_->Submit([this]()  {
+      ProcessSearchRequest();
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
+    }
   } else {
     GPR_ASSERT(status_ == FINISH);
     // Once in the FINISH state, deallocate ourselves (CallData).
@@ -1087,18 +1101,22 @@ void DeleteCall::Proceed() {
       data_->cq_, data_->cq_, this);
   } else if (status_ == PROCESS)  {
     new DeleteCall(data_);
-    bool ret = ProcessDeleteRequest();  
-    if (ret)  {
-      reply_.set_code(awadb_grpc::OK);
-    }  else  {
-      reply_.set_code(awadb_grpc::INTERNAL_ERROR);
-    }
 
-    // And we are done! Let the gRPC runtime know we've finished, using the
-    // memory address of this instance as the uniquely identifying tag for
-    // the event.
+    // The actual processing is done by a worker, which finishes the rpc.
     status_ = FINISH;
-    responder_.Finish(reply_, Status::OK, this);
+    bool queued = data_->write_lane_->Submit([this]()  {
+      bool ret = ProcessDeleteRequest();
+      if (ret)  {
+        reply_.set_code(awadb_grpc::OK);
+      }  else  {
+        reply_.set_code(awadb_grpc::INTERNAL_ERROR);
+      }
+      responder_.Finish(reply_, Status::OK, this);
+    });
+    if (!queued)  {
+      responder_.FinishWithError(
+        Status(grpc::StatusCode::RESOURCE_EXHAUSTED, "server is busy"), this);
+    }
   } else {
      GPR_ASSERT(status_ == FINISH);
      // Once in the FINISH state, deallocate ourselves (CallData).
@@ -24,6 +24,7 @@
 #include <grpcpp/grpcpp.h>
 
 #include "c_api/api_data/gamma_doc.h"
+#include "awadb_worker_pool.h"
 
 #include "awadb.pb.h"
 #include "awadb.grpc.pb.h"
@@ -48,6 +49,17 @@ struct CallData {
   cuckoohash_map<std::string, std::string> &db2tables_;
   std::string &data_dir_;
   std::string &log_dir_; 
+
+  // engine work is run on the worker pool instead of the completion queue
+  // threads, each lane limits the concurrency of one kind of rpc
+  RpcLane *search_lane_;
+  RpcLane *get_lane_;
+  // creating tables, adding fields, adding and deleting docs
+  RpcLane *write_lane_;
+
+  // search batching options of the table engines
+  int search_batch_wait_us_;
+  int search_batch_size_;
 };
 
 class Call {
@@ -7,21 +7,38 @@
 
 #include <stdlib.h>
 
+#include <algorithm>
+
 #include "util/utils.h"
 #include "c_api/gamma_api.h"
 #include "awadb_async_call.h"
 #include "awadb_server.h"
 
 
-LocalAsyncServer::LocalAsyncServer(const std::string &data_log_dir) {
+LocalAsyncServer::LocalAsyncServer(const std::string &data_log_dir,
+                                   const ServerOptions &options)
+    : options_(options) {
   root_data_dir_ = data_log_dir + "/data";
   root_log_dir_ = data_log_dir + "/log";
+
+  int cpu_num = std::max(1, (int)std::thread::hardware_concurrency());
+  if (options_.cq_threads <= 0) options_.cq_threads = cpu_num;
+  if (options_.worker_threads <= 0) options_.worker_threads = cpu_num;
+  if (options_.max_concurrent_searches <= 0) {
+    options_.max_concurrent_searches = options_.worker_threads;
+  }
+  if (options_.max_concurrent_gets <= 0) {
+    options_.max_concurrent_gets = options_.worker_threads;
+  }
+  if (options_.max_concurrent_writes <= 0) options_.max_concurrent_writes = 1;
 }
 
 LocalAsyncServer::~LocalAsyncServer() {
-  server_->Shutdown();
+  // the rpcs in progress are finished by the workers during the shutdown
+  if (server_) server_->Shutdown();
   // Always shutdown the completion queue after the server.
-  cq_->Shutdown();
+  for (auto &cq : cqs_) cq->Shutdown();
+  for (std::thread &t : cq_threads_) t.join();
 }
 
 void LocalAsyncServer::Run(const uint16_t &port)  {
@@ -38,37 +55,68 @@ void LocalAsyncServer::Run(const uint16_t &port)  {
   // Register "service_" as the instance through which we'll communicate with
   // clients. In this case it corresponds to an *asynchronous* service.
   builder.RegisterService(&service_);
-  // Get hold of the completion queue used for the asynchronous communication
-  // with the gRPC runtime.
-  cq_ = builder.AddCompletionQueue();
+  // Get hold of the completion queues used for the asynchronous communication
+  // with the gRPC runtime, one per polling thread.
+  for (int i = 0; i < options_.cq_threads; i++) {
+    cqs_.emplace_back(builder.AddCompletionQueue());
+  }
   // Finally assemble the server.
   server_ = builder.BuildAndStart();
-  std::cout << "Server listening on " << server_address << std::endl;
+  if (!server_) {
+    std::cout << "Server failed to listen on " << server_address << std::endl;
+    return;
+  }
+
+  // Engine work is handed to the workers, so that slow searches do not
+  // block the completion queues.
+  workers_.reset(new WorkerPool(options_.worker_threads,
+                                (size_t)options_.max_queued_rpcs));
+  search_lane_.reset(new RpcLane(workers_.get(),
+                                 options_.max_concurrent_searches,
+                                 (size_t)options_.max_queued_rpcs));
+  get_lane_.reset(new RpcLane(workers_.get(), options_.max_concurrent_gets,
+                              (size_t)options_.max_queued_rpcs));
+  write_lane_.reset(new RpcLane(workers_.get(),
+                                options_.max_concurrent_writes,
+                                (size_t)options_.max_queued_rpcs));
+  for (auto &cq : cqs_) {
+    call_data_.emplace_back(new CallData{
+        &service_, cq.get(), table2engine_, db2tables_, root_data_dir_,
+        root_log_dir_, search_lane_.get(), get_lane_.get(), write_lane_.get(),
+        options_.search_batch_wait_us, options_.search_batch_size});
+  }
+
+  std::cout << "Server listening on " << server_address << " with "
+            << options_.cq_threads << " completion queues and "
+            << options_.worker_threads << " workers" << std::endl;
   // Proceed to the server's main loop.
-  HandleRpcs();
+  for (int i = 1; i < options_.cq_threads; i++) {
+    cq_threads_.emplace_back(&LocalAsyncServer::HandleRpcs, this, i);
+  }
+  HandleRpcs(0);
 }
 
-void LocalAsyncServer::HandleRpcs()  {
+void LocalAsyncServer::HandleRpcs(int cq_idx)  {
+  ServerCompletionQueue *cq = cqs_[cq_idx].get();
   // Spawn a new CallData instance to serve new clients.
-  CallData data{&service_, cq_.get(), table2engine_, db2tables_, root_data_dir_, root_log_dir_};
-  new CreateCall(&data);
-  new CheckTableCall(&data);
-  new QueryTableDetailCall(&data);
-  new AddFieldsCall(&data);
-  new AddOrUpdateCall(&data);
-  new GetCall(&data);
-  new SearchCall(&data);
-  new DeleteCall(&data);
+  CallData *data = call_data_[cq_idx].get();
+  new CreateCall(data);
+  new CheckTableCall(data);
+  new QueryTableDetailCall(data);
+  new AddFieldsCall(data);
+  new AddOrUpdateCall(data);
+  new GetCall(data);
+  new SearchCall(data);
+  new DeleteCall(data);
 
   void* tag;  // uniquely identifies a request.
   bool ok;
-  while (true) {
-    // Block waiting to read the next event from the completion queue. The
-    // event is uniquely identified by its tag, which in this case is the
-    // memory address of a CallData instance.
-    // The return value of Next should always be checked. This return value
-    // tells us whether there is any kind of event or cq_ is shutting down.
-    GPR_ASSERT(cq_->Next(&tag, &ok));
+  // Block waiting to read the next event from the completion queue. The
+  // event is uniquely identified by its tag, which in this case is the
+  // memory address of a CallData instance.
+  // The return value of Next should always be checked. This return value
+  // tells us whether there is any kind of event or cq is shutting down.
+  while (cq->Next(&tag, &ok)) {
     //GPR_ASSERT(ok);
     if (!ok)  continue;
     static_cast<Call*>(tag)->Proceed();
@@ -90,6 +138,8 @@ bool LocalAsyncServer::InitTableEngines()  {
 	std::cout<<"Table "<<table<<" in db "<<db<<" initialize failed!"<<std::endl;
 	continue;
       }
+      SetSearchBatchOptions(table_engine, options_.search_batch_wait_us,
+                            options_.search_batch_size);
       if (0 == Load(table_engine))  {
 	std::string key = db + "/" + table;
         table2engine_.insert(key, table_engine);
@@ -113,18 +163,35 @@ bool LocalAsyncServer::InitTableEngines()  {
 
 
 int main(int argc, char** argv) {
-  if (argc < 2 || argc > 3)  {
-    std::cout<<"[awadb_server] [data_path] [port]"<<std::endl;
+  // the flags are removed, the positional arguments are left
+  std::vector<char *> args = absl::ParseCommandLine(argc, argv);
+  if (args.size() < 2 || args.size() > 3)  {
+    std::cout<<"[awadb_server] [data_path] [port] [--cq_threads=N] "
+             <<"[--worker_threads=N] [--max_queued_rpcs=N] "
+             <<"[--max_concurrent_searches=N] [--max_concurrent_gets=N] "
+             <<"[--max_concurrent_writes=N] [--search_batch_wait_us=N] "
+             <<"[--search_batch_size=N]"<<std::endl;
     return -1;
   } 
-  std::string data_path(argv[1]);
+  std::string data_path(args[1]);
   uint16_t port = 50005;
 
-  if (argc == 3)  {
-    port = (uint16_t)atoi(argv[2]);
+  if (args.size() == 3)  {
+    port = (uint16_t)atoi(args[2]);
   } 
 
-  LocalAsyncServer server(data_path);
+  ServerOptions options;
+  options.cq_threads = absl::GetFlag(FLAGS_cq_threads);
+  options.worker_threads = absl::GetFlag(FLAGS_worker_threads);
+  options.max_queued_rpcs = absl::GetFlag(FLAGS_max_queued_rpcs);
+  options.max_concurrent_searches =
+      absl::GetFlag(FLAGS_max_concurrent_searches);
+  options.max_concurrent_gets = absl::GetFlag(FLAGS_max_concurrent_gets);
+  options.max_concurrent_writes = absl::GetFlag(FLAGS_max_concurrent_writes);
+  options.search_batch_wait_us = absl::GetFlag(FLAGS_search_batch_wait_us);
+  options.search_batch_size = absl::GetFlag(FLAGS_search_batch_size);
+
+  LocalAsyncServer server(data_path, options);
   server.Run(port);
 
   return 0;
@@ -23,6 +23,7 @@
 #include <memory>
 #include <string>
 #include <thread>
+#include <vector>
 #include <libcuckoo/cuckoohash_map.hh>
 
 #include "absl/flags/flag.h"
@@ -34,8 +35,48 @@
 
 
 #include "awadb.grpc.pb.h"
+#include "awadb_async_call.h"
+#include "awadb_worker_pool.h"
 
 ABSL_FLAG(uint16_t, port, 50051, "Server port for the service");
+ABSL_FLAG(int, cq_threads, 0,
+          "Completion queues, each polled by one thread, 0 for the CPU number");
+ABSL_FLAG(int, worker_threads, 0,
+          "Threads running the engine work of the rpcs, 0 for the CPU number");
+ABSL_FLAG(int, max_queued_rpcs, 10000,
+          "Rpcs waiting for a worker, more are rejected as RESOURCE_EXHAUSTED");
+ABSL_FLAG(int, max_concurrent_searches, 0,
+          "Concurrently running Search rpcs, 0 for the worker number");
+ABSL_FLAG(int, max_concurrent_gets, 0,
+          "Concurrently running Get rpcs, 0 for the worker number");
+ABSL_FLAG(int, max_concurrent_writes, 1,
+          "Concurrently running Create, AddFields, AddOrUpdate and Delete rpcs");
+ABSL_FLAG(int, search_batch_wait_us, 0,
+          "Max microseconds a single query search waits to be batched with "
+          "the concurrent ones of the same table, 0 disables batching");
+ABSL_FLAG(int, search_batch_size, 32, "Max queries of a search batch");
+
+struct ServerOptions {
+  int cq_threads;
+  int worker_threads;
+  int max_queued_rpcs;
+  int max_concurrent_searches;
+  int max_concurrent_gets;
+  int max_concurrent_writes;
+  int search_batch_wait_us;
+  int search_batch_size;
+
+  ServerOptions() {
+    cq_threads = 0;
+    worker_threads = 0;
+    max_queued_rpcs = 10000;
+    max_concurrent_searches = 0;
+    max_concurrent_gets = 0;
+    max_concurrent_writes = 1;
+    search_batch_wait_us = 0;
+    search_batch_size = 32;
+  }
+};
 
 using grpc::Server;
 using grpc::ServerAsyncResponseWriter;
@@ -46,7 +87,8 @@ using grpc::Status;
 
 class LocalAsyncServer final {
  public:
-  LocalAsyncServer(const std::string &data_log_dir);
+  LocalAsyncServer(const std::string &data_log_dir,
+                   const ServerOptions &options = ServerOptions());
 
   ~LocalAsyncServer();
     
@@ -55,11 +97,19 @@ class LocalAsyncServer final {
 
  private:
   
-  // This can be run in multiple threads if needed.
-  void HandleRpcs();
+  // Polls the completion queue cq_idx, it is run by one thread per queue.
+  void HandleRpcs(int cq_idx);
 
   bool InitTableEngines();
-  std::unique_ptr<ServerCompletionQueue> cq_;
+  ServerOptions options_;
+  std::vector<std::unique_ptr<ServerCompletionQueue>> cqs_;
+  std::vector<std::unique_ptr<CallData>> call_data_;
+  std::vector<std::thread> cq_threads_;
+  // the lanes are destroyed after the pool, whose workers may still run them
+  std::unique_ptr<RpcLane> search_lane_;
+  std::unique_ptr<RpcLane> get_lane_;
+  std::unique_ptr<RpcLane> write_lane_;
+  std::unique_ptr<WorkerPool> workers_;
   awadb_grpc::AwaDBServer::AsyncService service_;
   std::unique_ptr<Server> server_;
   std::string root_data_dir_;
@@ -0,0 +1,87 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#include "awadb_worker_pool.h"
+
+WorkerPool::WorkerPool(int thread_num, size_t max_queued)
+    : max_queued_(max_queued), running_(true) {
+  if (thread_num < 1) thread_num = 1;
+  for (int i = 0; i < thread_num; i++) {
+    threads_.emplace_back(&WorkerPool::WorkerHandler, this);
+  }
+}
+
+WorkerPool::~WorkerPool() {
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    running_ = false;
+  }
+  cv_.notify_all();
+  for (std::thread &t : threads_) t.join();
+}
+
+bool WorkerPool::Submit(std::function<void()> task) {
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    if (!running_ || tasks_.size() >= max_queued_) return false;
+    tasks_.push_back(std::move(task));
+  }
+  cv_.notify_one();
+  return true;
+}
+
+void WorkerPool::WorkerHandler() {
+  while (true) {
+    std::function<void()> task;
+    {
+      std::unique_lock<std::mutex> lk(mu_);
+      cv_.wait(lk, [this] { return !running_ || !tasks_.empty(); });
+      // the queued tasks are still run when stopping, their rpcs are waiting
+      if (tasks_.empty()) return;
+      task = std::move(tasks_.front());
+      tasks_.pop_front();
+    }
+    task();
+  }
+}
+
+RpcLane::RpcLane(WorkerPool *pool, int limit, size_t max_queued)
+    : pool_(pool), limit_(limit > 0 ? limit : 1), max_queued_(max_queued) {
+  running_ = 0;
+}
+
+bool RpcLane::Submit(std::function<void()> task) {
+  {
+    std::lock_guard<std::mutex> lk(mu_);
+    if (running_ >= limit_) {
+      if (pending_.size() >= max_queued_) return false;
+      pending_.push_back(std::move(task));
+      return true;
+    }
+    running_++;
+  }
+  if (!pool_->Submit(
+          [this, task = std::move(task)]() mutable { Run(std::move(task)); })) {
+    std::lock_guard<std::mutex> lk(mu_);
+    running_--;
+    return false;
+  }
+  return true;
+}
+
+void RpcLane::Run(std::function<void()> task) {
+  while (true) {
+    task();
+    std::lock_guard<std::mutex> lk(mu_);
+    if (pending_.empty()) {
+      running_--;
+      return;
+    }
+    task = std::move(pending_.front());
+    pending_.pop_front();
+  }
+}
@@ -0,0 +1,70 @@
+/**
+ * Copyright 2023 The AwaDB Authors.
+ *
+ * This source code is licensed under the Apache License, Version 2.0 license
+ * found in the LICENSE file in the root directory of this source tree.
+ */
+
+#ifndef AWADB_WORKER_POOL_H_
+#define AWADB_WORKER_POOL_H_
+
+#include <condition_variable>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// Fixed number of threads running the engine work of the rpcs, the queue of
+// the waiting tasks is bounded so that an overloaded server rejects rpcs
+// instead of queueing them without limit.
+class WorkerPool {
+ public:
+  WorkerPool(int thread_num, size_t max_queued);
+
+  ~WorkerPool();
+
+  /**
+   * @return false if the queue is full or the pool is stopped
+   */
+  bool Submit(std::function<void()> task);
+
+  int ThreadNum() { return (int)threads_.size(); }
+
+ private:
+  void WorkerHandler();
+
+  std::mutex mu_;
+  std::condition_variable cv_;
+  std::deque<std::function<void()>> tasks_;
+  size_t max_queued_;
+  bool running_;
+  std::vector<std::thread> threads_;
+};
+
+// Runs at most limit tasks of one kind of rpc on the worker pool at a time,
+// the others wait in the lane, so that one kind of rpc cannot take all of
+// the workers.
+class RpcLane {
+ public:
+  RpcLane(WorkerPool *pool, int limit, size_t max_queued);
+
+  /**
+   * @return false if the lane or the pool is full
+   */
+  bool Submit(std::function<void()> task);
+
+ private:
+  // run the task and then the tasks waiting in the lane
+  void Run(std::function<void()> task);
+
+  WorkerPool *pool_;
+  int limit_;
+  size_t max_queued_;
+
+  std::mutex mu_;
+  std::deque<std::function<void()>> pending_;
+  int running_;
+};
+
+#endif
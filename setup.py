@@ -154,6 +154,10 @@ setup(
     packages=["awadb", "awadb.llm_embedding", "awadb.awa_embedding"],
     
     zip_safe=False,
-    extras_require={"test": ["pytest>=6.0"]},
+    extras_require={
+        "test": ["pytest>=6.0"],
+        "arrow": ["pyarrow"],
+        "openai": ["openai", "tiktoken"],
+    },
     python_requires=">=3.7",
 )
@@ -0,0 +1,95 @@
+# -*- coding:utf-8 -*-
+#!/usr/bin/python3
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("awa")
+
+from awadb.library import AwaLocal
+
+DIMENSION = 8
+
+
+def new_client(tmp_path):
+    return AwaLocal(root_dir=str(tmp_path))
+
+
+def test_round_trip(tmp_path):
+    client = new_client(tmp_path)
+    n = 100
+    ids = ["key%d" % i for i in range(n)]
+    vectors = np.random.rand(n, DIMENSION).astype(np.float32)
+    assert client.add_columns(
+        "columns",
+        ids=ids,
+        vectors=vectors,
+        price=np.arange(n, dtype=np.int64),
+        score=np.linspace(0.0, 1.0, n),
+        source=["doc%d" % i for i in range(n)],
+    )
+
+    docs = client.get("columns", ids=ids)
+    assert len(docs) == n
+    for i, doc in enumerate(docs):
+        assert doc["_id"] == ids[i]
+        assert doc["price"] == i
+        assert doc["score"] == pytest.approx(i / (n - 1), rel=1e-6)
+        assert doc["source"] == "doc%d" % i
+        assert np.allclose(doc["embedding"], vectors[i])
+
+
+def test_duplicate_keys(tmp_path):
+    client = new_client(tmp_path)
+    vectors = np.random.rand(3, DIMENSION).astype(np.float32)
+    assert client.add_columns(
+        "columns", ids=["a", "b", "c"], vectors=vectors, price=[1, 2, 3]
+    )
+
+    # the existing keys are updated and the last of the repeated keys wins
+    assert client.add_columns(
+        "columns", ids=["b", "d", "d"], vectors=vectors, price=[20, 40, 41]
+    )
+    docs = client.get("columns", ids=["a", "b", "c", "d"])
+    assert [doc["price"] for doc in docs] == [1, 20, 3, 41]
+
+
+def test_dtype_mismatch(tmp_path):
+    client = new_client(tmp_path)
+    vectors = np.random.rand(2, DIMENSION).astype(np.float32)
+    assert client.add_columns("columns", ids=["a", "b"], vectors=vectors, price=[1, 2])
+
+    # an int field is not truncated from floats or wrapped from large ints
+    assert not client.add_columns(
+        "columns", ids=["c", "d"], vectors=vectors, price=[1.5, 2.5]
+    )
+    with pytest.raises(ValueError):
+        client.add_columns(
+            "columns", ids=["c", "d"], vectors=vectors, price=np.array([1, 2**40])
+        )
+    with pytest.raises(ValueError):
+        client.add_columns(
+            "columns",
+            ids=["c", "d"],
+            vectors=vectors,
+            price=np.array([1, 2**63], dtype=np.uint64),
+        )
+
+    # a string field needs strings, a vector field its dimension
+    assert not client.add_columns("columns", ids=[3, 4], vectors=vectors, price=[3, 4])
+    assert not client.add_columns(
+        "columns", ids=["c", "d"], vectors=vectors[:, :4], price=[3, 4]
+    )
+    assert client.get("columns", ids=["c", "d"]) == []
+
+    # a new table is not created from values its schema can't hold
+    with pytest.raises(ValueError):
+        client.add_columns(
+            "other", ids=["a", "b"], vectors=vectors, price=np.array([1, 2**40])
+        )
+    assert client.status("other") == {}
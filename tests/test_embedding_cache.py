@@ -0,0 +1,73 @@
+# -*- coding:utf-8 -*-
+#!/usr/bin/python3
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("awa")
+
+from awadb.embedding_cache import EmbeddingCache
+
+MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def test_hit_and_miss(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, max_rows=8, lru_size=2)
+    assert cache.get("The man is happy") is None
+    cache.put("The man is happy", [1.0, 2.0, 3.0])
+    assert np.array_equal(cache.get("The man is happy"), [1.0, 2.0, 3.0])
+
+    embeddings = cache.get_batch(["The man is happy", "The cat is happy"])
+    assert np.array_equal(embeddings[0], [1.0, 2.0, 3.0])
+    assert embeddings[1] is None
+
+    stats = cache.stats()
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] == 2
+    assert stats["size"] == 1
+
+
+def test_persistence_without_flush(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, max_rows=8)
+    cache.put_batch(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+
+    # opened again as after a crash, no flush
+    reopened = EmbeddingCache(str(tmp_path), MODEL)
+    assert np.array_equal(reopened.get("a"), [1.0, 0.0])
+    assert np.array_equal(reopened.get("b"), [0.0, 1.0])
+    assert reopened.stats()["disk_hits"] == 2
+
+    # the new embeddings don't reuse the rows of the persisted ones
+    reopened.put("c", [1.0, 1.0])
+    again = EmbeddingCache(str(tmp_path), MODEL)
+    for text, vector in [("a", [1.0, 0.0]), ("b", [0.0, 1.0]), ("c", [1.0, 1.0])]:
+        assert np.array_equal(again.get(text), vector)
+
+
+def test_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, max_rows=2)
+    cache.put_batch(["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    assert cache.get("a") is None
+    assert np.array_equal(cache.get("c"), [3.0])
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL)
+    assert reopened.get("a") is None
+    assert np.array_equal(reopened.get("b"), [2.0])
+    assert np.array_equal(reopened.get("c"), [3.0])
+
+
+def test_models_are_separated(tmp_path):
+    first = EmbeddingCache(str(tmp_path), MODEL)
+    second = EmbeddingCache(str(tmp_path), "text-embedding-ada-002")
+    first.put("The man is happy", [1.0, 2.0])
+    assert second.get("The man is happy") is None
+    second.put("The man is happy", [3.0, 4.0, 5.0])
+    assert np.array_equal(first.get("The man is happy"), [1.0, 2.0])
+    assert np.array_equal(
+        EmbeddingCache(str(tmp_path), MODEL).get("The man is happy"), [1.0, 2.0]
+    )
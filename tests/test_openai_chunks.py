@@ -0,0 +1,47 @@
+# -*- coding:utf-8 -*-
+#!/usr/bin/python3
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("awa")
+
+from awadb.awa_embedding.openai import merge_embeddings, split_text
+
+
+def test_split_short_text():
+    assert split_text("The man is happy", 100) == [("The man is happy", 16)]
+
+
+def test_split_bounds_bytes_of_non_english_text():
+    text = "向量数据库" * 50  # 3 bytes a character
+    chunks = split_text(text, 64)
+    assert "".join(chunk for chunk, _ in chunks) == text
+    for chunk, num_tokens in chunks:
+        assert num_tokens == len(chunk.encode("utf-8"))
+        assert num_tokens <= 64
+
+
+def test_split_by_tiktoken():
+    tiktoken = pytest.importorskip("tiktoken")
+    encoding = tiktoken.get_encoding("cl100k_base")
+    text = "The man is happy. " * 100
+    chunks = split_text(text, 50, encoding)
+    assert len(chunks) > 1
+    assert "".join(chunk for chunk, _ in chunks) == text
+    for chunk, num_tokens in chunks:
+        assert num_tokens <= 50
+        assert len(encoding.encode(chunk)) <= 50
+
+
+def test_merge_embeddings():
+    assert merge_embeddings([[0.6, 0.8]], [3]) == [0.6, 0.8]
+
+    merged = merge_embeddings([[1.0, 0.0], [0.0, 1.0]], [3, 1])
+    assert np.allclose(merged, np.array([3.0, 1.0]) / np.sqrt(10.0))
+    assert np.isclose(np.linalg.norm(merged), 1.0)